@@ -162,6 +162,7 @@ def configure(ctx):
     pip_mgr.check_package(RUNTIME, 'sortedcontainers', version='2.1.0')
     pip_mgr.check_package(RUNTIME, 'toposort', version='1.5')
     pip_mgr.check_package(RUNTIME, 'urwid', version='2.1.0')
+    pip_mgr.check_package(RUNTIME, 'zstandard', version='0.13.0')
     pip_mgr.check_package(RUNTIME, 'fastjsonschema', version='2.14.2')
     pip_mgr.check_package(RUNTIME, 'mutagen', version='1.44.0')
     pip_mgr.check_package(BUILD, 'cssutils', version='1.0.2')
@@ -42,6 +42,10 @@ from . import audioproc_pb2
 
 logger = logging.getLogger(__name__)
 
+# Upper bound for concurrent requests to the audioproc process, e.g. control value updates
+# while dragging a knob.
+MAX_IN_FLIGHT = 256
+
 
 class AbstractAudioProcClient(object):
     def __init__(self) -> None:
@@ -100,6 +104,10 @@ class AbstractAudioProcClient(object):
     async def pipeline_mutation(self, realm: str, mutation: audioproc_pb2.Mutation) -> None:
         raise NotImplementedError
 
+    async def pipeline_mutations(
+            self, realm: str, mutations: Iterable[audioproc_pb2.Mutation]) -> None:
+        raise NotImplementedError
+
     async def create_plugin_ui(self, realm: str, node_id: str) -> Tuple[int, Tuple[int, int]]:
         raise NotImplementedError
 
@@ -134,6 +142,11 @@ class AbstractAudioProcClient(object):
     async def profile_audio_thread(self, duration: int) -> bytes:
         raise NotImplementedError
 
+    async def set_perf_stats_mode(
+            self, mode: audioproc_pb2.SetPerfStatsModeRequest.Mode, sample_interval: int = 1
+    ) -> None:
+        raise NotImplementedError
+
     async def dump(self) -> None:
         raise NotImplementedError
 
@@ -190,7 +203,7 @@ class AudioProcClient(AbstractAudioProcClient):
 
     async def connect(self, address: str, flags: Optional[Set[str]] = None) -> None:
         assert self._stub is None
-        self._stub = ipc.Stub(self.event_loop, address)
+        self._stub = ipc.Stub(self.event_loop, address, max_in_flight=MAX_IN_FLIGHT)
         await self._stub.connect(core.StartSessionRequest(
             callback_address=self.__cb_endpoint_address,
             flags=flags))
@@ -311,6 +324,14 @@ class AudioProcClient(AbstractAudioProcClient):
                 realm=realm,
                 mutation=mutation))
 
+    async def pipeline_mutations(
+            self, realm: str, mutations: Iterable[audioproc_pb2.Mutation]) -> None:
+        await self._stub.call(
+            'PIPELINE_MUTATIONS',
+            audioproc_pb2.PipelineMutationsRequest(
+                realm=realm,
+                mutations=mutations))
+
     async def create_plugin_ui(self, realm: str, node_id: str) -> Tuple[int, Tuple[int, int]]:
         request = audioproc_pb2.CreatePluginUIRequest(
             realm=realm,
@@ -375,6 +396,15 @@ class AudioProcClient(AbstractAudioProcClient):
         await self._stub.call('PROFILE_AUDIO_THREAD', request, response)
         return response.svg
 
+    async def set_perf_stats_mode(
+            self, mode: audioproc_pb2.SetPerfStatsModeRequest.Mode, sample_interval: int = 1
+    ) -> None:
+        await self._stub.call(
+            'SET_PERF_STATS_MODE',
+            audioproc_pb2.SetPerfStatsModeRequest(
+                mode=mode,
+                sample_interval=sample_interval))
+
     async def update_project_properties(
             self, realm: str, properties: project_properties_pb2.ProjectProperties) -> None:
         await self._stub.call(
@@ -21,15 +21,21 @@
 # @end:license
 
 import asyncio
+import contextlib
 import logging
+from unittest import mock
 
 import async_generator
 
 from noisidev import unittest
 from noisidev import unittest_mixins
 from noisicaa import node_db
+from noisicaa.core import session_data_pb2
 from . import audioproc_client
+from . import audioproc_pb2
 from .public import engine_notification_pb2
+from .engine import graph
+from .public import processor_message_pb2
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +79,25 @@ class AudioProcClientTest(
             ),
         )
 
+        self.control_description = node_db.NodeDescription(
+            uri='test://control',
+            type=node_db.NodeDescription.PROCESSOR,
+            ports=[
+                node_db.PortDescription(
+                    name='gain',
+                    direction=node_db.PortDescription.INPUT,
+                    types=[node_db.PortDescription.KRATE_CONTROL],
+                    float_value=node_db.FloatValueDescription(
+                        default=1.0,
+                        min=0.0,
+                        max=2.0),
+                ),
+            ],
+            processor=node_db.ProcessorDescription(
+                type='builtin://null',
+            ),
+        )
+
     @async_generator.asynccontextmanager
     @async_generator.async_generator
     async def create_process(self, *, inline_plugin_host=True, inline_audioproc=True):
@@ -123,6 +148,82 @@ class AudioProcClientTest(
             await client.add_node('root', id='test', description=self.passthru_description)
             await client.remove_node('root', 'test')
 
+    @contextlib.contextmanager
+    def track_node_setups(self):
+        """Delay the setup of processor nodes and record, which of them run concurrently."""
+
+        nodes = {}
+        active = set()
+        concurrent = set()
+        orig_setup = graph.ProcessorNode.setup
+
+        async def setup(node):
+            nodes[node.id] = node
+            active.add(node.id)
+            if len(active) > 1:
+                concurrent.update(active)
+            try:
+                # Give other setups a chance to start.
+                await asyncio.sleep(0.2, loop=self.loop)
+                await orig_setup(node)
+            finally:
+                active.discard(node.id)
+
+        with mock.patch.object(graph.ProcessorNode, 'setup', setup):
+            yield nodes, concurrent
+
+    def add_control_node_mutations(self, node_id, value):
+        return [
+            audioproc_pb2.Mutation(
+                add_node=audioproc_pb2.AddNode(
+                    id=node_id, description=self.control_description)),
+            audioproc_pb2.Mutation(
+                set_control_value=audioproc_pb2.SetControlValue(
+                    name=node_id + ':gain', value=value, generation=2)),
+        ]
+
+    async def test_batch_waits_for_node_setup(self):
+        with self.track_node_setups() as (nodes, _):
+            async with self.create_process() as client:
+                # On project open, the node and its control values arrive in the same batch,
+                # while the node is still being set up in the background.
+                await client.pipeline_mutations(
+                    'root', self.add_control_node_mutations('ctrl', 0.5))
+
+                self.assertTrue(nodes['ctrl'].ready)
+                self.assertEqual(
+                    [cv.value for cv in nodes['ctrl'].control_values], [0.5])
+
+    async def test_batch_sets_up_nodes_concurrently(self):
+        with self.track_node_setups() as (nodes, concurrent):
+            async with self.create_process() as client:
+                await client.pipeline_mutations(
+                    'root',
+                    self.add_control_node_mutations('ctrl1', 0.5)
+                    + self.add_control_node_mutations('ctrl2', 0.25))
+
+                self.assertEqual(concurrent, {'ctrl1', 'ctrl2'})
+                self.assertEqual(
+                    [cv.value for cv in nodes['ctrl1'].control_values], [0.5])
+                self.assertEqual(
+                    [cv.value for cv in nodes['ctrl2'].control_values], [0.25])
+
+    async def test_node_messages_wait_for_node_setup(self):
+        async with self.create_process() as client:
+            await client.add_node('root', id='node1', description=self.passthru_description)
+            await client.set_session_values(
+                'root',
+                [session_data_pb2.SessionValue(name='node/node1/muted', bool_value=True)])
+
+            await client.add_node('root', id='node2', description=self.passthru_description)
+            await client.send_node_messages(
+                'root',
+                processor_message_pb2.ProcessorMessageList(messages=[
+                    processor_message_pb2.ProcessorMessage(
+                        node_id='node2',
+                        mute_node=processor_message_pb2.ProcessorMessage.MuteNode(muted=True)),
+                ]))
+
     async def test_connect_ports(self):
         async with self.create_process() as client:
             await client.add_node('root', id='node1', description=self.passthru_description)
@@ -23,14 +23,16 @@
 import asyncio
 import functools
 import logging
+import os.path
 import subprocess
 import sys
 import time
 import uuid
-from typing import Any, Optional, Dict, Set
+from typing import Any, Optional, Dict, Iterable, List, Set
 
 import posix_ipc
 
+from noisicaa import constants
 from noisicaa import core
 from noisicaa.core import empty_message_pb2
 from noisicaa.core import ipc
@@ -47,6 +49,9 @@ from . import audioproc_pb2
 
 logger = logging.getLogger(__name__)
 
+# Upper bound for the disk space used by resampled audio files.
+RESAMPLE_CACHE_SIZE = 4 << 30
+
 
 class Session(ipc.CallbackSessionMixin, ipc.Session):
     async_connect = False
@@ -157,6 +162,9 @@ class AudioProcProcess(core.ProcessBase):
         self.__main_endpoint.add_handler(
             'PIPELINE_MUTATION', self.__handle_pipeline_mutation,
             audioproc_pb2.PipelineMutationRequest, empty_message_pb2.EmptyMessage)
+        self.__main_endpoint.add_handler(
+            'PIPELINE_MUTATIONS', self.__handle_pipeline_mutations,
+            audioproc_pb2.PipelineMutationsRequest, empty_message_pb2.EmptyMessage)
         self.__main_endpoint.add_handler(
             'SEND_NODE_MESSAGES', self.__handle_send_node_messages,
             audioproc_pb2.SendNodeMessagesRequest, empty_message_pb2.EmptyMessage)
@@ -175,6 +183,9 @@ class AudioProcProcess(core.ProcessBase):
         self.__main_endpoint.add_handler(
             'PROFILE_AUDIO_THREAD', self.__handle_profile_audio_thread,
             audioproc_pb2.ProfileAudioThreadRequest, audioproc_pb2.ProfileAudioThreadResponse)
+        self.__main_endpoint.add_handler(
+            'SET_PERF_STATS_MODE', self.__handle_set_perf_stats_mode,
+            audioproc_pb2.SetPerfStatsModeRequest, empty_message_pb2.EmptyMessage)
         self.__main_endpoint.add_handler(
             'DUMP', self.__handle_dump,
             empty_message_pb2.EmptyMessage, empty_message_pb2.EmptyMessage)
@@ -199,6 +210,8 @@ class AudioProcProcess(core.ProcessBase):
         if self.__sample_rate is not None:
             self.__host_system.set_sample_rate(self.__sample_rate)
         self.__host_system.setup()
+        self.__host_system.set_resample_cache(
+            os.path.join(constants.CACHE_DIR, 'resample'), RESAMPLE_CACHE_SIZE)
 
         self.__engine = engine.Engine(
             event_loop=self.event_loop,
@@ -273,11 +286,97 @@ class AudioProcProcess(core.ProcessBase):
         logging.info("Pipeline mutation:\n%s", request)
 
         realm = self.__engine.get_realm(request.realm)
+        with realm.batch_updates():
+            await self.__apply_pipeline_mutations(realm, [request.mutation])
+
+    async def __handle_pipeline_mutations(
+            self,
+            session: Session,
+            request: audioproc_pb2.PipelineMutationsRequest,
+            response: empty_message_pb2.EmptyMessage
+    ) -> None:
+        logging.info("%d pipeline mutations for realm %s", len(request.mutations), request.realm)
+
+        realm = self.__engine.get_realm(request.realm)
+        with realm.batch_updates():
+            await self.__apply_pipeline_mutations(realm, request.mutations)
+
+    def __mutation_node_ids(self, mutation: audioproc_pb2.Mutation) -> List[str]:
+        mutation_type = mutation.WhichOneof('type')
+        if mutation_type in ('connect_ports', 'disconnect_ports'):
+            m = getattr(mutation, mutation_type)
+            return [m.src_node_id, m.dest_node_id]
+        elif mutation_type == 'add_node':
+            return [mutation.add_node.id]
+        elif mutation_type == 'remove_node':
+            return [mutation.remove_node.id]
+        elif mutation_type == 'set_control_value':
+            # Control values are named '<node id>:<port name>'.
+            return [mutation.set_control_value.name.rpartition(':')[0]]
+        else:
+            return [getattr(mutation, mutation_type).node_id]
+
+    async def __apply_pipeline_mutations(
+            self,
+            realm: engine.Realm,
+            mutations: Iterable[audioproc_pb2.Mutation]
+    ) -> None:
+        # Mutations, which have to wait for the setup of their node, are queued per node. This way
+        # all nodes of a batch (e.g. when a project is opened) are set up concurrently, while the
+        # mutations of each node are still applied in order. Mutations, which affect more than one
+        # node, wait for the queues of those nodes.
+        queues = {}  # type: Dict[str, asyncio.Task]
+
+        async def apply_queued(
+                prev: Optional[asyncio.Task], mutation: audioproc_pb2.Mutation) -> None:
+            if prev is not None:
+                await prev
+            await self.__apply_pipeline_mutation(realm, mutation=mutation)
+
+        try:
+            for mutation in mutations:
+                node_ids = self.__mutation_node_ids(mutation)
+
+                if len(node_ids) == 1 and mutation.WhichOneof('type') != 'add_node':
+                    node_id = node_ids[0]
+                    try:
+                        node = realm.graph.find_node(node_id)
+                    except KeyError:
+                        node = None
+                    if node_id in queues or (node is not None and not node.ready):
+                        queues[node_id] = self.event_loop.create_task(
+                            apply_queued(queues.get(node_id), mutation))
+                        continue
+
+                for node_id in node_ids:
+                    queue = queues.pop(node_id, None)
+                    if queue is not None:
+                        await queue
+
+                await self.__apply_pipeline_mutation(realm, mutation=mutation)
+
+        except:  # pylint: disable=bare-except
+            # Do not leave queued mutations behind, when the batch fails.
+            await asyncio.gather(*queues.values(), loop=self.event_loop, return_exceptions=True)
+            raise
+
+        results = await asyncio.gather(
+            *queues.values(), loop=self.event_loop, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def __apply_pipeline_mutation(
+            self,
+            realm: engine.Realm,
+            *,
+            mutation: audioproc_pb2.Mutation
+    ) -> None:
         graph = realm.graph
 
-        mutation_type = request.mutation.WhichOneof('type')
+        mutation_type = mutation.WhichOneof('type')
         if mutation_type == 'add_node':
-            add_node = request.mutation.add_node
+            add_node = mutation.add_node
             logger.info("AddNode():\n%s", add_node.description)
             kwargs = {}  # type: Dict[str, Any]
             if add_node.HasField('name'):
@@ -292,19 +391,19 @@ class AudioProcProcess(core.ProcessBase):
                 description=add_node.description,
                 **kwargs)
             graph.add_node(node)
-            # TODO: schedule setup in a worker thread.
-            await realm.setup_node(node)
-            realm.update_spec()
+            # The node will be added to the spec, once its setup has completed.
+            realm.start_node_setup(node)
 
         elif mutation_type == 'remove_node':
-            remove_node = request.mutation.remove_node
+            remove_node = mutation.remove_node
             node = graph.find_node(remove_node.id)
+            await node.wait_ready()
             await node.cleanup(deref=True)
             graph.remove_node(node)
             realm.update_spec()
 
         elif mutation_type == 'connect_ports':
-            connect_ports = request.mutation.connect_ports
+            connect_ports = mutation.connect_ports
             node1 = graph.find_node(connect_ports.src_node_id)
             try:
                 port1 = node1.outputs[connect_ports.src_port]
@@ -327,7 +426,7 @@ class AudioProcProcess(core.ProcessBase):
             realm.update_spec()
 
         elif mutation_type == 'disconnect_ports':
-            disconnect_ports = request.mutation.disconnect_ports
+            disconnect_ports = mutation.disconnect_ports
             node1 = graph.find_node(disconnect_ports.src_node_id)
             node2 = graph.find_node(disconnect_ports.dest_node_id)
             node2.inputs[disconnect_ports.dest_port].disconnect(
@@ -335,39 +434,42 @@ class AudioProcProcess(core.ProcessBase):
             realm.update_spec()
 
         elif mutation_type == 'set_control_value':
-            set_control_value = request.mutation.set_control_value
-            realm.set_control_value(
+            set_control_value = mutation.set_control_value
+            await realm.set_control_value(
                 set_control_value.name,
                 set_control_value.value,
                 set_control_value.generation)
 
         elif mutation_type == 'set_plugin_state':
-            set_plugin_state = request.mutation.set_plugin_state
+            set_plugin_state = mutation.set_plugin_state
+            await graph.find_node(set_plugin_state.node_id).wait_ready()
             await realm.set_plugin_state(
                 set_plugin_state.node_id,
                 set_plugin_state.state)
 
         elif mutation_type == 'set_node_port_properties':
-            set_node_port_properties = request.mutation.set_node_port_properties
+            set_node_port_properties = mutation.set_node_port_properties
             node = graph.find_node(set_node_port_properties.node_id)
             node.set_port_properties(set_node_port_properties.port_properties)
             realm.update_spec()
 
         elif mutation_type == 'set_node_description':
-            set_node_description = request.mutation.set_node_description
+            set_node_description = mutation.set_node_description
             node = graph.find_node(set_node_description.node_id)
+            await node.wait_ready()
             if await node.set_description(set_node_description.description):
                 realm.update_spec()
 
         elif mutation_type == 'set_node_parameters':
-            set_node_parameters = request.mutation.set_node_parameters
+            set_node_parameters = mutation.set_node_parameters
             node = graph.find_node(set_node_parameters.node_id)
+            await node.wait_ready()
             node.set_parameters(set_node_parameters.parameters)
 
         else:
-            raise ValueError(request.mutation)
+            raise ValueError(mutation)
 
-    def __handle_send_node_messages(
+    async def __handle_send_node_messages(
             self,
             session: Session,
             request: audioproc_pb2.SendNodeMessagesRequest,
@@ -375,7 +477,7 @@ class AudioProcProcess(core.ProcessBase):
     ) -> None:
         realm = self.__engine.get_realm(request.realm)
         for msg in request.messages:
-            realm.send_node_message(msg)
+            await realm.send_node_message(msg)
 
     async def __handle_set_host_parameters(
             self,
@@ -393,14 +495,14 @@ class AudioProcProcess(core.ProcessBase):
     ) -> None:
         await self.__engine.set_backend(request.name, request.settings)
 
-    def __handle_set_session_values(
+    async def __handle_set_session_values(
             self,
             session: Session,
             request: audioproc_pb2.SetSessionValuesRequest,
             response: empty_message_pb2.EmptyMessage
     ) -> None:
         realm = self.__engine.get_realm(request.realm)
-        realm.set_session_values(request.session_values)
+        await realm.set_session_values(request.session_values)
 
     def __handle_update_player_state(
             self,
@@ -523,6 +625,19 @@ class AudioProcProcess(core.ProcessBase):
 
         response.svg = svg
 
+    def __handle_set_perf_stats_mode(
+            self,
+            session: Session,
+            request: audioproc_pb2.SetPerfStatsModeRequest,
+            response: empty_message_pb2.EmptyMessage
+    ) -> None:
+        mode = {
+            audioproc_pb2.SetPerfStatsModeRequest.FULL: 'full',
+            audioproc_pb2.SetPerfStatsModeRequest.SAMPLED: 'sampled',
+            audioproc_pb2.SetPerfStatsModeRequest.OFF: 'off',
+        }[request.mode]
+        self.__engine.set_perf_stats_mode(mode, request.sample_interval)
+
     async def __handle_dump(
             self,
             session: Session,
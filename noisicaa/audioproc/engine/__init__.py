@@ -24,6 +24,9 @@ from .engine import (
 from .spec import (
     PySpec as Spec
 )
+from .realm import (
+    PyRealm as Realm
+)
 from .graph import (
     Node,
 )
@@ -25,6 +25,7 @@ from cpython.ref cimport PyObject
 from cpython.exc cimport PyErr_Fetch, PyErr_Restore
 
 import asyncio
+import concurrent.futures
 import enum
 import functools
 import logging
@@ -54,6 +55,7 @@ from .block_context cimport PyBlockContext
 from .backend cimport PyBackend
 from . cimport message_queue
 from .player cimport PyPlayer
+from .worker_pool cimport PyWorkerPool
 from . import buffers
 from . import graph
 from . import plugin_host_pb2
@@ -61,6 +63,13 @@ from . import plugin_host_pb2
 logger = logging.getLogger(__name__)
 
 
+# Upper limit for the number of worker threads, which are used by default.
+MAX_WORKERS = 8
+
+# Number of threads, which are used to set up nodes.
+NUM_SETUP_THREADS = 4
+
+
 class Error(Exception):
     pass
 
@@ -109,12 +118,18 @@ cdef class PyEngine(object):
         self.__bpm = 120
         self.__duration = musical_time.PyMusicalDuration(2, 1)
 
+        self.__perf_stats_mode = 'full'
+        self.__perf_stats_sample_interval = 1
+
+        self.__worker_pool = None
+        self.__setup_executor = None
+
     def __set_state(self, state: engine_notification_pb2.EngineStateChange.State) -> None:
         self.notifications.call(engine_notification_pb2.EngineNotification(
             engine_state_changes=[engine_notification_pb2.EngineStateChange(
                 state=state)]))
 
-    async def setup(self, *):
+    async def setup(self, *, num_workers: int = None):
         self.__set_state(engine_notification_pb2.EngineStateChange.SETUP)
 
         self.__engine_ptr.reset(new Engine(
@@ -123,6 +138,18 @@ cdef class PyEngine(object):
         with nogil:
             check(self.__engine.setup())
 
+        if num_workers is None:
+            # The audio thread itself also processes tasks, so use one thread less than there
+            # are CPUs.
+            num_workers = max(0, min(os.cpu_count() or 1, MAX_WORKERS + 1) - 1)
+        if num_workers > 0:
+            logger.info("Using %d worker threads.", num_workers)
+            self.__worker_pool = PyWorkerPool(self.__host_system)
+            self.__worker_pool.setup(num_workers)
+
+        self.__setup_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=NUM_SETUP_THREADS)
+
     async def cleanup(self):
         self.__set_state(engine_notification_pb2.EngineStateChange.CLEANUP)
 
@@ -147,10 +174,18 @@ cdef class PyEngine(object):
         self.__realms.clear()
         self.__root_realm = None
 
+        if self.__setup_executor is not None:
+            self.__setup_executor.shutdown(wait=True)
+            self.__setup_executor = None
+
         for listener in self.__realm_listeners.values():
             listener.remove()
         self.__realm_listeners.clear()
 
+        if self.__worker_pool is not None:
+            self.__worker_pool.cleanup()
+            self.__worker_pool = None
+
         if self.__engine != NULL:
             with nogil:
                 self.__engine.cleanup()
@@ -208,6 +243,12 @@ cdef class PyEngine(object):
             out += realm.dump()
         return out
 
+    async def run_in_setup_thread(self, func, *args):
+        """Run a blocking function, which is part of a node's setup, in a background thread."""
+
+        assert self.__setup_executor is not None
+        return await self.__event_loop.run_in_executor(self.__setup_executor, func, *args)
+
     async def get_plugin_host(self):
         if self.__plugin_host is None:
             create_plugin_host_response = editor_main_pb2.CreateProcessResponse()
@@ -282,6 +323,8 @@ cdef class PyEngine(object):
             parent_realm.child_realms[name] = realm
 
         await realm.setup()
+        realm.set_perf_stats_mode(self.__perf_stats_mode, self.__perf_stats_sample_interval)
+        realm.set_worker_pool(self.__worker_pool)
         return realm
 
     async def delete_realm(self, name):
@@ -294,6 +337,13 @@ cdef class PyEngine(object):
         self.__realm_listeners.pop('%s:notifications' % name).remove()
         await realm.cleanup()
 
+    def set_perf_stats_mode(self, mode: str, sample_interval: int = 1) -> None:
+        logger.info("Setting perf stats mode to '%s' (sample_interval=%d)", mode, sample_interval)
+        for realm in self.__realms.values():
+            realm.set_perf_stats_mode(mode, sample_interval)
+        self.__perf_stats_mode = mode
+        self.__perf_stats_sample_interval = sample_interval
+
     def get_buffer(self, name, type):
         return self.__root_realm.get_buffer(name, type)
 
@@ -20,86 +20,244 @@
 #
 # @end:license
 
-# import logging
-# import os.path
+import logging
+import math
+import os.path
+import struct
+import textwrap
 
-# from noisidev import perf_stats
-# from noisidev import profutil
-# from noisidev import unittest
+import async_generator
 
-# from .. import backend
-# from .. import nodes
-# from . import engine
+from noisidev import perf_stats
+from noisidev import unittest
+from noisidev import unittest_mixins
+from noisidev import unittest_engine_mixins
+from noisicaa import node_db
+from noisicaa.constants import TEST_OPTS
+from noisicaa.audioproc.public import backend_settings_pb2
+from noisicaa.audioproc.public import instrument_spec_pb2
+from noisicaa.audioproc.public import musical_time
+from noisicaa.audioproc.public import node_parameters_pb2
+from noisicaa.builtin_nodes.custom_csound import processor_pb2 as custom_csound_pb2
+from noisicaa.builtin_nodes.instrument import processor_messages as instrument_messages
+from noisicaa.builtin_nodes.sample_track import processor_messages as sample_track_messages
+from .realm import PyRealm
+from .backend import PyBackend
+from .worker_pool import PyWorkerPool
+from . import graph as graph_lib
 
-# logger = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
 
 
-# class TestBackend(backend.Backend):
-#     def __init__(self, *, num_frames=1000, skip_first=10):
-#         super().__init__()
+class EnginePerfTest(
+        unittest_engine_mixins.HostSystemMixin,
+        unittest_mixins.NodeDBMixin,
+        unittest.AsyncTestCase):
+    """Measure the cost of Realm::process_block() for graphs of various sizes.
 
-#         self.__frame_num = 0
-#         self.__num_frames = num_frames
-#         self.__skip_first = skip_first
-#         self.frame_times = []
+    The blocks are driven by the null backend with time_scale=0, i.e. without waiting for real
+    time to pass. The collected PerfStats spans are written as per-opcode and per-processor
+    percentiles (see noisidev.perf_stats).
+    """
 
-#     def begin_frame(self, ctxt):
-#         super().begin_frame(ctxt)
-#         ctxt.duration = 128
-#         ctxt.perf.start_span('frame')
-#         if self.__frame_num >= self.__num_frames:
-#             self.stop()
-#             return
-#         self.__frame_num += 1
+    def setup_testcase(self):
+        self.host_system.set_block_size(256)
 
-#     def end_frame(self):
-#         self.ctxt.perf.end_span()
+        self.sample_path = os.path.join(TEST_OPTS.TMP_DIR, 'engine_perftest_sample.raw')
+        with open(self.sample_path, 'wb') as fp:
+            for n in range(44100):
+                fp.write(struct.pack('@f', math.sin(2 * math.pi * 440 * n / 44100)))
 
-#         if not self.stopped:
-#             topspan = self.ctxt.perf.serialize().spans[0]
-#             assert topspan.parentId == 0
-#             assert topspan.name == 'frame'
-#             duration = (topspan.endTimeNSec - topspan.startTimeNSec) / 1000.0
-#             if self.__frame_num > self.__skip_first:
-#                 self.frame_times.append(duration)
+    @async_generator.asynccontextmanager
+    @async_generator.async_generator
+    async def create_realm(self, *, num_workers=0):
+        pool = None
+        realm = PyRealm(
+            name='root', host_system=self.host_system,
+            engine=None, parent=None, player=None, callback_address=None)
+        try:
+            await realm.setup()
+            realm.block_context.create_out_messages()
+            if num_workers > 0:
+                pool = PyWorkerPool(self.host_system)
+                pool.setup(num_workers)
+                realm.set_worker_pool(pool)
+            await async_generator.yield_(realm)
 
-#         super().end_frame()
+        finally:
+            for node in realm.graph.nodes:
+                if node.id != 'sink':
+                    await node.cleanup()
+            await realm.cleanup()
+            if pool is not None:
+                pool.cleanup()
 
-#     def output(self, channel, samples):
-#         pass
+    async def add_node(self, realm, node_id, uri, parameters=None):
+        description = self.node_db.get_node_description(uri)
+        if uri == 'builtin://custom-csound':
+            description.ports.add(
+                name='out',
+                types=[node_db.PortDescription.AUDIO],
+                direction=node_db.PortDescription.OUTPUT)
 
+        node = graph_lib.Node.create(
+            id=node_id, host_system=self.host_system, description=description)
+        if parameters is not None:
+            node.set_parameters(parameters)
+        realm.graph.add_node(node)
+        await realm.setup_node(node)
 
-# class EnginePerfTest(unittest.TestCase):
+        sink = realm.graph.find_node('sink')
+        for port in node.outputs.values():
+            if node_db.PortDescription.AUDIO not in port.description.types:
+                continue
+            if not port.name.endswith(':right'):
+                sink.inputs['in:left'].connect(port, node_db.PortDescription.AUDIO)
+            if not port.name.endswith(':left'):
+                sink.inputs['in:right'].connect(port, node_db.PortDescription.AUDIO)
 
-#     def test_fluidsynth(self):
-#         vm = engine.Engine()
-#         try:
-#             vm.setup(start_thread=False)
+        return node
 
-#             sink = nodes.Sink()
-#             sink.setup()
-#             vm.add_node(sink)
+    async def run_blocks(self, realm, *, num_blocks=2000, skip_first=10):
+        realm.update_spec()
+        program = realm.get_active_program()
 
-#             for idx in range(3):
-#                 node = nodes.FluidSynthSource(
-#                     id='node%d' % idx,
-#                     soundfont_path='/usr/share/sounds/sf2/TimGM6mb.sf2', bank=0, preset=idx)
-#                 node.setup()
-#                 vm.add_node(node)
-#                 sink.inputs['in:left'].connect(node.outputs['out:left'])
-#                 sink.inputs['in:right'].connect(node.outputs['out:right'])
+        backend = PyBackend(
+            self.host_system, 'null', backend_settings_pb2.BackendSettings(time_scale=0.0))
+        backend.setup(realm)
+        try:
+            ctxt = realm.block_context
+            frame_times = []
+            span_times = {}
+            for block in range(num_blocks):
+                ctxt.perf.reset()
+                backend.begin_block(ctxt)
+                realm.process_block(program)
+                backend.end_block(ctxt)
 
-#             vm.update_spec()
+                if block < skip_first:
+                    continue
 
-#             be = TestBackend()
-#             vm.setup_backend(be)
+                call_span_ids = set()
+                for span in ctxt.perf.spans:
+                    if span.name == 'frame':
+                        frame_times.append(span.duration // 1000)
+                        continue
 
-#             profutil.profile(self.id(), vm.vm_loop)
+                    if span.name == 'opcode(CALL)':
+                        call_span_ids.add(span.id)
 
-#             perf_stats.write_frame_stats(
-#                 os.path.splitext(os.path.basename(__file__))[0],
-#                 '.'.join(self.id().split('.')[-2:]),
-#                 be.frame_times)
+                    if span.name.startswith('opcode(') or span.parent_id in call_span_ids:
+                        name = span.name
+                    else:
+                        name = 'other(%s)' % span.name
+                    span_times.setdefault(name, []).append(span.duration)
 
-#         finally:
-#             vm.cleanup()
+        finally:
+            backend.cleanup()
+
+        filebase = os.path.splitext(os.path.basename(__file__))[0]
+        testname = '.'.join(self.id().split('.')[-2:])
+        perf_stats.write_frame_stats(filebase, testname, frame_times)
+        perf_stats.write_span_stats(filebase, testname, span_times)
+
+    async def run_mixer_test(self, num_nodes):
+        async with self.create_realm() as realm:
+            for idx in range(num_nodes):
+                await self.add_node(realm, 'mixer%d' % idx, 'builtin://mixer')
+            await self.run_blocks(realm)
+
+    async def test_mixer_1(self):
+        await self.run_mixer_test(1)
+
+    async def test_mixer_10(self):
+        await self.run_mixer_test(10)
+
+    async def test_mixer_100(self):
+        await self.run_mixer_test(100)
+
+    async def run_oscillator_test(self, num_nodes):
+        async with self.create_realm() as realm:
+            for idx in range(num_nodes):
+                await self.add_node(realm, 'osc%d' % idx, 'builtin://oscillator')
+            await self.run_blocks(realm)
+
+    async def test_oscillator_10(self):
+        await self.run_oscillator_test(10)
+
+    async def test_oscillator_100(self):
+        await self.run_oscillator_test(100)
+
+    async def run_fluidsynth_test(self, num_nodes, num_workers=0):
+        async with self.create_realm(num_workers=num_workers) as realm:
+            for idx in range(num_nodes):
+                node = await self.add_node(realm, 'fluid%d' % idx, 'builtin://instrument')
+                node.processor.handle_message(instrument_messages.change_instrument(
+                    node.id,
+                    instrument_spec_pb2.InstrumentSpec(
+                        sf2=instrument_spec_pb2.SF2InstrumentSpec(
+                            path=os.path.join(unittest.TESTDATA_DIR, 'sf2test.sf2'),
+                            bank=0,
+                            preset=0))))
+            await self.run_blocks(realm)
+
+    async def test_fluidsynth_1(self):
+        await self.run_fluidsynth_test(1)
+
+    async def test_fluidsynth_10(self):
+        await self.run_fluidsynth_test(10)
+
+    async def test_fluidsynth_10_workers_4(self):
+        await self.run_fluidsynth_test(10, num_workers=4)
+
+    async def run_csound_test(self, num_nodes, num_workers=0):
+        params = node_parameters_pb2.NodeParameters()
+        csound_params = params.Extensions[custom_csound_pb2.custom_csound_parameters]
+        csound_params.orchestra = textwrap.dedent('''\
+            0dbfs = 1.0
+            ksmps = 32
+            nchnls = 2
+
+            gaOut chnexport "out", 2
+
+            instr 1
+              gaOut oscils 0.1, 440, 0
+            endin
+            ''')
+        csound_params.score = textwrap.dedent('''\
+            i1 0 -1
+            e 10000
+            ''')
+
+        async with self.create_realm(num_workers=num_workers) as realm:
+            for idx in range(num_nodes):
+                await self.add_node(realm, 'csound%d' % idx, 'builtin://custom-csound', params)
+            await self.run_blocks(realm)
+
+    async def test_csound_1(self):
+        await self.run_csound_test(1)
+
+    async def test_csound_10(self):
+        await self.run_csound_test(10)
+
+    async def test_csound_10_workers_4(self):
+        await self.run_csound_test(10, num_workers=4)
+
+    async def run_sample_track_test(self, num_nodes):
+        async with self.create_realm() as realm:
+            for idx in range(num_nodes):
+                node = await self.add_node(realm, 'track%d' % idx, 'builtin://sample-track')
+                node.processor.handle_message(sample_track_messages.add_sample(
+                    node_id=node.id,
+                    id=1,
+                    time=musical_time.PyMusicalTime(0, 1),
+                    sample_rate=44100,
+                    num_samples=44100,
+                    channel_paths=[self.sample_path]))
+            await self.run_blocks(realm)
+
+    async def test_sample_track_10(self):
+        await self.run_sample_track_test(10)
+
+    async def test_sample_track_100(self):
+        await self.run_sample_track_test(100)
@@ -32,18 +32,21 @@ FluidSynthUtil::FluidSynthUtil(HostSystem* host_system)
 
 FluidSynthUtil::~FluidSynthUtil() {
   if (_synth != nullptr) {
-        //     self.__synth.system_reset()
-        //     if self.__sfont is not None:
-        //         # TODO: This call spits out a ton of "CRITICAL **:
-        //         # fluid_synth_sfont_unref: assertion 'sfont_info != NULL' failed"
-        //         # messages on STDERR
-        //         self.__synth.remove_sfont(self.__sfont)
-        //         self.__sfont = None
+    // The sound font is owned by the FluidSynthSubSystem, so remove it from the synth before
+    // deleting it, or it would get deleted as well.
+    if (_sound_font != nullptr) {
+      fluid_synth_remove_sfont(_synth, _sound_font->sfont());
+    }
 
     delete_fluid_synth(_synth);
     _synth = nullptr;
   }
 
+  if (_sound_font != nullptr) {
+    _host_system->fluidsynth->release_sound_font(_sound_font);
+    _sound_font = nullptr;
+  }
+
   if (_settings != nullptr) {
     delete_fluid_settings(_settings);
     _settings = nullptr;
@@ -77,27 +80,17 @@ Status FluidSynthUtil::setup(const string& path, uint32_t bank, uint32_t preset)
     return ERROR_STATUS("Failed to create fluid synth object.");
   }
 
-  int sfid = fluid_synth_sfload(_synth, path.c_str(), true);
+  StatusOr<SoundFont*> stor_sound_font = _host_system->fluidsynth->load_sound_font(path);
+  RETURN_IF_ERROR(stor_sound_font);
+  SoundFont* sound_font = stor_sound_font.result();
+
+  int sfid = fluid_synth_add_sfont(_synth, sound_font->sfont());
   if (sfid == FLUID_FAILED) {
+    _host_system->fluidsynth->release_sound_font(sound_font);
     // TODO: error message?
-    return ERROR_STATUS("Failed to load soundfont.");
+    return ERROR_STATUS("Failed to add soundfont.");
   }
-
-  // try:
-  //     sfont = self.master_sfonts[self.__soundfont_path]
-  // except KeyError:
-  //     logger.info(
-  //         "Adding new soundfont %s to master synth.",
-  //         self.__soundfont_path)
-  //     master_sfid = self.master_synth.sfload(self.__soundfont_path)
-  //     sfont = self.master_synth.get_sfont(master_sfid)
-  //     self.master_sfonts[self.__soundfont_path] = sfont
-
-  // logger.debug("Using soundfont %s", sfont.id)
-  // sfid = self.__synth.add_sfont(sfont)
-
-  // logger.debug("Soundfont id=%s", sfid)
-  // self.__sfont = sfont
+  _sound_font = sound_font;
 
   rc = fluid_synth_system_reset(_synth);
   if (rc == FLUID_FAILED) {
@@ -38,6 +38,7 @@ using namespace std;
 
 class Logger;
 class HostSystem;
+class SoundFont;
 class BlockContext;
 class TimeMapper;
 
@@ -55,6 +56,7 @@ private:
 
   fluid_settings_t* _settings = nullptr;
   fluid_synth_t* _synth = nullptr;
+  SoundFont* _sound_font = nullptr;
 };
 
 }  // namespace noisicaa
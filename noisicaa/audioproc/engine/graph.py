@@ -20,6 +20,7 @@
 #
 # @end:license
 
+import asyncio
 import logging
 import typing
 from typing import Any, Dict, List, Optional, Set
@@ -176,6 +177,7 @@ class Node(object):
         self.initial_state = initial_state
 
         self.__realm = None  # type: realm_lib.PyRealm
+        self.__ready = None  # type: asyncio.Future
         self.broken = False
         self.ports = []  # type: List[Port]
         self.inputs = {}  # type: Dict[str, InputPort]
@@ -219,6 +221,26 @@ class Node(object):
     def is_owned_by(self, realm: realm_lib.PyRealm) -> bool:
         return self.__realm is realm
 
+    @property
+    def ready(self) -> bool:
+        """True, if the node has been set up successfully."""
+        return self.__ready is not None and self.__ready.done() and self.__ready.result()
+
+    def begin_setup(self) -> asyncio.Future:
+        """Mark the node as being set up.
+
+        The returned future must be resolved with True or False, once the setup has succeeded
+        or failed.
+        """
+        self.__ready = asyncio.get_event_loop().create_future()
+        return self.__ready
+
+    async def wait_ready(self) -> bool:
+        """Wait until a pending setup has finished and return if the node is ready."""
+        if self.__ready is None:
+            return False
+        return await asyncio.shield(self.__ready)
+
     def __create_port(self, port_desc: node_db.PortDescription) -> Port:
         port_cls = port_cls_map[port_desc.direction]
         kwargs = {}
@@ -272,6 +294,7 @@ class Node(object):
         The counterpart of setup().
         """
         logger.info("%s: cleanup()", self.name)
+        self.__ready = None
         self.__control_values.clear()
 
     def set_session_value(self, key: str, value: session_data_pb2.SessionValue) -> None:
@@ -334,7 +357,7 @@ class Node(object):
 
         self.description.CopyFrom(description)
 
-        await self.setup()
+        await self.realm.setup_node(self)
 
         return True
 
@@ -375,7 +398,8 @@ class Node(object):
             elif isinstance(port, InputPort):
                 spec.append_opcode('CLEAR', port.buf_name)
                 for upstream_port in port.connections:
-                    spec.append_opcode('MIX', upstream_port.buf_name, port.buf_name)
+                    if upstream_port.owner.ready:
+                        spec.append_opcode('MIX', upstream_port.buf_name, port.buf_name)
 
     def add_to_spec_post(self, spec: spec_lib.PySpec) -> None:
         pass
@@ -398,7 +422,9 @@ class ProcessorNode(Node):
         self.__processor = processor_lib.PyProcessor(
             self.realm.name, self.id, self._host_system, self.description)
         self.__processor.set_parameters(self.parameters)
-        self.__processor.setup()
+        # This might take a long time (e.g. compiling a csound orchestra or loading a
+        # soundfont), so keep it off the event loop.
+        await self.realm.run_in_setup_thread(self.__processor.setup)
         self.realm.add_active_processor(self.__processor)
 
     async def cleanup(self, deref: bool = False) -> None:
@@ -531,6 +557,8 @@ class Graph(object):
     def __init__(self, realm: realm_lib.PyRealm) -> None:
         self.__realm = realm
         self.__nodes = {}  # type: Dict[str, Node]
+        self.__sorted_deps = None  # type: Dict[Node, Set[Node]]
+        self.__sorted_levels = None  # type: List[Set[Node]]
 
     @property
     def nodes(self) -> Set[Node]:
@@ -557,12 +585,23 @@ class Graph(object):
         spec.bpm = bpm
         spec.duration = duration
 
-        sorted_nodes = toposort.toposort_flatten(
-            {node: set(node.parent_nodes) for node in self.__nodes.values()},
-            sort=False)
-
-        for node in sorted_nodes:
-            node.add_to_spec_pre(spec)
-            node.add_to_spec_post(spec)
+        # Nodes in the same level of the sort do not depend on each other, so the engine is free
+        # to process them concurrently.
+        # Most mutations do not change the structure of the graph, so only sort it again, when
+        # it did change.
+        deps = {node: set(node.parent_nodes) for node in self.__nodes.values()}
+        if deps != self.__sorted_deps:
+            self.__sorted_levels = list(toposort.toposort(deps))
+            self.__sorted_deps = deps
+
+        # Nodes, which are still being set up (or whose setup failed), are left out.
+        for level in self.__sorted_levels:
+            for node in level:
+                if not node.ready:
+                    continue
+                spec.begin_task()
+                node.add_to_spec_pre(spec)
+                node.add_to_spec_post(spec)
+            spec.end_stage()
 
         return spec
@@ -122,7 +122,6 @@ void Player::fill_time_map(TimeMapper* time_mapper, BlockContext* ctxt) {
     }
     if (mutation.set_current_time) {
       _state.current_time = mutation.current_time;
-      _tmap_it = time_mapper->find(_state.current_time);
     }
     if (mutation.set_loop_enabled) {
       _state.loop_enabled = mutation.loop_enabled;
@@ -139,10 +138,6 @@ void Player::fill_time_map(TimeMapper* time_mapper, BlockContext* ctxt) {
   SampleTime* stime_end = ctxt->time_map.get() + _host_system->block_size();
 
   if (_state.playing) {
-    if (!_tmap_it.valid() || !_tmap_it.is_owned_by(time_mapper) ) {
-      _tmap_it = time_mapper->find(_state.current_time);
-    }
-
     MusicalTime loop_start_time =
       (_state.loop_enabled && _state.loop_start_time >= MusicalTime(0, 1))
       ? _state.loop_start_time : MusicalTime(0, 1);
@@ -150,6 +145,16 @@ void Player::fill_time_map(TimeMapper* time_mapper, BlockContext* ctxt) {
       (_state.loop_enabled && _state.loop_end_time >= MusicalTime(0, 1))
       ? _state.loop_end_time : time_mapper->end_time();
 
+    // The playback position is tracked as an integer sample time, which maps exactly onto the
+    // musical time of each sample boundary. loop_end_time does not have to fall onto a sample
+    // boundary, so only the last step before it gets clamped, and all samples before that are
+    // filled without any rational comparisons.
+    uint64_t loop_end_sample = time_mapper->musical_to_sample_time(loop_end_time);
+    if (time_mapper->sample_to_musical_time(loop_end_sample) < loop_end_time) {
+      ++loop_end_sample;
+    }
+    uint64_t sample_time = time_mapper->musical_to_sample_time(_state.current_time);
+
     while (stime < stime_end) {
       if (_state.current_time >= loop_end_time) {
         if (!_state.loop_enabled) {
@@ -159,15 +164,33 @@ void Player::fill_time_map(TimeMapper* time_mapper, BlockContext* ctxt) {
         } else {
           _state.current_time = loop_start_time;
         }
-        _tmap_it = time_mapper->find(_state.current_time);
+        sample_time = time_mapper->musical_to_sample_time(_state.current_time);
       }
 
-      MusicalTime prev_time = _state.current_time;
-      ++_tmap_it;
-      _state.current_time = min(*_tmap_it, loop_end_time);
-      assert(_state.current_time > prev_time);
+      uint64_t num_samples = stime_end - stime;
+      uint64_t num_unclamped =
+        sample_time + 1 < loop_end_sample ? loop_end_sample - sample_time - 1 : 0;
+      bool clamp = num_unclamped < num_samples;
+      if (clamp) {
+        num_samples = num_unclamped;
+      }
 
-      *stime++ = SampleTime{ prev_time, _state.current_time };
+      if (num_samples > 0) {
+        stime->start_time = _state.current_time;
+        stime->end_time = time_mapper->sample_to_musical_time(++sample_time);
+        for (SampleTime* end = stime + num_samples ; ++stime < end ; ) {
+          stime->start_time = (stime - 1)->end_time;
+          stime->end_time = time_mapper->sample_to_musical_time(++sample_time);
+        }
+        _state.current_time = (stime - 1)->end_time;
+      }
+
+      if (clamp) {
+        assert(loop_end_time > _state.current_time);
+        *stime++ = SampleTime{ _state.current_time, loop_end_time };
+        _state.current_time = loop_end_time;
+        ++sample_time;
+      }
     }
 
     if (!_state.playing) {
@@ -82,8 +82,6 @@ private:
   const string _realm_name;
   HostSystem* _host_system;
 
-  TimeMapper::iterator _tmap_it;
-
   PlayerState _state;
   FifoQueue<PlayerStateMutation, 128> _mutation_queue;
 };
@@ -26,7 +26,9 @@
 #include <unistd.h>
 #include <sys/mman.h>
 #include <sys/stat.h>
+#include <algorithm>
 #include <random>
+#include <typeinfo>
 
 #include "noisicaa/core/logging.h"
 #include "noisicaa/core/perf_stats.h"
@@ -44,6 +46,7 @@
 #include "noisicaa/audioproc/engine/message_queue.h"
 #include "noisicaa/audioproc/engine/realm.h"
 #include "noisicaa/audioproc/engine/rtcheck.h"
+#include "noisicaa/audioproc/engine/worker_pool.h"
 
 namespace noisicaa {
 
@@ -57,23 +60,60 @@ Program::~Program() {
   _logger->info("Deleted program v%d", version);
 }
 
-Status Program::setup(Realm* realm, HostSystem* host_system, const Spec* s) {
+Status Program::setup(
+    Realm* realm, HostSystem* host_system, const Spec* s, const Program* prev) {
   spec.reset(s);
 
+  int num_buffers = spec->num_buffers();
+  vector<uint32_t> sizes(num_buffers);
   uint32_t total_size = 0;
-  for (int i = 0 ; i < spec->num_buffers() ; ++i) {
-    total_size += spec->get_buffer(i)->size(host_system);
+  for (int i = 0 ; i < num_buffers ; ++i) {
+    sizes[i] = spec->get_buffer(i)->size(host_system);
+    total_size += sizes[i];
   }
 
-  _logger->info("Require %lu bytes for buffers.", total_size);
-  StatusOr<BufferArena*> stor_buffer_arena = realm->get_buffer_arena(total_size);
-  RETURN_IF_ERROR(stor_buffer_arena);
-  buffer_arena = stor_buffer_arena.result();
+  vector<uint32_t> offsets(num_buffers, 0);
+  buffer_reused.assign(num_buffers, false);
+  if (prev != nullptr) {
+    has_base = true;
+    base_version = prev->version;
+    base_buffer_reused.assign(prev->buffers.size(), false);
 
-  BufferPtr data = buffer_arena->address();
-  for (int i = 0 ; i < spec->num_buffers() ; ++i) {
-    unique_ptr<Buffer> buf(new Buffer(host_system, spec->get_buffer(i), data));
-    data += buf->size();
+    uint32_t layout_size = layout_buffers(prev, sizes, offsets);
+    if (layout_size <= prev->buffer_arena->size()) {
+      buffer_arena = prev->buffer_arena;
+    }
+  }
+
+  if (buffer_arena == nullptr) {
+    // No previous program or it doesn't fit into the previous arena anymore, so just pack all
+    // buffers into a (possibly new) arena.
+    buffer_reused.assign(num_buffers, false);
+    base_buffer_reused.assign(base_buffer_reused.size(), false);
+
+    uint32_t offset = 0;
+    for (int i = 0 ; i < num_buffers ; ++i) {
+      offsets[i] = offset;
+      offset += sizes[i];
+    }
+
+    _logger->info("Require %lu bytes for buffers.", total_size);
+    StatusOr<BufferArena*> stor_buffer_arena = realm->get_buffer_arena(total_size);
+    RETURN_IF_ERROR(stor_buffer_arena);
+    buffer_arena = stor_buffer_arena.result();
+  } else {
+    int num_reused = 0;
+    for (bool reused : buffer_reused) {
+      num_reused += reused ? 1 : 0;
+    }
+    _logger->info(
+        "Require %lu bytes for buffers, reusing %d of %d buffers from program v%d.",
+        total_size, num_reused, num_buffers, prev->version);
+  }
+
+  for (int i = 0 ; i < num_buffers ; ++i) {
+    unique_ptr<Buffer> buf(
+        new Buffer(host_system, spec->get_buffer(i), buffer_arena->address() + offsets[i]));
     buffers.emplace_back(buf.release());
   }
 
@@ -81,9 +121,100 @@ Status Program::setup(Realm* realm, HostSystem* host_system, const Spec* s) {
   time_mapper->set_bpm(spec->bpm());
   time_mapper->set_duration(spec->duration());
 
+  init_ops.clear();
+  run_ops.clear();
+  tasks.clear();
+  stages.clear();
+  int prev_stage = -2;
+  int prev_task = -2;
+  for (int p = 0 ; p < spec->num_ops() ; ++p) {
+    const OpSpec& opspec = opspecs[spec->get_opcode(p)];
+    if (opspec.init != nullptr) {
+      init_ops.emplace_back(ProgramOp{opspec.init, &spec->get_opargs(p), spec->get_perf_label(p)});
+    }
+    if (opspec.run != nullptr) {
+      // Consecutive opcodes, which are not part of any task, form a stage with a single task,
+      // i.e. they are executed serially.
+      int stage = spec->get_stage(p);
+      int task = spec->get_task(p);
+      if (stage != prev_stage) {
+        stages.emplace_back(
+            ProgramStage{(uint32_t)tasks.size(), (uint32_t)tasks.size(), false});
+      }
+      if (stage != prev_stage || task != prev_task) {
+        tasks.emplace_back(ProgramTask{(uint32_t)run_ops.size(), (uint32_t)run_ops.size()});
+        ++stages.back().end;
+      }
+      prev_stage = stage;
+      prev_task = task;
+      if (spec->get_opcode(p) == OpCode::END) {
+        stages.back().has_end = true;
+      }
+
+      run_ops.emplace_back(ProgramOp{opspec.run, &spec->get_opargs(p), spec->get_perf_label(p)});
+      ++tasks.back().end;
+    }
+  }
+
   return Status::Ok();
 }
 
+uint32_t Program::layout_buffers(
+    const Program* prev, const vector<uint32_t>& sizes, vector<uint32_t>& offsets) {
+  // Buffers, which also exist in the previous program (same name and type), keep their position
+  // in the arena, so they neither have to be set up again, nor lose their contents.
+  vector<pair<uint32_t, uint32_t>> used;
+  for (int i = 0 ; i < spec->num_buffers() ; ++i) {
+    StatusOr<int> stor_idx = prev->spec->get_buffer_idx(spec->get_buffer_name(i));
+    if (stor_idx.is_error()) {
+      continue;
+    }
+    int prev_idx = stor_idx.result();
+    if (base_buffer_reused[prev_idx]) {
+      continue;
+    }
+
+    const BufferType* type = spec->get_buffer(i);
+    const BufferType* prev_type = prev->spec->get_buffer(prev_idx);
+    Buffer* prev_buf = prev->buffers[prev_idx].get();
+    if (typeid(*type) != typeid(*prev_type)
+        || type->type() != prev_type->type()
+        || sizes[i] != prev_buf->size()) {
+      continue;
+    }
+
+    offsets[i] = prev_buf->data() - prev->buffer_arena->address();
+    buffer_reused[i] = true;
+    base_buffer_reused[prev_idx] = true;
+    used.emplace_back(offsets[i], offsets[i] + sizes[i]);
+  }
+  sort(used.begin(), used.end());
+
+  // All other buffers go into the first gap, which is large enough.
+  for (int i = 0 ; i < spec->num_buffers() ; ++i) {
+    if (buffer_reused[i]) {
+      continue;
+    }
+
+    uint32_t offset = 0;
+    auto it = used.begin();
+    for ( ; it != used.end() ; ++it) {
+      if (offset + sizes[i] <= it->first) {
+        break;
+      }
+      offset = max(offset, it->second);
+    }
+    offsets[i] = offset;
+    used.emplace(it, offset, offset + sizes[i]);
+  }
+
+  uint32_t layout_size = 0;
+  for (const auto& it : used) {
+    layout_size = max(layout_size, it.second);
+  }
+  return layout_size;
+}
+
 Stack::Stack(size_t size) {
   _size = size;
   _data.reset(new uint8_t[_size]);
@@ -157,7 +288,10 @@ Realm::Realm(const string& name, HostSystem* host_system, Player* player)
     _player(player),
     _next_program(nullptr),
     _current_program(nullptr),
-    _old_program(nullptr) {
+    _old_program(nullptr),
+    _perf_stats_mode(PERF_STATS_FULL),
+    _perf_stats_sample_interval(1),
+    _worker_pool(nullptr) {
   char logger_name[MaxLoggerNameLength];
   snprintf(logger_name, MaxLoggerNameLength, "noisicaa.audioproc.engine.realm[%s]", name.c_str());
   _logger = LoggerRegistry::get_logger(logger_name);
@@ -394,7 +528,13 @@ Status Realm::set_spec(const Spec* s) {
 
   unique_ptr<Program> program(new Program(_logger, _program_version++));
 
-  RETURN_IF_ERROR(program->setup(this, _host_system, spec.release()));
+  // Base the buffer layout on the most recent program, which is most likely the one, which the
+  // audio thread will replace with this program.
+  Program* prev_program = _next_program.load();
+  if (prev_program == nullptr) {
+    prev_program = _current_program.load();
+  }
+  RETURN_IF_ERROR(program->setup(this, _host_system, spec.release(), prev_program));
 
   _logger->info("Activate next program v%d", program->version);
   activate_program(program.get());
@@ -456,6 +596,12 @@ Status Realm::send_processor_message(uint64_t processor_id, const string& msg_se
   return active_processor->processor->handle_message(msg_serialized);
 }
 
+void Realm::set_perf_stats_mode(PerfStatsMode mode, uint32_t sample_interval) {
+  assert(sample_interval > 0);
+  _perf_stats_sample_interval.store(sample_interval);
+  _perf_stats_mode.store(mode);
+}
+
 StatusOr<Program*> Realm::get_active_program() {
   // If there is a next program, make it the current. The current program becomes
   // the old program, which will eventually be destroyed in the main thread.
@@ -466,19 +612,30 @@ StatusOr<Program*> Realm::get_active_program() {
     if (program != nullptr) {
       _logger->info("Use program v%d", program->version);
       Program* old_program = _current_program.exchange(program);
+
+      // Buffers, which the new program took over from the old program, stay as they are.
+      bool reuse_buffers = (
+          old_program != nullptr
+          && program->has_base
+          && program->base_version == old_program->version);
+
       if (old_program) {
         _logger->info("Unuse program v%d", old_program->version);
 
-        for (auto& buffer : old_program->buffers) {
-          buffer->cleanup();
+        for (size_t i = 0 ; i < old_program->buffers.size() ; ++i) {
+          if (!reuse_buffers || !program->base_buffer_reused[i]) {
+            old_program->buffers[i]->cleanup();
+          }
         }
 
         old_program = _old_program.exchange(old_program);
         assert(old_program == nullptr);
       }
 
-      for (auto& buffer : program->buffers) {
-        RETURN_IF_ERROR(buffer->setup());
+      for (size_t i = 0 ; i < program->buffers.size() ; ++i) {
+        if (!reuse_buffers || !program->buffer_reused[i]) {
+          RETURN_IF_ERROR(program->buffers[i]->setup());
+        }
       }
     }
   }
@@ -486,6 +643,38 @@ StatusOr<Program*> Realm::get_active_program() {
   return _current_program.load();
 }
 
+static Status run_program_ops(
+    BlockContext* ctxt, ProgramState* state, const ProgramTask& task, bool track_perf) {
+  const ProgramOp* op = state->program->run_ops.data() + task.begin;
+  const ProgramOp* end = state->program->run_ops.data() + task.end;
+  if (track_perf) {
+    for ( ; op < end && !state->end ; ++op) {
+      PerfTracker tracker(ctxt->perf.get(), op->perf_label);
+      RETURN_IF_ERROR(op->func(ctxt, state, *op->args));
+    }
+  } else {
+    for ( ; op < end && !state->end ; ++op) {
+      RETURN_IF_ERROR(op->func(ctxt, state, *op->args));
+    }
+  }
+  return Status::Ok();
+}
+
+struct StageData {
+  const ProgramState* state;
+  const ProgramTask* tasks;
+  bool track_perf;
+};
+
+static Status run_stage_task(void* data, uint32_t task_idx, BlockContext* ctxt) {
+  const StageData* stage = (const StageData*)data;
+
+  // Tasks might run concurrently, so each one needs its own state. Stages with an END opcode
+  // are never passed to the worker pool, so the end flag does not have to be merged back.
+  ProgramState state = *stage->state;
+  return run_program_ops(ctxt, &state, stage->tasks[task_idx], stage->track_perf);
+}
+
 Status Realm::process_block(Program* program) {
   _block_context->buffer_arena = program->buffer_arena;
 
@@ -497,46 +686,59 @@ Status Realm::process_block(Program* program) {
 
   _logger->debug("Process block [%d,%d]", _block_context->sample_pos, _host_system->block_size());
 
-  if (_player != nullptr) {
-    PerfTracker tracker(_block_context->perf.get(), "fill_time_map");
+  bool track_perf;
+  switch (_perf_stats_mode.load()) {
+  case PERF_STATS_FULL:
+    track_perf = true;
+    break;
+  case PERF_STATS_SAMPLED:
+    track_perf = (_block_count % _perf_stats_sample_interval.load()) == 0;
+    break;
+  default:
+    track_perf = false;
+    break;
+  }
+  ++_block_count;
 
-    _player->fill_time_map(program->time_mapper.get(), _block_context.get());
+  PerfStats* perf = _block_context->perf.get();
+
+  if (_player != nullptr) {
+    if (track_perf) {
+      PerfTracker tracker(perf, "fill_time_map");
+      _player->fill_time_map(program->time_mapper.get(), _block_context.get());
+    } else {
+      _player->fill_time_map(program->time_mapper.get(), _block_context.get());
+    }
   }
 
-  const Spec* spec = program->spec.get();
-  ProgramState state = { _logger, _host_system, program, _stack.get(), 0, false };
+  BlockContext* ctxt = _block_context.get();
+  ProgramState state = { _logger, _host_system, program, _stack.get(), false };
 
   if (run_init) {
     _stack->reset();
-    while (state.p < spec->num_ops()) {
-      int p = state.p++;
-
-      OpCode opcode = spec->get_opcode(p);
-      OpSpec opspec = opspecs[opcode];
-      if (opspec.init != nullptr) {
-        RETURN_IF_ERROR(opspec.init(_block_context.get(), &state, spec->get_opargs(p)));
-      }
+    const ProgramOp* op = program->init_ops.data();
+    const ProgramOp* end = op + program->init_ops.size();
+    for ( ; op < end ; ++op) {
+      RETURN_IF_ERROR(op->func(ctxt, &state, *op->args));
     }
 
     program->initialized = true;
-    state.p = 0;
   }
 
   _stack->reset();
-  while (!state.end) {
-    if (state.p == spec->num_ops()) {
-      break;
+  WorkerPool* worker_pool = _worker_pool.load();
+  for (const ProgramStage& stage : program->stages) {
+    if (worker_pool != nullptr && stage.end - stage.begin > 1 && !stage.has_end) {
+      StageData data = { &state, program->tasks.data() + stage.begin, track_perf };
+      RETURN_IF_ERROR(worker_pool->run(ctxt, stage.end - stage.begin, run_stage_task, &data));
+    } else {
+      for (uint32_t t = stage.begin ; t < stage.end && !state.end ; ++t) {
+        RETURN_IF_ERROR(run_program_ops(ctxt, &state, program->tasks[t], track_perf));
+      }
     }
 
-    int p = state.p++;
-
-    OpCode opcode = spec->get_opcode(p);
-    OpSpec opspec = opspecs[opcode];
-    if (opspec.run != nullptr) {
-      char perf_label[PerfStats::NAME_LENGTH];
-      snprintf(perf_label, PerfStats::NAME_LENGTH, "opcode(%s)", opspec.name);
-      PerfTracker tracker(_block_context->perf.get(), perf_label);
-      RETURN_IF_ERROR(opspec.run(_block_context.get(), &state, spec->get_opargs(p)));
+    if (state.end) {
+      break;
     }
   }
 
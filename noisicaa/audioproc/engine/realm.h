@@ -34,6 +34,7 @@
 #include "noisicaa/core/refcount.h"
 #include "noisicaa/core/status.h"
 #include "noisicaa/core/slots.inl.h"
+#include "noisicaa/audioproc/engine/opcodes.h"
 #include "noisicaa/audioproc/engine/processor.h"
 
 namespace noisicaa {
@@ -50,26 +51,69 @@ class Player;
 class TimeMapper;
 class BufferArena;
 class Realm;
+class WorkerPool;
 
 namespace pb {
 class EngineNotification;
 }
 
+// An opcode of the Spec, decoded once when the Program is set up, so the audio thread doesn't
+// have to look up the OpSpec and arguments for every opcode in every block.
+struct ProgramOp {
+  OpFunc func;
+  const vector<OpArg>* args;
+  const char* perf_label;
+};
+
+// A consecutive range of run_ops, which must be executed serially.
+struct ProgramTask {
+  uint32_t begin;
+  uint32_t end;
+};
+
+// A consecutive range of tasks, which have no dependencies on each other and can be executed
+// concurrently. Stages with an END opcode are always executed serially, because END must skip
+// all opcodes after it.
+struct ProgramStage {
+  uint32_t begin;
+  uint32_t end;
+  bool has_end;
+};
+
 class Program {
 public:
   Program(Logger* logger, uint32_t version);
   ~Program();
 
-  Status setup(Realm* realm, HostSystem* host_system, const Spec* spec);
+  // If prev is given, buffers which are unchanged from that program are placed at the same
+  // position in the same arena.
+  Status setup(Realm* realm, HostSystem* host_system, const Spec* spec, const Program* prev);
 
   uint32_t version = 0;
   bool initialized = false;
   unique_ptr<const Spec> spec;
-  BufferArena* buffer_arena;
+  BufferArena* buffer_arena = nullptr;
   vector<unique_ptr<Buffer>> buffers;
+
+  // The program, on which the buffer layout is based, and which of its buffers have been reused
+  // (indexed by the buffers of this resp. the base program).
+  bool has_base = false;
+  uint32_t base_version = 0;
+  vector<bool> buffer_reused;
+  vector<bool> base_buffer_reused;
   unique_ptr<TimeMapper> time_mapper;
 
+  // Only the opcodes, which have an init resp. run function.
+  vector<ProgramOp> init_ops;
+  vector<ProgramOp> run_ops;
+
+  vector<ProgramTask> tasks;
+  vector<ProgramStage> stages;
+
 private:
+  uint32_t layout_buffers(
+      const Program* prev, const vector<uint32_t>& sizes, vector<uint32_t>& offsets);
+
   Logger* _logger;
 };
 
@@ -100,10 +144,19 @@ struct ProgramState {
   HostSystem* host_system;
   Program* program;
   Stack* stack;
-  int p;
   bool end;
 };
 
+// How much PerfStats instrumentation is done for the opcodes of a realm.
+enum PerfStatsMode {
+  // Track a span for every opcode in every block.
+  PERF_STATS_FULL = 0,
+  // Only track spans for every Nth block.
+  PERF_STATS_SAMPLED,
+  // Do not track any spans for opcodes.
+  PERF_STATS_OFF,
+};
+
 struct ActiveProcessor {
   ActiveProcessor(Processor* processor, Slot<pb::EngineNotification>::Callback notification_callback);
   ~ActiveProcessor();
@@ -155,6 +208,13 @@ public:
 
   Status send_processor_message(uint64_t processor_id, const string& msg_serialized);
 
+  void set_perf_stats_mode(PerfStatsMode mode, uint32_t sample_interval);
+  PerfStatsMode perf_stats_mode() const { return _perf_stats_mode.load(); }
+
+  // Use the given pool to execute independent tasks of the program concurrently. If not set (the
+  // default), all opcodes are executed serially in the calling thread.
+  void set_worker_pool(WorkerPool* pool) { _worker_pool.store(pool); }
+
   BlockContext* block_context() const { return _block_context.get(); }
   StatusOr<Program*> get_active_program();
   Status process_block(Program* program);
@@ -183,6 +243,10 @@ private:
   atomic<Program*> _current_program;
   atomic<Program*> _old_program;
   uint32_t _program_version = 0;
+  atomic<PerfStatsMode> _perf_stats_mode;
+  atomic<uint32_t> _perf_stats_sample_interval;
+  uint32_t _block_count = 0;
+  atomic<WorkerPool*> _worker_pool;
   map<uint64_t, unique_ptr<ActiveProcessor>> _processors;
   map<string, unique_ptr<ActiveControlValue>> _control_values;
   map<string, unique_ptr<ActiveChildRealm>> _child_realms;
@@ -31,12 +31,18 @@ from .processor cimport Processor, ProcessorState
 from .player cimport Player
 from .spec cimport Spec
 from .buffers cimport Buffer
+from .worker_pool cimport WorkerPool
 
 
 cdef extern from "noisicaa/audioproc/engine/realm.h" namespace "noisicaa" nogil:
     cppclass Program:
         pass
 
+    enum PerfStatsMode:
+        PERF_STATS_FULL
+        PERF_STATS_SAMPLED
+        PERF_STATS_OFF
+
     cppclass Realm(RefCounted):
         Realm(const string& name, HostSystem* host_system, Player* player)
 
@@ -54,6 +60,9 @@ cdef extern from "noisicaa/audioproc/engine/realm.h" namespace "noisicaa" nogil:
         StatusOr[Realm*] get_child_realm(const string& name)
         Status set_float_control_value(const string& name, float value, uint32_t generation)
         Status send_processor_message(uint64_t processor_id, const string& msg_serialized)
+        void set_perf_stats_mode(PerfStatsMode mode, uint32_t sample_interval)
+        PerfStatsMode perf_stats_mode() const
+        void set_worker_pool(WorkerPool* pool)
         Status set_spec(const Spec* spec)
         StatusOr[Program*] get_active_program()
         Status process_block(Program* program)
@@ -18,10 +18,12 @@
 #
 # @end:license
 
-from typing import Dict, List, Optional
+import asyncio
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional, TypeVar
 
 from noisicaa import core
 from noisicaa.core import ipc
+from noisicaa.core import session_data_pb2
 from noisicaa import audioproc
 from noisicaa import node_db
 from noisicaa import host_system as host_system_lib
@@ -35,11 +37,16 @@ from . import buffers
 from . import processor
 from . import graph as graph_lib
 from . import engine as engine_lib
+from . import worker_pool as worker_pool_lib
 
 # We actually use memoryviews, but mypy doesn't know that a memoryview can also behave like an
 # array of floats.
 BufferView = List
 
+T = TypeVar('T')
+
+perf_stats_mode_map = ...  # type: Dict[str, int]
+
 
 class PyProgram(object):
     pass
@@ -70,15 +77,25 @@ class PyRealm(object):
     def clear_programs(self) -> None: ...
     def get_buffer(self, name: str, type: buffers.PyBufferType) -> BufferView: ...
     async def get_plugin_host(self) -> ipc.Stub: ...
+    async def run_in_setup_thread(self, func: Callable[..., T], *args: Any) -> T: ...
     def update_spec(self) -> None: ...
+    def batch_updates(self) -> ContextManager[None]: ...
     def set_spec(self, spec: spec_lib.PySpec) -> None: ...
     async def setup_node(self, node: graph_lib.Node) -> None: ...
+    def start_node_setup(self, node: graph_lib.Node) -> asyncio.Task: ...
     def add_active_processor(self, proc: processor.PyProcessor) -> None: ...
     def add_active_control_value(self, control_value: control_value_lib.PyControlValue) -> None: ...
     def add_active_child_realm(self, child: PyRealm) -> None: ...
-    def set_control_value(self, name: str, value: float, generation: int) -> None: ...
+    async def wait_for_node(self, node_id: str) -> Optional[graph_lib.Node]: ...
+    async def set_control_value(self, name: str, value: float, generation: int) -> None: ...
     async def set_plugin_state(self, node: str, state: audioproc.PluginState) -> None: ...
-    def send_node_message(self, msg: audioproc.ProcessorMessage) -> None: ...
+    async def set_session_values(
+            self, session_values: Iterable[session_data_pb2.SessionValue]) -> None: ...
+    async def send_node_message(self, msg: audioproc.ProcessorMessage) -> None: ...
+    @property
+    def perf_stats_mode(self) -> str: ...
+    def set_perf_stats_mode(self, mode: str, sample_interval: int = 1) -> None: ...
+    def set_worker_pool(self, pool: Optional[worker_pool_lib.PyWorkerPool]) -> None: ...
     def update_project_properties(self, properties: audioproc.ProjectProperties) -> None: ...
     def get_active_program(self) -> Optional[PyProgram]: ...
     def process_block(self, program: PyProgram) -> None: ...
@@ -18,6 +18,8 @@
 #
 # @end:license
 
+import asyncio
+import contextlib
 import logging
 
 from cpython.ref cimport PyObject
@@ -39,12 +41,19 @@ from .processor cimport PyProcessor
 from .control_value cimport PyControlValue
 from .block_context cimport PyBlockContext
 from .buffers cimport Buffer, PyBufferType
+from .worker_pool cimport PyWorkerPool, WorkerPool
 from . import processor
 from . import graph
 from . import plugin_host_pb2
 
 logger = logging.getLogger(__name__)
 
+perf_stats_mode_map = {
+    'full': PerfStatsMode.PERF_STATS_FULL,
+    'sampled': PerfStatsMode.PERF_STATS_SAMPLED,
+    'off': PerfStatsMode.PERF_STATS_OFF,
+}
+
 
 cdef class PyProgram(object):
     cdef void set(self, Program* program) nogil:
@@ -71,6 +80,10 @@ cdef class PyRealm(object):
         self.__host_system = host_system
         self.__player = player
         self.__callback_address = callback_address
+        self.__worker_pool = None
+        self.__batch_depth = 0
+        self.__spec_dirty = False
+        self.__pending_setups = set()
 
         self.__bpm = 120
         self.__duration = audioproc.MusicalDuration(4, 1)
@@ -133,6 +146,10 @@ cdef class PyRealm(object):
     async def cleanup(self):
         logger.info("Cleaning up realm '%s'...", self.name)
 
+        if self.__pending_setups:
+            logger.info("Waiting for %d pending node setups...", len(self.__pending_setups))
+            await asyncio.wait(list(self.__pending_setups))
+
         await self.__sink.cleanup()
 
         if self.__realm != NULL:
@@ -162,9 +179,35 @@ cdef class PyRealm(object):
     async def get_plugin_host(self):
         return await self.__engine.get_plugin_host()
 
+    async def run_in_setup_thread(self, func, *args):
+        if self.__engine is None:
+            return func(*args)
+        return await self.__engine.run_in_setup_thread(func, *args)
+
     def update_spec(self):
+        if self.__batch_depth > 0:
+            self.__spec_dirty = True
+            return
+
+        self.__spec_dirty = False
         self.set_spec(self.__graph.compile(self.__bpm, self.__duration))
 
+    @contextlib.contextmanager
+    def batch_updates(self):
+        """Defer all update_spec() calls until the end of the batch.
+
+        The spec is then compiled once, if any of the mutations in the batch required it. Batches
+        can be nested, only the outermost one compiles the spec.
+        """
+
+        self.__batch_depth += 1
+        try:
+            yield
+        finally:
+            self.__batch_depth -= 1
+            if self.__batch_depth == 0 and self.__spec_dirty:
+                self.update_spec()
+
     def set_spec(self, PySpec spec):
         logger.debug("set_spec:\n%s", spec.dump())
         with nogil:
@@ -185,10 +228,39 @@ cdef class PyRealm(object):
         # if self._shm_data is not None:
         #     marker = node.id.encode('ascii') + b'\0'
         #     self._shm_data[512:512+len(marker)] = marker
-        await node.setup()
+        ready = node.begin_setup()
+        success = False
+        try:
+            await node.setup()
+            success = True
+        finally:
+            ready.set_result(success)
         # if self._shm_data is not None:
         #     self._shm_data[512] = 0
 
+    def start_node_setup(self, node):
+        """Set up a node in the background.
+
+        The node is left out of the spec until its setup has completed, then the spec is updated.
+        Use node.wait_ready() to wait for the setup.
+        """
+
+        task = asyncio.get_event_loop().create_task(self.__setup_node_in_background(node))
+        self.__pending_setups.add(task)
+        task.add_done_callback(self.__pending_setups.discard)
+        return task
+
+    async def __setup_node_in_background(self, node):
+        try:
+            await self.setup_node(node)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to set up node %s:", node.id)
+            node.broken = True
+            return
+
+        if node.is_owned_by(self):
+            self.update_spec()
+
     def add_active_processor(self, PyProcessor proc):
         with nogil:
             check(self.__realm.add_processor(proc.get()))
@@ -201,10 +273,34 @@ cdef class PyRealm(object):
         with nogil:
             check(self.__realm.add_child_realm(child.get()))
 
-    def set_control_value(self, name, value, generation):
+    async def wait_for_node(self, node_id):
+        """Get a node, once its pending setup has finished.
+
+        Returns None, if there is no such node or its setup failed.
+        """
+
+        try:
+            node = self.__graph.find_node(node_id)
+        except KeyError:
+            return None
+
+        if not await node.wait_ready():
+            return None
+
+        return node
+
+    async def set_control_value(self, name, value, generation):
         cdef string c_name = name.encode('utf-8')
         cdef float c_float
         cdef uint32_t c_generation = generation
+
+        # Control values are created by the setup of the node, which owns the port
+        # ('<node id>:<port name>').
+        node_id, _, _ = name.rpartition(':')
+        if await self.wait_for_node(node_id) is None:
+            logger.warning("Control value %s of unknown or broken node.", name)
+            return
+
         if isinstance(value, float):
             c_float = value
             with nogil:
@@ -220,32 +316,56 @@ cdef class PyRealm(object):
             plugin_host_pb2.SetPluginStateRequest(
                 realm=self.__name, node_id=node, state=state))
 
-    def set_session_values(self, session_values):
+    async def set_session_values(self, session_values):
         for session_value in session_values:
             key = session_value.name
             if key.startswith('node/'):
                 _, node_id, node_key = key.split('/', 2)
-                try:
-                    node = self.__graph.find_node(node_id)
-                except KeyError:
-                    pass
-                else:
+                node = await self.wait_for_node(node_id)
+                if node is not None:
                     node.set_session_value(node_key, session_value)
 
-    def send_node_message(self, msg):
-        try:
-            node = self.__graph.find_node(msg.node_id)
-        except KeyError:
-            logger.warning("Node message to unknown node:\n%s", msg)
+    async def send_node_message(self, msg):
+        cdef uint64_t c_processor_id
+        cdef string c_msg
+
+        node = await self.wait_for_node(msg.node_id)
+        if node is None:
+            logger.warning("Node message to unknown or broken node:\n%s", msg)
             return
         assert isinstance(node, graph.ProcessorNode), type(node).__name__
         proc = node.processor
 
-        cdef uint64_t c_processor_id = proc.id
-        cdef string c_msg = msg.SerializeToString()
+        c_processor_id = proc.id
+        c_msg = msg.SerializeToString()
         with nogil:
             check(self.__realm.send_processor_message(c_processor_id, c_msg))
 
+    @property
+    def perf_stats_mode(self):
+        cdef PerfStatsMode mode = self.__realm.perf_stats_mode()
+        for name, value in perf_stats_mode_map.items():
+            if value == mode:
+                return name
+        raise ValueError(mode)
+
+    def set_perf_stats_mode(self, str mode, int sample_interval=1):
+        if sample_interval < 1:
+            raise ValueError("Invalid sample_interval %d" % sample_interval)
+        cdef PerfStatsMode c_mode = perf_stats_mode_map[mode]
+        cdef uint32_t c_sample_interval = sample_interval
+        with nogil:
+            self.__realm.set_perf_stats_mode(c_mode, c_sample_interval)
+
+    def set_worker_pool(self, PyWorkerPool pool):
+        cdef WorkerPool* c_pool = NULL
+        if pool is not None:
+            c_pool = pool.get()
+        with nogil:
+            self.__realm.set_worker_pool(c_pool)
+        # Keep a reference, so the pool isn't destroyed while the realm uses it.
+        self.__worker_pool = pool
+
     def update_project_properties(self, properties: audioproc.ProjectProperties):
         if properties.HasField('bpm'):
             self.__bpm = properties.bpm
@@ -20,12 +20,14 @@
 
 import os
 import os.path
+from unittest import mock
 
 import async_generator
 
 from noisidev import unittest
 from noisidev import unittest_mixins
 from noisidev import unittest_engine_mixins
+from noisicaa import audioproc
 from noisicaa import constants
 from noisicaa import node_db
 from noisicaa.audioproc.public import instrument_spec_pb2
@@ -35,6 +37,7 @@ from .spec import PySpec
 from .realm import PyRealm
 from .backend import PyBackend
 from .processor import PyProcessor
+from .worker_pool import PyWorkerPool
 from . import buffers
 from . import graph as graph_lib
 
@@ -173,6 +176,219 @@ class RealmTest(
             self.assertEqual(buf2[0], 5.0)
             self.assertEqual(buf2[1], 7.0)
 
+    async def test_end_opcode(self):
+        async with self.create_realm() as realm:
+            spec = PySpec()
+            spec.append_buffer(
+                'sink:in:left',
+                buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO))
+            spec.append_buffer(
+                'sink:in:right',
+                buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO))
+            spec.append_buffer(
+                'buf1',
+                buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO))
+            spec.append_buffer(
+                'buf2',
+                buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO))
+            spec.append_opcode('MIX', 'buf1', 'buf2')
+            spec.append_opcode('END')
+            spec.append_opcode('MIX', 'buf1', 'buf2')
+            realm.set_spec(spec)
+
+            program = realm.get_active_program()
+
+            buf1 = realm.get_buffer(
+                'buf1',
+                buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO))
+            buf2 = realm.get_buffer(
+                'buf2',
+                buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO))
+
+            buf1[0] = 1.0
+            buf2[0] = 4.0
+
+            realm.process_block(program)
+
+            self.assertEqual(buf2[0], 5.0)
+
+    async def test_perf_stats_mode(self):
+        async with self.create_realm() as realm:
+            spec = PySpec()
+            spec.append_buffer(
+                'sink:in:left',
+                buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO))
+            spec.append_buffer(
+                'sink:in:right',
+                buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO))
+            spec.append_opcode('CLEAR', 'sink:in:left')
+            spec.append_opcode('CLEAR', 'sink:in:right')
+            realm.set_spec(spec)
+
+            program = realm.get_active_program()
+            perf = realm.block_context.perf
+
+            def process_blocks(num_blocks):
+                num_spans = []
+                for _ in range(num_blocks):
+                    perf.reset()
+                    realm.process_block(program)
+                    num_spans.append(len(perf))
+                return num_spans
+
+            self.assertEqual(realm.perf_stats_mode, 'full')
+            self.assertEqual(process_blocks(2), [2, 2])
+            self.assertEqual(
+                [span.name for span in perf.spans], ['opcode(CLEAR)', 'opcode(CLEAR)'])
+
+            realm.set_perf_stats_mode('off')
+            self.assertEqual(process_blocks(2), [0, 0])
+
+            realm.set_perf_stats_mode('sampled', 3)
+            self.assertEqual(sorted(process_blocks(6)), [0, 0, 0, 0, 2, 2])
+
+            with self.assertRaises(ValueError):
+                realm.set_perf_stats_mode('sampled', 0)
+
+    async def render_worker_pool_graph(self, pool, end_task=None):
+        audio_buf_type = buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO)
+        buf_names = ['sink:in:left', 'sink:in:right']
+        buf_names.extend('src%d' % idx for idx in range(8))
+        buf_names.extend('dst%d' % idx for idx in range(8))
+
+        async with self.create_realm() as realm:
+            realm.set_worker_pool(pool)
+
+            spec = PySpec()
+            for name in buf_names:
+                spec.append_buffer(name, audio_buf_type)
+            for idx in range(8):
+                spec.begin_task()
+                spec.append_opcode('COPY', 'src%d' % idx, 'dst%d' % idx)
+                spec.append_opcode('MUL', 'dst%d' % idx, 0.1 * (idx + 1))
+                if idx == end_task:
+                    spec.append_opcode('END')
+                spec.append_opcode('MIX', 'src%d' % idx, 'dst%d' % idx)
+            spec.end_stage()
+            spec.begin_task()
+            spec.append_opcode('CLEAR', 'sink:in:left')
+            for idx in range(8):
+                spec.append_opcode('MIX', 'dst%d' % idx, 'sink:in:left')
+            spec.end_stage()
+            realm.set_spec(spec)
+
+            program = realm.get_active_program()
+
+            for idx in range(8):
+                src = realm.get_buffer('src%d' % idx, audio_buf_type)
+                dst = realm.get_buffer('dst%d' % idx, audio_buf_type)
+                for i in range(256):
+                    src[i] = 0.001 * (i + 1) * (idx + 1)
+                    dst[i] = 0.0
+            sink = realm.get_buffer('sink:in:left', audio_buf_type)
+            for i in range(256):
+                sink[i] = 0.0
+
+            perf = realm.block_context.perf
+            num_spans = []
+            for _ in range(20):
+                perf.reset()
+                realm.process_block(program)
+                num_spans.append(len(perf))
+
+            result = {}
+            for name in buf_names:
+                buf = realm.get_buffer(name, audio_buf_type)
+                result[name] = [buf[i] for i in range(256)]
+
+            realm.set_worker_pool(None)
+
+        return num_spans, result
+
+    async def test_worker_pool(self):
+        self.host_system.set_block_size(256)
+        pool = PyWorkerPool(self.host_system)
+        pool.setup(3)
+        try:
+            serial_spans, serial_result = await self.render_worker_pool_graph(None)
+            pool_spans, pool_result = await self.render_worker_pool_graph(pool)
+
+            self.assertEqual(pool_spans, [8 * 3 + 1 + 8] * 20)
+            self.assertEqual(pool_spans, serial_spans)
+            self.assertTrue(any(v != 0.0 for v in pool_result['sink:in:left']))
+            # The same opcodes are applied to every buffer in the same order, so the results must
+            # be exactly the same.
+            self.assertEqual(pool_result, serial_result)
+
+        finally:
+            pool.cleanup()
+
+    async def test_worker_pool_end(self):
+        self.host_system.set_block_size(256)
+        pool = PyWorkerPool(self.host_system)
+        pool.setup(3)
+        try:
+            serial_spans, serial_result = await self.render_worker_pool_graph(None, end_task=3)
+            pool_spans, pool_result = await self.render_worker_pool_graph(pool, end_task=3)
+
+            # END skips the remaining opcodes of its task, the remaining tasks of the stage and
+            # all following stages.
+            self.assertEqual(serial_spans, [3 * 3 + 3] * 20)
+            self.assertEqual(pool_spans, serial_spans)
+            self.assertTrue(all(v == 0.0 for v in pool_result['dst4']))
+            self.assertTrue(all(v == 0.0 for v in pool_result['sink:in:left']))
+            self.assertEqual(pool_result, serial_result)
+
+        finally:
+            pool.cleanup()
+
+    async def test_reuse_buffers(self):
+        async with self.create_realm() as realm:
+            audio_buf_type = buffers.PyFloatAudioBlockBuffer(node_db.PortDescription.AUDIO)
+
+            spec = PySpec()
+            spec.append_buffer('sink:in:left', audio_buf_type)
+            spec.append_buffer('sink:in:right', audio_buf_type)
+            spec.append_buffer('buf1', audio_buf_type)
+            spec.append_buffer('buf2', audio_buf_type)
+            realm.set_spec(spec)
+            realm.get_active_program()
+
+            buf1 = realm.get_buffer('buf1', audio_buf_type)
+            buf1[0] = 1.0
+            buf2 = realm.get_buffer('buf2', audio_buf_type)
+            buf2[0] = 2.0
+
+            spec = PySpec()
+            spec.append_buffer('buf3', audio_buf_type)
+            spec.append_buffer('sink:in:left', audio_buf_type)
+            spec.append_buffer('sink:in:right', audio_buf_type)
+            spec.append_buffer('buf2', audio_buf_type)
+            realm.set_spec(spec)
+            realm.get_active_program()
+
+            # buf2 is still at the same place, with the same contents.
+            buf2 = realm.get_buffer('buf2', audio_buf_type)
+            self.assertEqual(buf2[0], 2.0)
+
+    async def test_batch_updates(self):
+        async with self.create_realm() as realm:
+            with mock.patch.object(realm.graph, 'compile', wraps=realm.graph.compile) as compile:
+                with realm.batch_updates():
+                    realm.update_spec()
+                    with realm.batch_updates():
+                        realm.update_spec()
+                    realm.update_spec()
+                    self.assertEqual(compile.call_count, 0)
+                self.assertEqual(compile.call_count, 1)
+
+                with realm.batch_updates():
+                    pass
+                self.assertEqual(compile.call_count, 1)
+
+                realm.update_spec()
+                self.assertEqual(compile.call_count, 2)
+
     async def test_processor(self):
         self.host_system.set_block_size(256)
         async with self.create_realm() as realm:
@@ -372,3 +588,34 @@ class RealmTest(
             graph.remove_node(mixer)
             await mixer.cleanup()
             realm.update_spec()
+
+    async def test_start_node_setup(self):
+        async with self.create_realm() as realm:
+            # Pylint is confused about the type of cdef class members.
+            # pylint: disable=no-member
+            graph = realm.graph
+
+            mixer = graph_lib.Node.create(
+                id='mixer',
+                host_system=self.host_system,
+                description=self.node_db.get_node_description('builtin://mixer'))
+            graph.add_node(mixer)
+            self.assertFalse(mixer.ready)
+
+            duration = audioproc.MusicalDuration(4, 1)
+            with mock.patch.object(graph, 'compile', wraps=graph.compile) as compile:
+                task = realm.start_node_setup(mixer)
+                # The node is left out of the spec, until its setup has completed.
+                self.assertNotIn('node_id=mixer', graph.compile(120, duration).dump())
+                self.assertTrue(await mixer.wait_ready())
+                await task
+                # The spec was updated once the setup completed.
+                self.assertEqual(compile.call_count, 2)
+
+            self.assertTrue(mixer.ready)
+            self.assertIn('node_id=mixer', graph.compile(120, duration).dump())
+
+            graph.remove_node(mixer)
+            await mixer.cleanup()
+            self.assertFalse(mixer.ready)
+            realm.update_spec()
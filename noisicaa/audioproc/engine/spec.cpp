@@ -22,6 +22,7 @@
 
 #include <stdarg.h>
 #include "noisicaa/core/logging.h"
+#include "noisicaa/core/perf_stats.h"
 #include "noisicaa/core/scope_guard.h"
 #include "noisicaa/audioproc/engine/spec.h"
 #include "noisicaa/audioproc/engine/control_value.h"
@@ -144,8 +145,16 @@ string Spec::dump(HostSystem* host_system) const {
   return out;
 }
 
+const char* Spec::intern_perf_label(const string& label) {
+  assert(label.size() < PerfStats::NAME_LENGTH);
+  const auto& it = _perf_labels.insert(label);
+  return it.first->c_str();
+}
+
 Status Spec::append_opcode(OpCode opcode, const vector<OpArg>& args) {
-  _opcodes.push_back({opcode, args});
+  const char* perf_label = intern_perf_label(sprintf("opcode(%s)", opspecs[opcode].name));
+  int stage = _current_task >= 0 ? _current_stage : -1;
+  _opcodes.push_back({opcode, args, perf_label, stage, _current_task});
   return Status::Ok();
 }
 
@@ -153,6 +162,7 @@ Status Spec::append_buffer(const string& name, BufferType* type) {
   char* name_c = new char[name.size() + 1];
   memmove(name_c, name.c_str(), name.size() + 1);
   _buffer_map[name_c] = _buffers.size();
+  _buffer_names.push_back(name_c);
   _buffers.emplace_back(type);
   return Status::Ok();
 }
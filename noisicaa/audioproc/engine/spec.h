@@ -27,6 +27,7 @@
 
 #include <map>
 #include <memory>
+#include <set>
 #include <vector>
 #include <stdint.h>
 #include "noisicaa/core/status.h"
@@ -47,6 +48,10 @@ class HostSystem;
 struct Instruction {
   OpCode opcode;
   vector<OpArg> args;
+  const char* perf_label;
+  // -1, if the opcode is not part of any task.
+  int stage;
+  int task;
 };
 
 class Spec {
@@ -70,10 +75,20 @@ public:
   const vector<OpArg>& get_opargs(int idx) const { return _opcodes[idx].args; }
   OpCode get_opcode(int idx) const { return _opcodes[idx].opcode; }
   const OpArg& get_oparg(int idx, int arg) const { return _opcodes[idx].args[arg]; }
+  const char* get_perf_label(int idx) const { return _opcodes[idx].perf_label; }
+  int get_stage(int idx) const { return _opcodes[idx].stage; }
+  int get_task(int idx) const { return _opcodes[idx].task; }
+
+  // Opcodes appended after begin_task() form a task, which must be executed serially. All tasks,
+  // which have been started since the last end_stage(), do not depend on each other, and may be
+  // executed concurrently.
+  void begin_task() { _current_task = _num_tasks++; }
+  void end_stage() { ++_current_stage; _current_task = -1; }
 
   Status append_buffer(const string& name, BufferType* type);
   int num_buffers() const { return _buffers.size(); }
   const BufferType* get_buffer(int idx) const { return _buffers[idx].get(); }
+  const char* get_buffer_name(int idx) const { return _buffer_names[idx]; }
   StatusOr<int> get_buffer_idx(const char* name) const;
 
   Status append_control_value(ControlValue* cv);
@@ -102,12 +117,21 @@ private:
   MusicalDuration _duration = MusicalDuration(2, 1);
 
   vector<Instruction> _opcodes;
+  int _num_tasks = 0;
+  int _current_stage = 0;
+  int _current_task = -1;
+
+  // Span names for the PerfStats of each opcode, so they don't have to be formatted for every
+  // block. Elements of a set are never moved, so pointers to their c_str() stay valid.
+  const char* intern_perf_label(const string& label);
+  set<string> _perf_labels;
 
   vector<Processor*> _processors;
   map<uint64_t, int> _processor_map;
 
   vector<unique_ptr<const BufferType>> _buffers;
   map<const char*, int, cmp_cstr> _buffer_map;
+  vector<const char*> _buffer_names;
 
   vector<ControlValue*> _control_values;
   map<string, int> _control_value_map;
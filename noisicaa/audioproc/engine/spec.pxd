@@ -44,6 +44,10 @@ cdef extern from "noisicaa/audioproc/engine/spec.h" namespace "noisicaa" nogil:
         int num_ops() const
         OpCode get_opcode(int idx) const
         const OpArg& get_oparg(int idx, int arg) const
+        int get_stage(int idx) const
+        int get_task(int idx) const
+        void begin_task()
+        void end_stage()
 
         Status append_buffer(const string& name, BufferType* type)
         int num_buffers() const
@@ -40,4 +40,6 @@ class PySpec(object):
     def append_control_value(self, cv: control_value.PyControlValue) -> None: ...
     def append_processor(self, processor: processor_lib.PyProcessor) -> None: ...
     def append_child_realm(self, child_realm: realm.PyRealm) -> None: ...
+    def begin_task(self) -> None: ...
+    def end_stage(self) -> None: ...
     def append_opcode(self, opcode: str, *args: Any) -> None: ...
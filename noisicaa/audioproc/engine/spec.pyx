@@ -134,6 +134,12 @@ cdef class PySpec(object):
     def append_child_realm(self, PyRealm child_realm):
         check(self.__spec.append_child_realm(child_realm.get()))
 
+    def begin_task(self):
+        self.__spec.begin_task()
+
+    def end_stage(self):
+        self.__spec.end_stage()
+
     def append_opcode(self, opcode, *args):
         cdef StatusOr[int] stor_int
 
@@ -0,0 +1,234 @@
+/*
+ * @begin:license
+ *
+ * Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License along
+ * with this program; if not, write to the Free Software Foundation, Inc.,
+ * 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+ *
+ * @end:license
+ */
+
+#include <stdio.h>
+#include <string.h>
+#include "noisicaa/core/logging.h"
+#include "noisicaa/core/perf_stats.h"
+#include "noisicaa/host_system/host_system.h"
+#include "noisicaa/audioproc/engine/block_context.h"
+#include "noisicaa/audioproc/engine/message_queue.h"
+#include "noisicaa/audioproc/engine/profile.h"
+#include "noisicaa/audioproc/engine/realtime.h"
+#include "noisicaa/audioproc/engine/rtcheck.h"
+#include "noisicaa/audioproc/engine/worker_pool.h"
+
+namespace noisicaa {
+
+WorkerPool::Context::Context()
+  : ctxt(new BlockContext()),
+    out_messages(new MessageQueue()) {
+  ctxt->perf.reset(new PerfStats());
+  ctxt->out_messages = out_messages.get();
+  status_message[0] = 0;
+}
+
+WorkerPool::Context::~Context() {}
+
+void WorkerPool::Context::sync(HostSystem* host_system, BlockContext* parent) {
+  ctxt->perf->reset();
+  ctxt->out_messages->clear();
+  ctxt->buffer_arena = parent->buffer_arena;
+  ctxt->input_events = parent->input_events;
+  ctxt->sample_pos = parent->sample_pos;
+
+  // The time map only changes once per block, so only copy it, when we see a new block.
+  if (parent != synced_ctxt || parent->sample_pos != synced_sample_pos) {
+    uint32_t block_size = host_system->block_size();
+    if (block_size != time_map_size) {
+      RTUnsafe rtu;  // Only happens, when the block size changes.
+      ctxt->alloc_time_map(block_size);
+      time_map_size = block_size;
+    }
+    memmove(ctxt->time_map.get(), parent->time_map.get(), block_size * sizeof(SampleTime));
+    synced_ctxt = parent;
+    synced_sample_pos = parent->sample_pos;
+  }
+
+  status_code = Status::Code::OK;
+}
+
+void WorkerPool::Context::merge(BlockContext* parent) {
+  PerfStats* perf = ctxt->perf.get();
+  for (int i = 0 ; i < perf->num_spans() ; ++i) {
+    PerfStats::Span span = perf->span(i);
+    if (span.parent_id == 0) {
+      span.parent_id = parent->perf->current_span_id();
+    }
+    parent->perf->append_span(span);
+  }
+
+  if (parent->out_messages != nullptr) {
+    Message* msg = out_messages->first();
+    while (!out_messages->is_end(msg)) {
+      parent->out_messages->push(msg);
+      msg = out_messages->next(msg);
+    }
+  }
+}
+
+WorkerPool::Worker::Worker() {
+  sem_init(&wakeup, 0, 0);
+}
+
+WorkerPool::Worker::~Worker() {
+  sem_destroy(&wakeup);
+}
+
+WorkerPool::WorkerPool(HostSystem* host_system)
+  : _host_system(host_system),
+    _logger(LoggerRegistry::get_logger("noisicaa.audioproc.engine.worker_pool")),
+    _stop(false),
+    _active(false),
+    _next_task(0),
+    _busy_workers(0) {}
+
+WorkerPool::~WorkerPool() {
+  cleanup();
+}
+
+Status WorkerPool::setup(uint32_t num_workers) {
+  _logger->info("Starting %d worker threads...", num_workers);
+  _stop.store(false);
+  for (uint32_t i = 0 ; i < num_workers ; ++i) {
+    unique_ptr<Worker> worker(new Worker());
+    worker->worker_thread.reset(new thread(&WorkerPool::worker_main, this, worker.get()));
+    _workers.emplace_back(move(worker));
+  }
+
+  return Status::Ok();
+}
+
+void WorkerPool::cleanup() {
+  if (_workers.size() > 0) {
+    _logger->info("Stopping worker threads...");
+    _stop.store(true);
+    for (auto& worker : _workers) {
+      sem_post(&worker->wakeup);
+    }
+    for (auto& worker : _workers) {
+      worker->worker_thread->join();
+    }
+    _workers.clear();
+    _logger->info("Worker threads stopped.");
+  }
+}
+
+void WorkerPool::worker_main(Worker* worker) {
+  Status status = set_thread_to_rt_priority(_logger);
+  if (status.is_error()) {
+    _logger->warning("Failed to set RT priority for worker thread: %s", status.message());
+  }
+
+  enable_profiling_in_thread();
+  RTSafe rts;  // Enable rtchecker in worker threads.
+
+  while (true) {
+    sem_wait(&worker->wakeup);
+    if (_stop.load()) {
+      break;
+    }
+
+    run_tasks(&worker->context);
+    _busy_workers.fetch_sub(1, memory_order_release);
+  }
+}
+
+void WorkerPool::run_tasks(Context* context) {
+  while (true) {
+    uint32_t task_idx = _next_task.fetch_add(1, memory_order_relaxed);
+    if (task_idx >= _num_tasks) {
+      break;
+    }
+
+    Status status = _func(_data, task_idx, context->ctxt.get());
+    if (status.is_error() && context->status_code == Status::Code::OK) {
+      context->status_code = status.code();
+      context->status_file = status.file();
+      context->status_line = status.line();
+      snprintf(context->status_message, Status::MaxMessageLength, "%s", status.message());
+    }
+  }
+}
+
+Status WorkerPool::run(BlockContext* ctxt, uint32_t num_tasks, TaskFunc func, void* data) {
+  bool expected = false;
+  if (_workers.size() == 0 || !_active.compare_exchange_strong(expected, true)) {
+    for (uint32_t task_idx = 0 ; task_idx < num_tasks ; ++task_idx) {
+      RETURN_IF_ERROR(func(data, task_idx, ctxt));
+    }
+    return Status::Ok();
+  }
+
+  // The calling thread takes one share of the tasks, so we don't need to wake up more workers
+  // than there are remaining tasks.
+  uint32_t num_workers = min((uint32_t)_workers.size(), num_tasks - 1);
+
+  _caller_context.sync(_host_system, ctxt);
+  for (uint32_t i = 0 ; i < num_workers ; ++i) {
+    _workers[i]->context.sync(_host_system, ctxt);
+  }
+
+  _func = func;
+  _data = data;
+  _num_tasks = num_tasks;
+  _next_task.store(0);
+  _busy_workers.store(num_workers);
+
+  // sem_post() is a full memory barrier, so the workers see the above state.
+  for (uint32_t i = 0 ; i < num_workers ; ++i) {
+    sem_post(&_workers[i]->wakeup);
+  }
+
+  run_tasks(&_caller_context);
+
+  // Wait until all woken up workers are done, even if they didn't get any task, so their
+  // contexts can be safely merged and the next job does not race with a late worker.
+  while (_busy_workers.load(memory_order_acquire) > 0) {
+    this_thread::yield();
+  }
+
+  _caller_context.merge(ctxt);
+  for (uint32_t i = 0 ; i < num_workers ; ++i) {
+    _workers[i]->context.merge(ctxt);
+  }
+
+  _active.store(false);
+
+  if (_caller_context.status_code != Status::Code::OK) {
+    return Status(
+        _caller_context.status_code, _caller_context.status_file, _caller_context.status_line,
+        _caller_context.status_message);
+  }
+  for (uint32_t i = 0 ; i < num_workers ; ++i) {
+    const Context& context = _workers[i]->context;
+    if (context.status_code != Status::Code::OK) {
+      return Status(
+          context.status_code, context.status_file, context.status_line,
+          context.status_message);
+    }
+  }
+
+  return Status::Ok();
+}
+
+}  // namespace noisicaa
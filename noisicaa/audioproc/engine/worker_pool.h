@@ -0,0 +1,121 @@
+// -*- mode: c++ -*-
+
+/*
+ * @begin:license
+ *
+ * Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License along
+ * with this program; if not, write to the Free Software Foundation, Inc.,
+ * 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+ *
+ * @end:license
+ */
+
+#ifndef _NOISICAA_AUDIOPROC_ENGINE_WORKER_POOL_H
+#define _NOISICAA_AUDIOPROC_ENGINE_WORKER_POOL_H
+
+#include <atomic>
+#include <memory>
+#include <thread>
+#include <vector>
+#include <semaphore.h>
+#include <stdint.h>
+#include "noisicaa/core/status.h"
+
+namespace noisicaa {
+
+using namespace std;
+
+class Logger;
+class HostSystem;
+class BlockContext;
+class MessageQueue;
+
+// A set of realtime threads, which the audio thread uses to process independent tasks of a
+// program concurrently.
+//
+// Each thread (including the calling thread) works with its own BlockContext, so processors
+// do not have to synchronize access to the PerfStats and out_messages of the block. The
+// spans and messages of all threads are merged into the caller's BlockContext after all tasks
+// have completed.
+class WorkerPool {
+public:
+  typedef Status (*TaskFunc)(void* data, uint32_t task_idx, BlockContext* ctxt);
+
+  WorkerPool(HostSystem* host_system);
+  ~WorkerPool();
+
+  Status setup(uint32_t num_workers);
+  void cleanup();
+
+  uint32_t num_workers() const { return _workers.size(); }
+
+  // Execute func(data, idx, ...) for all idx in [0, num_tasks) and return after all tasks are
+  // done. The tasks are distributed over the worker threads and the calling thread. If the pool
+  // is already running tasks (i.e. when called from within a task), all tasks are executed
+  // serially in the calling thread.
+  Status run(BlockContext* ctxt, uint32_t num_tasks, TaskFunc func, void* data);
+
+private:
+  struct Context {
+    Context();
+    ~Context();
+
+    void sync(HostSystem* host_system, BlockContext* ctxt);
+    void merge(BlockContext* ctxt);
+
+    unique_ptr<BlockContext> ctxt;
+    unique_ptr<MessageQueue> out_messages;
+    BlockContext* synced_ctxt = nullptr;
+    uint32_t synced_sample_pos = 0;
+    uint32_t time_map_size = 0;
+
+    // Status objects cannot be passed between threads, because the message is stored in thread
+    // local storage.
+    Status::Code status_code = Status::Code::OK;
+    const char* status_file = nullptr;
+    int status_line = 0;
+    char status_message[Status::MaxMessageLength];
+  };
+
+  struct Worker {
+    Worker();
+    ~Worker();
+
+    unique_ptr<thread> worker_thread;
+    sem_t wakeup;
+    Context context;
+  };
+
+  void worker_main(Worker* worker);
+  void run_tasks(Context* context);
+
+  HostSystem* _host_system;
+  Logger* _logger;
+  vector<unique_ptr<Worker>> _workers;
+  Context _caller_context;
+  atomic<bool> _stop;
+
+  // State of the currently running job.
+  atomic<bool> _active;
+  TaskFunc _func = nullptr;
+  void* _data = nullptr;
+  uint32_t _num_tasks = 0;
+  atomic<uint32_t> _next_task;
+  atomic<uint32_t> _busy_workers;
+};
+
+}  // namespace noisicaa
+
+#endif
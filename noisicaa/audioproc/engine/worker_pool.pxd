@@ -0,0 +1,40 @@
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# @end:license
+
+from libc.stdint cimport uint32_t
+from libcpp.memory cimport unique_ptr
+
+from noisicaa.core.status cimport Status
+from noisicaa.host_system.host_system cimport HostSystem
+
+
+cdef extern from "noisicaa/audioproc/engine/worker_pool.h" namespace "noisicaa" nogil:
+    cppclass WorkerPool:
+        WorkerPool(HostSystem* host_system)
+        Status setup(uint32_t num_workers)
+        void cleanup()
+        uint32_t num_workers() const
+
+
+cdef class PyWorkerPool(object):
+    cdef unique_ptr[WorkerPool] __pool_ptr
+    cdef WorkerPool* __pool
+
+    cdef WorkerPool* get(self) nogil
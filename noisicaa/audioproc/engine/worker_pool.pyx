@@ -0,0 +1,46 @@
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# @end:license
+
+from noisicaa.core.status cimport check
+from noisicaa.host_system.host_system cimport PyHostSystem
+
+
+cdef class PyWorkerPool(object):
+    def __init__(self, PyHostSystem host_system):
+        self.__pool_ptr.reset(new WorkerPool(host_system.get()))
+        self.__pool = self.__pool_ptr.get()
+
+    cdef WorkerPool* get(self) nogil:
+        return self.__pool
+
+    @property
+    def num_workers(self):
+        return int(self.__pool.num_workers())
+
+    def setup(self, int num_workers):
+        if num_workers < 0:
+            raise ValueError("Invalid num_workers %d" % num_workers)
+        cdef uint32_t c_num_workers = num_workers
+        with nogil:
+            check(self.__pool.setup(c_num_workers))
+
+    def cleanup(self):
+        with nogil:
+            self.__pool.cleanup()
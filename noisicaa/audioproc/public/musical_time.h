@@ -67,7 +67,7 @@ public:
   MusicalDuration() : Fraction(0, 1) {}
   MusicalDuration(int64_t n) : Fraction(n, 1) {}
   MusicalDuration(int64_t n, int64_t d) : Fraction(n, d) {}
-  MusicalDuration(const MusicalDuration& t) : Fraction(t.numerator(), t.denominator()) {}
+  MusicalDuration(const MusicalDuration& t) : Fraction(t) {}
   MusicalDuration(const pb::MusicalDuration& pb) : Fraction(pb.numerator(), pb.denominator()) {}
 
   void set_proto(pb::MusicalDuration* pb) const {
@@ -129,7 +129,7 @@ public:
   MusicalTime() : Fraction(0, 1) {}
   MusicalTime(int64_t n) : Fraction(n, 1) {}
   MusicalTime(int64_t n, int64_t d) : Fraction(n, d) {}
-  MusicalTime(const MusicalTime& t) : Fraction(t.numerator(), t.denominator()) {}
+  MusicalTime(const MusicalTime& t) : Fraction(t) {}
   MusicalTime(const pb::MusicalTime& pb) : Fraction(pb.numerator(), pb.denominator()) {}
 
   void set_proto(pb::MusicalTime* pb) const {
@@ -21,6 +21,7 @@
  */
 
 #include <assert.h>
+#include <algorithm>
 #include "noisicaa/audioproc/public/time_mapper.h"
 
 namespace noisicaa {
@@ -51,21 +52,69 @@ void TimeMapper::_changed() {
 }
 
 void TimeMapper::set_bpm(uint32_t bpm) {
-  _bpm = bpm;
+  _segments.clear();
+  _segments.push_back(TempoSegment{ MusicalTime(0, 1), bpm, 0 });
   _changed();
 }
 
-void TimeMapper::set_duration(MusicalDuration duration) {
-  _duration = duration;
+Status TimeMapper::set_tempo_map(const vector<pair<MusicalTime, uint32_t>>& tempo_map) {
+  if (tempo_map.size() == 0) {
+    return ERROR_STATUS("Empty tempo map.");
+  }
+  if (tempo_map[0].first != MusicalTime(0, 1)) {
+    return ERROR_STATUS("Tempo map must start at time 0.");
+  }
+  for (size_t i = 0 ; i < tempo_map.size() ; ++i) {
+    if (tempo_map[i].second == 0) {
+      return ERROR_STATUS("Invalid BPM at tempo map entry %d.", (int)i);
+    }
+    if (i > 0 && tempo_map[i].first <= tempo_map[i - 1].first) {
+      return ERROR_STATUS("Tempo map entry %d is not after its predecessor.", (int)i);
+    }
+  }
+
+  vector<TempoSegment> segments;
+  segments.reserve(tempo_map.size());
+  for (const auto& it : tempo_map) {
+    uint64_t start_sample =
+      segments.empty() ? 0 : _musical_to_sample_time(segments.back(), it.first);
+    segments.push_back(TempoSegment{ it.first, it.second, start_sample });
+  }
+
+  _segments.swap(segments);
   _changed();
+  return Status::Ok();
+}
+
+size_t TimeMapper::_find_segment_slow(uint64_t sample_time) const {
+  auto it = upper_bound(
+      _segments.begin() + 1, _segments.end(), sample_time,
+      [](uint64_t s, const TempoSegment& segment) { return s < segment.start_sample; });
+  return it - _segments.begin() - 1;
+}
+
+size_t TimeMapper::_find_segment_slow(const MusicalTime& t) const {
+  auto it = upper_bound(
+      _segments.begin() + 1, _segments.end(), t,
+      [](const MusicalTime& t, const TempoSegment& segment) { return t < segment.start_time; });
+  return it - _segments.begin() - 1;
 }
 
-MusicalTime TimeMapper::sample_to_musical_time(uint64_t sample_time) const {
-  return MusicalTime(_bpm * sample_time, 4 * 60 * _sample_rate);
+void TimeMapper::set_duration(MusicalDuration duration) {
+  _duration = duration;
+  _changed();
 }
 
-uint64_t TimeMapper::musical_to_sample_time(MusicalTime musical_time) const {
-  return 4 * 60 * _sample_rate * musical_time.numerator() / (_bpm * musical_time.denominator());
+uint64_t TimeMapper::_musical_to_sample_time(
+    const TempoSegment& segment, const MusicalTime& t) const {
+  // Computed with 128bit, because the products easily exceed 64bit for segments starting at odd
+  // times.
+  __int128 numerator =
+    (__int128)t.numerator() * segment.start_time.denominator()
+    - (__int128)segment.start_time.numerator() * t.denominator();
+  __int128 denominator = (__int128)t.denominator() * segment.start_time.denominator();
+  return segment.start_sample + (uint64_t)(
+      4 * 60 * _sample_rate * numerator / (segment.bpm * denominator));
 }
 
 }
@@ -27,13 +27,24 @@
 
 #include <stdlib.h>
 #include <iterator>
+#include <utility>
+#include <vector>
 #include "noisicaa/core/status.h"
 #include "noisicaa/audioproc/public/musical_time.h"
 
 namespace noisicaa {
 
+using namespace std;
+
 class TimeMapper {
 public:
+  struct TempoSegment {
+    MusicalTime start_time;
+    uint32_t bpm;
+    // Sample time of start_time, rounded down to a whole sample.
+    uint64_t start_sample;
+  };
+
   TimeMapper(uint32_t sample_rate);
 
   Status setup();
@@ -46,15 +57,29 @@ public:
   uint32_t sample_rate() const { return _sample_rate; }
 
   void set_bpm(uint32_t bpm);
-  uint32_t bpm() const { return _bpm; }
+  uint32_t bpm() const { return _segments[0].bpm; }
+  uint32_t bpm_at(MusicalTime t) const { return _segments[_find_segment(t)].bpm; }
+
+  // The first entry must be at time 0 and the times must be strictly increasing.
+  Status set_tempo_map(const vector<pair<MusicalTime, uint32_t>>& tempo_map);
+  const vector<TempoSegment>& tempo_map() const { return _segments; }
 
   void set_duration(MusicalDuration duration);
   MusicalDuration duration() const { return _duration; }
   MusicalTime end_time() const { return MusicalTime(0, 1) + _duration; }
   uint64_t num_samples() const { return musical_to_sample_time(end_time()); }
 
-  MusicalTime sample_to_musical_time(uint64_t sample_time) const;
-  uint64_t musical_to_sample_time(MusicalTime musical_time) const;
+  MusicalTime sample_to_musical_time(uint64_t sample_time) const {
+    const TempoSegment& segment = _segments[_find_segment(sample_time)];
+    // The offset is reduced, before it is added to the start time, so the intermediate products
+    // don't overflow for segments starting at odd times.
+    return segment.start_time + MusicalDuration(
+        (int64_t)segment.bpm * (int64_t)(sample_time - segment.start_sample),
+        4 * 60 * (int64_t)_sample_rate);
+  }
+  uint64_t musical_to_sample_time(MusicalTime musical_time) const {
+    return _musical_to_sample_time(_segments[_find_segment(musical_time)], musical_time);
+  }
 
   class iterator: public std::iterator<
     std::input_iterator_tag,   // iterator_category
@@ -106,11 +131,27 @@ public:
 private:
   void _changed();
 
+  size_t _find_segment(uint64_t sample_time) const {
+    if (_segments.size() == 1) {
+      return 0;
+    }
+    return _find_segment_slow(sample_time);
+  }
+  size_t _find_segment(const MusicalTime& t) const {
+    if (_segments.size() == 1) {
+      return 0;
+    }
+    return _find_segment_slow(t);
+  }
+  size_t _find_segment_slow(uint64_t sample_time) const;
+  size_t _find_segment_slow(const MusicalTime& t) const;
+  uint64_t _musical_to_sample_time(const TempoSegment& segment, const MusicalTime& t) const;
+
   uint32_t _serialnum = 1;
   void (*_callback)(void*) = nullptr;
   void *_userdata = nullptr;
 
-  uint32_t _bpm = 120;
+  vector<TempoSegment> _segments = { { MusicalTime(0, 1), 120, 0 } };
   uint32_t _sample_rate;
   MusicalDuration _duration = MusicalDuration(4, 1);
 };
@@ -21,6 +21,8 @@
 from libc.stdint cimport uint32_t, uint64_t
 from libcpp cimport bool
 from libcpp.memory cimport unique_ptr
+from libcpp.utility cimport pair
+from libcpp.vector cimport vector
 
 from noisicaa.core.status cimport Status
 from .musical_time cimport MusicalTime, MusicalDuration
@@ -28,6 +30,11 @@ from .musical_time cimport MusicalTime, MusicalDuration
 
 cdef extern from "noisicaa/audioproc/public/time_mapper.h" namespace "noisicaa" nogil:
     cppclass TimeMapper:
+        cppclass TempoSegment:
+            MusicalTime start_time
+            uint32_t bpm
+            uint64_t start_sample
+
         TimeMapper()  # only declared, because otherwise cython complains when instanciating
                       # a TimeMapper.iterator on the stack. cython bug?
         TimeMapper(uint32_t sample_rate)
@@ -41,6 +48,10 @@ cdef extern from "noisicaa/audioproc/public/time_mapper.h" namespace "noisicaa"
 
         void set_bpm(uint32_t bpm)
         uint32_t bpm() const
+        uint32_t bpm_at(MusicalTime t) const
+
+        Status set_tempo_map(const vector[pair[MusicalTime, uint32_t]]& tempo_map)
+        const vector[TempoSegment]& tempo_map() const
 
         void set_duration(MusicalDuration duration)
         MusicalDuration duration() const
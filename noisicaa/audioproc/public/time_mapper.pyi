@@ -18,13 +18,14 @@
 #
 # @end:license
 
-from typing import Iterator
+from typing import Iterator, List, Tuple
 from .musical_time import PyMusicalTime, PyMusicalDuration
 from noisicaa import music
 
 
 class PyTimeMapper(object):
     bpm = ...  # type: int
+    tempo_map = ...  # type: List[Tuple[PyMusicalTime, int]]
     duration = ...  # type: PyMusicalDuration
 
     def __init__(self, sample_rate: int) -> None: ...
@@ -32,6 +33,7 @@ class PyTimeMapper(object):
     def cleanup(self) -> None: ...
     @property
     def sample_rate(self) -> int: ...
+    def bpm_at(self, t: PyMusicalTime) -> int: ...
     @property
     def end_time(self) -> PyMusicalTime: ...
     @property
@@ -99,6 +99,25 @@ cdef class PyTimeMapper(object):
     def bpm(self, value):
         self.__tmap.set_bpm(value)
 
+    def bpm_at(self, PyMusicalTime t):
+        return int(self.__tmap.bpm_at(t.get()))
+
+    @property
+    def tempo_map(self):
+        cdef TimeMapper.TempoSegment segment
+        tempo_map = []
+        for segment in self.__tmap.tempo_map():
+            tempo_map.append((PyMusicalTime.create(segment.start_time), int(segment.bpm)))
+        return tempo_map
+
+    @tempo_map.setter
+    def tempo_map(self, value):
+        cdef vector[pair[MusicalTime, uint32_t]] tempo_map
+        cdef PyMusicalTime t
+        for t, bpm in value:
+            tempo_map.push_back(pair[MusicalTime, uint32_t](t.get(), bpm))
+        check(self.__tmap.set_tempo_map(tempo_map))
+
     @property
     def duration(self):
         return PyMusicalDuration.create(self.__tmap.duration())
@@ -21,6 +21,7 @@
 import itertools
 
 from noisidev import unittest
+from noisicaa.core import status
 from .time_mapper import PyTimeMapper
 from .musical_time import PyMusicalTime, PyMusicalDuration
 
@@ -65,6 +66,80 @@ class TimeMapperTest(unittest.TestCase):
         finally:
             tmap.cleanup()
 
+    def test_tempo_map(self):
+        tmap = PyTimeMapper(44100)
+        try:
+            tmap.setup()
+            tmap.tempo_map = [(PyMusicalTime(0, 1), 120), (PyMusicalTime(1, 1), 60)]
+            self.assertEqual(
+                tmap.tempo_map,
+                [(PyMusicalTime(0, 1), 120), (PyMusicalTime(1, 1), 60)])
+            self.assertEqual(tmap.bpm, 120)
+            self.assertEqual(tmap.bpm_at(PyMusicalTime(1, 2)), 120)
+            self.assertEqual(tmap.bpm_at(PyMusicalTime(3, 2)), 60)
+
+            self.assertEqual(tmap.musical_to_sample_time(PyMusicalTime(1, 2)), 44100)
+            self.assertEqual(tmap.musical_to_sample_time(PyMusicalTime(1, 1)), 88200)
+            self.assertEqual(tmap.musical_to_sample_time(PyMusicalTime(2, 1)), 264600)
+            self.assertEqual(tmap.sample_to_musical_time(88200), PyMusicalTime(1, 1))
+            self.assertEqual(tmap.sample_to_musical_time(264600), PyMusicalTime(2, 1))
+
+            tmap.bpm = 240
+            self.assertEqual(tmap.tempo_map, [(PyMusicalTime(0, 1), 240)])
+
+        finally:
+            tmap.cleanup()
+
+    def test_tempo_map_unaligned(self):
+        tmap = PyTimeMapper(44100)
+        try:
+            tmap.setup()
+            tmap.tempo_map = [
+                (PyMusicalTime(0, 1), 120),
+                (PyMusicalTime(1, 3), 97),
+                (PyMusicalTime(5, 7), 133)]
+
+            prev_mtime = None
+            for stime in range(0, 100000, 7):
+                mtime = tmap.sample_to_musical_time(stime)
+                if prev_mtime is not None:
+                    self.assertGreater(mtime, prev_mtime)
+                self.assertEqual(tmap.musical_to_sample_time(mtime), stime)
+                prev_mtime = mtime
+
+        finally:
+            tmap.cleanup()
+
+    def test_tempo_map_large_denominator(self):
+        tmap = PyTimeMapper(48000)
+        try:
+            tmap.setup()
+            tmap.tempo_map = [(PyMusicalTime(0, 1), 120), (PyMusicalTime(1, 999983), 97)]
+
+            # Long past the point, where 64bit intermediate products would overflow.
+            for stime in (1000, 10 ** 9, 10 ** 11):
+                mtime = tmap.sample_to_musical_time(stime)
+                self.assertGreater(mtime, PyMusicalTime(0, 1))
+                self.assertEqual(tmap.musical_to_sample_time(mtime), stime)
+
+        finally:
+            tmap.cleanup()
+
+    def test_invalid_tempo_map(self):
+        tmap = PyTimeMapper(44100)
+        try:
+            tmap.setup()
+            with self.assertRaises(status.Error):
+                tmap.tempo_map = []
+            with self.assertRaises(status.Error):
+                tmap.tempo_map = [(PyMusicalTime(1, 1), 120)]
+            with self.assertRaises(status.Error):
+                tmap.tempo_map = [(PyMusicalTime(0, 1), 120), (PyMusicalTime(0, 1), 90)]
+            self.assertEqual(tmap.tempo_map, [(PyMusicalTime(0, 1), 120)])
+
+        finally:
+            tmap.cleanup()
+
     def test_duration(self):
         tmap = PyTimeMapper(44100)
         try:
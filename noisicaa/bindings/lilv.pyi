@@ -57,6 +57,8 @@ class Plugin(object):
     def required_features(self) -> List[str]: ...
     @property
     def optional_features(self) -> List[str]: ...
+    @property
+    def bundle_path(self) -> str: ...
     def get_uri(self) -> Node: ...
     def get_name(self) -> Node: ...
     def get_port_by_index(self, index: int) -> Port: ...
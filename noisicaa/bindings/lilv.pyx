@@ -127,6 +127,18 @@ cdef class Plugin(object):
         """
         return ConstNode().init(lilv_plugin_get_bundle_uri(self.plugin))
 
+    @property
+    def bundle_path(self):
+        """Local filesystem path of the plugin's "main" bundle."""
+        cdef char* path = lilv_node_get_path(lilv_plugin_get_bundle_uri(self.plugin), NULL)
+        if path == NULL:
+            raise ValueError("not a path")
+        try:
+            return path.decode('utf-8')
+
+        finally:
+            lilv_free(path)
+
     def get_data_uris(self):
         """Get the (resolvable) URIs of the RDF data files that define a plugin.
 
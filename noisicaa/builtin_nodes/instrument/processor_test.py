@@ -65,3 +65,48 @@ class ProcessorInstrumentTest(
                     path=os.path.join(unittest.TESTDATA_DIR, 'sf2test.sf2'),
                     bank=0,
                     preset=0)))
+
+    def test_sf2_shared_sound_font(self):
+        path = os.path.join(unittest.TESTDATA_DIR, 'sf2test.sf2')
+        self.node_description = self.node_db['builtin://instrument']
+        self.create_processor()
+
+        for _ in range(2):
+            self.processor.handle_message(processor_messages.change_instrument(
+                'test_node',
+                instrument_spec_pb2.InstrumentSpec(
+                    sf2=instrument_spec_pb2.SF2InstrumentSpec(
+                        path=path,
+                        bank=0,
+                        preset=0))))
+
+        # Both instruments use the same sound font, which is only loaded once.
+        self.assertEqual(self.host_system.num_sound_fonts, 1)
+        self.assertEqual(self.host_system.sound_font_memory_usage, os.path.getsize(path))
+
+        self.processor.cleanup()
+        self.host_system.set_sound_font_eviction_policy('immediately')
+        self.assertEqual(self.host_system.num_sound_fonts, 0)
+        self.assertEqual(self.host_system.sound_font_memory_usage, 0)
+
+    def test_sf2_reload_sound_font(self):
+        path = os.path.join(unittest.TESTDATA_DIR, 'sf2test.sf2')
+        self.node_description = self.node_db['builtin://instrument']
+        self.host_system.set_sound_font_eviction_policy('immediately')
+
+        # The master synth assigns a new id on every load, so after the first round the id
+        # differs from the one, which the instrument's synth assigns. Unloading must still work.
+        for _ in range(3):
+            self.create_processor()
+            self.processor.handle_message(processor_messages.change_instrument(
+                'test_node',
+                instrument_spec_pb2.InstrumentSpec(
+                    sf2=instrument_spec_pb2.SF2InstrumentSpec(
+                        path=path,
+                        bank=0,
+                        preset=0))))
+            self.assertEqual(self.host_system.num_sound_fonts, 1)
+
+            self.processor.cleanup()
+            self.assertEqual(self.host_system.num_sound_fonts, 0)
+            self.assertEqual(self.host_system.sound_font_memory_usage, 0)
@@ -52,6 +52,7 @@ SampleScript::SampleScript(Logger* logger, HostSystem* host_system)
 
 SampleScript::~SampleScript() {
   for (auto& sample : samples) {
+    sample.audio_file->remove_reader(sample.reader);
     _host_system->audio_file->release_audio_file(sample.audio_file);
   }
 }
@@ -71,6 +72,7 @@ void SampleScript::apply_mutation(Logger* logger, pb::ProcessorMessage* msg) {
       sample.id = m.id();
       sample.time = m.time();
       sample.audio_file = stor_audio_file.result();
+      sample.reader = sample.audio_file->add_reader();
 
       auto it = lower_bound(samples.begin(), samples.end(), sample, sample_comp);
       samples.insert(it, sample);
@@ -85,6 +87,7 @@ void SampleScript::apply_mutation(Logger* logger, pb::ProcessorMessage* msg) {
 
     for (auto it = samples.begin() ; it != samples.end() ; ) {
       if (it->id == m.id()) {
+        it->audio_file->remove_reader(it->reader);
         _host_system->audio_file->release_audio_file(it->audio_file);
         it = samples.erase(it);
       } else {
@@ -167,6 +170,7 @@ Status ProcessorSampleScript::process_block_internal(BlockContext* ctxt, TimeMap
         script->offset = 0;
         script->tmap_serialnum = time_mapper->serialnum();
         script->current_audio_file = nullptr;
+        script->current_reader = nullptr;
         while ((size_t)script->offset < script->samples.size()) {
           const Sample& sample = script->samples[script->offset];
 
@@ -177,6 +181,7 @@ Status ProcessorSampleScript::process_block_internal(BlockContext* ctxt, TimeMap
           if (sample.time <= stime->start_time && sample_end_time >= stime->end_time) {
             // We seeked into an audio file.
             script->current_audio_file = sample.audio_file;
+            script->current_reader = sample.reader;
             script->file_offset = time_mapper->musical_to_sample_time(stime->start_time)
               - time_mapper->musical_to_sample_time(sample.time);
             ++script->offset;
@@ -196,6 +201,7 @@ Status ProcessorSampleScript::process_block_internal(BlockContext* ctxt, TimeMap
         if (sample.time < stime->end_time) {
           // Next audio file start playing.
           script->current_audio_file = sample.audio_file;
+          script->current_reader = sample.reader;
           script->file_offset = 0;
         }
       }
@@ -208,17 +214,27 @@ Status ProcessorSampleScript::process_block_internal(BlockContext* ctxt, TimeMap
       else if (script->file_offset >= script->current_audio_file->num_samples()) {
         // End of audio file reached.
         script->current_audio_file = nullptr;
+        script->current_reader = nullptr;
         lvalue = 0.0;
         rvalue = 0.0;
       } else {
         AudioFile* audio_file = script->current_audio_file;
-        float values[2];
-        for (int ch = 0 ; ch < 2 ; ++ch) {
-          const float* channel_data = audio_file->channel_data(ch % audio_file->num_channels());
-          values[ch] = channel_data[script->file_offset];
+        AudioFileReader* reader = script->current_reader;
+        reader->set_read_position(script->file_offset);
+        if (reader->is_resident(script->file_offset)) {
+          float values[2];
+          for (int ch = 0 ; ch < 2 ; ++ch) {
+            const float* channel_data = audio_file->channel_data(ch % audio_file->num_channels());
+            values[ch] = channel_data[script->file_offset];
+          }
+          lvalue = values[0];
+          rvalue = values[1];
+        } else {
+          // The prefetcher hasn't caught up yet (e.g. right after a seek). Rather output silence
+          // than blocking the audio thread on a page fault.
+          lvalue = 0.0;
+          rvalue = 0.0;
         }
-        lvalue = values[0];
-        rvalue = values[1];
 
         ++script->file_offset;
       }
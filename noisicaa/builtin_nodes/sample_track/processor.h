@@ -42,12 +42,15 @@ namespace noisicaa {
 class BlockContext;
 class HostSystem;
 class AudioFile;
+class AudioFileReader;
 
 class Sample {
 public:
   uint64_t id;
   MusicalTime time;
   AudioFile* audio_file;
+  // Samples can share the same AudioFile, but each one has its own read position.
+  AudioFileReader* reader;
 };
 
 class SampleScript : public ManagedState<pb::ProcessorMessage> {
@@ -62,6 +65,7 @@ public:
   MusicalTime current_time = MusicalTime(0, 1);
 
   AudioFile* current_audio_file = nullptr;
+  AudioFileReader* current_reader = nullptr;
   uint32_t file_offset;
 
   void apply_mutation(Logger* logger, pb::ProcessorMessage* msg) override;
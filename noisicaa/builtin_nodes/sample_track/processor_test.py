@@ -22,11 +22,15 @@ import math
 import os
 import os.path
 import struct
+import time
 
 from noisidev import unittest
+from noisidev import unittest_engine_utils
 from noisidev import unittest_processor_mixins
 from noisicaa.constants import TEST_OPTS
 from noisicaa.audioproc.public import musical_time
+from noisicaa.audioproc.engine import buffers
+from noisicaa.audioproc.engine import processor
 from . import processor_messages
 
 
@@ -132,3 +136,128 @@ class ProcessorSampleScriptTest(
 
         self.process_block()
         self.assertBufferIsNotQuiet('out:left')
+
+    def test_mmap_storage(self):
+        self.host_system.set_audio_file_storage('mmap')
+        try:
+            self.processor.handle_message(processor_messages.add_sample(
+                node_id='123',
+                id=0x0001,
+                time=musical_time.PyMusicalTime(2048, 44100),
+                sample_rate=self.sample_rate // 2,
+                num_samples=self.num_samples,
+                channel_paths=[self.sample1_path]))
+
+            # The resampled data is stored next to the source file.
+            self.assertTrue(os.path.isfile(
+                '%s.%d.raw' % (self.sample1_path, self.host_system.sample_rate)))
+
+            # Give the prefetcher a chance to lock the first pages into memory.
+            time.sleep(0.1)
+
+            self.process_block()
+            self.assertTrue(all(math.isclose(v, 0.0) for v in self.buffers['out:left'][:2048]))
+            self.assertTrue(any(not math.isclose(v, 0.0) for v in self.buffers['out:left'][2048:]))
+
+        finally:
+            self.host_system.set_audio_file_storage('heap')
+
+    def test_resample_cache(self):
+        cache_dir = os.path.join(TEST_OPTS.TMP_DIR, 'resample-cache')
+        self.host_system.set_resample_cache(cache_dir, 1 << 30)
+        try:
+            self.processor.handle_message(processor_messages.add_sample(
+                node_id='123',
+                id=0x0001,
+                time=musical_time.PyMusicalTime(2048, 44100),
+                sample_rate=self.sample_rate // 2,
+                num_samples=self.num_samples,
+                channel_paths=[self.sample1_path]))
+            self.assertEqual(self.host_system.resample_cache_entries, 1)
+
+            # A file with the same contents reuses the cached data.
+            sample1_copy_path = os.path.join(TEST_OPTS.TMP_DIR, 'sample1-copy.raw')
+            with open(self.sample1_path, 'rb') as fp_in:
+                with open(sample1_copy_path, 'wb') as fp_out:
+                    fp_out.write(fp_in.read())
+            self.processor.handle_message(processor_messages.add_sample(
+                node_id='123',
+                id=0x0002,
+                time=musical_time.PyMusicalTime(1024, 44100),
+                sample_rate=self.sample_rate // 2,
+                num_samples=self.num_samples,
+                channel_paths=[sample1_copy_path]))
+            self.assertEqual(self.host_system.resample_cache_entries, 1)
+
+            # The content hashes are remembered across restarts.
+            with open(os.path.join(cache_dir, 'hashes'), 'r') as fp:
+                hashes = fp.read()
+            self.assertIn(self.sample1_path, hashes)
+            self.assertIn(sample1_copy_path, hashes)
+
+            self.process_block()
+            self.assertTrue(all(math.isclose(v, 0.0) for v in self.buffers['out:left'][:1024]))
+            self.assertTrue(any(not math.isclose(v, 0.0) for v in self.buffers['out:left'][1024:]))
+
+        finally:
+            self.host_system.set_resample_cache('', 0)
+
+    def test_mmap_storage_concurrent_readers(self):
+        # Two tracks play the same file at positions, which are too far apart to share a prefetch
+        # window.
+        self.host_system.set_audio_file_storage('mmap', prefetch_window=4096)
+        try:
+            other_buffers = unittest_engine_utils.BufferManager(self.host_system, self.arena)
+            other_processor = processor.PyProcessor(
+                'realm', 'other_node', self.host_system, self.node_description)
+            other_processor.setup()
+            try:
+                other_buffers.allocate_from_node_description(self.node_description)
+                bufs = []
+                for port_idx, port_desc in enumerate(self.node_description.ports):
+                    buf = buffers.PyBuffer(
+                        self.host_system,
+                        other_buffers.type(port_desc.name),
+                        other_buffers.data(port_desc.name))
+                    bufs.append(buf)
+                    other_processor.connect_port(self.ctxt, port_idx, buf)
+
+                for node_id, proc in [('123', self.processor), ('124', other_processor)]:
+                    proc.handle_message(processor_messages.add_sample(
+                        node_id=node_id,
+                        id=0x0001,
+                        time=musical_time.PyMusicalTime(0, 1),
+                        sample_rate=self.sample_rate // 2,
+                        num_samples=self.num_samples,
+                        channel_paths=[self.sample1_path]))
+
+                def process_block(proc, sample_pos):
+                    self.ctxt.sample_pos = sample_pos
+                    self.ctxt.clear_time_map(self.host_system.block_size)
+                    for s in range(self.host_system.block_size):
+                        self.ctxt.set_sample_time(
+                            s,
+                            musical_time.PyMusicalTime(
+                                sample_pos + s, self.host_system.sample_rate),
+                            musical_time.PyMusicalTime(
+                                sample_pos + s + 1, self.host_system.sample_rate))
+                    proc.process_block(self.ctxt, self.time_mapper)
+
+                other_pos = 3 * self.host_system.sample_rate // 2
+
+                # Tell the prefetcher where both tracks are going to read, and give it a chance
+                # to lock those pages into memory.
+                process_block(self.processor, 0)
+                process_block(other_processor, other_pos)
+                time.sleep(0.2)
+
+                process_block(self.processor, 0)
+                process_block(other_processor, other_pos)
+                self.assertBufferIsNotQuiet('out:left')
+                self.assertTrue(any(v != 0.0 for v in other_buffers['out:left']))
+
+            finally:
+                other_processor.cleanup()
+
+        finally:
+            self.host_system.set_audio_file_storage('heap')
@@ -25,6 +25,7 @@ import enum
 import functools
 import io
 import logging
+import mmap
 import os
 import os.path
 import random
@@ -32,7 +33,7 @@ import struct
 import time
 import traceback
 from typing import (
-    cast, Any, Optional, Union, Dict, List, Set, Callable, Awaitable, Sequence, Type,
+    cast, Any, Optional, Union, Dict, List, Set, Tuple, Callable, Awaitable, Sequence, Type,
     Generic, TypeVar)
 try:
     from typing import Coroutine
@@ -47,6 +48,7 @@ import urllib.parse
 import uuid
 
 from google.protobuf import message as protobuf
+import posix_ipc
 
 from . import stats
 from . import ipc_pb2
@@ -71,8 +73,92 @@ class ConnectionClosed(Error):
     pass
 
 
-frame_header = struct.Struct('=L?')
+frame_header = struct.Struct('=LB')
 request_header = struct.Struct('=Qc')
+shm_descriptor = struct.Struct('=Q')
+
+# Flags in the frame header.
+FRAME_MORE = 0x01  # Not the last frame of the message.
+FRAME_SHM = 0x02   # Frame data is in shared memory, only its position is sent over the socket.
+
+# Frames larger than this are passed through shared memory, if the connection has it.
+SHM_FRAME_THRESHOLD = 65536
+
+
+# Frames are either bytes or, for frames larger than FrameProtocol.SMALL_FRAME_SIZE, a memoryview
+# of a buffer, which was filled directly from the socket.
+Frame = Union[bytes, memoryview]
+
+
+class SharedMemoryRing(object):
+    """Single producer, single consumer ring buffer in a POSIX shared memory segment.
+
+    The producer keeps its write position to itself. The consumer publishes its read position at
+    the start of the segment, so the producer knows which space can be reused. Both sides learn
+    about the position of each frame through the socket.
+    """
+
+    read_position = struct.Struct('=Q')
+    HEADER_SIZE = 64
+
+    def __init__(self, shm: posix_ipc.SharedMemory) -> None:
+        self.name = shm.name
+        self.size = shm.size - self.HEADER_SIZE
+        self.__map = mmap.mmap(shm.fd, shm.size)
+        shm.close_fd()
+        self.__view = memoryview(self.__map)
+        self.__write_pos = 0
+
+    @classmethod
+    def create(cls, size: int) -> 'SharedMemoryRing':
+        return cls(posix_ipc.SharedMemory(
+            '/noisicaa-ipc-%s' % uuid.uuid4().hex,
+            posix_ipc.O_CREX,
+            size=cls.HEADER_SIZE + size))
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedMemoryRing':
+        return cls(posix_ipc.SharedMemory(name))
+
+    def unlink(self) -> None:
+        try:
+            posix_ipc.unlink_shared_memory(self.name)
+        except posix_ipc.ExistentialError:
+            pass
+
+    def close(self) -> None:
+        self.__view.release()
+        self.__map.close()
+
+    def write(self, data: Frame) -> Optional[int]:
+        """Copy data into the ring.
+
+        Returns the position of the data or None, if the consumer has not yet released enough
+        space.
+        """
+
+        length = len(data)
+        pos = self.__write_pos
+        offset = pos % self.size
+        if offset + length > self.size:
+            # Frames are never split, if it does not fit at the end, continue at the start.
+            pos += self.size - offset
+            offset = 0
+
+        read_pos, = self.read_position.unpack_from(self.__map, 0)
+        if pos + length - read_pos > self.size:
+            return None
+
+        start = self.HEADER_SIZE + offset
+        self.__view[start:start + length] = data
+        self.__write_pos = pos + length
+        return pos
+
+    def read(self, pos: int, length: int) -> bytes:
+        start = self.HEADER_SIZE + pos % self.size
+        data = bytes(self.__view[start:start + length])
+        self.read_position.pack_into(self.__map, 0, pos + length)
+        return data
 
 
 class ConnState(enum.Enum):
@@ -80,7 +166,19 @@ class ConnState(enum.Enum):
     READ_DATA = 2
 
 
-class FrameProtocol(asyncio.Protocol):
+if hasattr(asyncio, 'BufferedProtocol'):
+    _FrameProtocolBase = asyncio.BufferedProtocol  # type: Type[asyncio.BaseProtocol]
+else:
+    # Python < 3.7 does not have BufferedProtocol, data_received() feeds the buffer instead.
+    _FrameProtocolBase = asyncio.Protocol
+
+
+class FrameProtocol(_FrameProtocolBase):  # type: ignore[misc,valid-type]
+    # Frames up to this size are copied out of the receive buffer, larger frames get a buffer of
+    # their own, which the transport reads into directly.
+    SMALL_FRAME_SIZE = 4096
+    RECEIVE_BUFFER_SIZE = 65536
+
     def __init__(
             self,
             logger: logging.Logger,  # pylint: disable=redefined-outer-name
@@ -92,49 +190,152 @@ class FrameProtocol(asyncio.Protocol):
         self.transport = None  # type: asyncio.WriteTransport
 
         self.state = ConnState.READ_HEADER
-        self.frames = []  # type: List[bytes]
-        self.frame_size = None
-        self.more = None
-        self.inbuf = bytearray()
+        self.frames = []  # type: List[Frame]
+        self.frame_size = None  # type: int
+        self.more = None  # type: bool
+        self.shm_frame_size = None  # type: int
+
+        self.__inbuf = memoryview(bytearray(self.RECEIVE_BUFFER_SIZE))
+        self.__read_pos = 0
+        self.__write_pos = 0
+        self.__frame_buf = None  # type: memoryview
+        self.__frame_pos = 0
+
+        self.__shm_tx = None  # type: SharedMemoryRing
+        self.__shm_rx = None  # type: SharedMemoryRing
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         self.transport = cast(asyncio.WriteTransport, transport)
 
-    def data_received(self, data: bytes) -> None:
-        self.inbuf.extend(data)
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.set_shared_memory(None, None)
 
-        while self.inbuf:
+    def set_shared_memory(
+            self, tx: Optional[SharedMemoryRing], rx: Optional[SharedMemoryRing]) -> None:
+        if self.__shm_tx is not None:
+            self.__shm_tx.close()
+        if self.__shm_rx is not None:
+            self.__shm_rx.close()
+        self.__shm_tx = tx
+        self.__shm_rx = rx
+
+    def send_frames(self, frames: Sequence[Frame]) -> None:
+        data = []  # type: List[Frame]
+        last_idx = len(frames) - 1
+        for idx, frame in enumerate(frames):
+            flags = FRAME_MORE if idx != last_idx else 0
+
+            if self.__shm_tx is not None and len(frame) > SHM_FRAME_THRESHOLD:
+                pos = self.__shm_tx.write(frame)
+                if pos is not None:
+                    data.append(frame_header.pack(len(frame), flags | FRAME_SHM))
+                    data.append(shm_descriptor.pack(pos))
+                    continue
+
+            data.append(frame_header.pack(len(frame), flags))
+            data.append(frame)
+        self.transport.writelines(data)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self.__frame_buf is not None:
+            return self.__frame_buf[self.__frame_pos:]
+
+        if self.__read_pos == self.__write_pos:
+            self.__read_pos = self.__write_pos = 0
+
+        elif len(self.__inbuf) - self.__write_pos < frame_header.size + self.SMALL_FRAME_SIZE:
+            # Everything, which is left in the buffer, is less than a header and a small frame, so
+            # moving it to the front is cheap.
+            length = self.__write_pos - self.__read_pos
+            self.__inbuf[:length] = self.__inbuf[self.__read_pos:self.__write_pos]
+            self.__read_pos = 0
+            self.__write_pos = length
+
+        return self.__inbuf[self.__write_pos:]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        if self.__frame_buf is not None:
+            self.__frame_pos += nbytes
+            if self.__frame_pos == len(self.__frame_buf):
+                frame = self.__frame_buf
+                self.__frame_buf = None
+                self.__add_frame(frame)
+            return
+
+        self.__write_pos += nbytes
+
+        while True:
+            available = self.__write_pos - self.__read_pos
             if self.state == ConnState.READ_HEADER:
-                if len(self.inbuf) < frame_header.size:
+                if available < frame_header.size:
                     break
 
-                self.frame_size, self.more = frame_header.unpack_from(self.inbuf)
-                del self.inbuf[:frame_header.size]
-                if self.frame_size == 0:
-                    self.frames.append(b'')
-                    if not self.more:
-                        self.handle_message(self.frames)
-                        self.frames = []
+                self.frame_size, flags = frame_header.unpack_from(
+                    self.__inbuf, self.__read_pos)
+                self.more = bool(flags & FRAME_MORE)
+                self.__read_pos += frame_header.size
+                available -= frame_header.size
+
+                if flags & FRAME_SHM:
+                    if self.__shm_rx is None:
+                        raise Error("Got shared memory frame without shared memory.")
+                    self.shm_frame_size = self.frame_size
+                    self.frame_size = shm_descriptor.size
+                    self.state = ConnState.READ_DATA
+
+                elif self.frame_size == 0:
+                    self.__add_frame(b'')
+
+                elif self.frame_size > self.SMALL_FRAME_SIZE:
+                    frame_buf = memoryview(bytearray(self.frame_size))
+                    length = min(available, self.frame_size)
+                    frame_buf[:length] = self.__inbuf[self.__read_pos:self.__read_pos + length]
+                    self.__read_pos += length
+                    if length == self.frame_size:
+                        self.__add_frame(frame_buf)
+                    else:
+                        # The rest of the frame goes directly into frame_buf.
+                        self.__frame_buf = frame_buf
+                        self.__frame_pos = length
+                        break
 
                 else:
                     self.state = ConnState.READ_DATA
 
             elif self.state == ConnState.READ_DATA:
-                if len(self.inbuf) < self.frame_size:
+                if available < self.frame_size:
                     break
-                frame = bytes(self.inbuf[:self.frame_size])
-                del self.inbuf[:self.frame_size]
+                if self.shm_frame_size is not None:
+                    pos, = shm_descriptor.unpack_from(self.__inbuf, self.__read_pos)
+                    frame = self.__shm_rx.read(pos, self.shm_frame_size)
+                else:
+                    frame = bytes(
+                        self.__inbuf[self.__read_pos:self.__read_pos + self.frame_size])
+                self.__read_pos += self.frame_size
+                self.__add_frame(frame)
 
-                self.frames.append(frame)
-                if not self.more:
-                    self.handle_message(self.frames)
-                    self.frames = []
+    def data_received(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            buf = self.get_buffer(len(view))
+            length = min(len(buf), len(view))
+            buf[:length] = view[:length]
+            self.buffer_updated(length)
+            view = view[length:]
+
+    def __add_frame(self, frame: Frame) -> None:
+        self.frames.append(frame)
+        if not self.more:
+            frames = self.frames
+            self.frames = []
+            self.handle_message(frames)
 
-                self.frame_size = None
-                self.more = None
-                self.state = ConnState.READ_HEADER
+        self.frame_size = None
+        self.more = None
+        self.shm_frame_size = None
+        self.state = ConnState.READ_HEADER
 
-    def handle_message(self, frame: List[bytes]) -> None:
+    def handle_message(self, frames: List[Frame]) -> None:
         raise NotImplementedError
 
 
@@ -171,6 +372,8 @@ class Session(object):
 
 class CallbackSessionMixin(Session):
     async_connect = True
+    # Size of the shared memory rings for the callback connection, if it carries large messages.
+    callback_shm_size = None  # type: Optional[int]
 
     def __init__(
             self,
@@ -195,7 +398,8 @@ class CallbackSessionMixin(Session):
     async def setup(self) -> None:
         await super().setup()
 
-        self.__callback_stub = Stub(self._event_loop, self.__callback_address)
+        self.__callback_stub = Stub(
+            self._event_loop, self.__callback_address, shm_size=self.callback_shm_size)
         if self.async_connect:
             self.__connect_task = self._event_loop.create_task(self.__callback_stub.connect())
             self.__connect_task.add_done_callback(self.__callback_connected)
@@ -285,12 +489,6 @@ class ServerProtocol(FrameProtocol):
             "%s: Draining connection with %d active requests",
             self.__server.id, len(self.__active_requests))
 
-    def send_frames(self, frames: Sequence[bytes]) -> None:
-        last_idx = len(frames) - 1
-        for idx, frame in enumerate(frames):
-            self.transport.write(frame_header.pack(len(frame), idx != last_idx))
-            self.transport.write(frame)
-
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         super().connection_made(transport)
         self.logger.info("%s: Accepted new connection.", self.__server.id)
@@ -306,7 +504,7 @@ class ServerProtocol(FrameProtocol):
         self.__server.remove_connection(self)
         self.__closed.set()
 
-    def handle_message(self, frames: List[bytes]) -> None:
+    def handle_message(self, frames: List[Frame]) -> None:
         if self.__drain:
             self.send_frames([frames[0], b'CLOSED'])
             return
@@ -316,7 +514,7 @@ class ServerProtocol(FrameProtocol):
             try:
                 assert self.__endpoint is not None
                 assert len(frames) == 3
-                handler = self.__endpoint.get_handler(frames[1])
+                handler = self.__endpoint.get_handler(bytes(frames[1]))
 
             except Exception:  # pylint: disable=broad-except
                 self.send_frames(
@@ -331,7 +529,7 @@ class ServerProtocol(FrameProtocol):
             response_frames = None
             try:
                 assert self.__endpoint is None
-                endpoint = self.__server.get_endpoint(frames[1])
+                endpoint = self.__server.get_endpoint(bytes(frames[1]))
                 if isinstance(endpoint, ServerEndpointWithSessions):
                     start_session_request = ipc_pb2.StartSessionRequest()
                     if len(frames) == 3:
@@ -351,6 +549,24 @@ class ServerProtocol(FrameProtocol):
                 if response_frames:
                     self.send_frames(response_frames)
 
+        elif request_type == b'M':
+            try:
+                assert len(frames) == 3
+                # The client's tx ring is our rx ring and vice versa.
+                rx = SharedMemoryRing.attach(bytes(frames[1]).decode('ascii'))
+                try:
+                    tx = SharedMemoryRing.attach(bytes(frames[2]).decode('ascii'))
+                except:  # pylint: disable=bare-except
+                    rx.close()
+                    raise
+
+            except Exception:  # pylint: disable=broad-except
+                self.send_frames([frames[0], b'EXC', str(traceback.format_exc()).encode('utf-8')])
+
+            else:
+                self.set_shared_memory(tx, rx)
+                self.send_frames([frames[0], b'OK', b''])
+
         elif request_type == b'P':
             self.send_frames([frames[0], b'PONG'])
 
@@ -359,7 +575,7 @@ class ServerProtocol(FrameProtocol):
 
     async def __start_session(
             self,
-            header: bytes,
+            header: Frame,
             endpoint: 'ServerEndpointWithSessions',
             start_session_request: ipc_pb2.StartSessionRequest
     ) -> None:
@@ -367,7 +583,7 @@ class ServerProtocol(FrameProtocol):
             self.__id, start_session_request, self.__server.event_loop)
         self.send_frames([header, b'OK', struct.pack('=Q', self.__session.id)])
 
-    def send_response(self, header: bytes, task: asyncio.Task) -> None:
+    def send_response(self, header: Frame, task: asyncio.Task) -> None:
         try:
             result_frames = task.result()
         except CloseConnection:
@@ -394,7 +610,7 @@ class CommandHandler(object):
         self.request_cls = request_cls
         self.response_cls = response_cls
 
-    async def run(self, payload: bytes, session: Optional[Session]) -> List[bytes]:
+    async def run(self, payload: Frame, session: Optional[Session]) -> List[bytes]:
         try:
             request = self.request_cls()
             if len(payload) > 0:
@@ -646,12 +862,31 @@ class ClientProtocol(FrameProtocol):
         self.__closed.set()
         self.__stub.connection_lost()
 
-    def handle_message(self, frames: List[bytes]) -> None:
+    def handle_message(self, frames: List[Frame]) -> None:
         self.__stub.handle_response(frames, self.transport)
 
 
+class StubCommandStats(object):
+    def __init__(self, stub_id: str, endpoint: str, command: str) -> None:
+        name = stats.StatName(stub_id=stub_id, endpoint=endpoint, command=command)
+        self.latency = stats.registry.register(
+            stats.Histogram, name.merge(stats.StatName(name='ipc_stub_latency')))
+        self.in_flight = stats.registry.register(
+            stats.Gauge, name.merge(stats.StatName(name='ipc_stub_in_flight')))
+
+    def unregister(self) -> None:
+        self.latency.unregister()
+        self.in_flight.unregister()
+
+
 class Stub(object):
-    def __init__(self, event_loop: asyncio.AbstractEventLoop, server_address: str) -> None:
+    def __init__(
+            self,
+            event_loop: asyncio.AbstractEventLoop,
+            server_address: str,
+            max_in_flight: Optional[int] = None,
+            shm_size: Optional[int] = None,
+    ) -> None:
         self.id = uuid.uuid4().hex
         self.__event_loop = event_loop
         self.__server_address = server_address
@@ -671,11 +906,27 @@ class Stub(object):
 
         self.__transport = None  # type: asyncio.WriteTransport
         self.__protocol = None  # type: ClientProtocol
-        self.__pending_requests = None  # type: Dict[int, asyncio.Future[bytes]]
+        self.__pending_requests = None  # type: Dict[int, asyncio.Future[Frame]]
         self.__session_id = None  # type: int
         self.__connected = False
         self.__lock = asyncio.Lock(loop=event_loop)
 
+        # Limits the number of calls, which are waiting for a response. Further calls are held
+        # back until a slot becomes free.
+        if max_in_flight is not None:
+            self.__window = asyncio.Semaphore(
+                max_in_flight, loop=event_loop)  # type: Optional[asyncio.Semaphore]
+        else:
+            self.__window = None
+
+        self.__command_stats = {}  # type: Dict[str, StubCommandStats]
+
+        # If set, large frames are passed through shared memory rings of this size (one per
+        # direction) instead of the socket.
+        self.__shm_size = shm_size
+        # The (tx, rx) rings, while the server is attaching them.
+        self.__pending_shm = None  # type: Tuple[SharedMemoryRing, SharedMemoryRing]
+
     @property
     def server_address(self) -> str:
         return self.__server_address
@@ -716,8 +967,34 @@ class Stub(object):
                 self.__session_id = struct.unpack('=Q', serialized_response)[0]
                 logger.info("%s: Session ID = %016x", self.id, self.session_id)
 
+            if self.__shm_size is not None:
+                await self.__setup_shared_memory()
+
             self.__connected = True
 
+    async def __setup_shared_memory(self) -> None:
+        tx = SharedMemoryRing.create(self.__shm_size)
+        rx = SharedMemoryRing.create(self.__shm_size)
+        self.__pending_shm = (tx, rx)
+        try:
+            # The rings are attached to the protocol by handle_response().
+            await self.__call_internal(b'M', [tx.name.encode('ascii'), rx.name.encode('ascii')])
+        except:  # pylint: disable=bare-except
+            if self.__pending_shm is not None:
+                tx.close()
+                rx.close()
+            raise
+        finally:
+            self.__pending_shm = None
+            # Both sides have the segments mapped now (or never will), so the names are not needed
+            # anymore. This way no stale segments are left behind, if a process crashes.
+            tx.unlink()
+            rx.unlink()
+
+        logger.info(
+            "%s: Using shared memory for frames larger than %d bytes",
+            self.id, SHM_FRAME_THRESHOLD)
+
     async def close(self) -> None:
         async with self.__lock:
             if not self.__connected:
@@ -733,6 +1010,10 @@ class Stub(object):
             self.__protocol = None
             self.__session_id = None
 
+            for command_stats in self.__command_stats.values():
+                command_stats.unregister()
+            self.__command_stats.clear()
+
             logger.info("%s: Stub closed.", self.id)
             self.__connected = False
 
@@ -748,17 +1029,23 @@ class Stub(object):
         for response_future in self.__pending_requests.values():
             response_future.set_exception(ConnectionClosed())
 
-    def handle_response(self, frames: List[bytes], transport: asyncio.WriteTransport) -> None:
+    def handle_response(self, frames: List[Frame], transport: asyncio.WriteTransport) -> None:
         request_id, request_type = request_header.unpack(frames[0])
         response_future = self.__pending_requests[request_id]
 
-        if request_type in (b'C', b'S'):
+        if request_type in (b'C', b'S', b'M'):
             if frames[1] == b'OK':
+                if request_type == b'M':
+                    # Attach the rings right away, the server might already use them for the next
+                    # frames, which could be handled before the caller gets to run again.
+                    tx, rx = self.__pending_shm
+                    self.__pending_shm = None
+                    self.__protocol.set_shared_memory(tx, rx)
                 response_future.set_result(frames[2])
 
             elif frames[1] == b'EXC':
                 response_future.set_exception(
-                    RemoteException(self.__server_address, frames[2].decode('utf-8')))
+                    RemoteException(self.__server_address, bytes(frames[2]).decode('utf-8')))
 
             elif frames[1] == b'CLOSED':
                 response_future.set_exception(ConnectionClosed())
@@ -772,19 +1059,16 @@ class Stub(object):
         else:
             raise ValueError(request_type)
 
-    async def __call_internal(self, request_type: bytes, frames: List[bytes]) -> bytes:
+    async def __call_internal(self, request_type: bytes, frames: List[bytes]) -> Frame:
         if self.__transport.is_closing():
             raise ConnectionClosed()
 
         request_id = random.getrandbits(63)
-        response_future = asyncio.Future(loop=self.__event_loop)  # type: asyncio.Future[bytes]
+        response_future = asyncio.Future(loop=self.__event_loop)  # type: asyncio.Future[Frame]
         self.__pending_requests[request_id] = response_future
         try:
             frames.insert(0, request_header.pack(request_id, request_type))
-            last_idx = len(frames) - 1
-            for idx, frame in enumerate(frames):
-                self.__transport.write(frame_header.pack(len(frame), idx != last_idx))
-                self.__transport.write(frame)
+            self.__protocol.send_frames(frames)
 
             response = await response_future
 
@@ -801,17 +1085,53 @@ class Stub(object):
         else:
             payload = b''
 
+        command_stats = self.__command_stats.get(cmd)
+        if command_stats is None:
+            command_stats = StubCommandStats(
+                self.id, self.__endpoint_name.decode('ascii'), cmd)
+            self.__command_stats[cmd] = command_stats
+
         logger.debug("%s: sending %s to %s...", self.id, cmd, self.__server_address)
         start_time = time.time()
-        serialized_response = await self.__call_internal(
-            b'C', [cmd.encode('ascii'), payload])
+        if self.__window is not None:
+            await self.__window.acquire()
+        command_stats.in_flight.incr()
+        try:
+            serialized_response = await self.__call_internal(
+                b'C', [cmd.encode('ascii'), payload])
+        finally:
+            command_stats.in_flight.decr()
+            if self.__window is not None:
+                self.__window.release()
+
+        latency = time.time() - start_time
+        command_stats.latency.observe(latency)
         logger.debug(
             "%s: %s to %s finished in %.2fmsec",
-            self.id, cmd, self.__server_address, 1000 * (time.time() - start_time))
+            self.id, cmd, self.__server_address, 1000 * latency)
 
         if response is not None:
             response.ParseFromString(serialized_response)
 
+    async def call_pipelined(
+            self,
+            calls: Sequence[Tuple[str, Optional[protobuf.Message], Optional[protobuf.Message]]]
+    ) -> None:
+        """Issue a sequence of independent calls without waiting for each response.
+
+        All requests are sent right away (as far as max_in_flight permits), and the responses are
+        filled in as they arrive. If any call fails, the first exception is raised after all calls
+        completed.
+        """
+
+        tasks = [
+            self.__event_loop.create_task(self.call(cmd, request, response))
+            for cmd, request, response in calls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
     async def ping(self) -> None:
         response = await self.__call_internal(b'P', [])
         assert response == b'PONG', response
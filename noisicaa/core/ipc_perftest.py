@@ -40,3 +40,13 @@ class IPCPerfTest(ipc_test.IPCPerfTestBase):
         for _ in range(10000):
             request.t.add(numerator=random.randint(0, 4), denominator=random.randint(1, 2))
         await self.run_test(request, 100)
+
+    async def test_huge_messages(self):
+        request = ipc_test_pb2.TestRequest()
+        for _ in range(200000):
+            request.t.add(numerator=random.randint(0, 4), denominator=random.randint(1, 2))
+        await self.run_test(request, 20)
+
+
+class IPCSharedMemoryPerfTest(IPCPerfTest):
+    shm_size = 16 << 20
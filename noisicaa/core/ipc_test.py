@@ -33,6 +33,7 @@ from indicator_cpufreq import cpufreq
 from noisidev import unittest
 from noisicaa.constants import TEST_OPTS
 from . import process_manager
+from . import stats
 from . import empty_message_pb2
 from . import ipc
 from . import ipc_test_pb2
@@ -40,6 +41,61 @@ from . import ipc_test_pb2
 logger = logging.getLogger(__name__)
 
 
+class FrameProtocolTest(unittest.TestCase):
+    class TestProtocol(ipc.FrameProtocol):
+        def __init__(self):
+            super().__init__(logger)
+            self.messages = []
+
+        def handle_message(self, frames):
+            self.messages.append([bytes(frame) for frame in frames])
+
+    class TestTransport(object):
+        def __init__(self):
+            self.data = bytearray()
+
+        def writelines(self, data):
+            for d in data:
+                self.data.extend(d)
+
+    def test_frames(self):
+        messages = [
+            [b'', b'a'],
+            [b'foo' * 1000, bytes(random.getrandbits(8) for _ in range(10000))],
+            [bytes(random.getrandbits(8) for _ in range(200000))],
+            [b'bar'],
+        ]
+
+        transport = self.TestTransport()
+        sender = self.TestProtocol()
+        sender.connection_made(transport)
+        for frames in messages:
+            sender.send_frames(frames)
+
+        for chunk_size in (1, 7, 4096, 100000):
+            receiver = self.TestProtocol()
+            data = memoryview(transport.data)
+            while data:
+                buf = receiver.get_buffer(-1)
+                length = min(len(buf), len(data), chunk_size)
+                buf[:length] = data[:length]
+                receiver.buffer_updated(length)
+                data = data[length:]
+
+            self.assertEqual(receiver.messages, messages)
+
+    def test_data_received(self):
+        transport = self.TestTransport()
+        sender = self.TestProtocol()
+        sender.connection_made(transport)
+        sender.send_frames([b'foo', b'x' * 50000])
+
+        receiver = self.TestProtocol()
+        receiver.data_received(bytes(transport.data[:100]))
+        receiver.data_received(bytes(transport.data[100:]))
+        self.assertEqual(receiver.messages, [[b'foo', b'x' * 50000]])
+
+
 class IPCTest(unittest.AsyncTestCase):
     async def test_ping(self):
         async with ipc.Server(self.loop, name='test', socket_dir=TEST_OPTS.TMP_DIR) as server:
@@ -68,6 +124,46 @@ class IPCTest(unittest.AsyncTestCase):
                 await stub.call('foo', request, response)
                 self.assertEqual(response.num, 4)
 
+    async def test_large_message(self):
+        async with ipc.Server(self.loop, name='test', socket_dir=TEST_OPTS.TMP_DIR) as server:
+            async def handler(request, response):
+                response.num = len(request.t)
+            endpoint = ipc.ServerEndpoint('main')
+            endpoint.add_handler(
+                'foo', handler, ipc_test_pb2.TestRequest, ipc_test_pb2.TestResponse)
+            await server.add_endpoint(endpoint)
+
+            async with ipc.Stub(self.loop, server.address) as stub:
+                request = ipc_test_pb2.TestRequest()
+                for i in range(100000):
+                    t = request.t.add()
+                    t.numerator = i
+                    t.denominator = 1
+                response = ipc_test_pb2.TestResponse()
+                await stub.call('foo', request, response)
+                self.assertEqual(response.num, 100000)
+
+    async def test_shared_memory(self):
+        async with ipc.Server(self.loop, name='test', socket_dir=TEST_OPTS.TMP_DIR) as server:
+            async def handler(request, response):
+                response.num = len(request.t)
+            endpoint = ipc.ServerEndpoint('main')
+            endpoint.add_handler(
+                'foo', handler, ipc_test_pb2.TestRequest, ipc_test_pb2.TestResponse)
+            await server.add_endpoint(endpoint)
+
+            # The ring is smaller than some of the requests, those fall back to the socket.
+            async with ipc.Stub(self.loop, server.address, shm_size=1 << 20) as stub:
+                for num in (10, 100000, 1000000, 100000):
+                    request = ipc_test_pb2.TestRequest()
+                    for i in range(num):
+                        t = request.t.add()
+                        t.numerator = i
+                        t.denominator = 1
+                    response = ipc_test_pb2.TestResponse()
+                    await stub.call('foo', request, response)
+                    self.assertEqual(response.num, num)
+
     async def test_endpoint(self):
         async with ipc.Server(self.loop, name='test', socket_dir=TEST_OPTS.TMP_DIR) as server:
             endpoint = ipc.ServerEndpoint('bar')
@@ -201,6 +297,41 @@ class IPCTest(unittest.AsyncTestCase):
                 for i, response in enumerate(responses):
                     self.assertEqual(response.num, 4 + 2 * i)
 
+    async def test_pipelined(self):
+        async with ipc.Server(self.loop, name='test', socket_dir=TEST_OPTS.TMP_DIR) as server:
+            active = [0, 0]
+
+            async def handler(request, response):
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+                await asyncio.sleep(0.01, loop=self.loop)
+                active[0] -= 1
+                response.num = request.num + 1
+
+            endpoint = ipc.ServerEndpoint('main')
+            endpoint.add_handler(
+                'foo', handler, ipc_test_pb2.TestRequest, ipc_test_pb2.TestResponse)
+            await server.add_endpoint(endpoint)
+
+            async with ipc.Stub(self.loop, server.address, max_in_flight=8) as stub:
+                calls = []
+                for i in range(100):
+                    request = ipc_test_pb2.TestRequest()
+                    request.num = i
+                    calls.append(('foo', request, ipc_test_pb2.TestResponse()))
+                await stub.call_pipelined(calls)
+
+                for i, (_, _, response) in enumerate(calls):
+                    self.assertEqual(response.num, i + 1)
+                self.assertGreater(active[1], 1)
+                self.assertLessEqual(active[1], 8)
+
+                latency = [
+                    value for name, value in stats.registry.collect()
+                    if name.get('name') == 'ipc_stub_latency' and name.get('stub_id') == stub.id
+                    and name.get('type') == 'count']
+                self.assertEqual(latency, [100])
+
 
 class TestSubprocess(process_manager.SubprocessMixin, process_manager.ProcessBase):
     async def run(self):
@@ -221,6 +352,9 @@ class TestSubprocess(process_manager.SubprocessMixin, process_manager.ProcessBas
 
 
 class IPCPerfTestBase(unittest.AsyncTestCase):
+    # Size of the shared memory rings, None to send everything through the socket.
+    shm_size = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -236,7 +370,7 @@ class IPCPerfTestBase(unittest.AsyncTestCase):
         self.proc = await self.mgr.start_subprocess(
             'test', 'noisicaa.core.ipc_test.TestSubprocess')
 
-        self.stub = ipc.Stub(self.loop, self.proc.address)
+        self.stub = ipc.Stub(self.loop, self.proc.address, shm_size=self.shm_size)
         await self.stub.connect()
 
         # Set CPUs to performance mode, so test results are not skewed by variable CPU frequency.
@@ -295,6 +429,9 @@ class IPCPerfTestBase(unittest.AsyncTestCase):
             "\033[1mTotal: Wall time: \033[32m%.3fsec\033[37m  CPU time: \033[32m%.3fsec\033[37m\n"
             % (wt, ct))
         out.write("Per request: \033[32m%.2fµsec\033[37;0m\n" % (1e6 * wt / num_requests))
+        out.write(
+            "Throughput: \033[32m%.1fMB/sec\033[37;0m\n"
+            % (request.ByteSize() * num_requests / wt / 2**20))
 
 
 class IPCPerfTest(IPCPerfTestBase):
@@ -24,6 +24,7 @@
 #include <chrono>
 #include <memory>
 #include <random>
+#include <thread>
 #include "noisicaa/core/perf_stats.h"
 
 namespace noisicaa {
@@ -49,7 +50,9 @@ void PerfStats::start_span(const char* name) {
 }
 
 void PerfStats::start_span(const char* name, uint64_t parent_id) {
-  static mt19937_64 rand(time(0));
+  // Spans might be created concurrently in several threads (each with its own PerfStats
+  // instance), which must not share the generator nor produce the same ids.
+  static thread_local mt19937_64 rand(time(0) ^ hash<thread::id>()(this_thread::get_id()));
   uint64_t id = rand();
 
   _stack.push_back(_spans.size());
@@ -134,6 +134,8 @@ class ChildCollector(object):
 
         self.__lock = threading.Lock()
         self.__connections = {}  # type: Dict[int, process_manager_io.ChildConnection]
+        self.__decoders = {}  # type: Dict[int, stats.StatsDecoder]
+        self.__latencies = {}  # type: Dict[int, stats.Histogram]
         self.__stop = None  # type: threading.Event
         self.__thread = None  # type: threading.Thread
 
@@ -159,6 +161,11 @@ class ChildCollector(object):
         for connection in self.__connections.values():
             connection.close()
         self.__connections.clear()
+        self.__decoders.clear()
+
+        for latency in self.__latencies.values():
+            latency.unregister()
+        self.__latencies.clear()
 
         if self.__stat_poll_duration is not None:
             self.__stat_poll_duration.unregister()
@@ -171,12 +178,19 @@ class ChildCollector(object):
     def add_child(self, pid: int, connection: process_manager_io.ChildConnection) -> None:
         with self.__lock:
             self.__connections[pid] = connection
+            self.__decoders[pid] = stats.StatsDecoder(stats.StatName(pid=pid))
+            self.__latencies[pid] = stats.registry.register(
+                stats.Histogram, stats.StatName(name='stat_collector_latency', child_pid=pid))
 
     def remove_child(self, pid: int) -> None:
         with self.__lock:
             connection = self.__connections.pop(pid, None)
             if connection is not None:
                 connection.close()
+            self.__decoders.pop(pid, None)
+            latency = self.__latencies.pop(pid, None)
+            if latency is not None:
+                latency.unregister()
 
     def collect(self) -> None:
         with self.__lock:
@@ -187,7 +201,11 @@ class ChildCollector(object):
             for pid, connection in self.__connections.items():
                 t0 = time.perf_counter()
                 try:
-                    connection.write(b'COLLECT_STATS')
+                    if self.__decoders[pid].synced:
+                        connection.write(b'COLLECT_STATS')
+                    else:
+                        # Ask for all stats, after a message could not be decoded.
+                        connection.write(b'COLLECT_ALL_STATS')
                 except OSError as exc:
                     logger.info("Failed to collect stats from PID=%d: %s", pid, exc)
                 else:
@@ -199,13 +217,14 @@ class ChildCollector(object):
                     t0, pid, connection = pending[fd]
                     if evt & select.POLLIN:
                         response = connection.read()
-                        # TODO: record per child latency
-                        #latency = time.perf_counter() - t0
+                        self.__latencies[pid].observe(time.perf_counter() - t0)
 
-                        child_name = stats.StatName(pid=pid)
-                        for name, value in pickle.loads(response):
-                            self.__stats_collector.add_value(
-                                name.merge(child_name), value)
+                        try:
+                            values = self.__decoders[pid].decode(response)
+                        except stats.DecodeError as exc:
+                            logger.error("Failed to decode stats from PID=%d: %s", pid, exc)
+                        else:
+                            self.__stats_collector.add_values(values)
 
                         poller.unregister(fd)
                         del pending[fd]
@@ -220,9 +239,8 @@ class ChildCollector(object):
             self.__stat_poll_count.incr(1)
 
         manager_name = stats.StatName(pid=os.getpid())
-        for name, value in stats.registry.collect():
-            self.__stats_collector.add_value(
-                name.merge(manager_name), value)
+        self.__stats_collector.add_values(
+            (name.merge(manager_name), value) for name, value in stats.registry.collect())
 
     def __main(self) -> None:
         next_collection = time.perf_counter()
@@ -549,8 +567,12 @@ class ProcessManager(object):
     ) -> None:
         if self._stats_collector is None:
             raise RuntimeError("Stats collection not enabled.")
-        expressions = pickle.loads(request.pickle)  # type: Dict[str, stats.Expression]
-        response.pickle = pickle.dumps(self._stats_collector.fetch_stats(expressions), -1)
+        # The request is a pair of expressions and, optionally, the timestamp of the latest value
+        # the client already has for each expression.
+        request_data = pickle.loads(request.pickle)
+        expressions = request_data[0]  # type: Dict[str, stats.Expression]
+        since = request_data[1]  # type: Dict[str, Dict[stats.StatName, float]]
+        response.pickle = pickle.dumps(self._stats_collector.fetch_stats(expressions, since), -1)
 
 
 class ChildConnectionHandler(object):
@@ -559,6 +581,7 @@ class ChildConnectionHandler(object):
 
         self.__stop = None  # type: eventfd.EventFD
         self.__thread = None  # type: threading.Thread
+        self.__stats_encoder = stats.StatsEncoder()
 
     def setup(self) -> None:
         self.__stop = eventfd.EventFD()
@@ -585,8 +608,10 @@ class ChildConnectionHandler(object):
                 if fd == fd_in and evt & select.POLLIN:
                     request = self.connection.read()
                     if request == b'COLLECT_STATS':
-                        data = stats.registry.collect()
-                        response = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+                        response = self.__stats_encoder.encode(stats.registry.collect())
+                    elif request == b'COLLECT_ALL_STATS':
+                        self.__stats_encoder.reset()
+                        response = self.__stats_encoder.encode(stats.registry.collect())
                     else:
                         raise ValueError(request)
 
@@ -20,6 +20,11 @@
 
 from .registry import Registry
 from .collector import Collector
+from .encoding import (
+    DecodeError,
+    StatsEncoder,
+    StatsDecoder,
+)
 from .expressions import (
     InvalidExpressionError,
     Expression,
@@ -28,8 +33,11 @@ from .expressions import (
 from .stats import (
     StatName,
     Counter,
+    Gauge,
+    Histogram,
 )
 from .timeseries import (
+    Value,
     Timeseries,
     TimeseriesSet,
 )
@@ -21,7 +21,7 @@
 # @end:license
 
 import logging
-from typing import Dict, List
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple, Union
 
 from . import timeseries
 from . import stats
@@ -32,23 +32,40 @@ logger = logging.getLogger(__name__)
 
 
 class Collector(object):
+    # Upper bound for the number of cached expression results.
+    MAX_CACHE_SIZE = 100
+
     def __init__(self, timeseries_length: int = 60*10*10) -> None:
         self.__timeseries = timeseries.TimeseriesSet()
         self.__timeseries_length = timeseries_length
 
+        # Incremented for every added value. The values of different processes are not added in
+        # timestamp order, so the timestamps cannot tell, if something has changed.
+        self.__generation = 0
+        self.__cache = {}  # type: Dict[Hashable, Tuple[int, timeseries.TimeseriesSet]]
+
     def add_value(self, name: stats.StatName, value: timeseries.Value) -> None:
-        ts = self.__timeseries.setdefault(name, timeseries.Timeseries())
-        ts.insert(0, value)
+        ts = self.__timeseries.get(name)
+        if ts is None:
+            ts = timeseries.Timeseries(self.__timeseries_length)
+            self.__timeseries[name] = ts
+        ts.add(value)
+        self.__generation += 1
 
-        drop_count = len(ts) - self.__timeseries_length
-        if drop_count > 0:
-            del ts[-drop_count:]
+    def add_values(self, values: Iterable[Tuple[stats.StatName, timeseries.Value]]) -> None:
+        for name, value in values:
+            self.add_value(name, value)
 
     def collect(self, registry: Registry) -> None:
-        for name, value in registry.collect():
-            self.add_value(name, value)
+        self.add_values(registry.collect())
 
     def evaluate_expression(self, expr: expressions.Expression) -> timeseries.TimeseriesSet:
+        # Results are reused, until new values have been added.
+        key = expressions.expression_key(expr)
+        cached = self.__cache.get(key)
+        if cached is not None and cached[0] == self.__generation:
+            return cached[1]
+
         result = self.__timeseries
 
         for op, *args in expr:
@@ -56,20 +73,40 @@ class Collector(object):
                 result = result.select(args[0])
             elif op == 'RATE':
                 result = result.rate()
+            elif op == 'AGGREGATE':
+                result = result.aggregate(args[0], args[1])
+            elif op == 'DOWNSAMPLE':
+                result = result.downsample(args[0], args[1])
             else:
                 raise ValueError(op)
 
+        if len(self.__cache) >= self.MAX_CACHE_SIZE:
+            self.__cache.clear()
+        self.__cache[key] = (self.__generation, result)
+
         return result
 
     def list_stats(self) -> List[stats.StatName]:
         return list(sorted(self.__timeseries.keys()))
 
     def fetch_stats(
-            self, exprs: Dict[str, expressions.Expression]
+            self,
+            exprs: Dict[str, expressions.Expression],
+            since: Optional[Dict[str, Union[float, Dict[stats.StatName, float]]]] = None,
     ) -> Dict[str, timeseries.TimeseriesSet]:
-        return {
-            id: self.evaluate_expression(expr)
-            for id, expr in exprs.items()}
+        """Evaluate expressions.
+
+        If since has a timestamp (or a timestamp per series) for an expression, only values after
+        that are returned. See TimeseriesSet.since().
+        """
+
+        result = {}  # type: Dict[str, timeseries.TimeseriesSet]
+        for id, expr in exprs.items():  # pylint: disable=redefined-builtin
+            ts_set = self.evaluate_expression(expr)
+            if since is not None and since.get(id) is not None:
+                ts_set = ts_set.since(since[id])
+            result[id] = ts_set
+        return result
 
     def dump(self) -> None:
         for name, ts in sorted(self.__timeseries.items()):
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# @end:license
+
+"""Compact binary encoding of collected stats, used between child processes and the manager.
+
+Each message carries the values of one collection. A stat name is assigned an integer ID, when
+it is first seen, and its labels are only sent in that message. Afterwards a value is only sent,
+when it changed since the previous message, and stats which disappeared are dropped by ID. The
+decoder keeps the state of its peer, so it can still produce the full set of values.
+
+If a message cannot be decoded, the decoder discards its state and must be resynchronized with a
+message from a freshly reset encoder, which contains all names and values again.
+"""
+
+import logging
+import struct
+from typing import Dict, List, Set, Tuple, Union
+
+from . import stats
+from . import timeseries
+
+logger = logging.getLogger(__name__)
+
+
+# timestamp, number of new names, number of removed names, number of int values, number of float
+# values
+message_header = struct.Struct('=dIIII')
+# id, number of labels
+name_header = struct.Struct('=IB')
+removed_id = struct.Struct('=I')
+label_length = struct.Struct('=H')
+int_label = struct.Struct('=q')
+int_value = struct.Struct('=Iq')
+float_value = struct.Struct('=Id')
+
+LABEL_STR = 0
+LABEL_INT = 1
+
+
+class DecodeError(Exception):
+    pass
+
+
+class StatsEncoder(object):
+    def __init__(self) -> None:
+        self.__ids = {}  # type: Dict[stats.StatName, int]
+        self.__next_id = 0
+        self.__last_values = {}  # type: Dict[int, timeseries.ValueType]
+
+    def reset(self) -> None:
+        """Start over, so the next message contains all names and values."""
+
+        self.__ids.clear()
+        self.__last_values.clear()
+
+    def __encode_name(self, stat_id: int, name: stats.StatName) -> bytes:
+        labels = name.labels
+        buf = bytearray(name_header.pack(stat_id, len(labels)))
+        for label, value in labels:
+            label_b = label.encode('utf-8')
+            buf += label_length.pack(len(label_b))
+            buf += label_b
+            if isinstance(value, int):
+                buf.append(LABEL_INT)
+                buf += int_label.pack(value)
+            else:
+                value_b = str(value).encode('utf-8')
+                buf.append(LABEL_STR)
+                buf += label_length.pack(len(value_b))
+                buf += value_b
+        return bytes(buf)
+
+    def encode(self, data: List[Tuple[stats.StatName, timeseries.Value]]) -> bytes:
+        timestamp = data[0][1].timestamp if data else 0.0
+
+        names = []  # type: List[bytes]
+        int_values = []  # type: List[bytes]
+        float_values = []  # type: List[bytes]
+        seen = set()  # type: Set[stats.StatName]
+        for name, value in data:
+            seen.add(name)
+            stat_id = self.__ids.get(name)
+            if stat_id is None:
+                stat_id = self.__next_id
+                self.__next_id += 1
+                self.__ids[name] = stat_id
+                names.append(self.__encode_name(stat_id, name))
+
+            last_value = self.__last_values.get(stat_id)
+            if (last_value is not None
+                    and last_value == value.value
+                    and type(last_value) is type(value.value)):  # pylint: disable=unidiomatic-typecheck
+                continue
+            self.__last_values[stat_id] = value.value
+
+            if isinstance(value.value, int):
+                int_values.append(int_value.pack(stat_id, value.value))
+            else:
+                float_values.append(float_value.pack(stat_id, value.value))
+
+        removed = []  # type: List[bytes]
+        if len(seen) != len(self.__ids):
+            for name in [name for name in self.__ids if name not in seen]:
+                stat_id = self.__ids.pop(name)
+                self.__last_values.pop(stat_id, None)
+                removed.append(removed_id.pack(stat_id))
+
+        return b''.join(
+            [message_header.pack(
+                timestamp, len(names), len(removed), len(int_values), len(float_values))]
+            + names + removed + int_values + float_values)
+
+
+class StatsDecoder(object):
+    def __init__(self, labels: stats.StatName) -> None:
+        self.__labels = labels
+        self.__names = {}  # type: Dict[int, stats.StatName]
+        self.__values = {}  # type: Dict[int, timeseries.ValueType]
+        self.__synced = True
+
+    @property
+    def synced(self) -> bool:
+        """False after a failed decode, until a message from a reset encoder was decoded."""
+        return self.__synced
+
+    def decode(self, data: bytes) -> List[Tuple[stats.StatName, timeseries.Value]]:
+        if not self.__synced:
+            # The message is expected to come from a reset encoder, so all previous state is
+            # replaced.
+            self.__names.clear()
+            self.__values.clear()
+
+        try:
+            timestamp, num_names, num_removed, num_ints, num_floats = (
+                message_header.unpack_from(data, 0))
+            offset = message_header.size
+
+            for _ in range(num_names):
+                stat_id, num_labels = name_header.unpack_from(data, offset)
+                offset += name_header.size
+
+                labels = {}  # type: Dict[str, Union[str, int]]
+                for _ in range(num_labels):
+                    length, = label_length.unpack_from(data, offset)
+                    offset += label_length.size
+                    label = data[offset:offset + length].decode('utf-8')
+                    offset += length
+                    label_type = data[offset]
+                    offset += 1
+                    if label_type == LABEL_INT:
+                        labels[label], = int_label.unpack_from(data, offset)
+                        offset += int_label.size
+                    elif label_type == LABEL_STR:
+                        length, = label_length.unpack_from(data, offset)
+                        offset += label_length.size
+                        labels[label] = data[offset:offset + length].decode('utf-8')
+                        offset += length
+                    else:
+                        raise DecodeError("Unknown label type %d" % label_type)
+
+                # Merging is done once per stat, instead of once per collection.
+                self.__names[stat_id] = stats.StatName(**labels).merge(self.__labels)
+
+            end = offset + num_removed * removed_id.size
+            for stat_id, in removed_id.iter_unpack(data[offset:end]):
+                del self.__names[stat_id]
+                self.__values.pop(stat_id, None)
+            offset = end
+
+            end = offset + num_ints * int_value.size
+            for stat_id, value in int_value.iter_unpack(data[offset:end]):
+                self.__values[stat_id] = value
+            offset = end
+
+            end = offset + num_floats * float_value.size
+            for stat_id, value in float_value.iter_unpack(data[offset:end]):
+                self.__values[stat_id] = value
+
+        except (struct.error, IndexError, KeyError, UnicodeDecodeError, DecodeError) as exc:
+            # The message might have been partially applied, and further deltas would be applied
+            # on top of that, so all state is discarded.
+            self.__names.clear()
+            self.__values.clear()
+            self.__synced = False
+            raise DecodeError(str(exc))
+
+        self.__synced = True
+
+        names = self.__names
+        return [
+            (names[stat_id], timeseries.Value(timestamp, value))
+            for stat_id, value in self.__values.items()]
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# @end:license
+
+from noisidev import unittest
+from . import encoding
+from . import stats
+from . import timeseries
+
+
+class EncodingTest(unittest.TestCase):
+    def setup_testcase(self):
+        self.encoder = encoding.StatsEncoder()
+        self.decoder = encoding.StatsDecoder(stats.StatName(pid=123))
+
+    def roundtrip(self, data):
+        message = self.encoder.encode(
+            [(stats.StatName(**labels), timeseries.Value(1.0, value)) for labels, value in data])
+        return message, {
+            name: value.value for name, value in self.decoder.decode(message)}
+
+    def test_roundtrip(self):
+        _, values = self.roundtrip([
+            ({'name': 'foo', 'id': 1}, 12),
+            ({'name': 'bar', 'type': 'üñïçødé'}, 0.5),
+        ])
+        self.assertEqual(
+            values,
+            {stats.StatName(name='foo', id=1, pid=123): 12,
+             stats.StatName(name='bar', type='üñïçødé', pid=123): 0.5})
+        self.assertIsInstance(values[stats.StatName(name='foo', id=1, pid=123)], int)
+
+    def test_deltas(self):
+        first, _ = self.roundtrip([({'name': 'foo'}, 1), ({'name': 'bar'}, 2.0)])
+        second, values = self.roundtrip([({'name': 'foo'}, 1), ({'name': 'bar'}, 3.0)])
+        self.assertLess(len(second), len(first))
+        self.assertEqual(
+            values,
+            {stats.StatName(name='foo', pid=123): 1,
+             stats.StatName(name='bar', pid=123): 3.0})
+
+    def test_removed(self):
+        self.roundtrip([({'name': 'foo'}, 1), ({'name': 'bar'}, 2)])
+        _, values = self.roundtrip([({'name': 'bar'}, 2)])
+        self.assertEqual(values, {stats.StatName(name='bar', pid=123): 2})
+
+        _, values = self.roundtrip([({'name': 'foo'}, 1), ({'name': 'bar'}, 2)])
+        self.assertEqual(
+            values,
+            {stats.StatName(name='foo', pid=123): 1,
+             stats.StatName(name='bar', pid=123): 2})
+
+    def test_truncated(self):
+        message = self.encoder.encode([(stats.StatName(name='foo'), timeseries.Value(1.0, 1))])
+        with self.assertRaises(encoding.DecodeError):
+            self.decoder.decode(message[:-3])
+
+    def test_resync(self):
+        self.roundtrip([({'name': 'foo'}, 1), ({'name': 'bar'}, 2)])
+
+        message = self.encoder.encode(
+            [(stats.StatName(name='foo'), timeseries.Value(1.0, 3)),
+             (stats.StatName(name='baz'), timeseries.Value(1.0, 4))])
+        with self.assertRaises(encoding.DecodeError):
+            self.decoder.decode(message[:-3])
+        self.assertFalse(self.decoder.synced)
+
+        self.encoder.reset()
+        _, values = self.roundtrip([({'name': 'foo'}, 5), ({'name': 'baz'}, 4)])
+        self.assertTrue(self.decoder.synced)
+        self.assertEqual(
+            values,
+            {stats.StatName(name='foo', pid=123): 5,
+             stats.StatName(name='baz', pid=123): 4})
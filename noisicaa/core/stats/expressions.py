@@ -21,7 +21,7 @@
 # @end:license
 
 import logging
-from typing import Any, List, Tuple
+from typing import Any, Hashable, List, Sequence, Tuple
 
 from . import stats
 
@@ -35,6 +35,26 @@ class InvalidExpressionError(ValueError):
 Expression = List[Tuple[Any, ...]]
 
 
+# Functions for aggregations and downsampling. Percentiles are written as 'p' followed by the
+# percentile, e.g. 'p95'.
+AGGREGATE_FUNCTIONS = ('sum', 'avg', 'min', 'max')
+DOWNSAMPLE_FUNCTIONS = AGGREGATE_FUNCTIONS + ('last',)
+
+
+def check_function(func: str, allowed: Sequence[str]) -> None:
+    if func in allowed:
+        return
+    if func.startswith('p'):
+        try:
+            percentile = float(func[1:])
+        except ValueError:
+            pass
+        else:
+            if 0 <= percentile <= 100:
+                return
+    raise InvalidExpressionError("Invalid function '%s'" % func)
+
+
 class Builder(object):
     def __init__(self, **labels: str) -> None:
         name = stats.StatName(**labels)
@@ -47,6 +67,35 @@ class Builder(object):
         self.__code.append(('RATE',))
         return self
 
+    def __aggregate(self, func: str, labels: Sequence[str]) -> 'Builder':
+        check_function(func, AGGREGATE_FUNCTIONS)
+        self.__code.append(('AGGREGATE', func, tuple(labels)))
+        return self
+
+    # Aggregate over all series, which have the same values for the given labels.
+    def SUM(self, *labels: str) -> 'Builder':
+        return self.__aggregate('sum', labels)
+
+    def AVG(self, *labels: str) -> 'Builder':
+        return self.__aggregate('avg', labels)
+
+    def MIN(self, *labels: str) -> 'Builder':
+        return self.__aggregate('min', labels)
+
+    def MAX(self, *labels: str) -> 'Builder':
+        return self.__aggregate('max', labels)
+
+    def PERCENTILE(self, percentile: float, *labels: str) -> 'Builder':
+        return self.__aggregate('p%g' % percentile, labels)
+
+    # Combine the values of each series into buckets of interval seconds.
+    def DOWNSAMPLE(self, interval: float, func: str = 'avg') -> 'Builder':
+        if not interval > 0:
+            raise InvalidExpressionError("Invalid interval %r" % interval)
+        check_function(func, DOWNSAMPLE_FUNCTIONS)
+        self.__code.append(('DOWNSAMPLE', float(interval), func))
+        return self
+
 
 def compile_expression(expr: str) -> Expression:
     try:
@@ -54,3 +103,7 @@ def compile_expression(expr: str) -> Expression:
     except Exception as exc:
         raise InvalidExpressionError(str(exc))
     return builder.get_code()
+
+
+def expression_key(expr: Expression) -> Hashable:
+    return tuple(tuple(op) for op in expr)
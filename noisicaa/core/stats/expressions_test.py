@@ -36,3 +36,27 @@ class CompileExpressionTest(unittest.TestCase):
             expressions.compile_expression('SELECT(name="foo").RATE()'),
             [('SELECT', stats.StatName(name='foo')),
              ('RATE',)])
+
+    def test_aggregate(self):
+        self.assertEqual(
+            expressions.compile_expression('SELECT(name="foo").SUM("pid")'),
+            [('SELECT', stats.StatName(name='foo')),
+             ('AGGREGATE', 'sum', ('pid',))])
+        self.assertEqual(
+            expressions.compile_expression('SELECT(name="foo").PERCENTILE(95)'),
+            [('SELECT', stats.StatName(name='foo')),
+             ('AGGREGATE', 'p95', ())])
+
+    def test_downsample(self):
+        self.assertEqual(
+            expressions.compile_expression('SELECT(name="foo").DOWNSAMPLE(5, "max")'),
+            [('SELECT', stats.StatName(name='foo')),
+             ('DOWNSAMPLE', 5.0, 'max')])
+
+    def test_invalid(self):
+        with self.assertRaises(expressions.InvalidExpressionError):
+            expressions.compile_expression('SELECT(name="foo").DOWNSAMPLE(5, "median")')
+        with self.assertRaises(expressions.InvalidExpressionError):
+            expressions.compile_expression('SELECT(name="foo").DOWNSAMPLE(0)')
+        with self.assertRaises(expressions.InvalidExpressionError):
+            expressions.compile_expression('SELECT(name="foo").PERCENTILE(101)')
@@ -68,8 +68,9 @@ class Registry(object):
 
         with self.__lock:
             now = time.time()
-            for name, stat in self.__stats.items():
-                data.append((name, timeseries.Value(now, stat.value)))
+            for stat in self.__stats.values():
+                for name, value in stat.values():
+                    data.append((name, timeseries.Value(now, value)))
 
             if proc_info is not None:
                 with proc_info.oneshot():
@@ -20,6 +20,7 @@
 #
 # @end:license
 
+import bisect
 import logging
 import threading
 from typing import Any, List, Optional, Tuple, Union, Generic, TypeVar
@@ -93,6 +94,9 @@ class BaseStat(object):
     def value(self) -> Union[int, float]:
         raise NotImplementedError
 
+    def values(self) -> List[Tuple[StatName, Union[int, float]]]:
+        return [(self.name, self.value)]
+
     def unregister(self) -> None:
         self.registry.unregister(self)
         self.registry = None
@@ -112,3 +116,67 @@ class Counter(Generic[COUNTERVAL], BaseStat):
     def incr(self, amount: COUNTERVAL = 1) -> None:
         with self._lock:
             self.__value += amount
+
+
+class Gauge(BaseStat):
+    def __init__(self, name: StatName, registry: Registry, lock: threading.RLock) -> None:
+        super().__init__(name, registry, lock)
+
+        self.__value = 0  # type: Union[int, float]
+
+    @property
+    def value(self) -> Union[int, float]:
+        return self.__value
+
+    def set(self, value: Union[int, float]) -> None:
+        with self._lock:
+            self.__value = value
+
+    def incr(self, amount: Union[int, float] = 1) -> None:
+        with self._lock:
+            self.__value += amount
+
+    def decr(self, amount: Union[int, float] = 1) -> None:
+        with self._lock:
+            self.__value -= amount
+
+
+class Histogram(BaseStat):
+    # Upper bounds of the buckets, chosen for latencies in seconds.
+    BUCKETS = (
+        0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+        2.5, 5.0, 10.0, float('inf'))
+
+    def __init__(self, name: StatName, registry: Registry, lock: threading.RLock) -> None:
+        super().__init__(name, registry, lock)
+
+        self.__counts = [0] * len(self.BUCKETS)
+        self.__count = 0
+        self.__sum = 0.0
+
+    @property
+    def value(self) -> Union[int, float]:
+        return self.__count
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.__counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+            self.__count += 1
+            self.__sum += value
+
+    def values(self) -> List[Tuple[StatName, Union[int, float]]]:
+        # Like Prometheus, each bucket counts all values less or equal to its bound, plus the
+        # total count and sum of all values.
+        with self._lock:
+            result = []  # type: List[Tuple[StatName, Union[int, float]]]
+            total = 0
+            for bound, count in zip(self.BUCKETS, self.__counts):
+                total += count
+                result.append((self.name.merge(StatName(le='%g' % bound)), total))
+            result.append((self.name.merge(StatName(type='count')), self.__count))
+            result.append((self.name.merge(StatName(type='sum')), self.__sum))
+            return result
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# @end:license
+
+from noisidev import unittest
+from .registry import Registry
+from . import stats
+
+
+class GaugeTest(unittest.TestCase):
+    def test_incr_decr(self):
+        reg = Registry()
+        gauge = reg.register(stats.Gauge, stats.StatName(name='foo'))
+        gauge.incr()
+        gauge.incr(3)
+        gauge.decr()
+        self.assertEqual(gauge.value, 3)
+        gauge.set(10)
+        self.assertEqual(gauge.value, 10)
+
+
+class HistogramTest(unittest.TestCase):
+    def test_observe(self):
+        reg = Registry()
+        histogram = reg.register(stats.Histogram, stats.StatName(name='foo'))
+        histogram.observe(0.0002)
+        histogram.observe(0.003)
+        histogram.observe(0.004)
+        histogram.observe(100.0)
+        self.assertEqual(histogram.value, 4)
+        self.assertAlmostEqual(histogram.sum, 100.0072)
+
+        values = dict(histogram.values())
+        self.assertEqual(values[stats.StatName(name='foo', le='0.0001')], 0)
+        self.assertEqual(values[stats.StatName(name='foo', le='0.00025')], 1)
+        self.assertEqual(values[stats.StatName(name='foo', le='0.005')], 3)
+        self.assertEqual(values[stats.StatName(name='foo', le='10')], 3)
+        self.assertEqual(values[stats.StatName(name='foo', le='inf')], 4)
+        self.assertEqual(values[stats.StatName(name='foo', type='count')], 4)
+
+    def test_collect(self):
+        reg = Registry()
+        histogram = reg.register(stats.Histogram, stats.StatName(name='foo'))
+        histogram.observe(0.5)
+        names = {name for name, _ in reg.collect()}
+        self.assertIn(stats.StatName(name='foo', le='inf'), names)
+        self.assertIn(stats.StatName(name='foo', type='sum'), names)
@@ -22,7 +22,9 @@
 
 import collections
 import logging
-from typing import List, MutableMapping, MutableSequence, Union
+from typing import Dict, Iterator, List, MutableMapping, Sequence, Union
+
+import numpy
 
 from . import stats
 
@@ -55,32 +57,172 @@ class ValueSet(collections.UserDict, MutableMapping[stats.StatName, Value]):
         return result
 
 
-class Timeseries(collections.UserList, MutableSequence[Value]):
-    # Declaration for UserList in the typeshed does not include the data attribute.
-    data = None  # type: List[Value]
+def reduce_values(func: str, values: numpy.ndarray, axis: int = 0) -> numpy.ndarray:
+    if func == 'sum':
+        return values.sum(axis=axis)
+    elif func == 'avg':
+        return values.mean(axis=axis)
+    elif func == 'min':
+        return values.min(axis=axis)
+    elif func == 'max':
+        return values.max(axis=axis)
+    elif func.startswith('p'):
+        return numpy.percentile(values, float(func[1:]), axis=axis)
+    else:
+        raise ValueError(func)
+
+
+class Timeseries(object):
+    """A fixed capacity series of values, indexed from the most recent value backwards.
+
+    Timestamps and values are kept in two contiguous arrays, which are used as ring buffers.
+    Once the capacity is reached, adding a value replaces the oldest one.
+    """
+
+    def __init__(self, capacity: int = 6000) -> None:
+        assert capacity > 0
+        self.__timestamps = numpy.zeros(capacity, dtype=numpy.float64)
+        self.__values = numpy.zeros(capacity, dtype=numpy.float64)
+        self.__head = 0
+        self.__length = 0
+
+    @classmethod
+    def from_arrays(cls, timestamps: numpy.ndarray, values: numpy.ndarray) -> 'Timeseries':
+        """Create a timeseries from arrays in chronological order."""
+
+        assert len(timestamps) == len(values)
+        ts = cls(max(1, len(values)))
+        ts.__set_chronological(timestamps, values)  # pylint: disable=protected-access
+        return ts
+
+    def __set_chronological(self, timestamps: numpy.ndarray, values: numpy.ndarray) -> None:
+        length = len(values)
+        self.__timestamps[:length] = timestamps
+        self.__values[:length] = values
+        self.__length = length
+        self.__head = length % len(self.__values)
+
+    def __chronological(self, array: numpy.ndarray) -> numpy.ndarray:
+        if self.__length < len(array):
+            return array[:self.__length]
+        return numpy.concatenate((array[self.__head:], array[:self.__head]))
+
+    def __getstate__(self) -> Dict[str, numpy.ndarray]:
+        # Only pickle the used part of the buffers.
+        return {
+            'timestamps': self.__chronological(self.__timestamps),
+            'values': self.__chronological(self.__values),
+        }
+
+    def __setstate__(self, state: Dict[str, numpy.ndarray]) -> None:
+        capacity = max(1, len(state['values']))
+        self.__timestamps = numpy.zeros(capacity, dtype=numpy.float64)
+        self.__values = numpy.zeros(capacity, dtype=numpy.float64)
+        self.__set_chronological(state['timestamps'], state['values'])
+
+    @property
+    def capacity(self) -> int:
+        return len(self.__values)
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __getitem__(self, idx: int) -> Value:
+        if idx < 0:
+            idx += self.__length
+        if not 0 <= idx < self.__length:
+            raise IndexError(idx)
+        pos = (self.__head - 1 - idx) % len(self.__values)
+        return Value(float(self.__timestamps[pos]), float(self.__values[pos]))
+
+    def __iter__(self) -> Iterator[Value]:
+        for timestamp, value in zip(self.timestamps().tolist(), self.values().tolist()):
+            yield Value(timestamp, value)
+
+    def add(self, value: Value) -> None:
+        self.__timestamps[self.__head] = value.timestamp
+        self.__values[self.__head] = value.value
+        self.__head = (self.__head + 1) % len(self.__values)
+        if self.__length < len(self.__values):
+            self.__length += 1
+
+    def timestamps(self) -> numpy.ndarray:
+        """The timestamps, most recent first."""
+        return self.__chronological(self.__timestamps)[::-1]
+
+    def values(self) -> numpy.ndarray:
+        """The values, most recent first."""
+        return self.__chronological(self.__values)[::-1]
 
     def rate(self) -> 'Timeseries':
-        result = Timeseries()
-        prev_value = None  # type: Value
-        for value in reversed(self):
-            if prev_value is not None:
-                result.insert(
-                    0,
-                    Value(
-                        value.timestamp,
-                        (value.value - prev_value.value)
-                        / (value.timestamp - prev_value.timestamp)))
-            prev_value = value
-        return result
+        timestamps = self.__chronological(self.__timestamps)
+        values = self.__chronological(self.__values)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rates = numpy.diff(values) / numpy.diff(timestamps)
+        return Timeseries.from_arrays(timestamps[1:], rates)
+
+    def since(self, timestamp: float) -> 'Timeseries':
+        """The values with a timestamp after the given one."""
+
+        timestamps = self.__chronological(self.__timestamps)
+        values = self.__chronological(self.__values)
+        start = numpy.searchsorted(timestamps, timestamp, side='right')
+        return Timeseries.from_arrays(timestamps[start:], values[start:])
+
+    def extend(self, other: 'Timeseries') -> None:
+        """Add the values of another timeseries, which are newer than our latest.
+
+        Older values are dropped, so overlapping incremental fetches do not add values twice.
+        """
+
+        timestamps = other.timestamps()[::-1]
+        values = other.values()[::-1]
+        if self.__length > 0:
+            start = numpy.searchsorted(timestamps, self.latest().timestamp, side='right')
+            timestamps = timestamps[start:]
+            values = values[start:]
+
+        for timestamp, value in zip(timestamps.tolist(), values.tolist()):
+            self.add(Value(timestamp, value))
+
+    def downsample(self, interval: float, func: str) -> 'Timeseries':
+        timestamps = self.__chronological(self.__timestamps)
+        values = self.__chronological(self.__values)
+
+        buckets = numpy.floor(timestamps / interval)
+        starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(buckets)) + 1))
+        # The last bucket is left out, because it might still get more values.
+        ends = starts[1:]
+        starts = starts[:-1]
+        if len(starts) == 0:
+            return Timeseries.from_arrays(numpy.zeros(0), numpy.zeros(0))
+
+        values = values[:ends[-1]]
+        if func == 'sum':
+            result = numpy.add.reduceat(values, starts)
+        elif func == 'avg':
+            result = numpy.add.reduceat(values, starts) / (ends - starts)
+        elif func == 'min':
+            result = numpy.minimum.reduceat(values, starts)
+        elif func == 'max':
+            result = numpy.maximum.reduceat(values, starts)
+        elif func == 'last':
+            result = values[ends - 1]
+        else:
+            result = numpy.array([
+                reduce_values(func, values[start:end])
+                for start, end in zip(starts.tolist(), ends.tolist())])
+
+        return Timeseries.from_arrays(buckets[starts] * interval, result)
 
     def latest(self) -> Value:
-        return self.data[0]
+        return self[0]
 
     def max(self) -> ValueType:
-        return max(value.value for value in self)
+        return float(self.__values[:self.__length].max())
 
     def min(self) -> ValueType:
-        return min(value.value for value in self)
+        return float(self.__values[:self.__length].min())
 
 
 class TimeseriesSet(collections.UserDict, MutableMapping[stats.StatName, Timeseries]):
@@ -99,6 +241,70 @@ class TimeseriesSet(collections.UserDict, MutableMapping[stats.StatName, Timeser
 
         return result
 
+    def since(self, timestamp: Union[float, Dict[stats.StatName, float]]) -> 'TimeseriesSet':
+        """The values after the given timestamp.
+
+        The timestamp can also be given per series, because series from different processes do
+        not arrive in timestamp order. Series, which are not listed, are returned completely.
+        """
+
+        result = TimeseriesSet()
+        for ts_name, ts in self.data.items():
+            if isinstance(timestamp, dict):
+                if ts_name in timestamp:
+                    result[ts_name] = ts.since(timestamp[ts_name])
+                else:
+                    result[ts_name] = ts
+            else:
+                result[ts_name] = ts.since(timestamp)
+
+        return result
+
+    def merge(self, other: 'TimeseriesSet', capacity: int = 6000) -> None:
+        """Append the values from another set, e.g. the result of an incremental fetch."""
+
+        for ts_name, ts in other.items():
+            own_ts = self.data.get(ts_name)
+            if own_ts is None:
+                own_ts = Timeseries(capacity)
+                self.data[ts_name] = own_ts
+            own_ts.extend(ts)
+
+    def aggregate(self, func: str, labels: Sequence[str]) -> 'TimeseriesSet':
+        """Combine the series, which have the same values for the given labels.
+
+        The series are aligned by their most recent value, so the result is only as long as the
+        shortest series in each group.
+        """
+
+        groups = {}  # type: Dict[stats.StatName, List[Timeseries]]
+        for ts_name, ts in self.data.items():
+            if len(ts) == 0:
+                continue
+            group_labels = {}  # type: Dict[str, Union[str, int]]
+            for label in labels:
+                value = ts_name.get(label)
+                if value is not None:
+                    group_labels[label] = value
+            groups.setdefault(stats.StatName(**group_labels), []).append(ts)
+
+        result = TimeseriesSet()
+        for group_name, group in groups.items():
+            length = min(len(ts) for ts in group)
+            values = numpy.stack([ts.values()[:length] for ts in group])
+            timestamps = group[0].timestamps()[:length]
+            result[group_name] = Timeseries.from_arrays(
+                timestamps[::-1], reduce_values(func, values, axis=0)[::-1])
+
+        return result
+
+    def downsample(self, interval: float, func: str) -> 'TimeseriesSet':
+        result = TimeseriesSet()
+        for ts_name, ts in self.data.items():
+            result[ts_name] = ts.downsample(interval, func)
+
+        return result
+
     def latest(self) -> ValueSet:
         result = ValueSet()
         for ts_name, ts in self.data.items():
@@ -107,13 +313,15 @@ class TimeseriesSet(collections.UserDict, MutableMapping[stats.StatName, Timeser
         return result
 
     def min(self) -> ValueType:
-        if self.data:
-            return min(ts.min() for ts in self.values())
+        series = [ts for ts in self.values() if len(ts) > 0]
+        if series:
+            return min(ts.min() for ts in series)
         else:
             return 0
 
     def max(self) -> ValueType:
-        if self.data:
-            return max(ts.max() for ts in self.values())
+        series = [ts for ts in self.values() if len(ts) > 0]
+        if series:
+            return max(ts.max() for ts in series)
         else:
             return 0
@@ -20,6 +20,8 @@
 #
 # @end:license
 
+import pickle
+
 from noisidev import unittest
 from . import stats
 
@@ -39,6 +41,64 @@ class StatNameTest(unittest.TestCase):
             stats.StatName(a=1, b=2, c=3).is_subset_of(stats.StatName(a=1, b=2)))
 
 
+class TimeseriesTest(unittest.TestCase):
+    def test_ring(self):
+        ts = stats.Timeseries(capacity=5)
+        for i in range(8):
+            ts.add(stats.Value(float(i), i * i))
+
+        self.assertEqual(len(ts), 5)
+        self.assertEqual([v.value for v in ts], [49, 36, 25, 16, 9])
+        self.assertEqual(ts.latest().timestamp, 7.0)
+        self.assertEqual(ts[-1].value, 9)
+        self.assertEqual(ts.min(), 9)
+        self.assertEqual(ts.max(), 49)
+
+    def test_rate(self):
+        ts = stats.Timeseries(capacity=5)
+        for i in range(8):
+            ts.add(stats.Value(2.0 * i, i * i))
+
+        rate = ts.rate()
+        self.assertEqual([v.timestamp for v in rate], [14.0, 12.0, 10.0, 8.0])
+        self.assertEqual([v.value for v in rate], [6.5, 5.5, 4.5, 3.5])
+
+    def test_pickle(self):
+        ts = stats.Timeseries(capacity=100)
+        for i in range(10):
+            ts.add(stats.Value(float(i), i))
+
+        ts2 = pickle.loads(pickle.dumps(ts))
+        self.assertEqual(ts2.capacity, 10)
+        self.assertEqual(ts2.values().tolist(), ts.values().tolist())
+        self.assertEqual(ts2.timestamps().tolist(), ts.timestamps().tolist())
+
+
+    def test_since(self):
+        ts = stats.Timeseries(capacity=5)
+        for i in range(8):
+            ts.add(stats.Value(float(i), i))
+
+        self.assertEqual(ts.since(5.0).values().tolist(), [7, 6])
+        self.assertEqual(len(ts.since(7.0)), 0)
+        self.assertEqual(len(ts.since(0.0)), 5)
+
+    def test_downsample(self):
+        ts = stats.Timeseries(capacity=100)
+        for i in range(10):
+            ts.add(stats.Value(float(i), i))
+
+        # The last bucket [8, 10) is incomplete and left out.
+        ds = ts.downsample(4.0, 'avg')
+        self.assertEqual(ds.timestamps().tolist(), [4.0, 0.0])
+        self.assertEqual(ds.values().tolist(), [5.5, 1.5])
+
+        self.assertEqual(ts.downsample(4.0, 'max').values().tolist(), [7, 3])
+        self.assertEqual(ts.downsample(4.0, 'last').values().tolist(), [7, 3])
+        self.assertEqual(ts.downsample(4.0, 'p50').values().tolist(), [5.5, 1.5])
+        self.assertEqual(len(ts.downsample(100.0, 'sum')), 0)
+
+
 class TimeseriesSetTest(unittest.TestCase):
     def test_select(self):
         s = stats.TimeseriesSet()
@@ -50,6 +110,50 @@ class TimeseriesSetTest(unittest.TestCase):
         r = s.select(stats.StatName(n=1))
         self.assertEqual(len(r), 1)
 
+    def test_aggregate(self):
+        s = stats.TimeseriesSet()
+        for pid, node, values in [(1, 'a', [1, 2, 3]), (1, 'b', [3, 4]), (2, 'a', [5, 6, 7])]:
+            ts = stats.Timeseries()
+            for i, v in enumerate(values):
+                ts.add(stats.Value(float(i), v))
+            s[stats.StatName(name='foo', pid=pid, node=node)] = ts
+
+        r = s.aggregate('sum', ['pid'])
+        self.assertEqual(set(r.keys()), {stats.StatName(pid=1), stats.StatName(pid=2)})
+        # Series are aligned by their most recent values.
+        self.assertEqual(r[stats.StatName(pid=1)].values().tolist(), [7, 5])
+        self.assertEqual(r[stats.StatName(pid=2)].values().tolist(), [7, 6, 5])
+
+        r = s.aggregate('max', [])
+        self.assertEqual(r[stats.StatName()].values().tolist(), [7, 6])
+
+    def test_merge(self):
+        s = stats.TimeseriesSet()
+        for start in (0, 3):
+            update = stats.TimeseriesSet()
+            ts = stats.Timeseries()
+            for i in range(start, start + 3):
+                ts.add(stats.Value(float(i), i))
+            update[stats.StatName(name='foo')] = ts
+            s.merge(update)
+
+        self.assertEqual(
+            s[stats.StatName(name='foo')].values().tolist(), [5, 4, 3, 2, 1, 0])
+
+    def test_merge_overlapping(self):
+        s = stats.TimeseriesSet()
+        for start in (0, 2, 2, 4):
+            update = stats.TimeseriesSet()
+            ts = stats.Timeseries()
+            for i in range(start, start + 3):
+                ts.add(stats.Value(float(i), i))
+            update[stats.StatName(name='foo')] = ts
+            s.merge(update)
+
+        # Values, which have been fetched before, are not added again.
+        self.assertEqual(
+            s[stats.StatName(name='foo')].values().tolist(), [6, 5, 4, 3, 2, 1, 0])
+
 
 class RegistryTest(unittest.TestCase):
     def test_counter(self):
@@ -75,3 +179,56 @@ class CollectorTest(unittest.TestCase):
             s1.incr()
             s2.incr(2)
             collector.collect(registry)
+
+        result = collector.fetch_stats(
+            {'s1': stats.compile_expression('SELECT(name="s1")')})
+        ts = result['s1'][stats.StatName(name='s1')]
+        self.assertEqual(len(ts), 5)
+        self.assertEqual(ts.latest().value, 10)
+
+    def test_fetch_since(self):
+        collector = stats.Collector()
+        for i in range(10):
+            collector.add_value(stats.StatName(name='s1'), stats.Value(float(i), i))
+
+        expr = stats.compile_expression('SELECT(name="s1").RATE()')
+        result = collector.fetch_stats({'s1': expr}, {'s1': 7.0})
+        ts = result['s1'][stats.StatName(name='s1')]
+        self.assertEqual(ts.timestamps().tolist(), [9.0, 8.0])
+
+    def test_out_of_order(self):
+        # Values from different processes are not added in timestamp order.
+        collector = stats.Collector()
+        expr = stats.compile_expression('SELECT(name="a")')
+        pid1 = stats.StatName(name='a', pid=1)
+        pid2 = stats.StatName(name='a', pid=2)
+
+        collector.add_value(pid1, stats.Value(2.05, 1))
+        result = collector.fetch_stats({'a': expr})
+        self.assertEqual(set(result['a'].keys()), {pid1})
+        since = {'a': {name: ts.latest().timestamp for name, ts in result['a'].items()}}
+
+        collector.add_value(pid2, stats.Value(2.03, 2))
+        # The cached result must not be reused, although there is no newer timestamp.
+        result = collector.fetch_stats({'a': expr})
+        self.assertEqual(set(result['a'].keys()), {pid1, pid2})
+
+        collector.add_value(pid1, stats.Value(2.15, 3))
+        collector.add_value(pid2, stats.Value(2.13, 4))
+        result = collector.fetch_stats({'a': expr}, since)
+        self.assertEqual(result['a'][pid1].values().tolist(), [3])
+        self.assertEqual(result['a'][pid2].values().tolist(), [4, 2])
+
+    def test_cache(self):
+        collector = stats.Collector()
+        collector.add_value(stats.StatName(name='s1'), stats.Value(1.0, 1))
+
+        expr = stats.compile_expression('SELECT(name="s1").SUM()')
+        r1 = collector.evaluate_expression(expr)
+        r2 = collector.evaluate_expression(stats.compile_expression('SELECT(name="s1").SUM()'))
+        self.assertIs(r1, r2)
+
+        collector.add_value(stats.StatName(name='s1'), stats.Value(2.0, 2))
+        r3 = collector.evaluate_expression(expr)
+        self.assertIsNot(r1, r3)
+        self.assertEqual(r3[stats.StatName()].values().tolist(), [2, 1])
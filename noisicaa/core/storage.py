@@ -20,20 +20,28 @@
 #
 # @end:license
 
+import bisect
 import collections
+import contextlib
 import enum
 import hashlib
+import io
+import itertools
 import logging
+import mmap
 import os
 import os.path
 import time
 import struct
-from typing import cast, Dict, List, Set, Tuple, IO
+import zlib
+from typing import cast, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union, IO
 
 from mypy_extensions import TypedDict
 import portalocker
+import zstandard
 
 from . import fileutil
+from . import stats
 from . import storage_pb2
 
 logger = logging.getLogger(__name__)
@@ -58,6 +66,8 @@ LogEntry = bytes
 Checkpoint = bytes
 HistoryEntry = Tuple[bytes, int, int, int]
 CheckpointIndexEntry = Tuple[int, int]
+# Merges two log entries into one, or returns None, if they can't be merged.
+MergeLogsFunc = Callable[[LogEntry, LogEntry], Optional[LogEntry]]
 
 
 class Action(enum.Enum):
@@ -67,20 +77,85 @@ class Action(enum.Enum):
 ACTION_FORWARD = Action.FORWARD
 ACTION_BACKWARD = Action.BACKWARD
 
+class SyncPolicy(enum.Enum):
+    # Leave it to the OS, when data hits the disk.
+    NEVER = 'never'
+    # fsync() once per group of log entries.
+    GROUP = 'group'
+    # fsync() after every single log entry, i.e. no group commits.
+    ENTRY = 'entry'
+
+
 def _reverse_action(action: bytes) -> bytes:
     if action == ACTION_BACKWARD.value:
         return ACTION_FORWARD.value
     return ACTION_BACKWARD.value
 
 
+def _map_file(fp: IO[bytes]) -> Union[mmap.mmap, bytes]:
+    if isinstance(fp, io.FileIO):
+        size = os.fstat(fp.fileno()).st_size
+        if size > 0:
+            return mmap.mmap(fp.fileno(), size, access=mmap.ACCESS_READ)
+        return b''
+
+    # Not a plain file, which could be mapped.
+    fp.seek(0, os.SEEK_SET)
+    return fp.read()
+
+
+class MappedBuffer(object):
+    """An append-only byte buffer, whose initial contents are mapped from a file.
+
+    Pages of the file are only read, when they are accessed. Data appended later is kept in
+    memory, writing it to the file is up to the caller.
+    """
+
+    def __init__(self, fp: IO[bytes]) -> None:
+        self.__mapped = _map_file(fp)
+        self.__appended = bytearray()
+
+    def close(self) -> None:
+        if isinstance(self.__mapped, mmap.mmap):
+            self.__mapped.close()
+        self.__mapped = b''
+        self.__appended = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.__mapped) + len(self.__appended)
+
+    def __getitem__(self, s: slice) -> bytes:
+        start, stop, step = s.indices(len(self))
+        assert step == 1
+        mapped_size = len(self.__mapped)
+        if stop <= mapped_size:
+            return self.__mapped[start:stop]
+        if start >= mapped_size:
+            return bytes(self.__appended[start - mapped_size:stop - mapped_size])
+        return self.__mapped[start:] + bytes(self.__appended[:stop - mapped_size])
+
+    def __iadd__(self, data: bytes) -> 'MappedBuffer':
+        self.__appended += data
+        return self
+
+    def __bytes__(self) -> bytes:
+        return self.__mapped[:] + bytes(self.__appended)
+
+
 class ProjectStorage(object):
     MAGIC = b'NOISICAA\n'
 
     VERSION = 1
     SUPPORTED_VERSIONS = [1]
 
-    def __init__(self) -> None:
+    def __init__(
+            self,
+            sync_policy: SyncPolicy = SyncPolicy.NEVER,
+            checkpoint_compression: int = storage_pb2.FileHeader.ZSTD
+    ) -> None:
         self.path = None  # type: str
+        self.sync_policy = sync_policy
+        self.checkpoint_compression = checkpoint_compression
         self.header_data = None  # type: HeaderData
         self.file_lock = None  # type: IO
         self.log_index_fp = None  # type: IO[bytes]
@@ -92,17 +167,18 @@ class ProjectStorage(object):
         self.log_fp = None  # type: IO[bytes]
         self.log_fp_map = {}  # type: Dict[int, IO]
         self.log_index_formatter = struct.Struct('>QQ')
-        self.log_index = None # type: bytearray
+        self.log_index = None # type: MappedBuffer
 
         self.log_history_formatter = struct.Struct('>cQQQ')
         self.next_sequence_number = None  # type: int
         self.undo_count = None  # type: int
         self.redo_count = None  # type: int
-        self.log_history = None  # type: bytearray
+        self.log_history = None  # type: MappedBuffer
 
         self.next_checkpoint_number = None  # type: int
         self.checkpoint_index_formatter = struct.Struct('>QQ')
-        self.checkpoint_index = None  # type: bytearray
+        self.checkpoint_index = None  # type: MappedBuffer
+        self.last_full_checkpoint_number = None  # type: int
 
         self.log_entry_cache = collections.OrderedDict()  # type: collections.OrderedDict[int, LogEntry]
         self.log_entry_cache_size = 20
@@ -110,6 +186,20 @@ class ProjectStorage(object):
         self.written_log_number = None  # type: int
         self.written_sequence_number = None  # type: int
 
+        # Log entries, which have not been written to disk yet.
+        self.group_depth = 0
+        self.pending_log = []  # type: List[bytes]
+        self.pending_log_size = 0
+        self.pending_log_index = []  # type: List[bytes]
+        self.pending_log_history = []  # type: List[bytes]
+        self.pending_log_number = None  # type: int
+        self.pending_sequence_number = None  # type: int
+
+        self.stat_commit_latency = None  # type: stats.Histogram
+        self.stat_fsync_latency = None  # type: stats.Histogram
+        self.stat_entries_written = None  # type: stats.Counter
+        self.stat_groups_written = None  # type: stats.Counter
+
     def open(self, path: str) -> None:
         assert self.path is None
 
@@ -132,6 +222,8 @@ class ProjectStorage(object):
         self.file_lock = self.acquire_file_lock(
             os.path.join(self.path, "lock"))
 
+        self._recover_compaction()
+
         log_path = os.path.join(self.path, 'log.%06d' % self.log_file_number)
         if os.path.exists(log_path):
             mode = 'a+b'
@@ -142,20 +234,24 @@ class ProjectStorage(object):
         self.log_index_fp = open(
             os.path.join(self.path, 'log.index'),
             mode='r+b', buffering=0)
-        self.log_index = bytearray(self.log_index_fp.read())
+        self.log_index = MappedBuffer(self.log_index_fp)
+        self.log_index_fp.seek(0, os.SEEK_END)
         self.next_log_number = len(self.log_index) // self.log_index_formatter.size
         if len(self.log_index) != self.next_log_number * self.log_index_formatter.size:
             raise CorruptedProjectError("Malformed log.index file.")
         self.written_log_number = self.next_log_number - 1
+        self.pending_log_number = self.written_log_number
 
         self.log_history_fp = open(
             os.path.join(self.path, 'log.history'),
             mode='r+b', buffering=0)
-        self.log_history = bytearray(self.log_history_fp.read())
+        self.log_history = MappedBuffer(self.log_history_fp)
+        self.log_history_fp.seek(0, os.SEEK_END)
         self.next_sequence_number = len(self.log_history) // self.log_history_formatter.size
         if len(self.log_history) != self.next_sequence_number * self.log_history_formatter.size:
             raise CorruptedProjectError("Malformed log.history file.")
         self.written_sequence_number = self.next_sequence_number - 1
+        self.pending_sequence_number = self.written_sequence_number
 
         if self.written_sequence_number >= 0:
             self.undo_count, self.redo_count = self.get_history_entry(
@@ -167,15 +263,33 @@ class ProjectStorage(object):
         self.checkpoint_index_fp = open(
             os.path.join(self.path, 'checkpoint.index'),
             mode='r+b', buffering=0)
-        self.checkpoint_index = bytearray(self.checkpoint_index_fp.read())
+        self.checkpoint_index = MappedBuffer(self.checkpoint_index_fp)
+        self.checkpoint_index_fp.seek(0, os.SEEK_END)
         self.next_checkpoint_number = (
             len(self.checkpoint_index) // self.checkpoint_index_formatter.size)
         if len(self.checkpoint_index) != (
                 self.next_checkpoint_number * self.checkpoint_index_formatter.size):
             raise CorruptedProjectError("Malformed checkpoint.index file.")
+        if self.next_checkpoint_number > 0:
+            checkpoint_number = self._get_checkpoint_entry(self.next_checkpoint_number - 1)[1]
+            header = self._read_checkpoint_header(checkpoint_number)
+            if header.HasField('delta_base'):
+                self.last_full_checkpoint_number = header.delta_base
+            else:
+                self.last_full_checkpoint_number = checkpoint_number
 
         os.utime(os.path.join(self.path, 'project.noise'))
 
+        name = stats.StatName(project=self.path, sync_policy=self.sync_policy.value)
+        self.stat_commit_latency = stats.registry.register(
+            stats.Histogram, name.merge(stats.StatName(name='storage_commit_latency')))
+        self.stat_fsync_latency = stats.registry.register(
+            stats.Histogram, name.merge(stats.StatName(name='storage_fsync_latency')))
+        self.stat_entries_written = stats.registry.register(
+            stats.Counter, name.merge(stats.StatName(name='storage_log_entries_written')))
+        self.stat_groups_written = stats.registry.register(
+            stats.Counter, name.merge(stats.StatName(name='storage_log_groups_written')))
+
     def get_restore_info(self) -> Tuple[int, List[Tuple[Action, int]]]:
         assert self.next_checkpoint_number > 0
 
@@ -190,7 +304,10 @@ class ProjectStorage(object):
         return checkpoint_number, actions
 
     @classmethod
-    def create(cls, path: str) -> 'ProjectStorage':
+    def create(
+            cls, path: str, sync_policy: SyncPolicy = SyncPolicy.NEVER,
+            checkpoint_compression: int = storage_pb2.FileHeader.ZSTD
+    ) -> 'ProjectStorage':
         header_data = {
             'created': int(time.time()),
         }  # type: HeaderData
@@ -212,20 +329,41 @@ class ProjectStorage(object):
         # There's a short, but probably irrelevant race here: Some other
         # process could open and lock our freshly created project,
         # causing the open call here to fail. Let's not care about that.
-        project_storage = cls()
+        project_storage = cls(
+            sync_policy=sync_policy, checkpoint_compression=checkpoint_compression)
         project_storage.open(path)
         return project_storage
 
     def close(self) -> None:
         assert self.path is not None, "Project already closed."
 
+        self.group_depth = 0
+        self._commit_log()
+
         os.utime(os.path.join(self.path, 'project.noise'))
         self.path = None
 
+        for stat in (self.stat_commit_latency, self.stat_fsync_latency,
+                     self.stat_entries_written, self.stat_groups_written):
+            if stat is not None:
+                stat.unregister()
+        self.stat_commit_latency = None
+        self.stat_fsync_latency = None
+        self.stat_entries_written = None
+        self.stat_groups_written = None
+
+        if self.log_index is not None:
+            self.log_index.close()
+            self.log_index = None
+
         if self.log_index_fp is not None:
             self.log_index_fp.close()
             self.log_index_fp = None
 
+        if self.log_history is not None:
+            self.log_history.close()
+            self.log_history = None
+
         if self.log_history_fp is not None:
             self.log_history_fp.close()
             self.log_history_fp = None
@@ -238,6 +376,10 @@ class ProjectStorage(object):
             log_fp.close()
         self.log_fp_map.clear()
 
+        if self.checkpoint_index is not None:
+            self.checkpoint_index.close()
+            self.checkpoint_index = None
+
         if self.checkpoint_index_fp is not None:
             self.checkpoint_index_fp.close()
             self.checkpoint_index_fp = None
@@ -245,6 +387,198 @@ class ProjectStorage(object):
         self.release_file_lock(self.file_lock)
         self.file_lock = None
 
+    @classmethod
+    def compact(
+            cls, path: str, *,
+            keep_checkpoints: int = 1,
+            merge_logs: Optional[MergeLogsFunc] = None
+    ) -> None:
+        """Drop all history before the last keep_checkpoints checkpoints.
+
+        If merge_logs is given, it is used to merge consecutive log entries, so they become a
+        single undo step.
+
+        The compacted storage is first written to a separate directory, which is then moved into
+        place, when the project is opened the next time. If that process is interrupted, it will
+        be rolled back or completed on the next open.
+        """
+
+        project_storage = cls()
+        project_storage.open(path)
+        try:
+            project_storage._write_compacted(keep_checkpoints, merge_logs)
+        finally:
+            project_storage.close()
+
+        project_storage = cls()
+        project_storage.open(path)
+        project_storage.close()
+
+    def _sync_dir(self, path: str) -> None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _recover_compaction(self) -> None:
+        tmp_path = os.path.join(self.path, 'compact.tmp')
+        if os.path.isdir(tmp_path):
+            logger.warning("Discarding incomplete compaction...")
+            for fname in os.listdir(tmp_path):
+                os.unlink(os.path.join(tmp_path, fname))
+            os.rmdir(tmp_path)
+
+        new_path = os.path.join(self.path, 'compact.new')
+        if not os.path.isdir(new_path):
+            return
+
+        logger.info("Installing compacted storage...")
+        with open(os.path.join(new_path, 'manifest'), 'r') as fp:
+            manifest = set(fp.read().split())
+
+        # Renames are atomic, and files, which were already moved in a previous attempt, are
+        # skipped. So this can safely be repeated, if it gets interrupted.
+        for fname in sorted(manifest):
+            if os.path.exists(os.path.join(new_path, fname)):
+                os.rename(os.path.join(new_path, fname), os.path.join(self.path, fname))
+        self._sync_dir(self.path)
+
+        for fname in os.listdir(self.path):
+            prefix, _, suffix = fname.partition('.')
+            if (prefix in ('log', 'checkpoint') and suffix.isdigit()
+                    and fname not in manifest):
+                os.unlink(os.path.join(self.path, fname))
+
+        os.unlink(os.path.join(new_path, 'manifest'))
+        os.rmdir(new_path)
+        self._sync_dir(self.path)
+
+    def _write_compacted(
+            self, keep_checkpoints: int, merge_logs: Optional[MergeLogsFunc]) -> None:
+        assert keep_checkpoints > 0
+        assert self.next_checkpoint_number > 0
+
+        self._commit_log()
+
+        # Keep the last keep_checkpoints checkpoints and the full checkpoints, which they are
+        # based on.
+        first_checkpoint = max(0, self.next_checkpoint_number - keep_checkpoints)
+        for checkpoint_number in range(first_checkpoint, self.next_checkpoint_number):
+            header = self._read_checkpoint_header(checkpoint_number)
+            if header.HasField('delta_base'):
+                first_checkpoint = min(first_checkpoint, header.delta_base)
+        checkpoint_seq_numbers = [
+            self._get_checkpoint_entry(checkpoint_number)[0]
+            for checkpoint_number in range(first_checkpoint, self.next_checkpoint_number)]
+
+        # Don't cut into the range of entries, which are needed for the current undo/redo
+        # state.
+        history_start = min(
+            checkpoint_seq_numbers[0], self.next_sequence_number - 2 * self.undo_count)
+        history_start = max(0, history_start)
+        undo_window_start = self.next_sequence_number - 2 * self.undo_count - 1
+
+        seq_numbers = list(range(history_start, self.next_sequence_number))
+        history = [self.get_history_entry(seq_number) for seq_number in seq_numbers]
+        log_numbers = sorted({entry[1] for entry in history})
+        logs = dict(zip(log_numbers, self.get_log_entries(log_numbers)))
+
+        if merge_logs is not None:
+            log_refs = collections.Counter(entry[1] for entry in history)
+            checkpoint_seq_number_set = set(checkpoint_seq_numbers)
+
+            def is_plain(idx: int) -> bool:
+                action, log_number, undo_count, redo_count = history[idx]
+                return (
+                    action == ACTION_FORWARD.value
+                    and undo_count == 0 and redo_count == 0
+                    and log_refs[log_number] == 1
+                    and seq_numbers[idx] < undo_window_start)
+
+            # Indices of the entries, which are kept. Merged entries are folded into the
+            # preceding kept entry.
+            kept = [0] if history else []
+            for idx in range(1, len(history)):
+                head = kept[-1]
+                if (is_plain(head) and is_plain(idx)
+                        and seq_numbers[idx] not in checkpoint_seq_number_set):
+                    merged_log = merge_logs(logs[history[head][1]], logs[history[idx][1]])
+                    if merged_log is not None:
+                        logs[history[head][1]] = merged_log
+                        del logs[history[idx][1]]
+                        continue
+
+                kept.append(idx)
+
+            logger.info("Merged %d of %d log entries.", len(history) - len(kept), len(history))
+            seq_numbers = [seq_numbers[idx] for idx in kept]
+            history = [history[idx] for idx in kept]
+
+        tmp_path = os.path.join(self.path, 'compact.tmp')
+        os.mkdir(tmp_path)
+        manifest = []  # type: List[str]
+
+        def write_file(fname: str, data: bytes) -> None:
+            with open(os.path.join(tmp_path, fname), 'wb', buffering=0) as fp:
+                fp.write(data)
+                os.fsync(fp.fileno())
+            manifest.append(fname)
+
+        log_number_map = {}  # type: Dict[int, int]
+        log_data = []  # type: List[bytes]
+        log_index = []  # type: List[bytes]
+        offset = 0
+        for log_number in sorted(logs.keys()):
+            log_number_map[log_number] = len(log_number_map)
+            packed_log_entry = struct.pack('>Q', len(logs[log_number])) + logs[log_number]
+            log_data.append(packed_log_entry)
+            log_index.append(self.log_index_formatter.pack(0, offset))
+            offset += len(packed_log_entry)
+        write_file('log.000000', b''.join(log_data))
+        write_file('log.index', b''.join(log_index))
+
+        write_file('log.history', b''.join(
+            self.log_history_formatter.pack(
+                action, log_number_map[log_number], undo_count, redo_count)
+            for action, log_number, undo_count, redo_count in history))
+
+        checkpoint_index = []  # type: List[bytes]
+        for checkpoint_number, checkpoint_seq_number in enumerate(
+                checkpoint_seq_numbers, first_checkpoint):
+            checkpoint_path = os.path.join(self.path, 'checkpoint.%06d' % checkpoint_number)
+            with open(checkpoint_path, 'rb') as fp:
+                header = self._read_file_header(fp)
+                payload = fp.read()
+            if header.HasField('delta_base'):
+                header.delta_base -= first_checkpoint
+
+            fp = io.BytesIO()
+            self._write_file_header(fp, header)
+            fp.write(payload)
+            new_checkpoint_number = checkpoint_number - first_checkpoint
+            write_file('checkpoint.%06d' % new_checkpoint_number, fp.getvalue())
+
+            checkpoint_index.append(self.checkpoint_index_formatter.pack(
+                bisect.bisect_left(seq_numbers, checkpoint_seq_number), new_checkpoint_number))
+        write_file('checkpoint.index', b''.join(checkpoint_index))
+
+        with open(os.path.join(tmp_path, 'manifest'), 'w') as fp:
+            fp.write('\n'.join(manifest))
+            fp.flush()
+            os.fsync(fp.fileno())
+        self._sync_dir(tmp_path)
+
+        # This is the commit point: once the directory has been renamed, the compacted storage
+        # will be installed.
+        os.rename(tmp_path, os.path.join(self.path, 'compact.new'))
+        self._sync_dir(self.path)
+
+        logger.info(
+            "Compacted storage: %d of %d history entries, %d of %d checkpoints.",
+            len(history), self.next_sequence_number,
+            len(checkpoint_seq_numbers), self.next_checkpoint_number)
+
     @classmethod
     def acquire_file_lock(cls, lock_path: str) -> IO:
         logger.info("Aquire file lock (%s).", lock_path)
@@ -258,6 +592,66 @@ class ProjectStorage(object):
         logger.info("Releasing file lock.")
         lock_fp.close()
 
+    def begin_group(self) -> None:
+        self.group_depth += 1
+
+    def commit_group(self) -> None:
+        assert self.group_depth > 0
+        self.group_depth -= 1
+        if self.group_depth == 0:
+            self._commit_log()
+
+    @contextlib.contextmanager
+    def group_commit(self) -> Iterator[None]:
+        """Coalesce all log writes within the context into a single commit."""
+
+        self.begin_group()
+        try:
+            yield
+        finally:
+            self.commit_group()
+
+    def _sync(self, fp: IO[bytes]) -> None:
+        t0 = time.perf_counter()
+        os.fsync(fp.fileno())
+        self.stat_fsync_latency.observe(time.perf_counter() - t0)
+
+    def _commit_log(self) -> None:
+        if not self.pending_log_history:
+            return
+
+        logger.info("Committing %d log entries...", len(self.pending_log_history))
+        t0 = time.perf_counter()
+
+        # The log and its index are written (and synced) before the history, so the history never
+        # refers to log entries, which are not on disk.
+        if self.pending_log:
+            self.log_fp.write(b''.join(self.pending_log))
+            self.log_fp.flush()
+            self.log_index_fp.write(b''.join(self.pending_log_index))
+            self.log_index_fp.flush()
+            if self.sync_policy != SyncPolicy.NEVER:
+                self._sync(self.log_fp)
+                self._sync(self.log_index_fp)
+
+        self.log_history_fp.write(b''.join(self.pending_log_history))
+        self.log_history_fp.flush()
+        if self.sync_policy != SyncPolicy.NEVER:
+            self._sync(self.log_history_fp)
+
+        self.stat_commit_latency.observe(time.perf_counter() - t0)
+        self.stat_entries_written.incr(len(self.pending_log_history))
+        self.stat_groups_written.incr()
+
+        self.written_sequence_number = self.pending_sequence_number
+        if self.pending_log:
+            self.written_log_number = self.pending_log_number
+
+        self.pending_log.clear()
+        self.pending_log_size = 0
+        self.pending_log_index.clear()
+        self.pending_log_history.clear()
+
     def _write_log(
             self, seq_number: int, history_entry: HistoryEntry, log_entry: LogEntry) -> None:
         log_number = history_entry[1]
@@ -265,36 +659,62 @@ class ProjectStorage(object):
         logger.info("Writing log entry #%d...", seq_number)
 
         if log_entry is not None:
-            offset = self.log_fp.tell()
+            offset = self.log_fp.tell() + self.pending_log_size
 
-            self.log_fp.write(struct.pack('>Q', len(log_entry)))
-            self.log_fp.write(log_entry)
-            self.log_fp.flush()
+            packed_log_entry = struct.pack('>Q', len(log_entry)) + log_entry
+            self.pending_log.append(packed_log_entry)
+            self.pending_log_size += len(packed_log_entry)
 
             packed_index_entry = self.log_index_formatter.pack(
                 self.log_file_number, offset)
-            self.log_index_fp.write(packed_index_entry)
-            self.log_index_fp.flush()
+            self.pending_log_index.append(packed_index_entry)
 
         packed_history_entry = self.log_history_formatter.pack(
             *history_entry)
-        self.log_history_fp.write(packed_history_entry)
-        self.log_history_fp.flush()
+        self.pending_log_history.append(packed_history_entry)
 
-        assert seq_number > self.written_sequence_number
-        self.written_sequence_number = seq_number
+        assert seq_number > self.pending_sequence_number
+        self.pending_sequence_number = seq_number
 
         if log_entry is not None:
             self.log_index += packed_index_entry
-            assert log_number > self.written_log_number
-            self.written_log_number = log_number
+            assert log_number > self.pending_log_number
+            self.pending_log_number = log_number
+
+        if self.group_depth == 0 or self.sync_policy == SyncPolicy.ENTRY:
+            self._commit_log()
+
+    def _compress(self, compression: int, data: bytes) -> bytes:
+        if compression == storage_pb2.FileHeader.UNCOMPRESSED:
+            return data
+        elif compression == storage_pb2.FileHeader.ZLIB:
+            return zlib.compress(data)
+        elif compression == storage_pb2.FileHeader.ZSTD:
+            return zstandard.ZstdCompressor().compress(data)
+        else:
+            raise ValueError("Unsupported compression %d" % compression)
+
+    def _decompress(self, compression: int, data: bytes) -> bytes:
+        try:
+            if compression == storage_pb2.FileHeader.UNCOMPRESSED:
+                return data
+            elif compression == storage_pb2.FileHeader.ZLIB:
+                return zlib.decompress(data)
+            elif compression == storage_pb2.FileHeader.ZSTD:
+                return zstandard.ZstdDecompressor().decompress(data)
+        except (zlib.error, zstandard.ZstdError) as exc:
+            raise CorruptedProjectError("Failed to decompress data: %s" % exc)
+
+        raise UnsupportedFileVersionError("Compression %d not supported" % compression)
 
     def _write_checkpoint(
-            self, seq_number: int, checkpoint_number: int, checkpoint: Checkpoint) -> None:
+            self, seq_number: int, checkpoint_number: int, checkpoint: Checkpoint,
+            delta_base: Optional[int]) -> None:
         checkpoint_path = os.path.join(
             self.path,
             'checkpoint.%06d' % checkpoint_number)
         logger.info("Writing checkpoint %s...", checkpoint_path)
+        payload = self._compress(self.checkpoint_compression, checkpoint)
         with open(checkpoint_path, mode='wb', buffering=0) as fp:
             header = storage_pb2.FileHeader()
             header.type = 'checkpoint'
@@ -303,9 +723,13 @@ class ProjectStorage(object):
             header.size = len(checkpoint)
             header.checksum_type = storage_pb2.FileHeader.MD5
             header.checksum = hashlib.md5(checkpoint).digest()
+            header.compression = self.checkpoint_compression
+            header.compressed_size = len(payload)
+            if delta_base is not None:
+                header.delta_base = delta_base
             self._write_file_header(fp, header)
 
-            fp.write(checkpoint)
+            fp.write(payload)
 
         packed_index_entry = self.checkpoint_index_formatter.pack(
             seq_number, checkpoint_number)
@@ -355,15 +779,17 @@ class ProjectStorage(object):
                     self.path,
                     'log.%06d' % file_number),
                 mode='r+b', buffering=0)
-            self.log_fp_map[self.log_file_number] = log_fp
+            self.log_fp_map[file_number] = log_fp
             return log_fp
 
-    def _read_log_entry(self, log_number: int) -> LogEntry:
+    def _get_log_location(self, log_number: int) -> Tuple[int, int]:
         size = self.log_index_formatter.size
         offset = log_number * size
         packed_index_entry = self.log_index[offset:offset+size]
-        file_number, file_offset = self.log_index_formatter.unpack(
-            packed_index_entry)
+        return cast(Tuple[int, int], self.log_index_formatter.unpack(packed_index_entry))
+
+    def _read_log_entry(self, log_number: int) -> LogEntry:
+        file_number, file_offset = self._get_log_location(log_number)
 
         log_fp = self._get_log_fp(file_number)
         log_fp.seek(file_offset, os.SEEK_SET)
@@ -381,6 +807,41 @@ class ProjectStorage(object):
             self._add_log_entry(log_number, entry)
         return entry
 
+    def get_log_entries(self, log_numbers: Sequence[int]) -> List[LogEntry]:
+        """Fetch many log entries at once.
+
+        The log files are mapped into memory and the entries read in file order, instead of
+        seeking and reading for each entry. Entries are not added to the cache.
+        """
+
+        entries = {}  # type: Dict[int, LogEntry]
+        locations = []  # type: List[Tuple[Tuple[int, int], int]]
+        for log_number in set(log_numbers):
+            try:
+                entries[log_number] = self.log_entry_cache[log_number]
+            except KeyError:
+                locations.append((self._get_log_location(log_number), log_number))
+        locations.sort()
+
+        for file_number, file_locations in itertools.groupby(locations, key=lambda l: l[0][0]):
+            log_map = _map_file(self._get_log_fp(file_number))
+            try:
+                for (_, file_offset), log_number in file_locations:
+                    try:
+                        entry_len, = struct.unpack_from('>Q', log_map, file_offset)
+                    except struct.error:
+                        raise CorruptedProjectError("Truncated log file.")
+                    entry_offset = file_offset + struct.calcsize('>Q')
+                    entry = log_map[entry_offset:entry_offset+entry_len]
+                    if len(entry) != entry_len:
+                        raise CorruptedProjectError("Truncated log file.")
+                    entries[log_number] = entry
+            finally:
+                if isinstance(log_map, mmap.mmap):
+                    log_map.close()
+
+        return [entries[log_number] for log_number in log_numbers]
+
     def _add_log_entry(self, log_number: int, entry: LogEntry) -> None:
         self.log_entry_cache[log_number] = entry
         self.flush_cache(self.log_entry_cache_size)
@@ -485,16 +946,55 @@ class ProjectStorage(object):
         seq_number, _ = self._get_checkpoint_entry(self.next_checkpoint_number - 1)
         return self.next_sequence_number - seq_number
 
-    def add_checkpoint(self, checkpoint: Checkpoint) -> None:
+    def add_checkpoint(self, checkpoint: Checkpoint, delta: bool = False) -> None:
+        """Add a new checkpoint.
+
+        If delta is True, the checkpoint only holds the changes since the most recent full
+        checkpoint, and get_checkpoint_chain() will return both of them.
+        """
+
+        # The checkpoint index must not be ahead of the log on disk.
+        self._commit_log()
+
+        if delta:
+            assert self.last_full_checkpoint_number is not None, "No full checkpoint yet."
+            delta_base = self.last_full_checkpoint_number  # type: Optional[int]
+        else:
+            delta_base = None
+
         self._write_checkpoint(
-            self.next_sequence_number, self.next_checkpoint_number, checkpoint)
+            self.next_sequence_number, self.next_checkpoint_number, checkpoint, delta_base)
 
         packed_index_entry = self.checkpoint_index_formatter.pack(
             self.next_sequence_number, self.next_checkpoint_number)
         self.checkpoint_index += packed_index_entry
+        if not delta:
+            self.last_full_checkpoint_number = self.next_checkpoint_number
         self.next_checkpoint_number += 1
 
+    def _read_checkpoint_header(self, checkpoint_number: int) -> storage_pb2.FileHeader:
+        checkpoint_path = os.path.join(
+            self.path,
+            'checkpoint.%06d' % checkpoint_number)
+        with open(checkpoint_path, mode='rb') as fp:
+            return self._read_file_header(fp)
+
     def get_checkpoint(self, checkpoint_number: int) -> Checkpoint:
+        return self._read_checkpoint(checkpoint_number)[1]
+
+    def get_checkpoint_chain(self, checkpoint_number: int) -> List[Checkpoint]:
+        """Returns the checkpoints needed to restore the given checkpoint.
+
+        This is either just the checkpoint itself, or the full checkpoint followed by the delta.
+        """
+
+        header, checkpoint = self._read_checkpoint(checkpoint_number)
+        if header.HasField('delta_base'):
+            return [self.get_checkpoint(header.delta_base), checkpoint]
+        return [checkpoint]
+
+    def _read_checkpoint(
+            self, checkpoint_number: int) -> Tuple[storage_pb2.FileHeader, Checkpoint]:
         checkpoint_number = self._get_checkpoint_entry(checkpoint_number)[1]
 
         checkpoint_path = os.path.join(
@@ -508,10 +1008,18 @@ class ProjectStorage(object):
             if header.version not in self.SUPPORTED_VERSIONS:
                 raise UnsupportedFileVersionError("File version %d not supported" % header.version)
 
-            checkpoint = fp.read(header.size)
-            if len(checkpoint) != header.size:
+            if header.compression == storage_pb2.FileHeader.UNCOMPRESSED:
+                payload_size = header.size
+            else:
+                payload_size = header.compressed_size
+            payload = fp.read(payload_size)
+            if len(payload) != payload_size:
                 raise CorruptedProjectError("Truncated file")
 
+            checkpoint = self._decompress(header.compression, payload)
+            if len(checkpoint) != header.size:
+                raise CorruptedProjectError("Size mismatch")
+
             if header.checksum_type == storage_pb2.FileHeader.MD5:
                 checksum = hashlib.md5(checkpoint).digest()
                 if checksum != header.checksum:
@@ -520,4 +1028,4 @@ class ProjectStorage(object):
                 raise UnsupportedFileVersionError(
                     "Checksum type %d not supported" % header.checksum_type)
 
-            return checkpoint
+            return header, checkpoint
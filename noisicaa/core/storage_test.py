@@ -21,13 +21,17 @@
 # @end:license
 
 import builtins
+import os.path
+import uuid
 
 from mox3 import stubout
 from pyfakefs import fake_filesystem
 
 from noisidev import unittest
+from noisicaa.constants import TEST_OPTS
 from . import fileutil
 from . import storage
+from . import storage_pb2
 
 
 class StorageTest(unittest.TestCase):
@@ -109,7 +113,7 @@ class StorageTest(unittest.TestCase):
 
             self.assertEqual(ps.next_sequence_number, 7)
 
-            entries = list(ps.log_history_formatter.iter_unpack(ps.log_history))
+            entries = list(ps.log_history_formatter.iter_unpack(bytes(ps.log_history)))
             self.assertEqual(
                 entries,
                 [(b'f', 0, 0, 0),
@@ -227,7 +231,7 @@ class StorageTest(unittest.TestCase):
 
             entries = list(
                 ps.checkpoint_index_formatter.iter_unpack(
-                    ps.checkpoint_index))
+                    bytes(ps.checkpoint_index)))
             self.assertEqual(
                 entries,
                 [(0, 0),
@@ -245,3 +249,357 @@ class StorageTest(unittest.TestCase):
             self.fake_os.path.isfile('/foo/checkpoint.000000'))
         self.assertTrue(
             self.fake_os.path.isfile('/foo/checkpoint.000001'))
+
+    def test_get_log_entries(self):
+        ps = storage.ProjectStorage.create('/foo')
+        try:
+            for i in range(10):
+                ps.append_log_entry(b'bla%d' % i)
+        finally:
+            ps.close()
+
+        ps = storage.ProjectStorage()
+        ps.open('/foo')
+        try:
+            ps.get_log_entry(3)
+            self.assertEqual(
+                ps.get_log_entries([7, 3, 0, 3, 9]),
+                [b'bla7', b'bla3', b'bla0', b'bla3', b'bla9'])
+        finally:
+            ps.close()
+
+    def test_group_commit(self):
+        ps = storage.ProjectStorage.create('/foo')
+        try:
+            with ps.group_commit():
+                ps.append_log_entry(b'bla1')
+                ps.append_log_entry(b'bla2')
+                ps.undo()
+                self.assertEqual(self.fake_os.path.getsize('/foo/log.history'), 0)
+                self.assertEqual(self.fake_os.path.getsize('/foo/log.index'), 0)
+
+                # Pending entries are still readable.
+                ps.flush_cache(0)
+                self.assertEqual(ps.get_log_entry(1), b'bla2')
+
+            self.assertEqual(
+                self.fake_os.path.getsize('/foo/log.history'),
+                3 * ps.log_history_formatter.size)
+            self.assertEqual(
+                self.fake_os.path.getsize('/foo/log.index'),
+                2 * ps.log_index_formatter.size)
+            self.assertEqual(ps.stat_groups_written.value, 1)
+            self.assertEqual(ps.stat_entries_written.value, 3)
+
+            ps.begin_group()
+            ps.append_log_entry(b'bla3')
+
+        finally:
+            # Pending entries are committed on close.
+            ps.close()
+
+        ps = storage.ProjectStorage()
+        ps.open('/foo')
+        try:
+            self.assertEqual(ps.next_sequence_number, 4)
+            self.assertEqual(ps.get_log_entry(0), b'bla1')
+            self.assertEqual(ps.get_log_entry(1), b'bla2')
+            self.assertEqual(ps.get_log_entry(2), b'bla3')
+        finally:
+            ps.close()
+
+    def _count_fsyncs(self, sync_policy):
+        fsync_calls = []
+        self.stubs.Set(self.fake_os, 'fsync', fsync_calls.append)
+
+        ps = storage.ProjectStorage.create('/foo', sync_policy=sync_policy)
+        try:
+            with ps.group_commit():
+                ps.append_log_entry(b'bla1')
+                ps.append_log_entry(b'bla2')
+                ps.append_log_entry(b'bla3')
+            ps.undo()
+        finally:
+            ps.close()
+
+        return len(fsync_calls)
+
+    def test_sync_policy_never(self):
+        self.assertEqual(self._count_fsyncs(storage.SyncPolicy.NEVER), 0)
+
+    def test_sync_policy_group(self):
+        # One group with three entries (log, index and history), one undo (history only).
+        self.assertEqual(self._count_fsyncs(storage.SyncPolicy.GROUP), 3 + 1)
+
+    def test_sync_policy_entry(self):
+        self.assertEqual(self._count_fsyncs(storage.SyncPolicy.ENTRY), 3 * 3 + 1)
+
+    def test_checkpoint_compression(self):
+        checkpoint = b'blurp' * 1000
+        for compression in (storage_pb2.FileHeader.UNCOMPRESSED,
+                            storage_pb2.FileHeader.ZLIB,
+                            storage_pb2.FileHeader.ZSTD):
+            path = '/foo%d' % compression
+            ps = storage.ProjectStorage.create(path, checkpoint_compression=compression)
+            try:
+                ps.add_checkpoint(checkpoint)
+                self.assertEqual(ps.get_checkpoint(0), checkpoint)
+            finally:
+                ps.close()
+
+            size = self.fake_os.path.getsize(path + '/checkpoint.000000')
+            if compression == storage_pb2.FileHeader.UNCOMPRESSED:
+                self.assertGreater(size, len(checkpoint))
+            else:
+                self.assertLess(size, len(checkpoint) // 10)
+
+            # The compression is taken from the file header, not from the storage settings.
+            ps = storage.ProjectStorage(checkpoint_compression=storage_pb2.FileHeader.ZLIB)
+            ps.open(path)
+            try:
+                self.assertEqual(ps.get_checkpoint(0), checkpoint)
+            finally:
+                ps.close()
+
+    def test_delta_checkpoints(self):
+        ps = storage.ProjectStorage.create('/foo')
+        try:
+            ps.add_checkpoint(b'full1')
+            ps.append_log_entry(b'bla1')
+            ps.add_checkpoint(b'delta1', delta=True)
+            ps.append_log_entry(b'bla2')
+            ps.add_checkpoint(b'delta2', delta=True)
+
+            self.assertEqual(ps.get_checkpoint_chain(0), [b'full1'])
+            self.assertEqual(ps.get_checkpoint_chain(1), [b'full1', b'delta1'])
+            self.assertEqual(ps.get_checkpoint_chain(2), [b'full1', b'delta2'])
+
+            ps.add_checkpoint(b'full2')
+            ps.append_log_entry(b'bla3')
+        finally:
+            ps.close()
+
+        ps = storage.ProjectStorage()
+        ps.open('/foo')
+        try:
+            self.assertEqual(ps.last_full_checkpoint_number, 3)
+            ps.add_checkpoint(b'delta3', delta=True)
+            checkpoint_number, actions = ps.get_restore_info()
+            self.assertEqual(checkpoint_number, 4)
+            self.assertEqual(actions, [])
+            self.assertEqual(ps.get_checkpoint_chain(checkpoint_number), [b'full2', b'delta3'])
+        finally:
+            ps.close()
+
+
+class MappedStorageTest(unittest.TestCase):
+    def get_project_path(self):
+        return os.path.join(TEST_OPTS.TMP_DIR, 'test-project-%s' % uuid.uuid4().hex)
+
+    def test_open(self):
+        path = self.get_project_path()
+
+        ps = storage.ProjectStorage.create(path)
+        try:
+            ps.add_checkpoint(b'blurp1')
+            for i in range(100):
+                ps.append_log_entry(b'bla%d' % i)
+            ps.undo()
+        finally:
+            ps.close()
+
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            self.assertIsInstance(ps.log_index, storage.MappedBuffer)
+            self.assertEqual(ps.next_log_number, 100)
+            self.assertEqual(ps.next_sequence_number, 101)
+            self.assertEqual(
+                ps.get_history_entry(100), (storage.ACTION_BACKWARD.value, 99, 1, 0))
+
+            checkpoint_number, actions = ps.get_restore_info()
+            self.assertEqual(ps.get_checkpoint(checkpoint_number), b'blurp1')
+            self.assertEqual(len(actions), 101)
+            self.assertEqual(
+                ps.get_log_entries([log_number for _, log_number in actions])[-3:],
+                [b'bla98', b'bla99', b'bla99'])
+
+            # Entries appended to the mapped files.
+            ps.append_log_entry(b'bla100')
+            ps.flush_cache(0)
+            self.assertEqual(ps.get_log_entry(100), b'bla100')
+            self.assertEqual(ps.get_log_entries([99, 100]), [b'bla99', b'bla100'])
+            self.assertEqual(
+                ps.get_history_entry(101), (storage.ACTION_FORWARD.value, 100, 0, 0))
+        finally:
+            ps.close()
+
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            self.assertEqual(ps.next_sequence_number, 102)
+            self.assertEqual(ps.get_log_entry(100), b'bla100')
+        finally:
+            ps.close()
+
+
+class CompactionTest(unittest.TestCase):
+    def get_project_path(self):
+        return os.path.join(TEST_OPTS.TMP_DIR, 'test-project-%s' % uuid.uuid4().hex)
+
+    def create_project(self):
+        path = self.get_project_path()
+        ps = storage.ProjectStorage.create(path)
+        try:
+            ps.add_checkpoint(b'blurp1')
+            ps.append_log_entry(b'bla1')
+            ps.append_log_entry(b'bla2')
+            ps.add_checkpoint(b'blurp2')
+            ps.append_log_entry(b'bla3')
+            ps.append_log_entry(b'bla4')
+            ps.add_checkpoint(b'blurp3')
+            ps.append_log_entry(b'bla5')
+        finally:
+            ps.close()
+        return path
+
+    def get_state(self, path):
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            checkpoint_number, actions = ps.get_restore_info()
+            return (
+                ps.get_checkpoint_chain(checkpoint_number),
+                [(action, ps.get_log_entry(log_number)) for action, log_number in actions],
+                ps.next_sequence_number,
+                ps.next_checkpoint_number)
+        finally:
+            ps.close()
+
+    def test_compact(self):
+        path = self.create_project()
+        storage.ProjectStorage.compact(path, keep_checkpoints=2)
+
+        self.assertEqual(
+            self.get_state(path),
+            ([b'blurp3'], [(storage.ACTION_FORWARD, b'bla5')], 3, 2))
+        self.assertFalse(os.path.exists(os.path.join(path, 'checkpoint.000002')))
+        self.assertFalse(os.path.exists(os.path.join(path, 'compact.new')))
+
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            self.assertEqual(ps.get_checkpoint(0), b'blurp2')
+            self.assertEqual(
+                ps.get_log_entry_to_undo(), (storage.ACTION_BACKWARD, b'bla5'))
+            ps.undo()
+            ps.undo()
+            ps.undo()
+            self.assertFalse(ps.can_undo)
+        finally:
+            ps.close()
+
+    def test_compact_keeps_undo_state(self):
+        path = self.create_project()
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            ps.undo()
+            ps.undo()
+            ps.undo()
+            ps.add_checkpoint(b'blurp4')
+        finally:
+            ps.close()
+
+        storage.ProjectStorage.compact(path, keep_checkpoints=1)
+
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            self.assertEqual(ps.get_log_entry_to_redo(), (storage.ACTION_FORWARD, b'bla3'))
+            ps.redo()
+            ps.redo()
+            ps.redo()
+            self.assertFalse(ps.can_redo)
+        finally:
+            ps.close()
+
+    def test_compact_delta_checkpoint(self):
+        path = self.create_project()
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            ps.add_checkpoint(b'delta', delta=True)
+        finally:
+            ps.close()
+
+        storage.ProjectStorage.compact(path, keep_checkpoints=1)
+
+        self.assertEqual(
+            self.get_state(path),
+            ([b'blurp3', b'delta'], [], 1, 2))
+
+    def test_compact_squash(self):
+        path = self.get_project_path()
+        ps = storage.ProjectStorage.create(path)
+        try:
+            ps.add_checkpoint(b'blurp1')
+            ps.append_log_entry(b'p1')
+            ps.append_log_entry(b'p2')
+            ps.append_log_entry(b'x3')
+            ps.append_log_entry(b'p4')
+            ps.append_log_entry(b'p5')
+            ps.add_checkpoint(b'blurp2')
+            ps.append_log_entry(b'p6')
+            ps.append_log_entry(b'p7')
+        finally:
+            ps.close()
+
+        def merge_logs(a, b):
+            if a.startswith(b'p') and b.startswith(b'p'):
+                return a + b
+            return None
+
+        storage.ProjectStorage.compact(path, keep_checkpoints=2, merge_logs=merge_logs)
+
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            self.assertEqual(
+                [ps.get_log_entry(ps.get_history_entry(seq_number)[1])
+                 for seq_number in range(ps.next_sequence_number)],
+                # The last entry is not merged, because it's the next to be undone.
+                [b'p1p2', b'x3', b'p4p5', b'p6', b'p7'])
+
+            checkpoint_number, actions = ps.get_restore_info()
+            self.assertEqual(ps.get_checkpoint(checkpoint_number), b'blurp2')
+            self.assertEqual(len(actions), 2)
+        finally:
+            ps.close()
+
+    def test_recover_interrupted_compaction(self):
+        path = self.create_project()
+        state = self.get_state(path)
+
+        # Compaction aborted before the commit point.
+        os.mkdir(os.path.join(path, 'compact.tmp'))
+        with open(os.path.join(path, 'compact.tmp', 'log.index'), 'wb') as fp:
+            fp.write(b'garbage')
+        self.assertEqual(self.get_state(path), state)
+        self.assertFalse(os.path.exists(os.path.join(path, 'compact.tmp')))
+
+        # Compaction aborted after the commit point, while installing the files.
+        ps = storage.ProjectStorage()
+        ps.open(path)
+        try:
+            ps._write_compacted(2, None)
+        finally:
+            ps.close()
+        os.rename(
+            os.path.join(path, 'compact.new', 'log.history'),
+            os.path.join(path, 'log.history'))
+
+        self.assertEqual(
+            self.get_state(path),
+            ([b'blurp3'], [(storage.ACTION_FORWARD, b'bla5')], 3, 2))
+        self.assertFalse(os.path.exists(os.path.join(path, 'compact.new')))
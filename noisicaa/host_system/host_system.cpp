@@ -28,7 +28,8 @@ namespace noisicaa {
 HostSystem::HostSystem(URIDMapper* urid_mapper)
   : lv2(new LV2SubSystem(urid_mapper)),
     csound(new CSoundSubSystem()),
-    audio_file(new AudioFileSubSystem()) {}
+    audio_file(new AudioFileSubSystem()),
+    fluidsynth(new FluidSynthSubSystem()) {}
 
 HostSystem::~HostSystem() {
   cleanup();
@@ -38,10 +39,12 @@ Status HostSystem::setup() {
   RETURN_IF_ERROR(lv2->setup());
   RETURN_IF_ERROR(csound->setup());
   RETURN_IF_ERROR(audio_file->setup(_sample_rate));
+  RETURN_IF_ERROR(fluidsynth->setup());
   return Status::Ok();
 }
 
 void HostSystem::cleanup() {
+  fluidsynth->cleanup();
   audio_file->cleanup();
   csound->cleanup();
   lv2->cleanup();
@@ -30,6 +30,7 @@
 #include "noisicaa/host_system/host_system_lv2.h"
 #include "noisicaa/host_system/host_system_csound.h"
 #include "noisicaa/host_system/host_system_audio_file.h"
+#include "noisicaa/host_system/host_system_fluidsynth.h"
 
 namespace noisicaa {
 
@@ -54,6 +55,7 @@ public:
   unique_ptr<LV2SubSystem> lv2;
   unique_ptr<CSoundSubSystem> csound;
   unique_ptr<AudioFileSubSystem> audio_file;
+  unique_ptr<FluidSynthSubSystem> fluidsynth;
 
 private:
   uint32_t _block_size = 4096;
@@ -19,7 +19,10 @@
 # @end:license
 
 from libc.stdint cimport uint32_t
+from libc.stddef cimport size_t
+from libcpp cimport bool
 from libcpp.memory cimport unique_ptr
+from libcpp.string cimport string
 from noisicaa.core.status cimport Status
 from noisicaa.lv2 cimport urid_mapper
 
@@ -29,6 +32,32 @@ cdef extern from "noisicaa/host_system/host_system.h" namespace "noisicaa" nogil
         Status setup()
         void cleanup()
 
+    enum AudioFileStorage:
+        AUDIO_FILE_STORAGE_HEAP
+        AUDIO_FILE_STORAGE_MMAP
+
+    cppclass ResampleCache:
+        bool enabled() const
+        size_t size()
+        uint32_t num_entries()
+
+    cppclass AudioFileSubSystem:
+        void set_storage(AudioFileStorage storage)
+        AudioFileStorage storage() const
+        void set_prefetch_window(uint32_t num_samples)
+        Status set_resample_cache(const string& dir, size_t max_size)
+        ResampleCache* resample_cache()
+
+    enum SoundFontEvictionPolicy:
+        EVICT_IMMEDIATELY
+        EVICT_LRU
+        EVICT_NEVER
+
+    cppclass FluidSynthSubSystem:
+        void set_eviction_policy(SoundFontEvictionPolicy policy, size_t cache_size)
+        size_t memory_usage()
+        uint32_t num_sound_fonts()
+
     cppclass HostSystem:
         HostSystem(urid_mapper.URIDMapper* mapper)
         Status setup()
@@ -40,6 +69,8 @@ cdef extern from "noisicaa/host_system/host_system.h" namespace "noisicaa" nogil
         void set_sample_rate(uint32_t sample_rate)
 
         unique_ptr[LV2SubSystem] lv2
+        unique_ptr[AudioFileSubSystem] audio_file
+        unique_ptr[FluidSynthSubSystem] fluidsynth
 
 
 cdef class PyHostSystem(object):
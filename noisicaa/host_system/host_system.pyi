@@ -18,15 +18,29 @@
 #
 # @end:license
 
+from typing import Dict
+
 from noisicaa import lv2
 
 
+audio_file_storage_map = ...  # type: Dict[str, int]
+sound_font_eviction_policy_map = ...  # type: Dict[str, int]
+
+
 class PyHostSystem(object):
     block_size = ...  # type: int
     sample_rate = ...  # type: int
+    audio_file_storage = ...  # type: str
+    resample_cache_size = ...  # type: int
+    resample_cache_entries = ...  # type: int
+    sound_font_memory_usage = ...  # type: int
+    num_sound_fonts = ...  # type: int
 
     def __init__(self, mapper: lv2.URIDMapper) -> None: ...
     def setup(self) -> None: ...
     def cleanup(self) -> None: ...
     def set_block_size(self, block_size: int) -> None: ...
     def set_sample_rate(self, sample_rate: int) -> None: ...
+    def set_audio_file_storage(self, storage: str, prefetch_window: int = 0) -> None: ...
+    def set_resample_cache(self, path: str, max_size: int) -> None: ...
+    def set_sound_font_eviction_policy(self, policy: str, cache_size: int = 0) -> None: ...
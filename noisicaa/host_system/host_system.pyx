@@ -21,6 +21,18 @@
 from noisicaa.core.status cimport check
 
 
+audio_file_storage_map = {
+    'heap': AudioFileStorage.AUDIO_FILE_STORAGE_HEAP,
+    'mmap': AudioFileStorage.AUDIO_FILE_STORAGE_MMAP,
+}
+
+sound_font_eviction_policy_map = {
+    'immediately': SoundFontEvictionPolicy.EVICT_IMMEDIATELY,
+    'lru': SoundFontEvictionPolicy.EVICT_LRU,
+    'never': SoundFontEvictionPolicy.EVICT_NEVER,
+}
+
+
 cdef class PyHostSystem(object):
     def __init__(self, mapper):
         self.__urid_mapper = mapper
@@ -53,3 +65,62 @@ cdef class PyHostSystem(object):
 
     def set_sample_rate(self, sample_rate):
         self.__host_system.set_sample_rate(sample_rate)
+
+    @property
+    def audio_file_storage(self):
+        cdef AudioFileStorage storage = self.__host_system.audio_file.get().storage()
+        for name, value in audio_file_storage_map.items():
+            if value == storage:
+                return name
+        raise ValueError(storage)
+
+    def set_audio_file_storage(self, str storage, int prefetch_window=0):
+        """Set how the samples of raw audio files are stored.
+
+        'heap' decodes them into memory, 'mmap' stores them in raw float files next to the
+        source and maps them into memory. A thread keeps prefetch_window samples (default 10
+        seconds) ahead of the play position locked in memory.
+        """
+
+        cdef AudioFileSubSystem* audio_file = self.__host_system.audio_file.get()
+        audio_file.set_storage(audio_file_storage_map[storage])
+        if prefetch_window > 0:
+            audio_file.set_prefetch_window(prefetch_window)
+
+    def set_resample_cache(self, str path, size_t max_size):
+        """Keep resampled audio data in the directory path, so it does not have to be resampled
+        again, when the same file is loaded again. Entries are keyed by the contents of the
+        source file, so the directory can be shared by all projects. The least recently used
+        entries are removed, when the cache grows beyond max_size bytes. An empty path disables
+        the cache.
+        """
+
+        check(self.__host_system.audio_file.get().set_resample_cache(path.encode('utf-8'), max_size))
+
+    @property
+    def resample_cache_size(self):
+        return self.__host_system.audio_file.get().resample_cache().size()
+
+    @property
+    def resample_cache_entries(self):
+        return self.__host_system.audio_file.get().resample_cache().num_entries()
+
+    @property
+    def sound_font_memory_usage(self):
+        return self.__host_system.fluidsynth.get().memory_usage()
+
+    @property
+    def num_sound_fonts(self):
+        return self.__host_system.fluidsynth.get().num_sound_fonts()
+
+    def set_sound_font_eviction_policy(self, str policy, int cache_size=0):
+        """Set how unused sound fonts are unloaded.
+
+        'immediately' unloads them as soon as they are released, 'lru' keeps up to cache_size
+        bytes of unused sound fonts loaded and 'never' keeps them until cleanup().
+        """
+
+        if cache_size < 0:
+            raise ValueError("Invalid cache_size %d" % cache_size)
+        self.__host_system.fluidsynth.get().set_eviction_policy(
+            sound_font_eviction_policy_map[policy], cache_size)
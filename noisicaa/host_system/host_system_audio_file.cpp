@@ -20,6 +20,16 @@
  * @end:license
  */
 
+#include <assert.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <stdio.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <algorithm>
+#include <chrono>
 #include "sndfile.h"
 extern "C" {
 #include "libswresample/swresample.h"
@@ -30,6 +40,55 @@ extern "C" {
 #include "noisicaa/core/scope_guard.h"
 #include "noisicaa/host_system/host_system_audio_file.h"
 
+namespace {
+
+using namespace std;
+
+typedef vector<pair<uint32_t, uint32_t>> Ranges;
+
+// Sort the ranges and merge overlapping or adjacent ones. Empty ranges are dropped.
+Ranges merge_ranges(Ranges ranges) {
+  sort(ranges.begin(), ranges.end());
+  Ranges result;
+  for (const auto& range : ranges) {
+    if (range.first >= range.second) {
+      continue;
+    }
+    if (!result.empty() && range.first <= result.back().second) {
+      result.back().second = max(result.back().second, range.second);
+    } else {
+      result.push_back(range);
+    }
+  }
+  return result;
+}
+
+// The parts of a, which are not covered by b. Both must be sorted and disjoint.
+Ranges subtract_ranges(const Ranges& a, const Ranges& b) {
+  Ranges result;
+  auto b_it = b.begin();
+  for (const auto& range : a) {
+    while (b_it != b.end() && b_it->second <= range.first) {
+      ++b_it;
+    }
+
+    uint32_t begin = range.first;
+    for (auto it = b_it ; begin < range.second ; ++it) {
+      if (it == b.end() || it->first >= range.second) {
+        result.emplace_back(begin, range.second);
+        break;
+      }
+      if (it->first > begin) {
+        result.emplace_back(begin, it->first);
+      }
+      begin = max(begin, it->second);
+    }
+  }
+  return result;
+}
+
+}  // namespace
+
 namespace noisicaa {
 
 AudioFile::AudioFile(const string& key, uint32_t num_samples, float** channel_data)
@@ -37,11 +96,157 @@ AudioFile::AudioFile(const string& key, uint32_t num_samples, float** channel_da
     _num_samples(num_samples) {
   for (float** cdat = channel_data ; *cdat != nullptr ; ++cdat) {
     _channel_data.emplace_back(*cdat);
+    _channels.push_back(*cdat);
+  }
+}
+
+AudioFile::AudioFile(const string& key, uint32_t num_samples, const vector<float*>& mapped_channels)
+  : _key(key),
+    _num_samples(num_samples),
+    _channels(mapped_channels),
+    _mapped(true) {}
+
+AudioFile::~AudioFile() {
+  if (_mapped) {
+    for (float* data : _channels) {
+      munmap(data, map_size());
+    }
+  }
+}
+
+AudioFileReader* AudioFile::add_reader() {
+  lock_guard<mutex> lock(_readers_mutex);
+  _readers.emplace_back(new AudioFileReader(_mapped));
+  return _readers.back().get();
+}
+
+void AudioFile::remove_reader(AudioFileReader* reader) {
+  lock_guard<mutex> lock(_readers_mutex);
+  for (auto it = _readers.begin() ; it != _readers.end() ; ++it) {
+    if (it->get() == reader) {
+      _readers.erase(it);
+      return;
+    }
+  }
+  assert(false);
+}
+
+void AudioFile::lock_range(uint32_t begin, uint32_t end, Logger* logger) {
+  const uint32_t page_samples = sysconf(_SC_PAGESIZE) / sizeof(float);
+  size_t length = (end - begin) * sizeof(float);
+  for (float* data : _channels) {
+    if (!_mlock_failed && mlock(data + begin, length) < 0) {
+      logger->warning(
+          "Failed to lock pages of '%s' (%s), audio data might get paged out.",
+          _key.c_str(), strerror(errno));
+      _mlock_failed = true;
+    }
+
+    if (_mlock_failed) {
+      // Best effort: read all pages of the range into memory.
+      madvise(data + begin, length, MADV_WILLNEED);
+      volatile float sink;
+      for (uint64_t p = begin ; p < end ; p += page_samples) {
+        sink = data[p];
+      }
+      (void)sink;
+    }
+  }
+}
+
+void AudioFile::unlock_range(uint32_t begin, uint32_t end) {
+  if (_mlock_failed) {
+    return;
+  }
+  for (float* data : _channels) {
+    munlock(data + begin, (end - begin) * sizeof(float));
+  }
+}
+
+void AudioFile::prefetch(uint32_t ahead, uint32_t behind, Logger* logger) {
+  if (!_mapped) {
+    return;
+  }
+
+  struct Window {
+    AudioFileReader* reader;
+    uint32_t begin;
+    uint32_t end;
+  };
+
+  // Align the windows to page boundaries. Each channel is mapped separately, so page boundaries
+  // are at the same sample positions for all channels.
+  const uint32_t page_samples = sysconf(_SC_PAGESIZE) / sizeof(float);
+  vector<Window> windows;
+  Ranges wanted;
+  {
+    lock_guard<mutex> lock(_readers_mutex);
+    for (const auto& reader : _readers) {
+      uint32_t pos = reader->_read_pos.load(memory_order_relaxed);
+      uint32_t begin = 0;
+      uint32_t end = 0;
+      if (pos != AudioFileReader::NO_POSITION) {
+        pos = min(pos, _num_samples);
+        begin = pos > behind ? pos - behind : 0;
+        begin -= begin % page_samples;
+        uint64_t end64 = (uint64_t)pos + ahead + page_samples - 1;
+        end = min((uint64_t)_num_samples, end64 - end64 % page_samples);
+      }
+
+      if (begin != reader->_window_begin || end != reader->_window_end) {
+        // First shrink the published window to the part, which stays locked. The new window is
+        // published, once it has been locked.
+        uint32_t keep_begin = max(begin, reader->_window_begin);
+        uint32_t keep_end = min(end, reader->_window_end);
+        if (keep_begin >= keep_end) {
+          keep_begin = keep_end = 0;
+        }
+        reader->_resident.store(((uint64_t)keep_begin << 32) | keep_end, memory_order_release);
+        windows.push_back(Window{reader.get(), begin, end});
+      }
+
+      wanted.emplace_back(begin, end);
+    }
+  }
+
+  // Lock the union of the windows of all readers, and unlock whatever no reader needs anymore.
+  wanted = merge_ranges(wanted);
+  if (wanted != _locked) {
+    for (const auto& range : subtract_ranges(wanted, _locked)) {
+      lock_range(range.first, range.second, logger);
+    }
+    for (const auto& range : subtract_ranges(_locked, wanted)) {
+      unlock_range(range.first, range.second);
+    }
+    _locked = wanted;
+  }
+
+  if (!windows.empty()) {
+    lock_guard<mutex> lock(_readers_mutex);
+    for (const Window& window : windows) {
+      // Readers might have been removed in the meantime.
+      bool found = false;
+      for (const auto& reader : _readers) {
+        if (reader.get() == window.reader) {
+          found = true;
+          break;
+        }
+      }
+      if (!found) {
+        continue;
+      }
+
+      window.reader->_window_begin = window.begin;
+      window.reader->_window_end = window.end;
+      window.reader->_resident.store(
+          ((uint64_t)window.begin << 32) | window.end, memory_order_release);
+    }
   }
 }
 
 AudioFileSubSystem::AudioFileSubSystem()
-  : _logger(LoggerRegistry::get_logger("noisicaa.host_system.audio_file")) {}
+  : _logger(LoggerRegistry::get_logger("noisicaa.host_system.audio_file")),
+    _resample_cache(_logger) {}
 
 AudioFileSubSystem::~AudioFileSubSystem() {
   cleanup();
@@ -49,20 +254,110 @@ AudioFileSubSystem::~AudioFileSubSystem() {
 
 Status AudioFileSubSystem::setup(uint32_t sample_rate) {
   _sample_rate = sample_rate;
+  if (_prefetch_ahead == 0) {
+    _prefetch_ahead = 10 * sample_rate;
+  }
+
+  _prefetch_stop = false;
+  _prefetch_thread.reset(new thread(&AudioFileSubSystem::prefetch_main, this));
+
   return Status::Ok();
 }
 
 void AudioFileSubSystem::cleanup() {
+  if (_prefetch_thread.get() != nullptr) {
+    {
+      lock_guard<mutex> lock(_mutex);
+      _prefetch_stop = true;
+      _prefetch_cond.notify_all();
+    }
+    _prefetch_thread->join();
+    _prefetch_thread.reset();
+  }
+
+  lock_guard<mutex> lock(_mutex);
   _map.clear();
+  _resample_cache.cleanup();
 }
 
-StatusOr<AudioFile*> AudioFileSubSystem::load_audio_file(const string& path) {
-  const auto& it = _map.find(path);
+bool AudioFileSubSystem::has_mapped_files_locked() const {
+  for (const auto& it : _map) {
+    if (it.second->is_mapped()) {
+      return true;
+    }
+  }
+  return false;
+}
+
+void AudioFileSubSystem::prefetch_main() {
+  unique_lock<mutex> lock(_mutex);
+  while (!_prefetch_stop) {
+    if (!has_mapped_files_locked()) {
+      // Nothing to do, until a mapped file gets loaded.
+      _prefetch_cond.wait(lock, [this]() { return _prefetch_stop || has_mapped_files_locked(); });
+      continue;
+    }
+
+    // Hold a reference to the mapped files, so they stay alive while the pages are read in
+    // without holding the lock.
+    vector<AudioFile*> mapped;
+    for (const auto& it : _map) {
+      if (it.second->is_mapped()) {
+        it.second->ref();
+        mapped.push_back(it.second.get());
+      }
+    }
+
+    lock.unlock();
+    for (AudioFile* audio_file : mapped) {
+      audio_file->prefetch(_prefetch_ahead, _sample_rate, _logger);
+    }
+    lock.lock();
+
+    for (AudioFile* audio_file : mapped) {
+      release_locked(audio_file);
+    }
+
+    // The audio thread cannot notify about changes of its read position, so poll.
+    _prefetch_cond.wait_for(lock, chrono::milliseconds(10));
+  }
+}
+
+StatusOr<AudioFile*> AudioFileSubSystem::get_or_load(
+    const string& key, const function<StatusOr<AudioFile*>()>& loader) {
+  unique_lock<mutex> lock(_mutex);
+
+  _load_cond.wait(lock, [&]() { return _loading.count(key) == 0; });
+
+  const auto& it = _map.find(key);
   if (it != _map.end()) {
     it->second->ref();
     return it->second.get();
   }
 
+  _loading.insert(key);
+  lock.unlock();
+  StatusOr<AudioFile*> stor_audio_file = loader();
+  lock.lock();
+  _loading.erase(key);
+  _load_cond.notify_all();
+  RETURN_IF_ERROR(stor_audio_file);
+
+  AudioFile* audio_file = stor_audio_file.result();
+  audio_file->ref();
+  _map.emplace(key, unique_ptr<AudioFile>(audio_file));
+  if (audio_file->is_mapped()) {
+    _prefetch_cond.notify_all();
+  }
+
+  return audio_file;
+}
+
+StatusOr<AudioFile*> AudioFileSubSystem::load_audio_file(const string& path) {
+  return get_or_load(path, [this, &path]() { return decode_audio_file(path); });
+}
+
+StatusOr<AudioFile*> AudioFileSubSystem::decode_audio_file(const string& path) {
   _logger->info("Load audio file '%s'", path.c_str());
 
   SF_INFO sfinfo;
@@ -82,6 +377,16 @@ StatusOr<AudioFile*> AudioFileSubSystem::load_audio_file(const string& path) {
   _logger->info("sections: %d", sfinfo.sections);
   _logger->info("seekable: %d", sfinfo.seekable);
 
+  // Resampling is expensive, so try to reuse the result of a previous run.
+  ResampleCache::Key cache_key = {0, (uint32_t)sfinfo.samplerate, _sample_rate, 0};
+  bool use_cache = get_cache_key(path, (uint32_t)sfinfo.samplerate, &cache_key);
+  if (use_cache) {
+    AudioFile* audio_file = load_cached_file(path, cache_key, sfinfo.channels, 0);
+    if (audio_file != nullptr) {
+      return audio_file;
+    }
+  }
+
   uint32_t num_samples = av_rescale_rnd(sfinfo.frames, _sample_rate, sfinfo.samplerate, AV_ROUND_UP);
   vector<unique_ptr<float>> channel_data;
   for (int i = 0 ; i < sfinfo.channels ; ++i) {
@@ -154,17 +459,23 @@ StatusOr<AudioFile*> AudioFileSubSystem::load_audio_file(const string& path) {
   // In case we have written less than we anticipated.
   num_samples = out_pos;
 
+  if (use_cache) {
+    for (int ch = 0 ; ch < sfinfo.channels ; ++ch) {
+      cache_key.channel = ch;
+      Status status = _resample_cache.store(cache_key, channel_data[ch].get(), num_samples);
+      if (status.is_error()) {
+        _logger->warning("Failed to store '%s' in resample cache: %s", path.c_str(), status.message());
+      }
+    }
+  }
+
   unique_ptr<float*> cdat(new float*[channel_data.size() + 1]);
   for (uint32_t ch = 0 ; ch < channel_data.size() ; ++ch) {
     cdat.get()[ch] = channel_data[ch].release();
   }
   cdat.get()[channel_data.size()] = nullptr;
 
-  AudioFile* audio_file = new AudioFile(path, num_samples, cdat.get());
-  audio_file->ref();
-  _map.emplace(path, unique_ptr<AudioFile>(audio_file));
-
-  return audio_file;
+  return new AudioFile(path, num_samples, cdat.get());
 }
 
 StatusOr<AudioFile*> AudioFileSubSystem::load_raw_file(
@@ -177,19 +488,248 @@ StatusOr<AudioFile*> AudioFileSubSystem::load_raw_file(
     key += ":" + p;
   }
 
-  const auto& it = _map.find(key);
-  if (it != _map.end()) {
-    it->second->ref();
-    return it->second.get();
-  }
+  return get_or_load(key, [&]() {
+      return (_storage == AUDIO_FILE_STORAGE_MMAP && num_samples > 0)
+          ? load_raw_file_mmap(key, sample_rate, num_samples, paths)
+          : load_raw_file_heap(key, sample_rate, num_samples, paths);
+    });
+}
 
+StatusOr<AudioFile*> AudioFileSubSystem::load_raw_file_heap(
+    const string& key, uint32_t sample_rate, uint32_t num_samples, const vector<string>& paths) {
   uint32_t num_channels = paths.size();
   uint32_t scaled_num_samples = av_rescale_rnd(num_samples, _sample_rate, sample_rate, AV_ROUND_UP);
   vector<unique_ptr<float>> channel_data;
-  for (int i = 0 ; i < num_channels ; ++i) {
+  for (uint32_t i = 0 ; i < num_channels ; ++i) {
     channel_data.emplace_back(new float[scaled_num_samples]);
   }
 
+  for (uint32_t ch = 0 ; ch < num_channels ; ++ch) {
+    float* data = channel_data[ch].get();
+
+    ResampleCache::Key cache_key;
+    bool use_cache = get_cache_key(paths[ch], sample_rate, &cache_key);
+    if (use_cache) {
+      string cache_path;
+      size_t cached_num_samples;
+      if (_resample_cache.lookup(cache_key, &cache_path, &cached_num_samples)
+          && cached_num_samples == scaled_num_samples) {
+        Status status = _resample_cache.read(cache_path, data, scaled_num_samples);
+        if (!status.is_error()) {
+          continue;
+        }
+        _logger->warning("Failed to read from resample cache: %s", status.message());
+      }
+    }
+
+    RETURN_IF_ERROR(resample_raw_file(
+        paths[ch], sample_rate, num_samples, data, scaled_num_samples));
+
+    if (use_cache) {
+      Status status = _resample_cache.store(cache_key, data, scaled_num_samples);
+      if (status.is_error()) {
+        _logger->warning(
+            "Failed to store '%s' in resample cache: %s", paths[ch].c_str(), status.message());
+      }
+    }
+  }
+
+  unique_ptr<float*> cdat(new float*[channel_data.size() + 1]);
+  for (uint32_t ch = 0 ; ch < channel_data.size() ; ++ch) {
+    cdat.get()[ch] = channel_data[ch].release();
+  }
+  cdat.get()[channel_data.size()] = nullptr;
+
+  return new AudioFile(key, scaled_num_samples, cdat.get());
+}
+
+StatusOr<AudioFile*> AudioFileSubSystem::load_raw_file_mmap(
+    const string& key, uint32_t sample_rate, uint32_t num_samples, const vector<string>& paths) {
+  uint32_t scaled_num_samples = av_rescale_rnd(num_samples, _sample_rate, sample_rate, AV_ROUND_UP);
+
+  vector<float*> channels;
+  auto unmap_channels = scopeGuard([&]() {
+      for (float* data : channels) {
+        munmap(data, (size_t)scaled_num_samples * sizeof(float));
+      }
+    });
+
+  for (const auto& path : paths) {
+    if (sample_rate == _sample_rate) {
+      // The raw file can be used as is.
+      StatusOr<float*> stor_data = map_raw_file(path, num_samples);
+      RETURN_IF_ERROR(stor_data);
+      channels.push_back(stor_data.result());
+      continue;
+    }
+
+    string cache_path;
+    ResampleCache::Key cache_key;
+    if (get_cache_key(path, sample_rate, &cache_key)) {
+      size_t cached_num_samples;
+      if (!_resample_cache.lookup(cache_key, &cache_path, &cached_num_samples)
+          || cached_num_samples != scaled_num_samples) {
+        string tmp_path = _resample_cache.begin_store(cache_key);
+        RETURN_IF_ERROR(resample_to_file(
+            path, sample_rate, num_samples, tmp_path, scaled_num_samples));
+        StatusOr<string> stor_path = _resample_cache.commit_store(cache_key, tmp_path);
+        RETURN_IF_ERROR(stor_path);
+        cache_path = stor_path.result();
+      }
+    } else {
+      // Without a resample cache, store the resampled data next to the source file.
+      cache_path = path + "." + to_string(_sample_rate) + ".raw";
+      struct stat st;
+      if (stat(cache_path.c_str(), &st) < 0
+          || (size_t)st.st_size != (size_t)scaled_num_samples * sizeof(float)) {
+        // Write to a temporary file first, so an interrupted run does not leave a truncated
+        // cache file behind.
+        string tmp_path = cache_path + ".tmp";
+        RETURN_IF_ERROR(resample_to_file(
+            path, sample_rate, num_samples, tmp_path, scaled_num_samples));
+        if (rename(tmp_path.c_str(), cache_path.c_str()) < 0) {
+          return OSERROR_STATUS("Failed to rename %s", tmp_path.c_str());
+        }
+      }
+    }
+
+    StatusOr<float*> stor_data = map_raw_file(cache_path, scaled_num_samples);
+    RETURN_IF_ERROR(stor_data);
+    channels.push_back(stor_data.result());
+  }
+
+  AudioFile* audio_file = new AudioFile(key, scaled_num_samples, channels);
+  channels.clear();
+  return audio_file;
+}
+
+Status AudioFileSubSystem::resample_to_file(
+    const string& path, uint32_t sample_rate, uint32_t num_samples,
+    const string& out_path, uint32_t scaled_num_samples) {
+  _logger->info("Resampling '%s' into '%s'", path.c_str(), out_path.c_str());
+
+  size_t size = (size_t)scaled_num_samples * sizeof(float);
+  int fd = open(out_path.c_str(), O_RDWR | O_CREAT | O_TRUNC, 0644);
+  if (fd < 0) {
+    return OSERROR_STATUS("Failed to create %s", out_path.c_str());
+  }
+  auto close_fd = scopeGuard([fd]() { close(fd); });
+
+  if (ftruncate(fd, size) < 0) {
+    return OSERROR_STATUS("Failed to resize %s", out_path.c_str());
+  }
+
+  void* data = mmap(nullptr, size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+  if (data == MAP_FAILED) {
+    return OSERROR_STATUS("Failed to mmap %s", out_path.c_str());
+  }
+  auto unmap_data = scopeGuard([data, size]() { munmap(data, size); });
+
+  RETURN_IF_ERROR(resample_raw_file(path, sample_rate, num_samples, (float*)data, scaled_num_samples));
+
+  if (msync(data, size, MS_SYNC) < 0) {
+    return OSERROR_STATUS("Failed to write %s", out_path.c_str());
+  }
+
+  return Status::Ok();
+}
+
+bool AudioFileSubSystem::get_cache_key(
+    const string& path, uint32_t sample_rate, ResampleCache::Key* key) {
+  if (!_resample_cache.enabled() || sample_rate == _sample_rate) {
+    return false;
+  }
+
+  StatusOr<uint64_t> stor_hash = _resample_cache.content_hash(path);
+  if (stor_hash.is_error()) {
+    _logger->warning(
+        "Not using resample cache for '%s': %s", path.c_str(), stor_hash.message());
+    return false;
+  }
+
+  key->content_hash = stor_hash.result();
+  key->source_rate = sample_rate;
+  key->target_rate = _sample_rate;
+  key->channel = 0;
+  return true;
+}
+
+AudioFile* AudioFileSubSystem::load_cached_file(
+    const string& key, ResampleCache::Key cache_key, uint32_t num_channels,
+    uint32_t num_samples) {
+  // All channels must be in the cache and have the same length.
+  vector<string> paths;
+  size_t cached_num_samples = 0;
+  for (uint32_t ch = 0 ; ch < num_channels ; ++ch) {
+    cache_key.channel = ch;
+    string path;
+    size_t n;
+    if (!_resample_cache.lookup(cache_key, &path, &n)
+        || (ch > 0 && n != cached_num_samples)
+        || (num_samples > 0 && n != num_samples)) {
+      return nullptr;
+    }
+    cached_num_samples = n;
+    paths.push_back(path);
+  }
+
+  vector<unique_ptr<float>> channel_data;
+  for (const auto& path : paths) {
+    channel_data.emplace_back(new float[cached_num_samples]);
+    Status status = _resample_cache.read(path, channel_data.back().get(), cached_num_samples);
+    if (status.is_error()) {
+      _logger->warning("Failed to read from resample cache: %s", status.message());
+      return nullptr;
+    }
+  }
+
+  _logger->info("Using resampled data of '%s' from cache", key.c_str());
+
+  unique_ptr<float*> cdat(new float*[channel_data.size() + 1]);
+  for (uint32_t ch = 0 ; ch < channel_data.size() ; ++ch) {
+    cdat.get()[ch] = channel_data[ch].release();
+  }
+  cdat.get()[channel_data.size()] = nullptr;
+
+  return new AudioFile(key, cached_num_samples, cdat.get());
+}
+
+Status AudioFileSubSystem::set_resample_cache(const string& dir, size_t max_size) {
+  if (dir.empty()) {
+    _resample_cache.cleanup();
+    return Status::Ok();
+  }
+  return _resample_cache.setup(dir, max_size);
+}
+
+StatusOr<float*> AudioFileSubSystem::map_raw_file(const string& path, uint32_t num_samples) {
+  int fd = open(path.c_str(), O_RDONLY);
+  if (fd < 0) {
+    return OSERROR_STATUS("Failed to open file %s", path.c_str());
+  }
+  auto close_fd = scopeGuard([fd]() { close(fd); });
+
+  size_t size = (size_t)num_samples * sizeof(float);
+  struct stat st;
+  if (fstat(fd, &st) < 0) {
+    return OSERROR_STATUS("Failed to stat file %s", path.c_str());
+  }
+  if ((size_t)st.st_size < size) {
+    return ERROR_STATUS(
+        "File %s too short (%ld < %ld bytes)", path.c_str(), (long)st.st_size, (long)size);
+  }
+
+  void* data = mmap(nullptr, size, PROT_READ, MAP_SHARED, fd, 0);
+  if (data == MAP_FAILED) {
+    return OSERROR_STATUS("Failed to mmap %s", path.c_str());
+  }
+
+  return (float*)data;
+}
+
+Status AudioFileSubSystem::resample_raw_file(
+    const string& path, uint32_t sample_rate, uint32_t num_samples,
+    float* out, uint32_t scaled_num_samples) {
   SwrContext* ctxt = swr_alloc_set_opts(
       nullptr,
       av_get_default_channel_layout(1), AV_SAMPLE_FMT_FLT, _sample_rate,
@@ -201,84 +741,74 @@ StatusOr<AudioFile*> AudioFileSubSystem::load_raw_file(
 
   auto free_ctxt = scopeGuard([&ctxt]() { swr_free(&ctxt); });
 
-  uint32_t ch = 0;
-  for (const auto& path : paths) {
-    int rc = swr_init(ctxt);
-    if (rc) {
-      char buf[AV_ERROR_MAX_STRING_SIZE];
-      return ERROR_STATUS(
-          "Failed to init swr context: %s", av_make_error_string(buf, sizeof(buf), rc));
-    }
-
-    FILE* fp = fopen(path.c_str(), "r");
-    if (fp == nullptr) {
-      return ERROR_STATUS("Failed to open file %s: %s", path.c_str(), strerror(errno));
-    }
-
-    auto close_fp = scopeGuard([fp]() { fclose(fp); });
-
-    float samples[1024];
-    sf_count_t in_pos = 0;
-    uint32_t out_pos = 0;
-    const uint8_t* in_planes[1] = { (const uint8_t*)samples };
-    uint8_t* out_planes[1];
-    while (in_pos < num_samples) {
-      size_t samples_read = fread(samples, sizeof(float), 1024, fp);
-      if (samples_read == 0) {
-        return ERROR_STATUS("Failed to read all samples (%d != %d)", in_pos, num_samples);
-      }
+  int rc = swr_init(ctxt);
+  if (rc) {
+    char buf[AV_ERROR_MAX_STRING_SIZE];
+    return ERROR_STATUS(
+        "Failed to init swr context: %s", av_make_error_string(buf, sizeof(buf), rc));
+  }
 
-      out_planes[0] = (uint8_t*)(channel_data[ch].get() + out_pos);
+  FILE* fp = fopen(path.c_str(), "r");
+  if (fp == nullptr) {
+    return ERROR_STATUS("Failed to open file %s: %s", path.c_str(), strerror(errno));
+  }
 
-      int samples_written = swr_convert(
-          ctxt,
-          out_planes, scaled_num_samples - out_pos,
-          in_planes, samples_read);
-      if (samples_written < 0) {
-        char buf[AV_ERROR_MAX_STRING_SIZE];
-        return ERROR_STATUS(
-            "Failed to convert samples: %s", av_make_error_string(buf, sizeof(buf), samples_written));
-      }
+  auto close_fp = scopeGuard([fp]() { fclose(fp); });
 
-      in_pos += samples_read;
-      out_pos += samples_written;
+  float samples[1024];
+  sf_count_t in_pos = 0;
+  uint32_t out_pos = 0;
+  const uint8_t* in_planes[1] = { (const uint8_t*)samples };
+  uint8_t* out_planes[1];
+  while (in_pos < num_samples) {
+    size_t samples_read = fread(samples, sizeof(float), 1024, fp);
+    if (samples_read == 0) {
+      return ERROR_STATUS("Failed to read all samples (%d != %d)", in_pos, num_samples);
     }
 
-    // Flush out any samples that swr_convert might have buffered.
-    out_planes[0] = (uint8_t*)(channel_data[ch].get() + out_pos);
+    out_planes[0] = (uint8_t*)(out + out_pos);
+
     int samples_written = swr_convert(
         ctxt,
         out_planes, scaled_num_samples - out_pos,
-        nullptr, 0);
-    if (rc < 0) {
+        in_planes, samples_read);
+    if (samples_written < 0) {
       char buf[AV_ERROR_MAX_STRING_SIZE];
       return ERROR_STATUS(
           "Failed to convert samples: %s", av_make_error_string(buf, sizeof(buf), samples_written));
     }
 
-    swr_close(ctxt);
-    ++ch;
+    in_pos += samples_read;
+    out_pos += samples_written;
   }
 
-  unique_ptr<float*> cdat(new float*[channel_data.size() + 1]);
-  for (uint32_t ch = 0 ; ch < channel_data.size() ; ++ch) {
-    cdat.get()[ch] = channel_data[ch].release();
+  // Flush out any samples that swr_convert might have buffered.
+  out_planes[0] = (uint8_t*)(out + out_pos);
+  int samples_written = swr_convert(
+      ctxt,
+      out_planes, scaled_num_samples - out_pos,
+      nullptr, 0);
+  if (samples_written < 0) {
+    char buf[AV_ERROR_MAX_STRING_SIZE];
+    return ERROR_STATUS(
+        "Failed to convert samples: %s", av_make_error_string(buf, sizeof(buf), samples_written));
   }
-  cdat.get()[channel_data.size()] = nullptr;
 
-  AudioFile* audio_file = new AudioFile(key, scaled_num_samples, cdat.get());
-  audio_file->ref();
-  _map.emplace(key, unique_ptr<AudioFile>(audio_file));
-
-  return audio_file;
+  return Status::Ok();
 }
 
 void AudioFileSubSystem::acquire_audio_file(AudioFile* audio_file) {
+  lock_guard<mutex> lock(_mutex);
   assert(_map.find(audio_file->key()) != _map.end());
   audio_file->ref();
 }
 
 void AudioFileSubSystem::release_audio_file(AudioFile* audio_file) {
+  lock_guard<mutex> lock(_mutex);
+  release_locked(audio_file);
+}
+
+void AudioFileSubSystem::release_locked(AudioFile* audio_file) {
   auto it = _map.find(audio_file->key());
   assert(it != _map.end());
   assert(audio_file->ref_count() > 0);
@@ -26,33 +26,119 @@
 #define _NOISICAA_HOST_SYSTEM_HOST_SYSTEM_AUDIO_FILE_H
 
 #include <stdlib.h>
+#include <atomic>
+#include <condition_variable>
+#include <functional>
 #include <map>
 #include <memory>
+#include <mutex>
+#include <set>
+#include <thread>
 #include <vector>
 #include "noisicaa/core/status.h"
+#include "noisicaa/host_system/host_system_resample_cache.h"
 
 namespace noisicaa {
 
 class Logger;
+class AudioFile;
+
+// A user of an AudioFile, which reads from it in the audio thread (e.g. a sample on a track). A
+// file can be shared by many readers, each with its own read position. The prefetcher keeps the
+// samples around the positions of all readers resident.
+class AudioFileReader {
+public:
+  // Tell the prefetcher where the audio thread is going to read next. RT safe.
+  void set_read_position(uint32_t pos) { _read_pos.store(pos, memory_order_relaxed); }
+
+  // Returns true, if the sample at pos can be read without causing a page fault. Heap allocated
+  // files are always resident. RT safe.
+  bool is_resident(uint32_t pos) const {
+    if (!_mapped) {
+      return true;
+    }
+    uint64_t window = _resident.load(memory_order_acquire);
+    return pos >= (window >> 32) && pos < (window & 0xffffffff);
+  }
+
+private:
+  friend class AudioFile;
+
+  AudioFileReader(bool mapped) : _mapped(mapped) {}
+
+  static const uint32_t NO_POSITION = 0xffffffff;
+
+  bool _mapped;
+  atomic<uint32_t> _read_pos{NO_POSITION};
+  // The [begin, end) range of samples around this reader's position, which is currently locked
+  // into memory, packed into a single value (begin << 32 | end), so the audio thread always sees
+  // a consistent range.
+  atomic<uint64_t> _resident{0};
+  // Only used by the prefetch thread.
+  uint32_t _window_begin = 0;
+  uint32_t _window_end = 0;
+};
 
 class AudioFile {
 public:
+  // Takes ownership of the nullptr terminated list of heap allocated arrays.
   AudioFile(const string& key, uint32_t num_samples, float** channel_data);
+  // Takes ownership of the mmap'ed channels, each one mapping num_samples floats.
+  AudioFile(const string& key, uint32_t num_samples, const vector<float*>& mapped_channels);
+  ~AudioFile();
 
   const string& key() const { return _key; }
   uint32_t num_samples() const { return _num_samples; }
-  uint32_t num_channels() const { return _channel_data.size(); }
-  const float* channel_data(uint32_t ch) const { return _channel_data[ch].get(); }
+  uint32_t num_channels() const { return _channels.size(); }
+  const float* channel_data(uint32_t ch) const { return _channels[ch]; }
 
   uint32_t ref_count() const { return _ref_count; }
   void ref() { ++_ref_count; }
   void deref() { --_ref_count; }
 
+  bool is_mapped() const { return _mapped; }
+
+  // Readers are added and removed outside of the audio thread. A reader must be removed, before
+  // the reference to the file is released.
+  AudioFileReader* add_reader();
+  void remove_reader(AudioFileReader* reader);
+
+  // Make the samples around the read positions of all readers resident. Called by the prefetch
+  // thread.
+  void prefetch(uint32_t ahead, uint32_t behind, Logger* logger);
+
 private:
+  typedef vector<pair<uint32_t, uint32_t>> Ranges;
+
+  size_t map_size() const { return (size_t)_num_samples * sizeof(float); }
+  void lock_range(uint32_t begin, uint32_t end, Logger* logger);
+  void unlock_range(uint32_t begin, uint32_t end);
+
   uint32_t _ref_count = 0;
   string _key;
   uint32_t _num_samples;
   vector<unique_ptr<float>> _channel_data;
+  vector<float*> _channels;
+
+  bool _mapped = false;
+  bool _mlock_failed = false;
+
+  // Protects _readers. Never held while doing I/O.
+  mutex _readers_mutex;
+  vector<unique_ptr<AudioFileReader>> _readers;
+
+  // The sorted, disjoint ranges of samples, which are currently locked into memory, i.e. the
+  // union of the windows of all readers. Only used by the prefetch thread.
+  Ranges _locked;
+};
+
+enum AudioFileStorage {
+  // Files are decoded into heap allocated arrays.
+  AUDIO_FILE_STORAGE_HEAP,
+
+  // Raw files are stored as raw float files next to their source (resampled, if needed) and
+  // mmap'ed. Only the pages around the play position are kept in memory by a prefetch thread.
+  AUDIO_FILE_STORAGE_MMAP,
 };
 
 class AudioFileSubSystem {
@@ -63,6 +149,17 @@ public:
   Status setup(uint32_t sample_rate);
   void cleanup();
 
+  void set_storage(AudioFileStorage storage) { _storage = storage; }
+  AudioFileStorage storage() const { return _storage; }
+  // Number of samples ahead of the play position, which the prefetcher keeps in memory.
+  void set_prefetch_window(uint32_t num_samples) { _prefetch_ahead = num_samples; }
+
+  // Store resampled data in dir and reuse it, if the same file is loaded again. Least recently
+  // used entries are removed, when the cache grows beyond max_size bytes. An empty dir disables
+  // the cache.
+  Status set_resample_cache(const string& dir, size_t max_size);
+  ResampleCache* resample_cache() { return &_resample_cache; }
+
   StatusOr<AudioFile*> load_audio_file(const string& path);
   StatusOr<AudioFile*> load_raw_file(uint32_t sample_rate, uint32_t num_samples, const vector<string>& paths);
 
@@ -70,9 +167,47 @@ public:
   void release_audio_file(AudioFile* audio_file);
 
 private:
+  // Returns the file for key with an added reference. If it is not loaded yet, the loader is
+  // called without holding _mutex. Concurrent loads of the same key wait for the first one.
+  StatusOr<AudioFile*> get_or_load(
+      const string& key, const function<StatusOr<AudioFile*>()>& loader);
+  void release_locked(AudioFile* audio_file);
+  bool has_mapped_files_locked() const;
+
+  StatusOr<AudioFile*> decode_audio_file(const string& path);
+  StatusOr<AudioFile*> load_raw_file_heap(
+      const string& key, uint32_t sample_rate, uint32_t num_samples, const vector<string>& paths);
+  StatusOr<AudioFile*> load_raw_file_mmap(
+      const string& key, uint32_t sample_rate, uint32_t num_samples, const vector<string>& paths);
+  StatusOr<float*> map_raw_file(const string& path, uint32_t num_samples);
+  Status resample_to_file(
+      const string& path, uint32_t sample_rate, uint32_t num_samples,
+      const string& out_path, uint32_t scaled_num_samples);
+  bool get_cache_key(const string& path, uint32_t sample_rate, ResampleCache::Key* key);
+  AudioFile* load_cached_file(
+      const string& key, ResampleCache::Key cache_key, uint32_t num_channels,
+      uint32_t num_samples);
+  Status resample_raw_file(
+      const string& path, uint32_t sample_rate, uint32_t num_samples,
+      float* out, uint32_t scaled_num_samples);
+
+  void prefetch_main();
+
   Logger* _logger;
+  ResampleCache _resample_cache;
   uint32_t _sample_rate = 0;
+  AudioFileStorage _storage = AUDIO_FILE_STORAGE_HEAP;
+
+  // Protects _map, _loading and the reference counts of the files. Never held while doing I/O.
+  mutex _mutex;
   map<string, unique_ptr<AudioFile>> _map;
+  set<string> _loading;
+  condition_variable _load_cond;
+
+  atomic<uint32_t> _prefetch_ahead{0};
+  unique_ptr<thread> _prefetch_thread;
+  condition_variable _prefetch_cond;
+  bool _prefetch_stop = false;
 };
 
 }  // namespace noisicaa
@@ -0,0 +1,202 @@
+/*
+ * @begin:license
+ *
+ * Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License along
+ * with this program; if not, write to the Free Software Foundation, Inc.,
+ * 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+ *
+ * @end:license
+ */
+
+#include <sys/stat.h>
+#include "noisicaa/core/logging.h"
+#include "noisicaa/host_system/host_system_fluidsynth.h"
+
+namespace noisicaa {
+
+SoundFont::SoundFont(const string& path, fluid_sfont_t* sfont, size_t size)
+  : _path(path),
+    _sfont(sfont),
+    _size(size) {}
+
+FluidSynthSubSystem::FluidSynthSubSystem()
+  : _logger(LoggerRegistry::get_logger("noisicaa.host_system.fluidsynth")) {}
+
+FluidSynthSubSystem::~FluidSynthSubSystem() {
+  cleanup();
+}
+
+Status FluidSynthSubSystem::setup() {
+  _settings = new_fluid_settings();
+  if (_settings == nullptr) {
+    return ERROR_STATUS("Failed to create fluid settings object.");
+  }
+
+  _master_synth = new_fluid_synth(_settings);
+  if (_master_synth == nullptr) {
+    return ERROR_STATUS("Failed to create fluid synth object.");
+  }
+
+  return Status::Ok();
+}
+
+void FluidSynthSubSystem::cleanup() {
+  lock_guard<mutex> lock(_mutex);
+
+  for (const auto& it : _map) {
+    if (it.second->ref_count() > 0) {
+      _logger->warning(
+          "Sound font '%s' still has %d references.",
+          it.first.c_str(), it.second->ref_count());
+    }
+  }
+  _unused.clear();
+  _map.clear();
+  _memory_usage = 0;
+
+  if (_master_synth != nullptr) {
+    // This also unloads all sound fonts.
+    delete_fluid_synth(_master_synth);
+    _master_synth = nullptr;
+  }
+
+  if (_settings != nullptr) {
+    delete_fluid_settings(_settings);
+    _settings = nullptr;
+  }
+}
+
+StatusOr<SoundFont*> FluidSynthSubSystem::load_sound_font(const string& path) {
+  lock_guard<mutex> lock(_mutex);
+
+  if (_master_synth == nullptr) {
+    return ERROR_STATUS("FluidSynth subsystem not set up.");
+  }
+
+  const auto& it = _map.find(path);
+  if (it != _map.end()) {
+    SoundFont* sound_font = it->second.get();
+    if (sound_font->ref_count() == 0) {
+      _unused.remove(sound_font);
+    }
+    sound_font->ref();
+    return sound_font;
+  }
+
+  _logger->info("Load sound font '%s'", path.c_str());
+
+  struct stat st;
+  if (stat(path.c_str(), &st) < 0) {
+    return OSERROR_STATUS("Failed to stat %s", path.c_str());
+  }
+
+  int sfid = fluid_synth_sfload(_master_synth, path.c_str(), false);
+  if (sfid == FLUID_FAILED) {
+    return ERROR_STATUS("Failed to load soundfont %s.", path.c_str());
+  }
+
+  fluid_sfont_t* sfont = fluid_synth_get_sfont_by_id(_master_synth, sfid);
+  if (sfont == nullptr) {
+    return ERROR_STATUS("Failed to get soundfont %d.", sfid);
+  }
+
+  // Most of a sound font file is sample data, so its size is a good estimate for the memory,
+  // which is used by the loaded sound font.
+  SoundFont* sound_font = new SoundFont(path, sfont, st.st_size);
+  sound_font->ref();
+  _map.emplace(path, unique_ptr<SoundFont>(sound_font));
+  _memory_usage += sound_font->size();
+
+  return sound_font;
+}
+
+void FluidSynthSubSystem::release_sound_font(SoundFont* sound_font) {
+  lock_guard<mutex> lock(_mutex);
+
+  assert(_map.find(sound_font->path()) != _map.end());
+  assert(sound_font->ref_count() > 0);
+  sound_font->deref();
+
+  if (sound_font->ref_count() == 0) {
+    _unused.push_front(sound_font);
+    evict();
+  }
+}
+
+void FluidSynthSubSystem::set_eviction_policy(SoundFontEvictionPolicy policy, size_t cache_size) {
+  lock_guard<mutex> lock(_mutex);
+
+  _eviction_policy = policy;
+  _cache_size = cache_size;
+  evict();
+}
+
+size_t FluidSynthSubSystem::memory_usage() {
+  lock_guard<mutex> lock(_mutex);
+  return _memory_usage;
+}
+
+uint32_t FluidSynthSubSystem::num_sound_fonts() {
+  lock_guard<mutex> lock(_mutex);
+  if (_master_synth == nullptr) {
+    return 0;
+  }
+  return fluid_synth_sfcount(_master_synth);
+}
+
+void FluidSynthSubSystem::evict() {
+  switch (_eviction_policy) {
+  case EVICT_IMMEDIATELY:
+    while (!_unused.empty()) {
+      unload(_unused.back());
+      _unused.pop_back();
+    }
+    break;
+
+  case EVICT_LRU: {
+    size_t unused_size = 0;
+    for (SoundFont* sound_font : _unused) {
+      unused_size += sound_font->size();
+    }
+    while (!_unused.empty() && unused_size > _cache_size) {
+      unused_size -= _unused.back()->size();
+      unload(_unused.back());
+      _unused.pop_back();
+    }
+    break;
+  }
+
+  case EVICT_NEVER:
+    break;
+  }
+}
+
+void FluidSynthSubSystem::unload(SoundFont* sound_font) {
+  _logger->info("Unload sound font '%s'", sound_font->path().c_str());
+
+  assert(sound_font->ref_count() == 0);
+  _memory_usage -= sound_font->size();
+  // Unload by pointer, fluid_synth_sfunload() would look the sound font up by its id, which
+  // has been changed by every fluid_synth_add_sfont() call since it was loaded.
+  fluid_sfont_t* sfont = sound_font->sfont();
+  fluid_synth_remove_sfont(_master_synth, sfont);
+  if (delete_fluid_sfont(sfont) != 0) {
+    _logger->warning("Failed to unload sound font '%s'", sound_font->path().c_str());
+  }
+  string path = sound_font->path();
+  _map.erase(path);
+}
+
+}  // namespace noisicaa
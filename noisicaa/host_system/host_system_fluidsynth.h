@@ -0,0 +1,118 @@
+// -*- mode: c++ -*-
+
+/*
+ * @begin:license
+ *
+ * Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License along
+ * with this program; if not, write to the Free Software Foundation, Inc.,
+ * 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+ *
+ * @end:license
+ */
+
+#ifndef _NOISICAA_HOST_SYSTEM_HOST_SYSTEM_FLUIDSYNTH_H
+#define _NOISICAA_HOST_SYSTEM_HOST_SYSTEM_FLUIDSYNTH_H
+
+#include <stdint.h>
+#include <list>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <string>
+#include "fluidsynth.h"
+#include "noisicaa/core/status.h"
+
+namespace noisicaa {
+
+using namespace std;
+
+class Logger;
+
+class SoundFont {
+public:
+  SoundFont(const string& path, fluid_sfont_t* sfont, size_t size);
+
+  const string& path() const { return _path; }
+  // The sound font's id is not kept, because fluid_synth_add_sfont() reassigns it for every
+  // synth, which the sound font is added to.
+  fluid_sfont_t* sfont() const { return _sfont; }
+  size_t size() const { return _size; }
+
+  uint32_t ref_count() const { return _ref_count; }
+  void ref() { ++_ref_count; }
+  void deref() { --_ref_count; }
+
+private:
+  uint32_t _ref_count = 0;
+  string _path;
+  fluid_sfont_t* _sfont;
+  size_t _size;
+};
+
+enum SoundFontEvictionPolicy {
+  // Unload a sound font as soon as the last user released it.
+  EVICT_IMMEDIATELY,
+
+  // Keep unused sound fonts loaded, until their total size exceeds the cache size. The least
+  // recently used ones are unloaded first.
+  EVICT_LRU,
+
+  // Keep all sound fonts loaded, until the subsystem is cleaned up.
+  EVICT_NEVER,
+};
+
+// Loads each sound font only once and shares it between all fluid_synth instances, which use
+// it. The sound fonts are owned by a master synth, which is never used for rendering.
+class FluidSynthSubSystem {
+public:
+  FluidSynthSubSystem();
+  ~FluidSynthSubSystem();
+
+  Status setup();
+  void cleanup();
+
+  // Returns the sound font with an added reference. The caller must pass it to
+  // release_sound_font(), when it is not used anymore.
+  StatusOr<SoundFont*> load_sound_font(const string& path);
+  void release_sound_font(SoundFont* sound_font);
+
+  void set_eviction_policy(SoundFontEvictionPolicy policy, size_t cache_size);
+
+  // Total size of all loaded sound fonts (including unused ones, which are kept in the cache).
+  size_t memory_usage();
+  // Number of sound fonts, which are loaded into the master synth.
+  uint32_t num_sound_fonts();
+
+private:
+  void unload(SoundFont* sound_font);
+  void evict();
+
+  Logger* _logger;
+
+  mutex _mutex;
+  fluid_settings_t* _settings = nullptr;
+  fluid_synth_t* _master_synth = nullptr;
+  map<string, unique_ptr<SoundFont>> _map;
+  // Unused sound fonts, most recently released at the front.
+  list<SoundFont*> _unused;
+  size_t _memory_usage = 0;
+
+  SoundFontEvictionPolicy _eviction_policy = EVICT_LRU;
+  size_t _cache_size = 256 << 20;
+};
+
+}  // namespace noisicaa
+
+#endif
@@ -0,0 +1,387 @@
+/*
+ * @begin:license
+ *
+ * Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License along
+ * with this program; if not, write to the Free Software Foundation, Inc.,
+ * 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+ *
+ * @end:license
+ */
+
+#include <dirent.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <limits.h>
+#include <stdio.h>
+#include <string.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <memory>
+#include "noisicaa/core/logging.h"
+#include "noisicaa/core/scope_guard.h"
+#include "noisicaa/host_system/host_system_resample_cache.h"
+
+namespace {
+
+// Identifies the resampler and its settings. Must be changed, whenever the resampling code
+// changes in a way, which changes its output.
+const char* resampler_id = "swr0";
+
+const char* entry_suffix = ".raw";
+const char* tmp_suffix = ".tmp";
+const char* hashes_name = "hashes";
+
+bool ends_with(const std::string& s, const char* suffix) {
+  size_t len = strlen(suffix);
+  return s.size() >= len && s.compare(s.size() - len, len, suffix) == 0;
+}
+
+}  // namespace
+
+namespace noisicaa {
+
+ResampleCache::ResampleCache(Logger* logger)
+  : _logger(logger) {}
+
+Status ResampleCache::setup(const string& dir, size_t max_size) {
+  lock_guard<mutex> lock(_mutex);
+
+  _entries.clear();
+  _size = 0;
+  _dir.clear();
+
+  // Create the directory and all missing parents.
+  for (size_t p = dir.find('/', 1) ; ; p = dir.find('/', p + 1)) {
+    string d = dir.substr(0, p);
+    if (mkdir(d.c_str(), 0755) < 0 && errno != EEXIST) {
+      return OSERROR_STATUS("Failed to create directory %s", d.c_str());
+    }
+    if (p == string::npos) {
+      break;
+    }
+  }
+
+  DIR* dp = opendir(dir.c_str());
+  if (dp == nullptr) {
+    return OSERROR_STATUS("Failed to open directory %s", dir.c_str());
+  }
+  auto close_dp = scopeGuard([dp]() { closedir(dp); });
+
+  struct dirent* de;
+  while ((de = readdir(dp)) != nullptr) {
+    string name = de->d_name;
+    string path = dir + "/" + name;
+    if (ends_with(name, tmp_suffix)) {
+      // Left over from an interrupted store.
+      unlink(path.c_str());
+    } else if (ends_with(name, entry_suffix)) {
+      struct stat st;
+      if (stat(path.c_str(), &st) == 0) {
+        _entries.emplace(name, Entry{(size_t)st.st_size, st.st_mtime});
+        _size += st.st_size;
+      }
+    }
+  }
+
+  _dir = dir;
+  _max_size = max_size;
+  load_hashes();
+  _logger->info(
+      "Using resample cache %s (%d entries, %ld bytes)", _dir.c_str(), _entries.size(), _size);
+  evict("");
+
+  return Status::Ok();
+}
+
+void ResampleCache::cleanup() {
+  lock_guard<mutex> lock(_mutex);
+  _dir.clear();
+  _entries.clear();
+  _hashes.clear();
+  _size = 0;
+}
+
+size_t ResampleCache::size() {
+  lock_guard<mutex> lock(_mutex);
+  return _size;
+}
+
+uint32_t ResampleCache::num_entries() {
+  lock_guard<mutex> lock(_mutex);
+  return _entries.size();
+}
+
+ResampleCache::HashMemo ResampleCache::stat_memo(const struct stat& st) {
+  return HashMemo{
+    (size_t)st.st_size,
+    (int64_t)st.st_mtim.tv_sec * 1000000000 + st.st_mtim.tv_nsec,
+    st.st_ino,
+    0};
+}
+
+string ResampleCache::hashes_path() const {
+  return _dir + "/" + hashes_name;
+}
+
+void ResampleCache::load_hashes() {
+  _hashes.clear();
+
+  FILE* fp = fopen(hashes_path().c_str(), "r");
+  if (fp != nullptr) {
+    auto close_fp = scopeGuard([fp]() { fclose(fp); });
+
+    // Each line is "<size> <mtime ns> <inode> <hash> <path>".
+    char line[PATH_MAX + 128];
+    while (fgets(line, sizeof(line), fp) != nullptr) {
+      unsigned long long size, ino, hash;
+      long long mtime_ns;
+      int offset;
+      if (sscanf(line, "%llu %lld %llu %llx%n", &size, &mtime_ns, &ino, &hash, &offset) != 4
+          || line[offset] != ' ') {
+        continue;
+      }
+      string path(line + offset + 1);
+      if (path.size() < 2 || path.back() != '\n') {
+        // Truncated by an interrupted write.
+        continue;
+      }
+      path.pop_back();
+      _hashes[path] = HashMemo{(size_t)size, (int64_t)mtime_ns, (ino_t)ino, (uint64_t)hash};
+    }
+  }
+
+  // Forget about files, which have been modified or removed, and write back the remaining
+  // entries, so the index does not grow forever.
+  for (auto it = _hashes.begin() ; it != _hashes.end() ; ) {
+    struct stat st;
+    if (stat(it->first.c_str(), &st) < 0 || !stat_memo(st).same_file(it->second)) {
+      it = _hashes.erase(it);
+    } else {
+      ++it;
+    }
+  }
+
+  string tmp_path = hashes_path() + tmp_suffix;
+  fp = fopen(tmp_path.c_str(), "w");
+  if (fp == nullptr) {
+    _logger->warning("Failed to write %s: %s", tmp_path.c_str(), strerror(errno));
+    return;
+  }
+  for (const auto& it : _hashes) {
+    fprintf(
+        fp, "%llu %lld %llu %016llx %s\n",
+        (unsigned long long)it.second.size, (long long)it.second.mtime_ns,
+        (unsigned long long)it.second.ino, (unsigned long long)it.second.hash,
+        it.first.c_str());
+  }
+  if (fclose(fp) != 0 || rename(tmp_path.c_str(), hashes_path().c_str()) < 0) {
+    _logger->warning("Failed to write %s: %s", hashes_path().c_str(), strerror(errno));
+    unlink(tmp_path.c_str());
+  }
+}
+
+void ResampleCache::append_hash(const string& path, const HashMemo& memo) {
+  if (_dir.empty() || path.find('\n') != string::npos) {
+    return;
+  }
+
+  FILE* fp = fopen(hashes_path().c_str(), "a");
+  if (fp == nullptr) {
+    _logger->warning("Failed to write %s: %s", hashes_path().c_str(), strerror(errno));
+    return;
+  }
+  fprintf(
+      fp, "%llu %lld %llu %016llx %s\n",
+      (unsigned long long)memo.size, (long long)memo.mtime_ns,
+      (unsigned long long)memo.ino, (unsigned long long)memo.hash,
+      path.c_str());
+  fclose(fp);
+}
+
+StatusOr<uint64_t> ResampleCache::content_hash(const string& path) {
+  struct stat st;
+  if (stat(path.c_str(), &st) < 0) {
+    return OSERROR_STATUS("Failed to stat %s", path.c_str());
+  }
+  HashMemo memo = stat_memo(st);
+
+  {
+    lock_guard<mutex> lock(_mutex);
+    const auto& it = _hashes.find(path);
+    if (it != _hashes.end() && it->second.same_file(memo)) {
+      return it->second.hash;
+    }
+  }
+
+  FILE* fp = fopen(path.c_str(), "rb");
+  if (fp == nullptr) {
+    return OSERROR_STATUS("Failed to open file %s", path.c_str());
+  }
+  auto close_fp = scopeGuard([fp]() { fclose(fp); });
+
+  // 64bit FNV-1a
+  uint64_t hash = 0xcbf29ce484222325ULL;
+  unique_ptr<uint8_t[]> buf(new uint8_t[1 << 16]);
+  size_t bytes_read;
+  while ((bytes_read = fread(buf.get(), 1, 1 << 16, fp)) > 0) {
+    for (size_t i = 0 ; i < bytes_read ; ++i) {
+      hash = (hash ^ buf[i]) * 0x100000001b3ULL;
+    }
+  }
+  if (ferror(fp)) {
+    return ERROR_STATUS("Failed to read file %s", path.c_str());
+  }
+
+  memo.hash = hash;
+  lock_guard<mutex> lock(_mutex);
+  _hashes[path] = memo;
+  append_hash(path, memo);
+  return hash;
+}
+
+string ResampleCache::entry_name(const Key& key) const {
+  char name[128];
+  snprintf(
+      name, sizeof(name), "%016llx-%u-%u-%s-%u%s",
+      (unsigned long long)key.content_hash, key.source_rate, key.target_rate, resampler_id,
+      key.channel, entry_suffix);
+  return name;
+}
+
+bool ResampleCache::lookup(const Key& key, string* path, size_t* num_samples) {
+  lock_guard<mutex> lock(_mutex);
+
+  if (_dir.empty()) {
+    return false;
+  }
+
+  string name = entry_name(key);
+  const auto& it = _entries.find(name);
+  if (it == _entries.end()) {
+    return false;
+  }
+
+  string entry_path = _dir + "/" + name;
+  if (utimensat(AT_FDCWD, entry_path.c_str(), nullptr, 0) < 0) {
+    // The entry has been removed behind our back.
+    _size -= it->second.size;
+    _entries.erase(it);
+    return false;
+  }
+  it->second.atime = time(nullptr);
+
+  *path = entry_path;
+  *num_samples = it->second.size / sizeof(float);
+  return true;
+}
+
+Status ResampleCache::read(const string& path, float* data, size_t num_samples) {
+  FILE* fp = fopen(path.c_str(), "rb");
+  if (fp == nullptr) {
+    return OSERROR_STATUS("Failed to open file %s", path.c_str());
+  }
+  auto close_fp = scopeGuard([fp]() { fclose(fp); });
+
+  if (fread(data, sizeof(float), num_samples, fp) != num_samples) {
+    return ERROR_STATUS("Failed to read file %s", path.c_str());
+  }
+
+  return Status::Ok();
+}
+
+string ResampleCache::begin_store(const Key& key) {
+  lock_guard<mutex> lock(_mutex);
+  if (_dir.empty()) {
+    return "";
+  }
+
+  // Concurrent stores of the same entry must not share a temporary file.
+  return _dir + "/" + entry_name(key) + "." + to_string(++_tmp_serial) + tmp_suffix;
+}
+
+StatusOr<string> ResampleCache::commit_store(const Key& key, const string& tmp_path) {
+  struct stat st;
+  if (stat(tmp_path.c_str(), &st) < 0) {
+    return OSERROR_STATUS("Failed to stat %s", tmp_path.c_str());
+  }
+
+  lock_guard<mutex> lock(_mutex);
+  if (_dir.empty()) {
+    unlink(tmp_path.c_str());
+    return ERROR_STATUS("Resample cache is disabled.");
+  }
+
+  string name = entry_name(key);
+  string path = _dir + "/" + name;
+  if (rename(tmp_path.c_str(), path.c_str()) < 0) {
+    unlink(tmp_path.c_str());
+    return OSERROR_STATUS("Failed to rename %s", tmp_path.c_str());
+  }
+
+  const auto& it = _entries.find(name);
+  if (it != _entries.end()) {
+    _size -= it->second.size;
+    _entries.erase(it);
+  }
+  _entries.emplace(name, Entry{(size_t)st.st_size, time(nullptr)});
+  _size += st.st_size;
+
+  evict(name);
+
+  return path;
+}
+
+Status ResampleCache::store(const Key& key, const float* data, size_t num_samples) {
+  string tmp_path = begin_store(key);
+  if (tmp_path.empty()) {
+    return ERROR_STATUS("Resample cache is disabled.");
+  }
+
+  FILE* fp = fopen(tmp_path.c_str(), "wb");
+  if (fp == nullptr) {
+    return OSERROR_STATUS("Failed to create %s", tmp_path.c_str());
+  }
+  size_t written = fwrite(data, sizeof(float), num_samples, fp);
+  if (fclose(fp) != 0 || written != num_samples) {
+    unlink(tmp_path.c_str());
+    return ERROR_STATUS("Failed to write %s", tmp_path.c_str());
+  }
+
+  StatusOr<string> stor_path = commit_store(key, tmp_path);
+  RETURN_IF_ERROR(stor_path);
+  return Status::Ok();
+}
+
+void ResampleCache::evict(const string& keep) {
+  while (_size > _max_size) {
+    auto lru = _entries.end();
+    for (auto it = _entries.begin() ; it != _entries.end() ; ++it) {
+      if (it->first != keep && (lru == _entries.end() || it->second.atime < lru->second.atime)) {
+        lru = it;
+      }
+    }
+    if (lru == _entries.end()) {
+      break;
+    }
+
+    _logger->info("Evicting %s from resample cache", lru->first.c_str());
+    // Files, which are still mmap'ed, stay valid until they are unmapped.
+    unlink((_dir + "/" + lru->first).c_str());
+    _size -= lru->second.size;
+    _entries.erase(lru);
+  }
+}
+
+}  // namespace noisicaa
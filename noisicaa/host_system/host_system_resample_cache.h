@@ -0,0 +1,116 @@
+// -*- mode: c++ -*-
+
+/*
+ * @begin:license
+ *
+ * Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License along
+ * with this program; if not, write to the Free Software Foundation, Inc.,
+ * 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+ *
+ * @end:license
+ */
+
+#ifndef _NOISICAA_HOST_SYSTEM_HOST_SYSTEM_RESAMPLE_CACHE_H
+#define _NOISICAA_HOST_SYSTEM_HOST_SYSTEM_RESAMPLE_CACHE_H
+
+#include <stdint.h>
+#include <sys/stat.h>
+#include <time.h>
+#include <map>
+#include <mutex>
+#include <string>
+#include "noisicaa/core/status.h"
+
+namespace noisicaa {
+
+using namespace std;
+
+class Logger;
+
+// A persistent, size limited cache of resampled audio data.
+//
+// Each entry holds the samples of one channel as raw floats. Entries are keyed by the content
+// of the source file (not its path), so renamed or copied files still hit the cache. The
+// modification time of an entry's file is used as its last access time, so the LRU order
+// survives restarts. The content hashes of source files are kept in an index in the cache
+// directory, so a source file is only read again, when it has been modified.
+class ResampleCache {
+public:
+  struct Key {
+    uint64_t content_hash;
+    uint32_t source_rate;
+    uint32_t target_rate;
+    uint32_t channel;
+  };
+
+  ResampleCache(Logger* logger);
+
+  Status setup(const string& dir, size_t max_size);
+  void cleanup();
+
+  bool enabled() const { return !_dir.empty(); }
+  size_t size();
+  uint32_t num_entries();
+
+  StatusOr<uint64_t> content_hash(const string& path);
+
+  // Returns true and fills in path and number of samples of the entry, if it is in the cache.
+  bool lookup(const Key& key, string* path, size_t* num_samples);
+  Status read(const string& path, float* data, size_t num_samples);
+
+  // Create an entry by writing the samples to a temporary file (returned by begin_store()) and
+  // then passing it to commit_store(), which returns the path of the final entry.
+  string begin_store(const Key& key);
+  StatusOr<string> commit_store(const Key& key, const string& tmp_path);
+  Status store(const Key& key, const float* data, size_t num_samples);
+
+private:
+  struct HashMemo {
+    size_t size;
+    int64_t mtime_ns;
+    ino_t ino;
+    uint64_t hash;
+
+    bool same_file(const HashMemo& other) const {
+      return size == other.size && mtime_ns == other.mtime_ns && ino == other.ino;
+    }
+  };
+
+  static HashMemo stat_memo(const struct stat& st);
+
+  string entry_name(const Key& key) const;
+  void evict(const string& keep);
+  string hashes_path() const;
+  void load_hashes();
+  void append_hash(const string& path, const HashMemo& memo);
+
+  struct Entry {
+    size_t size;
+    time_t atime;
+  };
+
+  Logger* _logger;
+  mutex _mutex;
+  string _dir;
+  size_t _max_size = 0;
+  size_t _size = 0;
+  uint32_t _tmp_serial = 0;
+  map<string, Entry> _entries;
+  map<string, HashMemo> _hashes;
+};
+
+}  // namespace noisicaa
+
+#endif
@@ -39,6 +39,16 @@ class DataError(Error):
 
 
 class RiffFile(object):
+    def __init__(self) -> None:
+        self.__stopped = False
+
+    def stop_parsing(self) -> None:
+        """Skip the remainder of the file.
+
+        Can be called from a handler, when everything of interest has been seen.
+        """
+        self.__stopped = True
+
     def start_list(self, identifier: str, path: List[str]) -> None:
         pass
 
@@ -51,7 +61,8 @@ class RiffFile(object):
     def parse(self, path: str) -> 'RiffFile':
         logger.info("Opening file %s", path)
         with open(path, 'rb') as fp:
-            if os.path.getsize(path) < 8:
+            file_size = os.fstat(fp.fileno()).st_size
+            if file_size < 8:
                 raise DataError("File truncated")
 
             sig = fp.read(4)
@@ -60,14 +71,14 @@ class RiffFile(object):
 
             size = struct.unpack('<L', fp.read(4))[0]
             logger.debug("0x%08x: Content size %r", 4, size)
-            if size == os.path.getsize(path):
+            if size == file_size:
                 logger.debug("Uncorrect content size (includes RIFF header)")
                 size -= 8
 
-            if size + 8 != os.path.getsize(path):
+            if size + 8 != file_size:
                 raise DataError(
                     "File size mismatch (expected %d, got %d)"
-                    % (size + 8, os.path.getsize(path)))
+                    % (size + 8, file_size))
 
             self._parse_list(fp, [], 8, size + 8)
 
@@ -102,6 +113,9 @@ class RiffFile(object):
                 self.handle_chunk(identifier, path + [list_identifier], chunksize, fp)
                 fp.seek(offset + (chunksize + 1) & 0xfffffffe, io.SEEK_SET)
 
+            if self.__stopped:
+                break
+
             if offset + chunksize == end_offset and chunksize & 1 == 1:
                 logger.debug("Ignoring missing pad byte on last chunk.")
                 offset = end_offset
@@ -70,10 +70,14 @@ class Instrument(object):
 
 
 class SoundFont(riff.RiffFile):
-    def __init__(self) -> None:
+    def __init__(self, *, header_only: bool = False) -> None:
         super().__init__()
         self.__seen = set()  # type: Set[str]
 
+        # Stop parsing after the preset headers, so instruments and everything else in the pdta
+        # chunk are not read.
+        self.__header_only = header_only
+
         self.file_version = None  # type: Tuple[int, int]
         self.sound_engine = 'EMU8000'  # type: str
         self.bank_name = None  # type: str
@@ -185,6 +189,9 @@ class SoundFont(riff.RiffFile):
                 self.presets.append(Preset(name, preset, bank, bag_index,
                                            library, genre, morphology))
 
+        if self.__header_only:
+            self.stop_parsing()
+
     def handle_sfbk_pdta_inst(self, size: int, fp: IO) -> None:
         if size % 22 != 0 or size < 44:
             raise FormatError("Invalid inst chunk size %d" % size)
@@ -36,9 +36,12 @@ class FormatError(Error):
 
 
 class WaveFile(riff.RiffFile):
-    def __init__(self) -> None:
+    def __init__(self, *, header_only: bool = False) -> None:
         super().__init__()
 
+        # Stop parsing at the data chunk, ignoring any trailing chunks.
+        self.__header_only = header_only
+
         self.data_format = None  # type: str
         self.channels = None  # type: int
         self.sample_rate = None  # type: int
@@ -128,3 +131,5 @@ class WaveFile(riff.RiffFile):
         self.__seen.add('WAVE/data')
 
         self.__data_length = size
+        if self.__header_only:
+            self.stop_parsing()
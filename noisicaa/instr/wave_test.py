@@ -35,3 +35,12 @@ class WaveFileTest(unittest.TestCase):
         self.assertEqual(w.sample_rate, 44100)
         self.assertEqual(w.bits_per_sample, 16)
         self.assertEqual(w.num_samples, 9450)
+
+    def test_header_only(self):
+        w = wave.WaveFile(header_only=True)
+        w.parse(os.path.join(unittest.TESTDATA_DIR, 'test1.wav'))
+        self.assertEqual(w.data_format, 'pcm')
+        self.assertEqual(w.channels, 2)
+        self.assertEqual(w.sample_rate, 44100)
+        self.assertEqual(w.bits_per_sample, 16)
+        self.assertEqual(w.num_samples, 9450)
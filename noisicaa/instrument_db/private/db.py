@@ -21,6 +21,8 @@
 # @end:license
 
 import asyncio
+import concurrent.futures
+import concurrent.futures.process
 import os
 import os.path
 import logging
@@ -29,16 +31,53 @@ import queue
 import sys
 import threading
 import time
-from typing import Any, Callable, Dict, List, Set
+from typing import Any, Callable, Dict, List, Set, Tuple
 
 from noisicaa import core
 from noisicaa import instrument_db
 
+from . import scanner as scanner_lib
 from . import sample_scanner
 from . import soundfont_scanner
 
 logger = logging.getLogger(__name__)
 
+# path, mtime
+FileEntry = Tuple[str, float]
+
+
+def create_scanners() -> List[scanner_lib.Scanner]:
+    return [
+        sample_scanner.SampleScanner(),
+        soundfont_scanner.SoundFontScanner(),
+    ]
+
+
+# Scanner instances of a worker process, created on first use.
+_worker_scanners = None  # type: List[scanner_lib.Scanner]
+
+
+def _scan_batch(paths: List[str]) -> List[List[bytes]]:
+    """Run in a worker process, returns the serialized descriptions for each path."""
+
+    global _worker_scanners  # pylint: disable=global-statement
+    if _worker_scanners is None:
+        _worker_scanners = create_scanners()
+
+    results = []  # type: List[List[bytes]]
+    for path in paths:
+        descriptions = []  # type: List[bytes]
+        try:
+            for scanner in _worker_scanners:
+                for description in scanner.scan(path):
+                    descriptions.append(description.SerializeToString())
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error("Failed to scan %s: %s: %s", path, type(exc).__name__, exc)
+            descriptions.clear()
+        results.append(descriptions)
+
+    return results
+
 
 class ScanAborted(Exception):
     pass
@@ -47,12 +86,24 @@ class ScanAborted(Exception):
 class InstrumentDB(object):
     VERSION = 3
 
-    def __init__(self, event_loop: asyncio.AbstractEventLoop, cache_dir: str) -> None:
+    # Number of files, which are passed to a worker process in one go.
+    SCAN_BATCH_SIZE = 32
+
+    # Minimum interval in seconds between two SCANNING state updates.
+    SCAN_STATE_INTERVAL = 0.1
+
+    def __init__(
+            self,
+            event_loop: asyncio.AbstractEventLoop,
+            cache_dir: str,
+            num_workers: int = None
+    ) -> None:
         self.scan_state_handlers = core.Callback[instrument_db.ScanState]()
         self.__mutation_listeners = core.Callback[instrument_db.Mutations]()
 
         self.__event_loop = event_loop
         self.__cache_dir = cache_dir
+        self.__num_workers = num_workers or os.cpu_count() or 1
 
         self.__instruments = None  # type: Dict[str, instrument_db.InstrumentDescription]
         self.__file_map = None  # type: Dict[str, float]
@@ -174,31 +225,59 @@ class InstrumentDB(object):
             self.__publish_scan_state(instrument_db.ScanState(
                 state=instrument_db.ScanState.ABORTED))
 
-    def __collect_files(self, search_paths: List[str], incremental: bool) -> List[str]:
+    def __collect_files(
+            self, search_paths: List[str], incremental: bool) -> List[FileEntry]:
         logger.info("Collecting files (incremental=%s)", incremental)
         self.__publish_scan_state(instrument_db.ScanState(
             state=instrument_db.ScanState.PREPARING))
 
+        file_extensions = tuple(
+            ext for scanner in create_scanners() for ext in scanner.file_extensions)
+
         seen_files = set()  # type: Set[str]
-        file_list = []
+        file_list = []  # type: List[FileEntry]
         for root_path in search_paths:
             logger.info("Collecting files from %s", root_path)
 
-            for dname, _, files in os.walk(root_path):
+            # Walk the tree top-down, like os.walk(), but reuse the stat results from scandir().
+            pending_dirs = [os.path.abspath(root_path)]
+            while pending_dirs:
                 if self.__stopping.is_set():
                     raise ScanAborted
 
-                for fname in sorted(files):
-                    path = os.path.join(dname, fname)
-                    path = os.path.abspath(path)
-                    if path in seen_files:
+                dname = pending_dirs.pop()
+                try:
+                    entries = sorted(os.scandir(dname), key=lambda entry: entry.name)
+                except OSError as exc:
+                    logger.warning("Failed to list %s: %s", dname, exc)
+                    continue
+
+                subdirs = []  # type: List[str]
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+
+                        if not entry.name.endswith(file_extensions):
+                            continue
+
+                        path = entry.path
+                        if path in seen_files:
+                            continue
+
+                        mtime = entry.stat().st_mtime
+                    except OSError as exc:
+                        logger.warning("Failed to stat %s: %s", entry.path, exc)
                         continue
 
-                    if incremental and os.path.getmtime(path) == self.__file_map.get(path, -1):
+                    if incremental and mtime == self.__file_map.get(path, -1):
                         continue
 
                     seen_files.add(path)
-                    file_list.append(path)
+                    file_list.append((path, mtime))
+
+                pending_dirs.extend(reversed(subdirs))
 
         if incremental:
             logger.info("%d new/modified files found.", len(file_list))
@@ -207,37 +286,120 @@ class InstrumentDB(object):
 
         return file_list
 
-    def __scan_files(self, file_list: List[str]) -> None:
-        scanners = [
-            sample_scanner.SampleScanner(),
-            soundfont_scanner.SoundFontScanner(),
-        ]
+    def __scan_files(self, file_list: List[FileEntry]) -> None:
+        batches = [
+            file_list[idx:idx + self.SCAN_BATCH_SIZE]
+            for idx in range(0, len(file_list), self.SCAN_BATCH_SIZE)]
+        batches.reverse()
+
+        num_scanned = 0
+        last_state_time = None  # type: float
+        descriptions = []  # type: List[instrument_db.InstrumentDescription]
+
+        def add_results(batch: List[FileEntry], results: List[List[bytes]]) -> None:
+            nonlocal num_scanned
+
+            for (path, mtime), serialized in zip(batch, results):
+                for data in serialized:
+                    description = instrument_db.InstrumentDescription()
+                    description.ParseFromString(data)
+                    descriptions.append(description)
+                self.__file_map[path] = mtime
+            num_scanned += len(batch)
+
+            if descriptions:
+                self.__event_loop.call_soon_threadsafe(
+                    self.__add_instruments, list(descriptions))
+                descriptions.clear()
+
+        def publish_progress() -> None:
+            nonlocal last_state_time
+
+            now = time.monotonic()
+            if last_state_time is None or now - last_state_time >= self.SCAN_STATE_INTERVAL:
+                self.__publish_scan_state(instrument_db.ScanState(
+                    state=instrument_db.ScanState.SCANNING,
+                    current=num_scanned,
+                    total=len(file_list)))
+                last_state_time = now
+
+        # A worker process, which dies (e.g. crashes in a parser or gets killed by the OOM
+        # killer), breaks the whole pool and all batches, which are in flight. Those files are
+        # scanned again one by one at the end, to single out the culprit.
+        suspects = []  # type: List[FileEntry]
+
+        logger.info("Scanning %d files with %d workers...", len(file_list), self.__num_workers)
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.__num_workers)
+        generation = 0
+        try:
+            # Only keep a few batches in flight, so an abort does not have to wait for the
+            # complete list to be processed.
+            pending = {}  # type: Dict[concurrent.futures.Future, Tuple[List[FileEntry], int]]
+            while batches or pending:
+                if self.__stopping.is_set():
+                    for future in pending:
+                        future.cancel()
+                    raise ScanAborted
 
-        batch = []
-        for idx, path in enumerate(file_list):
-            if self.__stopping.is_set():
-                raise ScanAborted
+                while batches and len(pending) < 2 * self.__num_workers:
+                    batch = batches[-1]
+                    try:
+                        future = executor.submit(_scan_batch, [path for path, _ in batch])
+                    except concurrent.futures.process.BrokenProcessPool:
+                        executor.shutdown(wait=False)
+                        executor = concurrent.futures.ProcessPoolExecutor(
+                            max_workers=self.__num_workers)
+                        generation += 1
+                        continue
+                    pending[future] = (batches.pop(), generation)
+
+                done, _ = concurrent.futures.wait(
+                    pending, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    batch, batch_generation = pending.pop(future)
+                    try:
+                        results = future.result()
+                    except concurrent.futures.process.BrokenProcessPool:
+                        logger.warning(
+                            "Worker process died, scanning %d files again later.", len(batch))
+                        suspects.extend(batch)
+                        if batch_generation == generation:
+                            executor.shutdown(wait=False)
+                            executor = concurrent.futures.ProcessPoolExecutor(
+                                max_workers=self.__num_workers)
+                            generation += 1
+                        continue
 
-            logger.info("Scanning file %s...", path)
-            self.__publish_scan_state(instrument_db.ScanState(
-                state=instrument_db.ScanState.SCANNING,
-                current=idx,
-                total=len(file_list)))
+                    add_results(batch, results)
 
-            for scanner in scanners:
-                for description in scanner.scan(path):
-                    batch.append(description)
-                    if len(batch) > 10:
-                        self.__event_loop.call_soon_threadsafe(
-                            self.__add_instruments, list(batch))
-                        batch.clear()
-
-            self.__file_map[path] = os.path.getmtime(path)
-
-        if batch:
-            self.__event_loop.call_soon_threadsafe(
-                self.__add_instruments, list(batch))
-            batch.clear()
+                publish_progress()
+
+        finally:
+            executor.shutdown(wait=True)
+
+        executor = None
+        try:
+            for path, mtime in suspects:
+                if self.__stopping.is_set():
+                    raise ScanAborted
+
+                if executor is None:
+                    executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+                try:
+                    results = executor.submit(_scan_batch, [path]).result()
+                except concurrent.futures.process.BrokenProcessPool:
+                    logger.error("Worker process died while scanning %s, skipping it.", path)
+                    executor.shutdown(wait=False)
+                    executor = None
+                    num_scanned += 1
+                    continue
+
+                add_results([(path, mtime)], results)
+                publish_progress()
+
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
 
         self.__publish_scan_state(instrument_db.ScanState(
             state=instrument_db.ScanState.COMPLETED))
@@ -22,14 +22,32 @@
 
 import asyncio
 import logging
+import os
+import os.path
+import shutil
+import signal
+import uuid
+from unittest import mock
 
 from noisidev import unittest
 from noisicaa import instrument_db
+from noisicaa.constants import TEST_OPTS
 from . import db
+from . import sample_scanner
+from . import scanner
 
 logger = logging.getLogger(__name__)
 
 
+class CrashingScanner(scanner.Scanner):
+    file_extensions = ('.wav',)
+
+    def scan(self, path):
+        if os.path.basename(path) == 'crash.wav':
+            os.kill(os.getpid(), signal.SIGKILL)
+        return []
+
+
 class InstrumentDBTest(unittest.AsyncTestCase):
     async def test_scan(self):
         complete = asyncio.Event(loop=self.loop)
@@ -48,3 +66,72 @@ class InstrumentDBTest(unittest.AsyncTestCase):
 
         finally:
             instdb.cleanup()
+
+    async def test_scan_adds_instruments(self):
+        complete = asyncio.Event(loop=self.loop)
+        def state_listener(state):
+            if state.state == instrument_db.ScanState.COMPLETED:
+                complete.set()
+
+        added = {}
+        def mutations_listener(mutations):
+            for mutation in mutations.mutations:
+                added[mutation.add_instrument.uri] = mutation.add_instrument
+
+        instdb = db.InstrumentDB(self.loop, '/tmp', num_workers=2)
+        instdb.scan_state_handlers.add(state_listener)
+        instdb.add_mutations_listener(mutations_listener)
+        try:
+            instdb.setup()
+
+            instdb.start_scan([unittest.TESTDATA_DIR], False)
+            self.assertTrue(await complete.wait())
+
+        finally:
+            instdb.cleanup()
+
+        descriptions = {
+            os.path.basename(description.path): description
+            for description in added.values()}
+        self.assertIn('test1.wav', descriptions)
+        description = descriptions['test1.wav']
+        self.assertEqual(description.format, instrument_db.InstrumentDescription.SAMPLE)
+        self.assertEqual(description.num_channels, 2)
+        self.assertEqual(description.sample_rate, 44100)
+        self.assertEqual(description.num_samples, 9450)
+
+    async def test_worker_crashes(self):
+        search_path = os.path.join(TEST_OPTS.TMP_DIR, 'instruments-%s' % uuid.uuid4().hex)
+        os.makedirs(search_path)
+        for name in ('a.wav', 'b.wav', 'crash.wav', 'c.wav'):
+            shutil.copy(
+                os.path.join(unittest.TESTDATA_DIR, 'test1.wav'),
+                os.path.join(search_path, name))
+
+        complete = asyncio.Event(loop=self.loop)
+        def state_listener(state):
+            if state.state == instrument_db.ScanState.COMPLETED:
+                complete.set()
+
+        added = set()
+        def mutations_listener(mutations):
+            for mutation in mutations.mutations:
+                added.add(os.path.basename(mutation.add_instrument.path))
+
+        def create_scanners():
+            return [sample_scanner.SampleScanner(), CrashingScanner()]
+
+        instdb = db.InstrumentDB(self.loop, '/tmp', num_workers=2)
+        instdb.scan_state_handlers.add(state_listener)
+        instdb.add_mutations_listener(mutations_listener)
+        try:
+            with mock.patch.object(db, 'create_scanners', create_scanners):
+                instdb.setup()
+
+                instdb.start_scan([search_path], False)
+                self.assertTrue(await complete.wait())
+
+        finally:
+            instdb.cleanup()
+
+        self.assertEqual(added, {'a.wav', 'b.wav', 'c.wav'})
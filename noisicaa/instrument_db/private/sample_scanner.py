@@ -35,15 +35,17 @@ logger = logging.getLogger(__name__)
 
 
 class SampleScanner(scanner.Scanner):
+    file_extensions = ('.wav',)
+
     def scan(self, path: str) -> Iterable[instrument_db.InstrumentDescription]:
-        if not path.endswith('.wav'):
+        if not path.endswith(self.file_extensions):
             return
 
         uri = self.make_uri('sample', path)
         logger.info("Adding sample instrument %s...", uri)
 
         try:
-            parsed = wave.WaveFile()
+            parsed = wave.WaveFile(header_only=True)
             parsed.parse(path)
         except riff.Error as exc:
             logger.error("Failed to parse WAVE file %s: %s", path, exc)
@@ -20,13 +20,16 @@
 #
 # @end:license
 
-from typing import Iterable, Any
+from typing import Iterable, Any, Tuple
 import urllib.parse
 
 from noisicaa import instrument_db
 
 
 class Scanner(object):
+    # Files with other extensions are never passed to scan().
+    file_extensions = ()  # type: Tuple[str, ...]
+
     def make_uri(self, fmt: str, path: str, **kwargs: Any) -> str:
         return urllib.parse.urlunparse((
             fmt,
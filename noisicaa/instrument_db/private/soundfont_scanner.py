@@ -33,11 +33,13 @@ logger = logging.getLogger(__name__)
 
 
 class SoundFontScanner(scanner.Scanner):
+    file_extensions = ('.sf2',)
+
     def scan(self, path: str) -> Iterable[instrument_db.InstrumentDescription]:
-        if not path.endswith('.sf2'):
+        if not path.endswith(self.file_extensions):
             return
 
-        sf = soundfont.SoundFont()
+        sf = soundfont.SoundFont(header_only=True)
         try:
             sf.parse(path)
         except riff.Error as exc:
@@ -37,6 +37,9 @@ logger = logging.getLogger(__name__)
 
 
 class Session(ipc.CallbackSessionMixin, ipc.Session):
+    # The initial mutations of a large library can be a big message.
+    callback_shm_size = 16 << 20
+
     def __init__(
             self,
             session_id: int,
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# @end:license
+
+import argparse
+import os
+import os.path
+import sys
+from typing import List, Optional
+
+from noisicaa.core import storage
+from . import mutations
+from . import mutations_pb2
+
+
+def merge_logs(log_a: bytes, log_b: bytes) -> Optional[bytes]:
+    mutation_list_a = mutations_pb2.MutationList()
+    mutation_list_a.MergeFromString(log_a)
+    mutation_list_b = mutations_pb2.MutationList()
+    mutation_list_b.MergeFromString(log_b)
+
+    if not mutations.merge_mutation_lists(mutation_list_a, mutation_list_b):
+        return None
+    return mutation_list_a.SerializeToString()
+
+
+def get_storage_size(path: str) -> int:
+    size = 0
+    for fname in os.listdir(path):
+        prefix, _, suffix = fname.partition('.')
+        if prefix in ('log', 'checkpoint') and (suffix.isdigit() or suffix in ('index', 'history')):
+            size += os.path.getsize(os.path.join(path, fname))
+    return size
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog=argv[0],
+        description="Drop old history from a project.")
+    parser.add_argument(
+        '--keep-checkpoints',
+        type=int,
+        default=1,
+        help="Number of checkpoints to keep. Undo is not possible beyond the oldest one.")
+    parser.add_argument(
+        '--squash',
+        action='store_true',
+        default=False,
+        help="Merge consecutive changes of the same properties into a single undo step.")
+    parser.add_argument(
+        'path',
+        help="Project to compact.")
+    args = parser.parse_args(args=argv[1:])
+
+    if args.keep_checkpoints < 1:
+        parser.error("--keep-checkpoints must be at least 1.")
+
+    try:
+        size_before = get_storage_size(args.path)
+        storage.ProjectStorage.compact(
+            args.path,
+            keep_checkpoints=args.keep_checkpoints,
+            merge_logs=merge_logs if args.squash else None)
+        size_after = get_storage_size(args.path)
+    except storage.Error as exc:
+        print("%s: %s" % (args.path, exc), file=sys.stderr)
+        return 1
+
+    print("%s: %d bytes -> %d bytes" % (args.path, size_before, size_after))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -27,7 +27,7 @@ import sys
 import typing
 from typing import (
     cast, overload,
-    Any, Optional, Union,
+    Any, Optional, Union, AbstractSet,
     Iterable, Iterator, MutableMapping, Sequence, MutableSequence, Dict, Type, Generic, TypeVar)
 
 from google.protobuf import message as protobuf
@@ -909,6 +909,20 @@ class ObjectBase(object):
 
         return objtree
 
+    def serialize_delta(
+            self, changed_objects: AbstractSet[int]) -> model_base_pb2.ObjectTreeDelta:
+        """Serialize the objects with the given IDs and the structure of the tree."""
+
+        delta = model_base_pb2.ObjectTreeDelta()
+        delta.root = self.id
+        for obj in self.walk_object_tree():
+            delta.object_ids.append(obj.id)
+            if obj.id in changed_objects:
+                oproto = delta.objects.add()
+                oproto.CopyFrom(obj.proto)
+
+        return delta
+
     def reset_state(self) -> None:
         for prop in self.list_properties():
             if isinstance(prop, ObjectProperty):
@@ -1070,6 +1084,20 @@ class Pool(MutableMapping[int, ObjectBase]):
         self.set_root(self.__obj_map[objtree.root])
         return self.__obj_map[objtree.root]
 
+    def deserialize_tree_delta(
+            self, objtree: model_base_pb2.ObjectTree, delta: model_base_pb2.ObjectTreeDelta
+    ) -> 'ObjectBase':
+        objects = {oproto.id: oproto for oproto in objtree.objects}
+        for oproto in delta.objects:
+            objects[oproto.id] = oproto
+
+        merged = model_base_pb2.ObjectTree()
+        merged.root = delta.root
+        for id in delta.object_ids:
+            merged.objects.add().CopyFrom(objects[id])
+
+        return self.deserialize_tree(merged)
+
     def clone_tree(self, objtree: model_base_pb2.ObjectTree) -> 'ObjectBase':
         idmap = {}  # type: Dict[int, int]
         for oproto in objtree.objects:
@@ -477,6 +477,28 @@ class ObjectTest(unittest.TestCase):
         self.assertIsInstance(serialized, model_base_pb2.ObjectTree)
         self.assertEqual(serialized.root, obj.id)
 
+    def test_serialize_delta(self):
+        obj = self.pool.create(Root, id=100)
+        self.pool.set_root(obj)
+        obj.child_list.append(self.pool.create(Child, id=110))
+        obj.child_list.append(self.pool.create(Child, id=111))
+        base = obj.serialize()
+
+        obj.child_list[0].child = self.pool.create(GrandChild, id=120)
+        del obj.child_list[1]
+
+        delta = obj.serialize_delta({110, 111, 120})
+        self.assertEqual(delta.root, 100)
+        self.assertEqual(list(delta.object_ids), [120, 110, 100])
+        self.assertEqual({o.id for o in delta.objects}, {110, 120})
+
+        pool = Pool()
+        restored = pool.deserialize_tree_delta(base, delta)
+        self.assertEqual(restored.id, 100)
+        self.assertEqual([c.id for c in restored.child_list], [110])
+        self.assertEqual(restored.child_list[0].child.id, 120)
+        self.assertNotIn(111, pool)
+
 
 class PropertyTest(unittest.TestCase):
     def setup_testcase(self):
@@ -24,7 +24,7 @@ import contextlib
 import copy
 import logging
 import typing
-from typing import Any, Generator
+from typing import Any, Dict, Generator, Tuple
 
 from noisicaa import audioproc
 from noisicaa import value_types
@@ -47,6 +47,51 @@ def _assert_equal(a: Any, b: Any) -> None:
     assert a == b, '%r != %r' % (a, b)
 
 
+def merge_mutation_lists(
+        mutation_list_a: mutations_pb2.MutationList,
+        mutation_list_b: mutations_pb2.MutationList
+) -> bool:
+    """Fold mutation_list_b into mutation_list_a, if both only change the same properties.
+
+    Returns False, if the lists can't be merged, and mutation_list_a is left unchanged.
+    """
+
+    k = None  # type: Tuple[Any, ...]
+
+    property_changes_a = {}  # type: Dict[Tuple[Any, ...], int]
+    for op in mutation_list_a.ops:
+        if op.WhichOneof('op') == 'set_property':
+            k = (op.set_property.obj_id, op.set_property.prop_name)
+            property_changes_a[k] = op.set_property.new_slot
+        elif op.WhichOneof('op') == 'list_set':
+            k = (op.list_set.obj_id, op.list_set.prop_name, op.list_set.index)
+            property_changes_a[k] = op.list_set.new_slot
+        else:
+            return False
+
+    property_changes_b = {}  # type: Dict[Tuple[Any, ...], int]
+    for op in mutation_list_b.ops:
+        if op.WhichOneof('op') == 'set_property':
+            k = (op.set_property.obj_id, op.set_property.prop_name)
+            property_changes_b[k] = op.set_property.new_slot
+        elif op.WhichOneof('op') == 'list_set':
+            k = (op.list_set.obj_id, op.list_set.prop_name, op.list_set.index)
+            property_changes_b[k] = op.list_set.new_slot
+        else:
+            return False
+
+    if set(property_changes_a.keys()) != set(property_changes_b.keys()):
+        return False
+
+    for k, slot_idx_a in property_changes_a.items():
+        slot_a = mutation_list_a.slots[slot_idx_a]
+        slot_b = mutation_list_b.slots[property_changes_b[k]]
+        assert slot_a.WhichOneof('value') == slot_b.WhichOneof('value'), (slot_a, slot_b)
+        mutation_list_a.slots[slot_idx_a].CopyFrom(slot_b)
+
+    return True
+
+
 class MutationList(object):
     def __init__(
             self, pool: model_base.Pool, mutation_list: mutations_pb2.MutationList
@@ -25,7 +25,7 @@ import concurrent.futures
 import logging
 import uuid
 import typing
-from typing import Optional, Iterator, Iterable, Dict, Tuple
+from typing import Optional, Iterator, Iterable, Dict, Tuple, List
 
 from noisicaa import core
 from noisicaa.core import ipc
@@ -66,6 +66,7 @@ class Player(object):
         self.callback_stub = None  # type: ipc.Stub
 
         self.__node_connectors = {}  # type: Dict[int, node_connector.NodeConnector]
+        self.__pending_mutations = []  # type: List[audioproc.Mutation]
 
     async def setup(self) -> None:
         logger.info("Setting up player instance %s..", self.id)
@@ -79,8 +80,7 @@ class Player(object):
             self.handle_pipeline_mutation)
 
         logger.info("Populating realm with project state...")
-        for mutation in self.project.get_add_mutations():
-            await self.publish_pipeline_mutation(mutation)
+        await self.publish_pipeline_mutations(list(self.project.get_add_mutations()))
 
         await self.audioproc_client.update_project_properties(
             self.realm,
@@ -180,7 +180,16 @@ class Player(object):
             self.__node_connectors.pop(node.id).cleanup()
 
     def handle_pipeline_mutation(self, mutation: audioproc.Mutation) -> None:
-        self.event_loop.create_task(self.publish_pipeline_mutation(mutation))
+        # A single change to the project often results in several mutations, so collect all
+        # mutations, which happen before the loop gets to publish them, into one batch.
+        self.__pending_mutations.append(mutation)
+        if len(self.__pending_mutations) == 1:
+            self.event_loop.create_task(self.__publish_pending_mutations())
+
+    async def __publish_pending_mutations(self) -> None:
+        mutations = self.__pending_mutations
+        self.__pending_mutations = []
+        await self.publish_pipeline_mutations(mutations)
 
     async def publish_pipeline_mutation(self, mutation: audioproc.Mutation) -> None:
         if self.audioproc_client is None:
@@ -188,6 +197,15 @@ class Player(object):
 
         await self.audioproc_client.pipeline_mutation(self.realm, mutation)
 
+    async def publish_pipeline_mutations(self, mutations: List[audioproc.Mutation]) -> None:
+        if self.audioproc_client is None or not mutations:
+            return
+
+        if len(mutations) == 1:
+            await self.audioproc_client.pipeline_mutation(self.realm, mutations[0])
+        else:
+            await self.audioproc_client.pipeline_mutations(self.realm, mutations)
+
     def send_node_message(self, msg: audioproc.ProcessorMessage) -> None:
         messages = audioproc.ProcessorMessageList()
         messages.messages.extend([msg])
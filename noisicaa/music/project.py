@@ -20,10 +20,12 @@
 #
 # @end:license
 
+import asyncio
 import contextlib
+import functools
 import logging
 import time
-from typing import Any, Optional, Dict, Tuple, Iterator, Generator, Type
+from typing import Any, Optional, Sequence, Set, Tuple, Iterator, Generator, Type
 
 from noisicaa.core.typing_extra import down_cast
 from noisicaa.core import storage
@@ -150,8 +152,8 @@ class BaseProject(_model.Project, model_base.ObjectBase):
     def attached_to_project(self) -> bool:
         return True
 
-    def get_bpm(self, measure_idx: int, tick: int) -> int:  # pylint: disable=unused-argument
-        return self.bpm
+    def get_bpm(self, time: audioproc.MusicalTime) -> int:
+        return self.__time_mapper.bpm_at(time)
 
     @property
     def data_dir(self) -> Optional[str]:
@@ -293,6 +295,8 @@ class Project(BaseProject):
 
         self.__writer = None  # type: writer_client.WriterClient
         self.__logs_since_last_checkpoint = None  # type: int
+        # IDs of all objects, which changed since the last full checkpoint.
+        self.__changed_objects = set()  # type: Set[int]
         self.__latest_mutation_list = None  # type: mutations_pb2.MutationList
         self.__latest_mutation_time = None  # type: float
 
@@ -327,13 +331,20 @@ class Project(BaseProject):
             writer: writer_client.WriterClient,
             node_db: node_db_lib.NodeDBClient
     ) -> 'Project':
-        checkpoint_serialized, actions = await writer.open(path)
+        checkpoint_serialized, checkpoint_delta_serialized, actions = await writer.open(path)
 
         checkpoint = model_base_pb2.ObjectTree()
         checkpoint.MergeFromString(checkpoint_serialized)
 
-        project = pool.deserialize_tree(checkpoint)
-        assert isinstance(project, Project)
+        if checkpoint_delta_serialized is not None:
+            checkpoint_delta = model_base_pb2.ObjectTreeDelta()
+            checkpoint_delta.MergeFromString(checkpoint_delta_serialized)
+            project = pool.deserialize_tree_delta(checkpoint, checkpoint_delta)
+            assert isinstance(project, Project)
+            project.__changed_objects.update(oproto.id for oproto in checkpoint_delta.objects)
+        else:
+            project = pool.deserialize_tree(checkpoint)
+            assert isinstance(project, Project)
 
         project.node_db = node_db
         project.__writer = writer
@@ -348,12 +359,11 @@ class Project(BaseProject):
 
         validate_node(None, project)
 
-        project.__logs_since_last_checkpoint = 0
-        for action, mutation_list_serialized in actions:
-            project.__apply_mutation_list(
-                action,
-                project.deserialize_mutation_list(mutation_list_serialized))
-            project.__logs_since_last_checkpoint += 1
+        logger.info("Replaying %d mutation lists...", len(actions))
+        project.__apply_mutation_lists(
+            [(action, project.deserialize_mutation_list(mutation_list_serialized))
+             for action, mutation_list_serialized in actions])
+        project.__logs_since_last_checkpoint = len(actions)
 
         return project
 
@@ -383,14 +393,50 @@ class Project(BaseProject):
 
         self.reset_state()
         self.__logs_since_last_checkpoint = None
+        self.__changed_objects.clear()
 
         await super().close()
 
     def create_checkpoint(self) -> None:
-        checkpoint_serialized = self.serialize_object(self)
-        self.__writer.write_checkpoint(checkpoint_serialized)
+        if self.__writer.checkpoint_pending:
+            # Try again with the next log.
+            return
+
+        # The checkpoint is serialized in a child process, which works on a snapshot of the
+        # project, so walking a large project does not block the event loop. Objects changed from
+        # now on are tracked separately, until we know, if a full checkpoint has been written.
+        changed_objects = self.__changed_objects
+        self.__changed_objects = set()
+        task = self.__writer.write_checkpoint(
+            functools.partial(self.__serialize_checkpoint, changed_objects))
+        task.add_done_callback(functools.partial(self.__checkpoint_written, changed_objects))
+
         self.__logs_since_last_checkpoint = 0
 
+    def __serialize_checkpoint(self, changed_objects: Set[int]) -> Tuple[bytes, bool]:
+        # Only write a full checkpoint, if a large part of the project changed since the
+        # previous one. Otherwise only the changed objects are written.
+        checkpoint_delta = self.serialize_delta(changed_objects)
+        if len(checkpoint_delta.objects) > len(checkpoint_delta.object_ids) // 2:
+            return self.serialize().SerializeToString(), False
+        return checkpoint_delta.SerializeToString(), True
+
+    def __checkpoint_written(self, changed_objects: Set[int], task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to write checkpoint: %s", task.exception())
+
+        if task.cancelled() or task.exception() is not None or task.result():
+            # Not a full checkpoint, so these objects still differ from the previous one.
+            self.__changed_objects |= changed_objects
+
+    def __track_changed_objects(self, mutation_list: mutations_pb2.MutationList) -> None:
+        for op in mutation_list.ops:
+            op_type = op.WhichOneof('op')
+            if op_type in ('add_object', 'remove_object'):
+                self.__changed_objects.add(getattr(op, op_type).object.id)
+            else:
+                self.__changed_objects.add(getattr(op, op_type).obj_id)
+
     def serialize_object(self, obj: model_base.ObjectBase) -> bytes:
         proto = obj.serialize()
         return proto.SerializeToString()
@@ -412,49 +458,13 @@ class Project(BaseProject):
         if self.__logs_since_last_checkpoint > 1000:
             self.create_checkpoint()
 
-    def __try_merge_mutation_list(self, mutation_list: mutations_pb2.MutationList) -> bool:
-        assert self.__latest_mutation_list is not None
-
-        k = None  # type: Tuple[Any, ...]
-
-        property_changes_a = {}  # type: Dict[Tuple[Any, ...], int]
-        for op in self.__latest_mutation_list.ops:
-            if op.WhichOneof('op') == 'set_property':
-                k = (op.set_property.obj_id, op.set_property.prop_name)
-                property_changes_a[k] = op.set_property.new_slot
-            elif op.WhichOneof('op') == 'list_set':
-                k = (op.list_set.obj_id, op.list_set.prop_name, op.list_set.index)
-                property_changes_a[k] = op.list_set.new_slot
-            else:
-                return False
-
-        property_changes_b = {}  # type: Dict[Tuple[Any, ...], int]
-        for op in mutation_list.ops:
-            if op.WhichOneof('op') == 'set_property':
-                k = (op.set_property.obj_id, op.set_property.prop_name)
-                property_changes_b[k] = op.set_property.new_slot
-            elif op.WhichOneof('op') == 'list_set':
-                k = (op.list_set.obj_id, op.list_set.prop_name, op.list_set.index)
-                property_changes_b[k] = op.list_set.new_slot
-            else:
-                return False
-
-        if set(property_changes_a.keys()) != set(property_changes_b.keys()):
-            return False
-
-        for k, slot_idx_a in property_changes_a.items():
-            slot_a = self.__latest_mutation_list.slots[slot_idx_a]
-            slot_b = mutation_list.slots[property_changes_b[k]]
-            assert slot_a.WhichOneof('value') == slot_b.WhichOneof('value'), (slot_a, slot_b)
-            self.__latest_mutation_list.slots[slot_idx_a].CopyFrom(slot_b)
-
-        return True
-
     def _mutation_list_applied(self, mutation_list: mutations_pb2.MutationList) -> None:
+        self.__track_changed_objects(mutation_list)
         if len(mutation_list.ops) != 0:
             if (self.__latest_mutation_list is None
                     or time.time() - self.__latest_mutation_time > 4
-                    or not self.__try_merge_mutation_list(mutation_list)):
+                    or not mutations.merge_mutation_lists(
+                        self.__latest_mutation_list, mutation_list)):
                 self.__flush_mutations()
                 self.__latest_mutation_list = mutation_list
                 self.__latest_mutation_time = time.time()
@@ -468,14 +478,23 @@ class Project(BaseProject):
             "Apply '%s' (%d operations) %s",
             mutation_list_pb.name, len(mutation_list_pb.ops), action.name)
 
-        mutation_list = mutations.MutationList(self._pool, mutation_list_pb)
+        self.__apply_mutation_lists([(action, mutation_list_pb)])
+
+    def __apply_mutation_lists(
+            self,
+            actions: Sequence[Tuple[storage.Action, mutations_pb2.MutationList]]
+    ) -> None:
         try:
             self._in_mutation = True
-            if action == storage.ACTION_FORWARD:
-                mutation_list.apply_forward()
-            else:
-                assert action == storage.ACTION_BACKWARD
-                mutation_list.apply_backward()
+            for action, mutation_list_pb in actions:
+                self.__track_changed_objects(mutation_list_pb)
+
+                mutation_list = mutations.MutationList(self._pool, mutation_list_pb)
+                if action == storage.ACTION_FORWARD:
+                    mutation_list.apply_forward()
+                else:
+                    assert action == storage.ACTION_BACKWARD
+                    mutation_list.apply_backward()
 
         finally:
             self._in_mutation = False
@@ -20,7 +20,9 @@
 #
 # @end:license
 
+import asyncio
 import builtins
+import time
 from typing import cast
 
 from mox3 import stubout
@@ -167,6 +169,109 @@ class ProjectTest(
         self.assertTrue(
             self.fake_os.path.isfile('/foo/checkpoint.000001'))
 
+    async def test_delta_checkpoint(self):
+        p = await project.Project.create_blank(
+            path='/foo',
+            pool=self.pool,
+            writer=self.writer_client,
+            node_db=self.node_db)
+        try:
+            with p.apply_mutations('test'):
+                p.create_node('builtin://score-track')
+            with p.apply_mutations('test'):
+                p.bpm = p.bpm + 1
+            p.create_checkpoint()
+            with p.apply_mutations('test'):
+                p.bpm = p.bpm + 1
+            num_nodes = len(p.nodes)
+            track_id = p.nodes[-1].id
+            bpm = p.bpm
+        finally:
+            await p.close()
+
+        pool = project.Pool(project_cls=project.Project)
+        p = await project.Project.open(
+            path='/foo',
+            pool=pool,
+            writer=self.writer_client,
+            node_db=self.node_db)
+        try:
+            self.assertEqual(len(p.nodes), num_nodes)
+            self.assertEqual(p.nodes[-1].id, track_id)
+            self.assertEqual(p.bpm, bpm)
+        finally:
+            await p.close()
+
+    async def test_checkpoint_is_snapshot(self):
+        p = await project.Project.create_blank(
+            path='/foo',
+            pool=self.pool,
+            writer=self.writer_client,
+            node_db=self.node_db)
+        try:
+            p.create_checkpoint()
+            # Changes made while the checkpoint is being written are not part of it.
+            with p.apply_mutations('test'):
+                p.create_node('builtin://score-track')
+            num_nodes = len(p.nodes)
+            track_id = p.nodes[-1].id
+        finally:
+            await p.close()
+
+        pool = project.Pool(project_cls=project.Project)
+        p = await project.Project.open(
+            path='/foo',
+            pool=pool,
+            writer=self.writer_client,
+            node_db=self.node_db)
+        try:
+            self.assertEqual(len(p.nodes), num_nodes)
+            self.assertEqual(p.nodes[-1].id, track_id)
+        finally:
+            await p.close()
+
+    async def test_checkpoint_does_not_block_loop(self):
+        p = await project.Project.create_blank(
+            path='/foo',
+            pool=self.pool,
+            writer=self.writer_client,
+            node_db=self.node_db)
+        try:
+            p.nodes.append(self.pool.create(
+                score_track.ScoreTrack, name='Track 1', num_measures=10000))
+
+            # That's how long the event loop would be blocked, if the project was walked in the
+            # event loop.
+            t0 = time.perf_counter()
+            p.serialize_delta(set())
+            walk_time = time.perf_counter() - t0
+
+            max_gap = 0.0
+            async def ticker():
+                nonlocal max_gap
+                prev = time.perf_counter()
+                while True:
+                    await asyncio.sleep(0.001, loop=self.loop)
+                    now = time.perf_counter()
+                    max_gap = max(max_gap, now - prev)
+                    prev = now
+
+            ticker_task = self.loop.create_task(ticker())
+            try:
+                await asyncio.sleep(0.01, loop=self.loop)
+                p.create_checkpoint()
+                await self.writer_client.flush()
+            finally:
+                ticker_task.cancel()
+
+            self.assertLess(max_gap, walk_time / 2)
+
+        finally:
+            await p.close()
+
+        self.assertTrue(
+            self.fake_os.path.isfile('/foo/checkpoint.000001'))
+
     async def test_merge_mutations(self):
         p = await project.Project.create_blank(
             path='/foo.noise',
@@ -415,7 +415,8 @@ class Renderer(object):
             f.result()
 
     async def __setup_callback_stub(self) -> None:
-        self.__callback = ipc.Stub(self.__event_loop, self.__callback_address)
+        self.__callback = ipc.Stub(
+            self.__event_loop, self.__callback_address, shm_size=16 << 20)
         await self.__callback.connect()
 
     async def __data_pump_main(self) -> None:
@@ -23,8 +23,11 @@
 import asyncio
 import functools
 import logging
+import os
+import signal
+import traceback
 import uuid
-from typing import Optional, Dict, List, Tuple
+from typing import Any, Awaitable, Callable, Optional, Dict, List, Tuple, Union
 
 from google.protobuf import message as protobuf
 
@@ -38,9 +41,14 @@ logger = logging.getLogger(__name__)
 class WriterClient(object):
     def __init__(
             self, *,
-            event_loop: asyncio.AbstractEventLoop) -> None:
+            event_loop: asyncio.AbstractEventLoop,
+            sync_policy: storage.SyncPolicy = storage.SyncPolicy.GROUP,
+            group_commit_window: float = 0.02
+    ) -> None:
         super().__init__()
         self.__event_loop = event_loop
+        self.__sync_policy = sync_policy
+        self.__group_commit_window = group_commit_window
 
         self.__stub = None  # type: ipc.Stub
         self.__opened = False
@@ -50,6 +58,9 @@ class WriterClient(object):
         self.__can_redo = None  # type: bool
         self.__pending_writes = {}  # type: Dict[str, asyncio.Task]
         self.__write_queue_empty = asyncio.Event(loop=self.__event_loop)
+        self.__log_queue = []  # type: List[bytes]
+        self.__log_queue_flusher = None  # type: asyncio.Handle
+        self.__checkpoint_pending = False
 
     @property
     def path(self) -> str:
@@ -78,6 +89,8 @@ class WriterClient(object):
     async def setup(self) -> None:
         self.__pending_writes.clear()
         self.__write_queue_empty.clear()
+        self.__log_queue.clear()
+        self.__checkpoint_pending = False
 
     async def cleanup(self) -> None:
         await self.disconnect()
@@ -85,10 +98,22 @@ class WriterClient(object):
     async def connect(self, address: str) -> None:
         assert self.__stub is None
 
-        self.__stub = ipc.Stub(self.__event_loop, address)
+        # Checkpoints are large, pass them through shared memory.
+        self.__stub = ipc.Stub(self.__event_loop, address, shm_size=64 << 20)
         await self.__stub.connect()
 
     async def disconnect(self) -> None:
+        if self.__stub is not None and self.__opened:
+            # Get queued logs to the writer, before the connection goes away.
+            await self.flush()
+
+        if self.__log_queue_flusher is not None:
+            self.__log_queue_flusher.cancel()
+            self.__log_queue_flusher = None
+        if self.__log_queue:
+            logger.warning("Dropping %d unwritten logs.", len(self.__log_queue))
+            self.__log_queue.clear()
+
         if self.__stub is not None:
             await self.__stub.close()
             self.__stub = None
@@ -102,7 +127,8 @@ class WriterClient(object):
 
         request = writer_process_pb2.CreateRequest(
             path=path,
-            initial_checkpoint=initial_checkpoint)
+            initial_checkpoint=initial_checkpoint,
+            sync_policy=self.__sync_policy.value)
         response = writer_process_pb2.CreateResponse()
         await self.__stub.call('CREATE', request, response)
 
@@ -111,11 +137,14 @@ class WriterClient(object):
         self.__data_dir = response.data_dir
         self.__update_storage_state(response.storage_state)
 
-    async def open(self, path: str) -> Tuple[bytes, List[Tuple[storage.Action, bytes]]]:
+    async def open(
+            self, path: str
+    ) -> Tuple[bytes, Optional[bytes], List[Tuple[storage.Action, bytes]]]:
         assert not self.__opened
 
         request = writer_process_pb2.OpenRequest(
-            path=path)
+            path=path,
+            sync_policy=self.__sync_policy.value)
         response = writer_process_pb2.OpenResponse()
         await self.__stub.call('OPEN', request, response)
 
@@ -126,6 +155,7 @@ class WriterClient(object):
 
         return (
             response.checkpoint,
+            response.checkpoint_delta if response.HasField('checkpoint_delta') else None,
             [({writer_process_pb2.Action.FORWARD: storage.ACTION_FORWARD,
                writer_process_pb2.Action.BACKWARD: storage.ACTION_BACKWARD}[action.direction],
               action.data)
@@ -140,6 +170,7 @@ class WriterClient(object):
             self.__data_dir = None
 
     async def flush(self) -> None:
+        self.__flush_log_queue()
         if len(self.__pending_writes) > 0:
             logger.info("Waiting for %d pending writes to complete...", len(self.__pending_writes))
             await self.__write_queue_empty.wait()
@@ -151,11 +182,19 @@ class WriterClient(object):
             request: protobuf.Message,
             response: writer_process_pb2.WriteResponse
     ) -> None:
+        self.__start_write(self.__stub.call(method, request), response)
+
+    def __start_write(
+            self,
+            coroutine: Awaitable[Any],
+            response: writer_process_pb2.WriteResponse
+    ) -> asyncio.Task:
         task_id = uuid.uuid4().hex
-        task = self.__event_loop.create_task(self.__stub.call(method, request))
+        task = self.__event_loop.create_task(coroutine)
         task.add_done_callback(functools.partial(self.__write_done, task_id, response))
         self.__pending_writes[task_id] = task
         self.__write_queue_empty.clear()
+        return task
 
     def __write_done(
             self,
@@ -168,21 +207,129 @@ class WriterClient(object):
         if len(self.__pending_writes) == 0:
             self.__write_queue_empty.set()
 
-    def write_log(self, log: bytes) -> None:
-        assert self.__opened
+    def __flush_log_queue(self) -> None:
+        if self.__log_queue_flusher is not None:
+            self.__log_queue_flusher.cancel()
+            self.__log_queue_flusher = None
+
+        if not self.__log_queue:
+            return
+
+        if self.__checkpoint_pending:
+            # Will be flushed, once the checkpoint has been written.
+            return
 
         request = writer_process_pb2.WriteLogRequest(
-            log=log)
+            logs=self.__log_queue)
         response = writer_process_pb2.WriteResponse()
         self.__write('WRITE_LOG', request, response)
+        self.__log_queue.clear()
+
+    def write_log(self, log: bytes) -> None:
+        assert self.__opened
+
+        # Logs arriving within the group commit window are sent in a single request and written
+        # to disk as a single group.
+        self.__log_queue.append(log)
+        if self.__group_commit_window <= 0:
+            self.__flush_log_queue()
+        elif self.__log_queue_flusher is None:
+            self.__log_queue_flusher = self.__event_loop.call_later(
+                self.__group_commit_window, self.__flush_log_queue)
+
+    @property
+    def checkpoint_pending(self) -> bool:
+        return self.__checkpoint_pending
+
+    def write_checkpoint(
+            self,
+            checkpoint: Union[bytes, Callable[[], Tuple[bytes, bool]]],
+            delta: bool = False
+    ) -> asyncio.Task:
+        """Write a checkpoint.
+
+        checkpoint is either the serialized checkpoint or a function, which returns the serialized
+        checkpoint and whether it is a delta. The function is called in a forked child process,
+        which sees a snapshot of the caller's state as of this call, so the event loop keeps
+        running while a large checkpoint is serialized. Logs written in the meantime are held back
+        until the checkpoint has been written.
+
+        Returns a task, which completes with the delta flag, once the checkpoint has been written.
+        """
 
-    def write_checkpoint(self, checkpoint: bytes) -> None:
         assert self.__opened
+        assert not self.__checkpoint_pending
+
+        # Make sure the checkpoint is written after all preceding logs.
+        self.__flush_log_queue()
 
-        request = writer_process_pb2.WriteCheckpointRequest(
-            checkpoint=checkpoint)
+        data = None  # type: Optional[bytes]
+        serializer = None  # type: Optional[Tuple[int, int]]
+        if callable(checkpoint):
+            serializer = self.__start_serializer(checkpoint)
+        else:
+            data = checkpoint
+
+        self.__checkpoint_pending = True
         response = writer_process_pb2.WriteResponse()
-        self.__write('WRITE_CHECKPOINT', request, response)
+        return self.__start_write(
+            self.__write_checkpoint(data, delta, serializer, response), response)
+
+    def __start_serializer(self, serialize: Callable[[], Tuple[bytes, bool]]) -> Tuple[int, int]:
+        read_fd, write_fd = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            # In child process, which works on a copy of the parent's memory. It must not touch
+            # the event loop or anything else, which is shared with the parent.
+            status = 1
+            try:
+                signal.set_wakeup_fd(-1)
+                os.close(read_fd)
+
+                data, delta = serialize()
+                with os.fdopen(write_fd, 'wb') as fp:
+                    fp.write(b'D' if delta else b'F')
+                    fp.write(data)
+                status = 0
+
+            except:  # pylint: disable=bare-except
+                traceback.print_exc()
+
+            finally:
+                os._exit(status)  # pylint: disable=protected-access
+
+        os.close(write_fd)
+        return pid, read_fd
+
+    async def __read_serializer_result(self, pid: int, read_fd: int) -> Tuple[bytes, bool]:
+        with os.fdopen(read_fd, 'rb') as fp:
+            data = await self.__event_loop.run_in_executor(None, fp.read)
+        _, status = await self.__event_loop.run_in_executor(None, os.waitpid, pid, 0)
+        if status != 0 or not data:
+            raise RuntimeError("Failed to serialize checkpoint (status %d)" % status)
+        return data[1:], data[:1] == b'D'
+
+    async def __write_checkpoint(
+            self,
+            checkpoint: Optional[bytes],
+            delta: bool,
+            serializer: Optional[Tuple[int, int]],
+            response: writer_process_pb2.WriteResponse
+    ) -> bool:
+        try:
+            if serializer is not None:
+                checkpoint, delta = await self.__read_serializer_result(*serializer)
+
+            request = writer_process_pb2.WriteCheckpointRequest(
+                checkpoint=checkpoint,
+                delta=delta)
+            await self.__stub.call('WRITE_CHECKPOINT', request, response)
+            return delta
+
+        finally:
+            self.__checkpoint_pending = False
+            self.__flush_log_queue()
 
     async def undo(self) -> Optional[Tuple[storage.Action, bytes]]:
         assert self.__opened
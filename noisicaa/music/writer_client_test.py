@@ -82,7 +82,99 @@ class WriterClientTestBase(
             await client.close()
 
         async with self.connect_client() as client:
-            checkpoint, actions = await client.open(path)
+            checkpoint, checkpoint_delta, actions = await client.open(path)
             self.assertEqual(checkpoint, b'initial_checkpoint')
+            self.assertIsNone(checkpoint_delta)
             self.assertEqual(actions, [])
             await client.close()
+
+    async def test_group_commit(self):
+        path = self.get_project_path()
+
+        async with self.connect_client() as client:
+            await client.create(path, b'initial_checkpoint')
+            for i in range(10):
+                client.write_log(b'log%d' % i)
+            client.write_checkpoint(b'checkpoint')
+            client.write_log(b'log10')
+            await client.close()
+
+        async with self.connect_client() as client:
+            checkpoint, checkpoint_delta, actions = await client.open(path)
+            self.assertEqual(checkpoint, b'checkpoint')
+            self.assertIsNone(checkpoint_delta)
+            self.assertEqual([data for _, data in actions], [b'log10'])
+            await client.close()
+
+    async def test_delta_checkpoint(self):
+        path = self.get_project_path()
+
+        async with self.connect_client() as client:
+            await client.create(path, b'initial_checkpoint')
+            client.write_log(b'log1')
+            client.write_checkpoint(b'delta1', delta=True)
+            self.assertTrue(client.checkpoint_pending)
+            client.write_log(b'log2')
+            await client.flush()
+            self.assertFalse(client.checkpoint_pending)
+            client.write_checkpoint(b'delta2', delta=True)
+            client.write_log(b'log3')
+            await client.close()
+
+        async with self.connect_client() as client:
+            checkpoint, checkpoint_delta, actions = await client.open(path)
+            self.assertEqual(checkpoint, b'initial_checkpoint')
+            self.assertEqual(checkpoint_delta, b'delta2')
+            self.assertEqual([data for _, data in actions], [b'log3'])
+            await client.close()
+
+    async def test_serialized_checkpoint(self):
+        path = self.get_project_path()
+
+        async with self.connect_client() as client:
+            await client.create(path, b'initial_checkpoint')
+            client.write_log(b'log1')
+            task = client.write_checkpoint(lambda: (b'delta1', True))
+            self.assertTrue(client.checkpoint_pending)
+            client.write_log(b'log2')
+            await client.flush()
+            self.assertTrue(task.result())
+            await client.close()
+
+        async with self.connect_client() as client:
+            checkpoint, checkpoint_delta, actions = await client.open(path)
+            self.assertEqual(checkpoint, b'initial_checkpoint')
+            self.assertEqual(checkpoint_delta, b'delta1')
+            self.assertEqual([data for _, data in actions], [b'log2'])
+            await client.close()
+
+    async def test_disconnect_flushes_logs(self):
+        path = self.get_project_path()
+
+        client = writer_client.WriterClient(event_loop=self.loop, group_commit_window=60.0)
+        await client.setup()
+        await client.connect(self.writer_address)
+        try:
+            await client.create(path, b'initial_checkpoint')
+            client.write_log(b'log1')
+            client.write_log(b'log2')
+        finally:
+            await client.disconnect()
+            await client.cleanup()
+
+        # Restart the writer, so the project gets closed.
+        await self.process_manager_client.call(
+            'SHUTDOWN_PROCESS',
+            editor_main_pb2.ShutdownProcessRequest(
+                address=self.writer_address))
+        self.writer_address = None
+        create_process_response = editor_main_pb2.CreateProcessResponse()
+        await self.process_manager_client.call(
+            'CREATE_WRITER_PROCESS',
+            None, create_process_response)
+        self.writer_address = create_process_response.address
+
+        async with self.connect_client() as client:
+            _, _, actions = await client.open(path)
+            self.assertEqual([data for _, data in actions], [b'log1', b'log2'])
+            await client.close()
@@ -85,7 +85,8 @@ class WriterProcess(core.ProcessBase):
     ) -> None:
         assert self.__storage is None
 
-        self.__storage = storage.ProjectStorage.create(request.path)
+        self.__storage = storage.ProjectStorage.create(
+            request.path, sync_policy=storage.SyncPolicy(request.sync_policy))
         response.data_dir = self.__storage.path
         self.__storage.add_checkpoint(request.initial_checkpoint)
 
@@ -98,16 +99,20 @@ class WriterProcess(core.ProcessBase):
     ) -> None:
         assert self.__storage is None
 
-        self.__storage = storage.ProjectStorage()
+        self.__storage = storage.ProjectStorage(
+            sync_policy=storage.SyncPolicy(request.sync_policy))
         self.__storage.open(request.path)
         response.data_dir = self.__storage.path
 
         checkpoint_number, actions = self.__storage.get_restore_info()
 
-        response.checkpoint = self.__storage.get_checkpoint(checkpoint_number)
+        checkpoints = self.__storage.get_checkpoint_chain(checkpoint_number)
+        response.checkpoint = checkpoints[0]
+        if len(checkpoints) > 1:
+            response.checkpoint_delta = checkpoints[1]
 
-        for action, log_number in actions:
-            sequence_data = self.__storage.get_log_entry(log_number)
+        log_entries = self.__storage.get_log_entries([log_number for _, log_number in actions])
+        for (action, _), sequence_data in zip(actions, log_entries):
             response.actions.add(
                 direction={
                     storage.ACTION_FORWARD: writer_process_pb2.Action.FORWARD,
@@ -133,7 +138,9 @@ class WriterProcess(core.ProcessBase):
     ) -> Any:
         assert self.__storage is not None
 
-        self.__storage.append_log_entry(request.log)
+        with self.__storage.group_commit():
+            for log in request.logs:
+                self.__storage.append_log_entry(log)
 
         response.storage_state.CopyFrom(self.__get_storage_state())
 
@@ -144,7 +151,7 @@ class WriterProcess(core.ProcessBase):
     ) -> Any:
         assert self.__storage is not None
 
-        self.__storage.add_checkpoint(request.checkpoint)
+        self.__storage.add_checkpoint(request.checkpoint, delta=request.delta)
 
         response.storage_state.CopyFrom(self.__get_storage_state())
 
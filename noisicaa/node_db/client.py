@@ -92,6 +92,8 @@ class NodeDBClient(object):
         if request.WhichOneof('type') == 'add_node':
             assert request.add_node.uri not in self.__nodes
             self.__nodes[request.add_node.uri] = request.add_node
+        elif request.WhichOneof('type') == 'remove_node':
+            del self.__nodes[request.remove_node]
         else:
             raise ValueError(request)
 
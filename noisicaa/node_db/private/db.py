@@ -20,23 +20,56 @@
 #
 # @end:license
 
+import asyncio
 import logging
-from typing import Iterator, Dict
+import os
+import os.path
+import pickle
+import queue
+import sys
+import threading
+from typing import cast, Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+from noisicaa import core
 from noisicaa import node_db
 
 from . import csound_scanner
 from . import builtin_scanner
 from . import ladspa_scanner
 from . import lv2_scanner
+from . import scanner
+from . import scanner_pool
 #from . import preset_scanner
 
 logger = logging.getLogger(__name__)
 
 
+# stamp, node descriptions, error
+SourceEntry = Tuple[Any, List[node_db.NodeDescription], Optional[str]]
+# scanner name -> source path -> entry
+Sources = Dict[str, Dict[str, SourceEntry]]
+# scanner name, source path
+SourceKey = Tuple[str, str]
+
+
 class NodeDB(object):
-    def __init__(self) -> None:
+    VERSION = 2
+
+    def __init__(
+            self, event_loop: asyncio.AbstractEventLoop, cache_dir: Optional[str] = None
+    ) -> None:
+        self.__mutation_listeners = core.Callback[node_db.Mutation]()
+
+        self.__event_loop = event_loop
+        self.__cache_dir = cache_dir
+
         self.__nodes = {}  # type: Dict[str, node_db.NodeDescription]
+        self.__node_sources = {}  # type: Dict[str, SourceKey]
+        self.__builtin_nodes = []  # type: List[node_db.NodeDescription]
+        self.__sources = {}  # type: Sources
+        self.__scan_thread = None  # type: threading.Thread
+        self.__scan_commands = queue.Queue()  # type: queue.Queue
+        self.__stopping = threading.Event()  # type: threading.Event
 
     def __getitem__(self, uri: str) -> node_db.NodeDescription:
         return self.get_node_description(uri)
@@ -46,18 +79,34 @@ class NodeDB(object):
         desc.CopyFrom(self.__nodes[uri])
         return desc
 
+    def add_mutation_listener(
+            self, callback: Callable[[node_db.Mutation], None]) -> core.Listener:
+        return self.__mutation_listeners.add(callback)
+
     def setup(self) -> None:
-        scanners = [
-            csound_scanner.CSoundScanner(),
-            builtin_scanner.BuiltinScanner(),
-            ladspa_scanner.LadspaScanner(),
-            lv2_scanner.LV2Scanner(),
-        ]
-        for scanner in scanners:
-            for node_description in scanner.scan():
-                logger.debug("%s", node_description)
-                assert node_description.uri not in self.__nodes
-                self.__nodes[node_description.uri] = node_description
+        # Builtin nodes are defined by the code and not read from disk, so there's nothing to
+        # cache about them.
+        self.__builtin_nodes = list(builtin_scanner.BuiltinScanner().scan())
+
+        cached_sources = None  # type: Sources
+        if self.__cache_dir is not None:
+            if not os.path.isdir(self.__cache_dir):
+                os.makedirs(self.__cache_dir)
+            cached_sources = self.__load_cache()
+
+        if cached_sources is not None:
+            logger.info("Loaded cached node database.")
+            self.__sources = cached_sources
+            for _, scanner_sources in sorted(self.__sources.items()):
+                for path, (stamp, _, error) in sorted(scanner_sources.items()):
+                    if error is not None and stamp is not None:
+                        logger.warning("%s is quarantined: %s", path, error)
+        else:
+            logger.info("Scanning all nodes...")
+            self.__sources = self.__scan_sources({})
+            self.__store_cache(self.__sources)
+
+        self.__nodes, self.__node_sources = self.__collect_nodes(self.__sources)
 
         # scanner = preset_scanner.PresetScanner(self.__nodes)
         # presets = {}
@@ -66,12 +115,240 @@ class NodeDB(object):
         #     presets[uri] = preset_description
         # self.__nodes.update(presets)
 
+        self.__scan_thread = threading.Thread(target=self.__scan_main)
+        self.__scan_thread.start()
+
+        if cached_sources is not None:
+            # Pick up anything, which changed since the cache was written, in the background.
+            self.start_scan()
+
     def cleanup(self) -> None:
-        pass
+        if self.__scan_thread is not None:
+            self.__scan_commands.put(('STOP',))
+            self.__stopping.set()
+            self.__scan_thread.join()
+            self.__scan_thread = None
 
     def initial_mutations(self) -> Iterator[node_db.Mutation]:
         for _, node_description in sorted(self.__nodes.items()):
             yield node_db.Mutation(add_node=node_description)
 
     def start_scan(self) -> None:
-        pass
+        self.__scan_commands.put(('SCAN',))
+
+    @property
+    def __cache_path(self) -> str:
+        return os.path.join(self.__cache_dir, 'node_db.cache')
+
+    def __load_cache(self) -> Optional[Sources]:
+        path = self.__cache_path
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, 'rb') as fp:
+                cached = pickle.load(fp)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to read node database cache %s: %s", path, exc)
+            return None
+
+        if not isinstance(cached, dict):
+            return None
+
+        if cached.get('version', -1) != self.VERSION:
+            return None
+
+        return cast(Sources, cached.get('data', None))
+
+    def __store_cache(self, sources: Sources) -> None:
+        if self.__cache_dir is None:
+            return
+
+        cached = {
+            'version': self.VERSION,
+            'data': sources,
+        }
+
+        path = self.__cache_path
+        with open(path + '.new', 'wb') as fp:
+            pickle.dump(cached, fp)
+
+        os.replace(path + '.new', path)
+
+    def __create_scanners(self) -> Dict[str, scanner.Scanner]:
+        return {
+            'csound': csound_scanner.CSoundScanner(),
+            'ladspa': ladspa_scanner.LadspaScanner(),
+            'lv2': lv2_scanner.LV2Scanner(),
+        }
+
+    def __scan_sources(
+            self,
+            old_sources: Sources,
+            update_callback: Optional[Callable[[str, str, SourceEntry], None]] = None
+    ) -> Sources:
+        pool = scanner_pool.ScannerPool(self.__stopping)
+
+        num_scanned = 0
+        num_cached = 0
+        sources = {}  # type: Sources
+        for name, sc in sorted(self.__create_scanners().items()):
+            old = old_sources.get(name, {})
+            new = sources[name] = {}
+            stamps = {}  # type: Dict[str, Any]
+            for path in sc.list_sources():
+                if self.__stopping.is_set():
+                    raise scanner.ScanAborted
+
+                try:
+                    stamp = sc.get_stamp(path)
+                except OSError as exc:
+                    logger.warning("Failed to stat %s: %s", path, exc)
+                    continue
+
+                # This also skips quarantined sources, until they are modified.
+                if path in old and old[path][0] == stamp:
+                    new[path] = old[path]
+                    num_cached += 1
+                    continue
+
+                stamps[path] = stamp
+
+            if sc.sandboxed:
+                results = pool.scan(sc, sorted(stamps))  # type: Iterator[scanner_pool.ScanResult]
+            else:
+                results = (
+                    (path, list(sc.scan_source(path)), None, False) for path in sorted(stamps))
+
+            for path, node_descriptions, error, transient in results:
+                stamp = stamps[path]
+                if error is not None and transient:
+                    logger.warning("Failed to scan %s, retrying on next scan: %s", path, error)
+                    # Does not match any real stamp, so the source is scanned again next time.
+                    stamp = None
+                elif error is not None:
+                    logger.warning("Failed to scan %s, quarantining it: %s", path, error)
+                else:
+                    logger.info("Scanned %s.", path)
+
+                entry = (stamp, node_descriptions, error)
+                new[path] = entry
+                num_scanned += 1
+
+                if update_callback is not None:
+                    update_callback(name, path, entry)
+
+        logger.info("%d sources scanned, %d sources unchanged.", num_scanned, num_cached)
+        return sources
+
+    def __collect_nodes(
+            self, sources: Sources
+    ) -> Tuple[Dict[str, node_db.NodeDescription], Dict[str, SourceKey]]:
+        nodes = {}  # type: Dict[str, node_db.NodeDescription]
+        node_sources = {}  # type: Dict[str, SourceKey]
+        for node_description in self.__builtin_nodes:
+            assert node_description.uri not in nodes
+            nodes[node_description.uri] = node_description
+
+        for name, scanner_sources in sorted(sources.items()):
+            for path, (_, node_descriptions, _) in sorted(scanner_sources.items()):
+                for node_description in node_descriptions:
+                    logger.debug("%s", node_description)
+                    uri = node_description.uri
+                    if uri in nodes:
+                        logger.warning(
+                            "Ignoring %s from %s, already defined by %s.",
+                            uri, path, node_sources.get(uri, ('builtin', 'builtin'))[1])
+                        continue
+                    nodes[uri] = node_description
+                    node_sources[uri] = (name, path)
+
+        return nodes, node_sources
+
+    def __scan_main(self) -> None:
+        try:
+            while not self.__stopping.is_set():
+                cmd, *args = self.__scan_commands.get()
+                if cmd == 'STOP':
+                    break
+                elif cmd == 'SCAN':
+                    self.__do_scan(*args)
+                else:
+                    raise ValueError(cmd)
+
+        except:  # pylint: disable=bare-except
+            sys.stdout.flush()
+            sys.excepthook(*sys.exc_info())
+            sys.stderr.flush()
+            os._exit(1)  # pylint: disable=protected-access
+
+    def __do_scan(self) -> None:
+        def update_callback(name: str, path: str, entry: SourceEntry) -> None:
+            self.__event_loop.call_soon_threadsafe(self.__update_source, name, path, entry)
+
+        try:
+            sources = self.__scan_sources(self.__sources, update_callback)
+        except scanner.ScanAborted:
+            logger.warning("Scan was aborted.")
+            return
+
+        self.__store_cache(sources)
+        self.__event_loop.call_soon_threadsafe(self.__finish_scan, sources)
+
+    def __publish_mutations(self, mutations: List[node_db.Mutation]) -> None:
+        for mutation in mutations:
+            self.__mutation_listeners.call(mutation)
+
+    def __remove_source_node(
+            self, uri: str, source: SourceKey, mutations: List[node_db.Mutation]) -> None:
+        # A node might have moved to another source (e.g. a renamed LV2 bundle), which has already
+        # been scanned. Then it must not be removed along with the old source.
+        if self.__node_sources.get(uri) != source:
+            return
+
+        mutations.append(node_db.Mutation(remove_node=uri))
+        del self.__nodes[uri]
+        del self.__node_sources[uri]
+
+    def __update_source(self, name: str, path: str, entry: SourceEntry) -> None:
+        source = (name, path)
+        old_entry = self.__sources.get(name, {}).get(path)
+        old_nodes = {desc.uri: desc for desc in old_entry[1]} if old_entry is not None else {}
+        new_nodes = {desc.uri: desc for desc in entry[1]}
+
+        mutations = []  # type: List[node_db.Mutation]
+        for uri, node_description in sorted(old_nodes.items()):
+            if uri not in new_nodes or new_nodes[uri] != node_description:
+                self.__remove_source_node(uri, source, mutations)
+        for uri, node_description in sorted(new_nodes.items()):
+            if self.__node_sources.get(uri) == source and old_nodes.get(uri) == node_description:
+                continue
+
+            if uri in self.__nodes:
+                if uri not in self.__node_sources:
+                    logger.warning("Ignoring %s from %s, which is a builtin node.", uri, path)
+                    continue
+                logger.info(
+                    "%s moved from %s to %s.", uri, self.__node_sources[uri][1], path)
+                mutations.append(node_db.Mutation(remove_node=uri))
+
+            mutations.append(node_db.Mutation(add_node=node_description))
+            self.__nodes[uri] = node_description
+            self.__node_sources[uri] = source
+
+        self.__sources.setdefault(name, {})[path] = entry
+        self.__publish_mutations(mutations)
+
+    def __finish_scan(self, sources: Sources) -> None:
+        # All new and modified sources have been handled by __update_source(), so only remove
+        # the ones, which have disappeared.
+        mutations = []  # type: List[node_db.Mutation]
+        for name, scanner_sources in sorted(self.__sources.items()):
+            for path, (_, node_descriptions, _) in sorted(scanner_sources.items()):
+                if path not in sources.get(name, {}):
+                    for node_description in node_descriptions:
+                        self.__remove_source_node(node_description.uri, (name, path), mutations)
+
+        self.__sources = sources
+        logger.info("Node database scan completed.")
+        self.__publish_mutations(mutations)
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# @end:license
+
+
+import asyncio
+import logging
+import os.path
+import pickle
+import uuid
+
+from noisidev import unittest
+from noisicaa.constants import TEST_OPTS
+from . import db
+
+logger = logging.getLogger(__name__)
+
+
+class NodeDBTest(unittest.AsyncTestCase):
+    def setup_testcase(self):
+        self.cache_dir = os.path.join(TEST_OPTS.TMP_DIR, 'node_db-%s' % uuid.uuid4().hex)
+
+    def get_initial_nodes(self, nodedb):
+        return {
+            mutation.add_node.uri: mutation.add_node
+            for mutation in nodedb.initial_mutations()}
+
+    async def test_no_cache(self):
+        nodedb = db.NodeDB(self.loop)
+        try:
+            nodedb.setup()
+            self.assertIn('builtin://sink', self.get_initial_nodes(nodedb))
+        finally:
+            nodedb.cleanup()
+
+    async def test_cache(self):
+        nodedb = db.NodeDB(self.loop, self.cache_dir)
+        try:
+            nodedb.setup()
+            nodes = self.get_initial_nodes(nodedb)
+        finally:
+            nodedb.cleanup()
+
+        cache_path = os.path.join(self.cache_dir, 'node_db.cache')
+        self.assertTrue(os.path.isfile(cache_path))
+
+        # Modify a cached node and its stamp, so it looks like its source was changed after the
+        # cache was written.
+        with open(cache_path, 'rb') as fp:
+            cached = pickle.load(fp)
+        path, (_, node_descriptions, _) = sorted(cached['data']['csound'].items())[0]
+        uri = node_descriptions[0].uri
+        node_descriptions[0].display_name = 'Stale'
+        cached['data']['csound'][path] = ((0, 0), node_descriptions, None)
+        with open(cache_path, 'wb') as fp:
+            pickle.dump(cached, fp)
+
+        mutations = []
+        updated = asyncio.Event(loop=self.loop)
+        def mutation_listener(mutation):
+            mutations.append(mutation)
+            if mutation.WhichOneof('type') == 'add_node':
+                updated.set()
+
+        nodedb = db.NodeDB(self.loop, self.cache_dir)
+        nodedb.add_mutation_listener(mutation_listener)
+        try:
+            nodedb.setup()
+
+            # The cached description is used at first...
+            cached_nodes = self.get_initial_nodes(nodedb)
+            self.assertEqual(set(cached_nodes), set(nodes))
+            self.assertEqual(cached_nodes[uri].display_name, 'Stale')
+
+            # ... and then replaced by the background scan.
+            await asyncio.wait_for(updated.wait(), 60, loop=self.loop)
+            self.assertEqual(
+                [mutation.WhichOneof('type') for mutation in mutations],
+                ['remove_node', 'add_node'])
+            self.assertEqual(mutations[0].remove_node, uri)
+            self.assertEqual(mutations[1].add_node, nodes[uri])
+            self.assertEqual(nodedb[uri], nodes[uri])
+
+        finally:
+            nodedb.cleanup()
+
+    async def test_node_moved_to_other_source(self):
+        nodedb = db.NodeDB(self.loop, self.cache_dir)
+        try:
+            nodedb.setup()
+            nodes = self.get_initial_nodes(nodedb)
+        finally:
+            nodedb.cleanup()
+
+        # Pretend, that a node was defined by another source (e.g. an LV2 bundle, which has
+        # since been renamed), when the cache was written.
+        cache_path = os.path.join(self.cache_dir, 'node_db.cache')
+        with open(cache_path, 'rb') as fp:
+            cached = pickle.load(fp)
+        path, entry = sorted(cached['data']['csound'].items())[0]
+        uri = entry[1][0].uri
+        old_path = '/does/not/exist/' + os.path.basename(path)
+        del cached['data']['csound'][path]
+        cached['data']['csound'][old_path] = entry
+        with open(cache_path, 'wb') as fp:
+            pickle.dump(cached, fp)
+
+        mutations = []
+        nodedb = db.NodeDB(self.loop, self.cache_dir)
+        nodedb.add_mutation_listener(mutations.append)
+        try:
+            nodedb.setup()
+
+            # Wait until the background scan has written the updated cache.
+            for _ in range(600):
+                with open(cache_path, 'rb') as fp:
+                    cached = pickle.load(fp)
+                if old_path not in cached['data']['csound']:
+                    break
+                await asyncio.sleep(0.1, loop=self.loop)
+            else:
+                self.fail("Scan did not complete.")
+            await asyncio.sleep(0.1, loop=self.loop)
+
+            self.assertEqual(
+                [(mutation.WhichOneof('type'), mutation.remove_node or mutation.add_node.uri)
+                 for mutation in mutations],
+                [('remove_node', uri), ('add_node', uri)])
+            self.assertEqual(nodedb[uri], nodes[uri])
+            self.assertEqual(self.get_initial_nodes(nodedb), nodes)
+
+        finally:
+            nodedb.cleanup()
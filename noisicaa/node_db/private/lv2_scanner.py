@@ -21,7 +21,9 @@
 # @end:license
 
 import logging
-from typing import Iterator
+import os
+import os.path
+from typing import Any, Dict, Iterator, List
 
 from noisicaa import node_db
 from noisicaa import lv2
@@ -41,14 +43,49 @@ supported_uis = {
 
 
 class LV2Scanner(scanner.Scanner):
-    def scan(self) -> Iterator[node_db.NodeDescription]:
-        world = lilv.World()
-        ns = world.ns
-        world.load_all()
-
-        plugins = world.get_all_plugins()
-
-        for plugin in plugins:
+    sandboxed = True
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.__world = None  # type: lilv.World
+        self.__bundles = None  # type: Dict[str, List[lilv.Plugin]]
+
+    def __load_world(self) -> None:
+        if self.__world is not None:
+            return
+
+        # This only reads the manifests of all bundles, the plugin data is loaded lazily when it
+        # is first queried.
+        self.__world = lilv.World()
+        self.__world.load_all()
+
+        self.__bundles = {}
+        for plugin in self.__world.get_all_plugins():
+            self.__bundles.setdefault(plugin.bundle_path, []).append(plugin)
+
+    def list_sources(self) -> Iterator[str]:
+        self.__load_world()
+        yield from sorted(self.__bundles)
+
+    def get_stamp(self, path: str) -> Any:
+        # The mtime of the bundle directory does not change, when a file in it is modified.
+        mtime = os.stat(path).st_mtime_ns
+        size = 0
+        num_files = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                st = os.stat(os.path.join(dirpath, filename))
+                mtime = max(mtime, st.st_mtime_ns)
+                size += st.st_size
+                num_files += 1
+        return (mtime, size, num_files)
+
+    def scan_source(self, path: str) -> Iterator[node_db.NodeDescription]:
+        self.__load_world()
+        ns = self.__world.ns
+
+        for plugin in self.__bundles.get(path, []):
             logger.info("Adding LV2 plugin %s", plugin.get_uri())
 
             desc = node_db.NodeDescription()
@@ -20,13 +20,34 @@
 #
 # @end:license
 
-from typing import Iterator
+import os
+from typing import Any, Iterator
 from noisicaa import node_db
 
 
+class ScanAborted(Exception):
+    pass
+
+
 class Scanner(object):
+    # Scan sources in separate processes, because they run third party code.
+    sandboxed = False
+
     def __init__(self) -> None:
         pass
 
-    def scan(self) -> Iterator[node_db.NodeDescription]:
+    def list_sources(self) -> Iterator[str]:
+        """Yields the paths of all files or directories, which provide nodes."""
         raise NotImplementedError
+
+    def get_stamp(self, path: str) -> Any:
+        """Returns a value, which changes whenever the source at path is modified."""
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def scan_source(self, path: str) -> Iterator[node_db.NodeDescription]:
+        raise NotImplementedError
+
+    def scan(self) -> Iterator[node_db.NodeDescription]:
+        for path in self.list_sources():
+            yield from self.scan_source(path)
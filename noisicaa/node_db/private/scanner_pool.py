@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# @end:license
+
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from noisicaa import node_db
+
+from . import scanner
+
+logger = logging.getLogger(__name__)
+
+
+# path, node descriptions, error, transient
+# A transient error (e.g. a timeout, which could just be caused by a heavily loaded system) might
+# not happen again, when the source is scanned another time.
+ScanResult = Tuple[str, List[node_db.NodeDescription], Optional[str], bool]
+
+
+def _worker_main(sc: scanner.Scanner, path: str, conn: Any) -> None:
+    try:
+        try:
+            result = ('ok', [desc.SerializePartialToString() for desc in sc.scan_source(path)])
+        except Exception as exc:  # pylint: disable=broad-except
+            result = ('error', '%s: %s' % (type(exc).__name__, exc))
+        conn.send(result)
+        conn.close()
+
+    finally:
+        # Do not run any cleanup inherited from the parent process.
+        os._exit(0)  # pylint: disable=protected-access
+
+
+class ScannerPool(object):
+    """Scans sources in short-lived worker processes.
+
+    Each source is scanned in its own process, which is forked from the calling process (so
+    scanners can share state, which they set up in list_sources()). A plugin, which crashes or
+    hangs, only takes its worker down and is reported as an error.
+    """
+
+    def __init__(
+            self,
+            stopping: threading.Event,
+            num_workers: Optional[int] = None,
+            timeout: float = 30.0
+    ) -> None:
+        self.__stopping = stopping
+        self.__num_workers = num_workers or os.cpu_count() or 1
+        self.__timeout = timeout
+        self.__mp = multiprocessing.get_context('fork')
+
+    def scan(self, sc: scanner.Scanner, paths: List[str]) -> Iterator[ScanResult]:
+        """Yields the results for all paths, in the order in which they complete."""
+
+        pending = list(reversed(paths))
+        running = {}  # type: Dict[Any, Tuple[multiprocessing.process.BaseProcess, str, float]]
+        try:
+            while pending or running:
+                if self.__stopping.is_set():
+                    raise scanner.ScanAborted
+
+                while pending and len(running) < self.__num_workers:
+                    path = pending.pop()
+                    recv_conn, send_conn = self.__mp.Pipe(duplex=False)
+                    proc = self.__mp.Process(
+                        target=_worker_main, args=(sc, path, send_conn), daemon=True)
+                    proc.start()
+                    send_conn.close()
+                    running[recv_conn] = (proc, path, time.monotonic() + self.__timeout)
+
+                next_deadline = min(deadline for _, _, deadline in running.values())
+                ready = multiprocessing.connection.wait(
+                    list(running), timeout=max(0.0, min(next_deadline - time.monotonic(), 0.5)))
+
+                for conn in ready:
+                    proc, path, _ = running.pop(conn)
+                    yield self.__collect(proc, path, conn)
+
+                now = time.monotonic()
+                for conn, (proc, path, deadline) in list(running.items()):
+                    if now >= deadline:
+                        del running[conn]
+                        self.__kill(proc)
+                        conn.close()
+                        yield (path, [], "Timed out after %.0fs" % self.__timeout, True)
+
+        finally:
+            for conn, (proc, _, _) in running.items():
+                self.__kill(proc)
+                conn.close()
+
+    def __collect(
+            self, proc: multiprocessing.process.BaseProcess, path: str, conn: Any
+    ) -> ScanResult:
+        try:
+            status, data = conn.recv()
+        except EOFError:
+            proc.join()
+            return (path, [], "Worker crashed with exit code %s" % proc.exitcode, False)
+        finally:
+            conn.close()
+
+        proc.join()
+
+        if status != 'ok':
+            return (path, [], data, False)
+
+        descriptions = []
+        for serialized in data:
+            desc = node_db.NodeDescription()
+            desc.MergeFromString(serialized)
+            descriptions.append(desc)
+        return (path, descriptions, None, False)
+
+    def __kill(self, proc: multiprocessing.process.BaseProcess) -> None:
+        try:
+            os.kill(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.join()
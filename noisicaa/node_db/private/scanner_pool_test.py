@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+# @begin:license
+#
+# Copyright (c) 2015-2019, Benjamin Niemann <pink@odahoda.de>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# @end:license
+
+import os
+import signal
+import threading
+import time
+
+from noisidev import unittest
+from noisicaa import node_db
+from . import scanner
+from . import scanner_pool
+
+
+class TestScanner(scanner.Scanner):
+    sandboxed = True
+
+    def scan_source(self, path):
+        if path == 'crash':
+            os.kill(os.getpid(), signal.SIGSEGV)
+        elif path == 'hang':
+            time.sleep(100)
+        elif path == 'error':
+            raise ValueError("Broken plugin")
+
+        for idx in (1, 2):
+            yield node_db.NodeDescription(
+                uri='test://%s/%d' % (path, idx),
+                type=node_db.NodeDescription.PLUGIN)
+
+
+class ScannerPoolTest(unittest.TestCase):
+    def test_scan(self):
+        pool = scanner_pool.ScannerPool(threading.Event(), num_workers=2, timeout=2.0)
+        results = {
+            path: (sorted(desc.uri for desc in descs), error, transient)
+            for path, descs, error, transient in pool.scan(
+                TestScanner(), ['ok1', 'crash', 'hang', 'error', 'ok2'])}
+
+        self.assertEqual(results['ok1'], (['test://ok1/1', 'test://ok1/2'], None, False))
+        self.assertEqual(results['ok2'], (['test://ok2/1', 'test://ok2/2'], None, False))
+        self.assertEqual(results['crash'][0], [])
+        self.assertIn("crashed", results['crash'][1])
+        self.assertFalse(results['crash'][2])
+        self.assertEqual(results['hang'][0], [])
+        self.assertIn("Timed out", results['hang'][1])
+        self.assertTrue(results['hang'][2])
+        self.assertEqual(results['error'], ([], "ValueError: Broken plugin", False))
+
+    def test_abort(self):
+        stopping = threading.Event()
+        pool = scanner_pool.ScannerPool(stopping, num_workers=1)
+        results = pool.scan(TestScanner(), ['ok', 'hang', 'ok2'])
+        self.assertEqual(next(results)[0], 'ok')
+        stopping.set()
+        with self.assertRaises(scanner.ScanAborted):
+            next(results)
@@ -23,6 +23,7 @@
 import logging
 from typing import Any
 
+from noisicaa import constants
 from noisicaa import core
 from noisicaa.core import empty_message_pb2
 from noisicaa.core import ipc
@@ -45,12 +46,15 @@ class Session(ipc.CallbackSessionMixin, ipc.Session):
 class NodeDBProcess(core.ProcessBase):
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
-        self.__db = db.NodeDB()
+        self.__db = None  # type: db.NodeDB
         self.__main_endpoint = None  # type: ipc.ServerEndpointWithSessions[Session]
 
     async def setup(self) -> None:
         await super().setup()
+
+        self.__db = db.NodeDB(self.event_loop, constants.CACHE_DIR)
         self.__db.setup()
+        self.__db.add_mutation_listener(self.publish_mutation)
 
         self.__main_endpoint = ipc.ServerEndpointWithSessions(
             'main', Session,
@@ -61,7 +65,10 @@ class NodeDBProcess(core.ProcessBase):
         await self.server.add_endpoint(self.__main_endpoint)
 
     async def cleanup(self) -> None:
-        self.__db.cleanup()
+        if self.__db is not None:
+            self.__db.cleanup()
+            self.__db = None
+
         await super().cleanup()
 
     def publish_mutation(self, mutation: node_db_pb2.Mutation) -> None:
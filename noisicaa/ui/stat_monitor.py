@@ -51,6 +51,7 @@ class StatGraph(QtWidgets.QWidget):
         self.__compiled_expression = None
         self.__id = uuid.uuid4().hex
         self.__timeseries_set = None
+        self.__generation = 0
 
     def id(self):
         return self.__id
@@ -71,12 +72,28 @@ class StatGraph(QtWidgets.QWidget):
     def setExpression(self, expr, compiled):
         self.__expression = expr
         self.__compiled_expression = compiled
+        self.__timeseries_set = None
+        self.__generation += 1
 
     def is_valid(self):
         return self.__compiled_expression is not None
 
-    def setTimeseriesSet(self, ts_set):
-        self.__timeseries_set = ts_set
+    def generation(self):
+        return self.__generation
+
+    def latestTimestamps(self):
+        # Per series, because series from different processes do not arrive in timestamp order.
+        if self.__timeseries_set is None:
+            return None
+        return {
+            name: ts.latest().timestamp
+            for name, ts in self.__timeseries_set.items()
+            if len(ts) > 0}
+
+    def addTimeseriesSet(self, ts_set):
+        if self.__timeseries_set is None:
+            self.__timeseries_set = stats.TimeseriesSet()
+        self.__timeseries_set.merge(ts_set)
         self.update()
 
     def mousePressEvent(self, evt):
@@ -110,9 +127,9 @@ class StatGraph(QtWidgets.QWidget):
             for _, ts in self.__timeseries_set.items():
                 px = None  # type: int
                 py = None  # type: int
-                for idx, value in enumerate(ts):
+                for idx, value in enumerate(ts.values().tolist()):
                     x = self.width() - idx - 1
-                    y = int((self.height() - 1) * (vmax - value.value) / (vmax - vmin))
+                    y = int((self.height() - 1) * (vmax - value) / (vmax - vmin))
                     if px is not None:
                         painter.drawLine(px, py, x, y)
                     px, py = x, y
@@ -274,21 +291,25 @@ class StatMonitor(ui_base.AbstractStatMonitor):
             self.__time_scale //= 2
 
     def onUpdate(self):
-        expressions = {
-            graph.id(): graph.compiled_expression()
-            for graph in self.__stat_graphs
-            if graph.is_valid()}
+        # Only fetch the values, which were added since the previous update.
+        graphs = [graph for graph in self.__stat_graphs if graph.is_valid()]
+        expressions = {graph.id(): graph.compiled_expression() for graph in graphs}
+        since = {graph.id(): graph.latestTimestamps() for graph in graphs}
+        generations = {graph.id(): graph.generation() for graph in graphs}
         request = process_manager_pb2.FetchStatsRequest(
-            pickle=pickle.dumps(expressions, -1))
+            pickle=pickle.dumps((expressions, since), -1))
         response = process_manager_pb2.FetchStatsResponse()
         self.call_async(
             self.app.process.manager.call('STATS_FETCH', request, response),
-            callback=functools.partial(self.onStatsFetched, response))
+            callback=functools.partial(self.onStatsFetched, response, generations))
 
-    def onStatsFetched(self, response, _):
+    def onStatsFetched(self, response, generations, _):
         result = pickle.loads(response.pickle)
         for graph in self.__stat_graphs:
-            graph.setTimeseriesSet(result.get(graph.id(), None))
+            ts_set = result.get(graph.id(), None)
+            # Drop results for an expression, which has been changed in the meantime.
+            if ts_set is not None and generations.get(graph.id()) == graph.generation():
+                graph.addTimeseriesSet(ts_set)
 
     def onAddStat(self):
         graph = StatGraph(parent=self.__stat_list)
@@ -66,3 +66,31 @@ def write_frame_stats(filebase, testname, frame_times):
             if fp.tell() == 0:
                 writer.writerow([h for h, _ in data])
             writer.writerow([v for _, v in data])
+
+
+def write_span_stats(filebase, testname, span_times):
+    """Write percentiles of span durations.
+
+    span_times maps span names (e.g. 'opcode(MIX)') to lists of durations in nsec. One row per
+    span name is written to '<filebase>.spans.csv', so results can be tracked over time.
+    """
+
+    now = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    header = ['datetime', 'testname', 'span', '#samples', 'p50', 'p99', 'max']
+    rows = []  # type: List[List[Any]]
+    for name, times in sorted(span_times.items()):
+        times = numpy.array(times, dtype=numpy.int64)
+        rows.append([
+            now, testname, name, len(times),
+            numpy.percentile(times, 50), numpy.percentile(times, 99), times.max()])
+
+    logger.info("Span stats:\n%s", pprint.pformat([row[2:] for row in rows]))
+
+    if constants.TEST_OPTS.WRITE_PERF_STATS:
+        with open(
+                os.path.join(constants.TESTLOG_DIR, filebase + '.spans.csv'),
+                'a', newline='', encoding='utf-8') as fp:
+            writer = csv.writer(fp, dialect=csv.unix_dialect)
+            if fp.tell() == 0:
+                writer.writerow(header)
+            writer.writerows(rows)
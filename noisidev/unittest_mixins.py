@@ -64,7 +64,7 @@ class NodeDBMixin(unittest.AbstractAsyncTestCase):
         self.node_db = None
 
     def setup_testcase(self):
-        self.node_db = node_db.NodeDB()
+        self.node_db = node_db.NodeDB(self.loop)
         self.node_db.setup()
 
     def cleanup_testcase(self):